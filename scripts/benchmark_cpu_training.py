@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark: entrenamiento en CPU con distintas configuraciones
+
+Entrena una época sobre un corpus sintético con cada combinación de hilos,
+workers del DataLoader, bf16, acumulación de gradientes y procesos DDP, y
+muestra los ejemplos/s que reporta el Trainer. Cada configuración corre en un
+proceso nuevo (los hilos de torch no se pueden reconfigurar del todo en un
+proceso ya usado); las de DDP se lanzan con torchrun.
+
+Uso:
+    poetry run python scripts/benchmark_cpu_training.py --threads 4 8 --workers 0 2 --bf16 --ddp 1 2
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+RESULT_PREFIX = "RESULT "
+
+
+def run_single(config: dict):
+    """Entrena con una configuración e imprime el resultado (en el proceso principal)"""
+    from benchmark_prepare_dataset import make_poems
+    from poema_algoritmo.cpu_training import CPUTrainingProfile, is_main_process
+    from poema_algoritmo.train_model import PoetryTrainer
+
+    profile = CPUTrainingProfile(
+        num_threads=config["threads"],
+        dataloader_workers=config["workers"],
+        bf16=config["bf16"],
+    )
+    with tempfile.TemporaryDirectory() as output_dir:
+        trainer = PoetryTrainer(
+            base_model=config["model"],
+            output_dir=output_dir,
+            max_length=config["max_length"],
+            token_cache_dir=None,
+            cpu_profile=profile,
+        )
+        dataset = trainer.prepare_dataset(make_poems(config["poems"]))
+        trainer.train(
+            dataset,
+            num_epochs=1,
+            batch_size=config["batch_size"],
+            save_steps=10 ** 9,
+            resume=False,
+            gradient_accumulation_steps=config["grad_accum"],
+        )
+    if is_main_process():
+        print(RESULT_PREFIX + json.dumps({
+            **config,
+            "bf16": trainer.cpu_profile.bf16,
+            "samples_per_sec": trainer.train_metrics.get("train_samples_per_second"),
+            "runtime": trainer.train_metrics.get("train_runtime"),
+        }), flush=True)
+
+
+def launch(config: dict) -> dict:
+    """Ejecuta una configuración en un proceso nuevo (o en varios con torchrun)"""
+    command = [sys.executable]
+    if config["ddp"] > 1:
+        command += ["-m", "torch.distributed.run", "--standalone", f"--nproc_per_node={config['ddp']}"]
+    command += [os.path.abspath(__file__), "--single", json.dumps(config)]
+    output = subprocess.run(command, capture_output=True, text=True)
+    for line in output.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    print(output.stderr[-2000:], file=sys.stderr)
+    return {**config, "samples_per_sec": None, "runtime": None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de entrenamiento en CPU")
+    parser.add_argument("--model", default="gpt2", help="Modelo base")
+    parser.add_argument("--poems", type=int, default=512, help="Poemas del corpus sintético")
+    parser.add_argument("--max-length", type=int, default=128, help="Longitud máxima de secuencia")
+    parser.add_argument("--batch-size", type=int, default=4, help="Batch por proceso")
+    parser.add_argument("--threads", type=int, nargs="+", default=[0],
+                        help="Hilos de torch por proceso (0 = automático)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0], help="Workers del DataLoader")
+    parser.add_argument("--grad-accum", type=int, nargs="+", default=[1], help="Acumulación de gradientes")
+    parser.add_argument("--ddp", type=int, nargs="+", default=[1], help="Procesos DDP (torchrun)")
+    parser.add_argument("--bf16", action="store_true", help="Probar también con autocast a bf16")
+    parser.add_argument("--single", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        run_single(json.loads(args.single))
+        return
+
+    print(f"{'ddp':>4} {'hilos':>6} {'workers':>8} {'accum':>6} {'bf16':>5} {'ejemplos/s':>11} {'tiempo s':>9}")
+    for ddp, threads, workers, grad_accum, bf16 in itertools.product(
+        args.ddp, args.threads, args.workers, args.grad_accum, (False, True) if args.bf16 else (False,)
+    ):
+        result = launch({
+            "model": args.model,
+            "poems": args.poems,
+            "max_length": args.max_length,
+            "batch_size": args.batch_size,
+            "threads": threads or None,
+            "workers": workers,
+            "grad_accum": grad_accum,
+            "bf16": bf16,
+            "ddp": ddp,
+        })
+        speed = f"{result['samples_per_sec']:.2f}" if result["samples_per_sec"] else "error"
+        runtime = f"{result['runtime']:.1f}" if result["runtime"] else "-"
+        print(f"{ddp:>4} {threads or 'auto':>6} {workers:>8} {grad_accum:>6} "
+              f"{'sí' if result['bf16'] else 'no':>5} {speed:>11} {runtime:>9}")
+
+
+if __name__ == "__main__":
+    main()
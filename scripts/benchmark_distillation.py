@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: modelo destilado frente a su profesor (latencia y calidad)
+
+Para cada modelo mide:
+- parámetros y tamaño en disco;
+- perplejidad sobre el conjunto de validación del corpus (el mismo split
+  determinista para los dos modelos);
+- latencia de generación en CPU (o GPU) con un lote de 1 y tokens/s.
+
+Uso:
+    poetry run python scripts/benchmark_distillation.py data/poems.txt \\
+        --teacher models/poetry_model --student models/poetry_model-distilled
+"""
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+import torch
+from transformers import AutoTokenizer, GPT2LMHeadModel
+
+from poema_algoritmo.distillation import distilled_output_dir
+from poema_algoritmo.evaluation import perplexity, split_held_out
+from poema_algoritmo.train_model import PoetryTrainer
+
+PROMPTS = [
+    "Tema: mar\n\nPoema sobre mar:\n\n",
+    "Escribe un poema triste sobre la casa:\n\n",
+    "Soneto romántico sobre el amor:\n\n",
+    "Verso libre sobre la ciudad:\n\n",
+]
+
+
+def measure_latency(model, tokenizer, device, new_tokens: int, repeats: int):
+    """Latencias (s) de generar `new_tokens` tokens con cada prompt"""
+    latencies = []
+    torch.manual_seed(0)
+    for _ in range(repeats):
+        for prompt in PROMPTS:
+            inputs = tokenizer(prompt, return_tensors="pt").to(device)
+            start = time.perf_counter()
+            with torch.no_grad():
+                model.generate(
+                    **inputs,
+                    max_new_tokens=new_tokens,
+                    min_new_tokens=new_tokens,
+                    do_sample=True,
+                    top_k=35,
+                    pad_token_id=tokenizer.eos_token_id,
+                )
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de destilación (profesor vs alumno)")
+    parser.add_argument("poems_file", help="Corpus de poemas (se usa su conjunto de validación)")
+    parser.add_argument("--teacher", default="models/poetry_model", help="Modelo profesor")
+    parser.add_argument("--student", default=None, help="Modelo alumno (default: <profesor>-distilled)")
+    parser.add_argument("--max-length", type=int, default=512, help="Longitud máxima al evaluar")
+    parser.add_argument("--new-tokens", type=int, default=64, help="Tokens generados por petición")
+    parser.add_argument("--repeats", type=int, default=3, help="Repeticiones de cada prompt")
+    args = parser.parse_args()
+
+    student = args.student or distilled_output_dir(args.teacher)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    _, held_out = split_held_out(PoetryTrainer.load_poems(args.poems_file))
+    print(f"Validación: {len(held_out)} poemas · dispositivo: {device}\n")
+
+    print(f"{'modelo':<40} {'parámetros':>12} {'disco MB':>9} {'perplejidad':>12} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'tokens/s':>9}")
+    for path in (args.teacher, student):
+        tokenizer = AutoTokenizer.from_pretrained(path, use_fast=True)
+        model = GPT2LMHeadModel.from_pretrained(path).to(device)
+        model.eval()
+
+        params = sum(p.numel() for p in model.parameters())
+        disk_mb = sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file()) / (1024 * 1024)
+        ppl = perplexity(model, tokenizer, held_out, max_length=args.max_length, device=device)
+
+        # Calentamiento (asignación de memoria, kernels)
+        measure_latency(model, tokenizer, device, args.new_tokens, 1)
+        latencies = sorted(measure_latency(model, tokenizer, device, args.new_tokens, args.repeats))
+        p50 = statistics.median(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        tokens_per_sec = args.new_tokens * len(latencies) / sum(latencies)
+
+        ppl_text = f"{ppl:.2f}" if ppl is not None else "-"
+        print(f"{path:<40} {params:>12,} {disk_mb:>9.1f} {ppl_text:>12} "
+              f"{p50 * 1000:>8.0f} {p95 * 1000:>8.0f} {tokens_per_sec:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark: escalado de EPUBProcessor.process_directory con varios procesos
+
+Genera un corpus sintético de EPUBs y mide el tiempo con 1, 2, 4... workers,
+comprobando que el resultado es idéntico al secuencial. Después mide una
+reconstrucción completa con la caché de EPUBs vacía y con la caché llena.
+
+Uso:
+    poetry run python scripts/benchmark_epub_parallel.py --books 16 --chapters 40
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from synthetic_epubs import generate_corpus
+from poema_algoritmo.epub_processor import EPUBProcessor
+
+
+def run(directory: str, workers: int, cache_dir: str = None):
+    processor = EPUBProcessor(cache_dir=cache_dir)
+    # Silenciar el log por capítulo para no medir la consola
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        poems = processor.process_directory(directory, workers=workers)
+        elapsed = time.perf_counter() - start
+    return poems, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de procesamiento paralelo de EPUBs")
+    parser.add_argument("--books", type=int, default=16)
+    parser.add_argument("--chapters", type=int, default=40)
+    parser.add_argument("--poems-per-chapter", type=int, default=10)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--corpus", default=None, help="Directorio con EPUBs existentes (no generar)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.corpus
+        if directory is None:
+            directory = os.path.join(tmp, "epub")
+            print(f"Generando {args.books} EPUBs sintéticos...")
+            generate_corpus(directory, args.books, args.chapters, args.poems_per_chapter)
+
+        size_mb = sum(
+            os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory) if f.endswith(".epub")
+        ) / (1024 * 1024)
+        print(f"Corpus: {directory} ({size_mb:.1f} MB)\n")
+
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= args.max_workers:
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != args.max_workers:
+            worker_counts.append(args.max_workers)
+
+        print(f"{'workers':>8} {'tiempo (s)':>11} {'speedup':>8} {'poemas':>8}")
+        baseline_poems, baseline_time = None, None
+        for workers in worker_counts:
+            poems, elapsed = run(directory, workers)
+            if baseline_poems is None:
+                baseline_poems, baseline_time = poems, elapsed
+            elif poems != baseline_poems:
+                raise SystemExit(f"✗ El resultado con {workers} workers difiere del secuencial")
+            print(f"{workers:>8} {elapsed:>11.2f} {baseline_time / elapsed:>7.2f}x {len(poems):>8}")
+
+        print("\n✓ Resultados idénticos al modo secuencial\n")
+
+        cache_dir = os.path.join(tmp, "cache")
+        _, cold = run(directory, args.max_workers, cache_dir)
+        poems, warm = run(directory, args.max_workers, cache_dir)
+        if poems != baseline_poems:
+            raise SystemExit("✗ El resultado desde la caché difiere del secuencial")
+        print(f"{'caché':>8} {'tiempo (s)':>11} {'speedup':>8}")
+        print(f"{'vacía':>8} {cold:>11.2f} {baseline_time / cold:>7.2f}x")
+        print(f"{'llena':>8} {warm:>11.2f} {baseline_time / warm:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
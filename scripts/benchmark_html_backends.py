@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: extractores de texto HTML de EPUBProcessor ("stream" vs "bs4")
+
+Comprueba que ambos backends producen exactamente el mismo texto (casos
+límite de XHTML y todos los documentos del corpus) y mide su throughput.
+
+Uso:
+    poetry run python scripts/benchmark_html_backends.py --books 4 --chapters 40
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import ebooklib
+from ebooklib import epub
+
+from synthetic_epubs import generate_corpus
+from poema_algoritmo.html_text import HTML_BACKENDS
+
+# Casos límite que deben dar el mismo texto con cualquier backend
+PARITY_CASES = [
+    '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+    '<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Título</title>'
+    '<style>p { margin: 0 }</style></head>\n<body>\n  <h1>AL LECTOR</h1>\n'
+    '  <p>La necedad, el error,<br/>el pecado &amp; la tacaña</p>\n'
+    '<!-- comentario --><p>a<b>b</b> c</p><script>var x = 1;</script>'
+    '<pre>  \n </pre><p>&nbsp;x&#233;&eacute;&#x41;&#8212;</p></body></html>'.encode('utf-8'),
+    b'<p>uno<![CDATA[dos]]>tres</p>  <div>\t</div>',
+    b'<p>sin cerrar <i>cursiva',
+    b'<p>a<br>b<br/>c</p><script/>d',
+    '<p>caf\xe9 &desconocida; &amp &#150; &lt;x&gt; 5 &amp;&amp; 6 & 7</p>'.encode('latin-1'),
+]
+
+
+def load_documents(directory: str):
+    """Contenido HTML (bytes) de todos los documentos de los EPUB del directorio"""
+    documents = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".epub"):
+            book = epub.read_epub(os.path.join(directory, name))
+            documents.extend(
+                item.get_content() for item in book.get_items()
+                if item.get_type() == ebooklib.ITEM_DOCUMENT
+            )
+    return documents
+
+
+def check_parity(documents):
+    """Falla si algún backend da un texto distinto al de bs4"""
+    reference = HTML_BACKENDS["bs4"]
+    for name, backend in HTML_BACKENDS.items():
+        for i, content in enumerate(documents):
+            if backend(content) != reference(content):
+                raise SystemExit(f"✗ '{name}' difiere de 'bs4' en el documento {i}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extractores HTML")
+    parser.add_argument("--books", type=int, default=4)
+    parser.add_argument("--chapters", type=int, default=40)
+    parser.add_argument("--poems-per-chapter", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se toma la mejor)")
+    parser.add_argument("--corpus", default=None, help="Directorio con EPUBs existentes (no generar)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.corpus
+        if directory is None:
+            directory = os.path.join(tmp, "epub")
+            print(f"Generando {args.books} EPUBs sintéticos...")
+            generate_corpus(directory, args.books, args.chapters, args.poems_per_chapter)
+        documents = load_documents(directory)
+
+    check_parity(PARITY_CASES)
+    check_parity(documents)
+    print(f"✓ Texto idéntico en {len(PARITY_CASES)} casos límite y {len(documents)} documentos\n")
+
+    size_mb = sum(len(content) for content in documents) / (1024 * 1024)
+    print(f"Corpus: {len(documents)} documentos ({size_mb:.1f} MB de HTML)\n")
+    print(f"{'backend':>8} {'tiempo (s)':>11} {'MB/s':>8} {'speedup':>8}")
+
+    timings = {}
+    for name, backend in HTML_BACKENDS.items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for content in documents:
+                backend(content)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+
+    for name, elapsed in timings.items():
+        print(f"{name:>8} {elapsed:>11.2f} {size_mb / elapsed:>8.1f} {timings['bs4'] / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: tiempo de importación y memoria al arrancar el servidor
+
+Importa la aplicación en un proceso nuevo con `python -X importtime` y muestra
+el tiempo total de importación, la memoria residente máxima y los módulos más
+lentos. Sirve como prueba de regresión: termina con código 1 si al arrancar se
+importa alguna dependencia pesada (torch, transformers, datasets, ebooklib...),
+que solo deben cargarse al generar, entrenar o procesar EPUBs, o si se supera
+`--max-ms`.
+
+Modos:
+    cli      importar poema_algoritmo.main (lo que paga `poema models ...`)
+    serving  crear la aplicación solo de generación (réplicas de inferencia)
+    admin    crear la aplicación solo de administración
+    full     crear la aplicación completa (generación y panel)
+
+Uso:
+    poetry run python scripts/benchmark_import_time.py
+    poetry run python scripts/benchmark_import_time.py --modes serving --max-ms 800
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Dependencias que no se deben importar al arrancar
+HEAVY_MODULES = ("torch", "transformers", "datasets", "accelerate", "peft", "ebooklib", "bs4", "lxml")
+
+MODES = {
+    "cli": "import poema_algoritmo.main",
+    "serving": "from poema_algoritmo.main import create_serving_app; create_serving_app()",
+    "admin": "from poema_algoritmo.main import create_admin_app; create_admin_app()",
+    "full": "from poema_algoritmo.main import create_app; create_app()",
+}
+
+# Se imprime después de importar: memoria residente máxima del proceso
+RSS_SNIPPET = (
+    "; import resource, sys; "
+    "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; "
+    "print(rss // 1024 if sys.platform != 'darwin' else rss // (1024 * 1024))"
+)
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def parse_importtime(stderr: str):
+    """{módulo: (propio µs, acumulado µs)} de la salida de -X importtime"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure(mode: str) -> dict:
+    """Importa la aplicación en un proceso nuevo y devuelve tiempo, memoria y módulos"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SRC_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", MODES[mode] + RSS_SNIPPET],
+        capture_output=True, text=True, env=env
+    )
+    if output.returncode != 0:
+        raise RuntimeError(f"El modo {mode} falló:\n{output.stderr[-2000:]}")
+
+    modules = parse_importtime(output.stderr)
+    packages = defaultdict(int)
+    for name, (self_us, _) in modules.items():
+        packages[name.split(".")[0]] += self_us
+    return {
+        "mode": mode,
+        "total_ms": sum(self_us for self_us, _ in modules.values()) / 1000,
+        "max_rss_mb": int(output.stdout.strip().splitlines()[-1]),
+        "modules": len(modules),
+        "heavy": sorted(set(packages) & set(HEAVY_MODULES)),
+        "top_packages": sorted(packages.items(), key=lambda item: item[1], reverse=True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de tiempo de importación")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES),
+                        help="Modos a medir (default: todos)")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Repeticiones por modo; se queda con la más rápida (default: 3)")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Falla si algún modo tarda más en importar")
+    parser.add_argument("--top", type=int, default=8, help="Paquetes más lentos a mostrar")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes:
+        runs = [measure(mode) for _ in range(max(1, args.repeats))]
+        results.append(min(runs, key=lambda run: run["total_ms"]))
+
+    failed = False
+    if args.json:
+        print(json.dumps([{**r, "top_packages": r["top_packages"][:args.top]} for r in results], indent=2))
+    else:
+        print(f"{'modo':<8} {'importación ms':>15} {'RSS máx. MB':>12} {'módulos':>8}  dependencias pesadas")
+        for r in results:
+            print(f"{r['mode']:<8} {r['total_ms']:>15.1f} {r['max_rss_mb']:>12} {r['modules']:>8}  "
+                  f"{', '.join(r['heavy']) or '-'}")
+        for r in results:
+            print(f"\nPaquetes más lentos ({r['mode']}):")
+            for name, self_us in r["top_packages"][:args.top]:
+                print(f"  {name:<30} {self_us / 1000:>8.1f} ms")
+
+    for r in results:
+        if r["heavy"]:
+            print(f"✗ {r['mode']}: se importan al arrancar {', '.join(r['heavy'])}", file=sys.stderr)
+            failed = True
+        if args.max_ms is not None and r["total_ms"] > args.max_ms:
+            print(f"✗ {r['mode']}: {r['total_ms']:.0f} ms > {args.max_ms:.0f} ms", file=sys.stderr)
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
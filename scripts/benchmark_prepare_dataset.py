@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark: preparación del dataset de entrenamiento (directrices + tokenización)
+
+Genera un corpus sintético de poemas y mide por separado el formato con
+directrices (función pura) y la tokenización completa con `tokenize_texts`
+para distintos números de procesos. No usa la caché tokenizada.
+
+Uso:
+    poetry run python scripts/benchmark_prepare_dataset.py --poems 100000 --num-proc 1 4 8
+"""
+import argparse
+import random
+import time
+
+from synthetic_epubs import VOCABULARY, make_line
+from poema_algoritmo.directives import format_training_examples
+
+
+def make_poems(count: int, seed: int = 42):
+    """Poemas sintéticos: un título corto y 2-4 estrofas"""
+    rng = random.Random(seed)
+    poems = []
+    for _ in range(count):
+        lines = [" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 3))).capitalize(), ""]
+        for _ in range(rng.randint(2, 4)):
+            lines.extend(make_line(rng) for _ in range(rng.randint(3, 5)))
+            lines.append("")
+        poems.append("\n".join(lines).strip())
+    return poems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la preparación del dataset")
+    parser.add_argument("--poems", type=int, default=100000, help="Poemas del corpus")
+    parser.add_argument("--tokenizer", default="gpt2", help="Tokenizer (modelo base)")
+    parser.add_argument("--max-length", type=int, default=512, help="Longitud máxima de secuencia")
+    parser.add_argument("--num-proc", type=int, nargs="+", default=[1, 4], help="Procesos a probar")
+    parser.add_argument("--slow", action="store_true", help="Comparar también con el tokenizer lento (Python)")
+    args = parser.parse_args()
+
+    poems = make_poems(args.poems)
+    size_mb = sum(len(p.encode("utf-8")) for p in poems) / (1024 * 1024)
+    print(f"Corpus: {len(poems)} poemas, {size_mb:.1f} MB")
+
+    start = time.perf_counter()
+    formatted = format_training_examples(poems)
+    elapsed = time.perf_counter() - start
+    with_directives = sum(1 for text, poem in zip(formatted, poems) if text != poem)
+    print(f"Directrices: {elapsed:.2f} s ({len(poems) / elapsed:,.0f} poemas/s, "
+          f"{with_directives / len(poems):.0%} con formato)")
+
+    # Tokenización: requiere transformers/datasets
+    from transformers import AutoTokenizer
+    from poema_algoritmo.training_data import tokenize_texts
+
+    for use_fast in ((False, True) if args.slow else (True,)):
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer, use_fast=use_fast)
+        name = type(tokenizer).__name__
+        for num_proc in args.num_proc:
+            start = time.perf_counter()
+            dataset = tokenize_texts(poems, tokenizer, args.max_length, directive_seed=42, num_proc=num_proc)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>20} num_proc={num_proc:<3} {elapsed:>8.2f} s  "
+                  f"{len(dataset) / elapsed:>10,.0f} ejemplos/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memoria de varios workers de generación con y sin modelo compartido
+
+Arranca `poema serve --role inference --workers N` con el modelo precargado y
+compartido (preload + fork), y con una copia por worker (--no-preload), y mide
+la memoria de cada proceso desde /proc/<pid>/smaps_rollup (solo Linux):
+
+- RSS: memoria residente (cuenta entera la compartida, así que engaña);
+- PSS: la compartida repartida entre los procesos que la usan;
+- USS: memoria privada, la que se liberaría al terminar el proceso.
+
+Con el modelo compartido la USS de cada worker extra debería ser casi nula.
+Opcionalmente lanza peticiones de generación antes de medir (--requests).
+
+Uso:
+    poetry run python scripts/benchmark_serving_memory.py --workers 4
+    poetry run python scripts/benchmark_serving_memory.py --workers 4 --share-memory --requests 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def memory_kb(pid: int) -> dict:
+    """RSS, PSS y USS (privada) de un proceso en KB"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def child_pids(parent: int) -> list:
+    """Procesos hijos directos de `parent`"""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # El nombre va entre paréntesis y puede tener espacios
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == parent:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def wait_until_ready(url: str, server: subprocess.Popen, workers: int, timeout: float):
+    """Espera a que responda /api/health, estén todos los workers y su memoria se estabilice"""
+    deadline = time.monotonic() + timeout
+    previous = None
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("El servidor terminó antes de estar listo")
+        try:
+            urllib.request.urlopen(f"{url}/api/health", timeout=2).read()
+        except OSError:
+            time.sleep(1)
+            continue
+        pids = child_pids(server.pid)
+        if len(pids) >= workers:
+            total = sum(memory_kb(pid)["rss"] for pid in pids)
+            if previous and abs(total - previous) <= 0.01 * previous:
+                return
+            previous = total
+        time.sleep(2)
+    raise RuntimeError("El servidor no estuvo listo a tiempo")
+
+
+def generate(url: str, count: int):
+    """Peticiones de generación (se reparten entre los workers)"""
+    body = json.dumps({"input_text": "el mar", "max_sentences": 2, "prefer_lm_studio": False}).encode("utf-8")
+    for _ in range(count):
+        request = urllib.request.Request(
+            f"{url}/api/generate", data=body, headers={"Content-Type": "application/json"}
+        )
+        urllib.request.urlopen(request, timeout=300).read()
+
+
+def run_mode(args, preload: bool) -> dict:
+    """Arranca el servidor en un modo, mide la memoria y lo detiene"""
+    port = args.port + (0 if preload else 1)
+    url = f"http://127.0.0.1:{port}"
+    command = [
+        sys.executable, "-m", "poema_algoritmo.main", "serve",
+        "--role", "inference", "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers),
+    ]
+    if not preload:
+        command.append("--no-preload")
+    if args.share_memory:
+        command.append("--share-memory")
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = SRC_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("LM_STUDIO_URL", "http://127.0.0.1:9")  # sin LM Studio: genera el modelo local
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(url, server, args.workers, args.timeout)
+        if args.requests:
+            generate(url, args.requests)
+        workers = [memory_kb(pid) for pid in child_pids(server.pid)]
+        parent = memory_kb(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    return {"preload": preload, "parent": parent, "workers": workers}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de memoria de los workers de generación")
+    parser.add_argument("--workers", type=int, default=4, help="Workers de generación")
+    parser.add_argument("--port", type=int, default=8790, help="Puerto (el modo sin preload usa el siguiente)")
+    parser.add_argument("--requests", type=int, default=0, help="Peticiones de generación antes de medir")
+    parser.add_argument("--share-memory", action="store_true", help="Pesos en memoria compartida")
+    parser.add_argument("--timeout", type=float, default=300, help="Segundos máximos para arrancar")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("Este benchmark necesita /proc/<pid>/smaps_rollup (Linux >= 4.14)")
+
+    print(f"{'modo':<22} {'proceso':<10} {'RSS MB':>9} {'PSS MB':>9} {'USS MB':>9}")
+    for preload in (True, False):
+        result = run_mode(args, preload)
+        mode = "modelo compartido" if preload else "copia por worker"
+        rows = [("principal", result["parent"])] + [(f"worker {i}", m) for i, m in enumerate(result["workers"])]
+        for name, memory in rows:
+            print(f"{mode:<22} {name:<10} {memory['rss'] / 1024:>9.1f} {memory['pss'] / 1024:>9.1f} "
+                  f"{memory['uss'] / 1024:>9.1f}")
+        total_pss = sum(memory["pss"] for _, memory in rows) / 1024
+        worker_uss = [memory["uss"] / 1024 for memory in result["workers"]]
+        mean_uss = sum(worker_uss) / len(worker_uss) if worker_uss else 0
+        print(f"{mode:<22} {'total PSS':<10} {total_pss:>9.1f}   USS media por worker: {mean_uss:.1f} MB\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Genera un corpus sintético de EPUBs con poemas para los benchmarks
+"""
+import argparse
+import os
+import random
+
+from ebooklib import epub
+
+VOCABULARY = (
+    "luna mar noche sombra viento fuego silencio ciudad amor olvido tiempo "
+    "ceniza espejo jardín lluvia horizonte memoria río piedra cielo sueño "
+    "herida alba invierno otoño raíz pájaro latido niebla verso ausencia"
+).split()
+
+CONNECTORS = ["y", "de", "en", "bajo", "sobre", "como", "sin", "hacia", "entre", "con"]
+
+
+def make_line(rng: random.Random) -> str:
+    """Un verso de 4 a 9 palabras"""
+    words = []
+    for i in range(rng.randint(4, 9)):
+        words.append(rng.choice(CONNECTORS) if i % 2 else rng.choice(VOCABULARY))
+    line = " ".join(words)
+    return line[0].upper() + line[1:] + rng.choice([",", ";", ".", ""])
+
+
+def make_poem_html(rng: random.Random, index: int) -> str:
+    """Un poema en HTML: título y 2-4 estrofas de 3-5 versos"""
+    stanzas = []
+    for _ in range(rng.randint(2, 4)):
+        lines = [make_line(rng) for _ in range(rng.randint(3, 5))]
+        stanzas.append("<p>" + "<br/>".join(lines) + "</p>")
+    title = " ".join(rng.choice(VOCABULARY) for _ in range(2)).upper()
+    return f"<h2>{title} {index}</h2>" + "".join(stanzas)
+
+
+def make_epub(path: str, rng: random.Random, chapters: int, poems_per_chapter: int):
+    """Escribe un EPUB con `chapters` capítulos de `poems_per_chapter` poemas"""
+    book = epub.EpubBook()
+    name = os.path.splitext(os.path.basename(path))[0]
+    book.set_identifier(name)
+    book.set_title(f"Poemario sintético {name}")
+    book.set_language("es")
+
+    items = []
+    for c in range(chapters):
+        chapter = epub.EpubHtml(title=f"Capítulo {c + 1}", file_name=f"chap_{c:04d}.xhtml", lang="es")
+        body = "".join(make_poem_html(rng, c * poems_per_chapter + p) for p in range(poems_per_chapter))
+        chapter.content = f"<html><head><title>Capítulo {c + 1}</title></head><body>{body}</body></html>"
+        book.add_item(chapter)
+        items.append(chapter)
+
+    book.toc = items
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ["nav"] + items
+    epub.write_epub(path, book)
+
+
+def generate_corpus(directory: str, books: int, chapters: int, poems_per_chapter: int, seed: int = 42):
+    """Genera `books` EPUBs deterministas en `directory`"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    for b in range(books):
+        make_epub(os.path.join(directory, f"libro_{b:03d}.epub"), rng, chapters, poems_per_chapter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generar EPUBs sintéticos de poesía")
+    parser.add_argument("directory", help="Directorio de salida")
+    parser.add_argument("--books", type=int, default=16)
+    parser.add_argument("--chapters", type=int, default=40)
+    parser.add_argument("--poems-per-chapter", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generate_corpus(args.directory, args.books, args.chapters, args.poems_per_chapter, args.seed)
+    print(f"✓ {args.books} EPUBs generados en {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,7 +28,7 @@ echo ""
 # Paso 1: Extraer poesías de EPUBs
 if [ -d "$EPUB_DIR" ] && [ "$(ls -A $EPUB_DIR/*.epub 2>/dev/null)" ]; then
     echo -e "${GREEN}[1/2]${NC} Extrayendo poesías de archivos EPUB..."
-    poetry run python -m poema_algoritmo.epub_processor "$EPUB_DIR" -o "$POEMS_FILE"
+    poetry run python -m poema_algoritmo.epub_processor "$EPUB_DIR" -o "$POEMS_FILE" --workers "${EPUB_WORKERS:-0}"
     echo ""
 else
     echo -e "${YELLOW}⚠${NC} No se encontraron archivos EPUB en $EPUB_DIR"
@@ -2,19 +2,42 @@
 Panel de administración para gestionar datasets y entrenar modelos
 """
 import os
+import asyncio
 import json
 import shutil
 import re
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, Request, Header
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import json
 
-from .train_model import PoetryTrainer
+from .training_jobs import ACTIVE_STATES, TrainingJobQueue
+from .lora import DEFAULT_LORA_R, adapter_base_model, is_adapter_dir
+from .evaluation import read_report
+from .model_catalog import get_catalog
+from .serving_control import list_replicas, read_reload_request, request_reload
 from .epub_processor import EPUBProcessor
+from .dataset_store import (
+    get_dataset_lock,
+    write_locked,
+    atomic_write_bytes,
+    atomic_write_text,
+    compute_etag,
+    etag_matches,
+)
+from .uploads import (
+    ResumableUploadStore,
+    UploadChecksumError,
+    UploadOffsetError,
+    UploadTooLargeError,
+    stream_upload_to_temp,
+)
+from .epub_jobs import EPUBJobManager
+from .segmentation import ADMIN_RULES, segment_poems
+from .near_duplicates import DEFAULT_THRESHOLD, NearDuplicateIndex, pick_canonical
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -22,12 +45,41 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 DATA_DIR = Path("data")
 MODELS_DIR = Path("models")
 EPUB_DIR = DATA_DIR / "epub"
+UPLOADS_DIR = DATA_DIR / ".uploads"
+JOBS_DIR = DATA_DIR / ".jobs"
 
 # Asegurar que los directorios existen
 DATA_DIR.mkdir(exist_ok=True)
 MODELS_DIR.mkdir(exist_ok=True)
 EPUB_DIR.mkdir(exist_ok=True)
 
+# Sesiones de subida reanudables (corpus muy grandes)
+upload_store = ResumableUploadStore(UPLOADS_DIR)
+
+# Conversiones EPUB en segundo plano (pool de procesos)
+epub_jobs = EPUBJobManager(JOBS_DIR)
+
+# Cola de entrenamientos (cada uno en su proceso; límites en TRAINING_* del entorno)
+training_jobs = TrainingJobQueue(MODELS_DIR / ".training_jobs")
+
+
+@router.on_event("startup")
+def start_training_scheduler():
+    """Arranca el planificador (los entrenamientos interrumpidos vuelven a la cola)"""
+    training_jobs.start()
+
+
+@router.on_event("startup")
+def recover_epub_jobs():
+    """Las conversiones EPUB interrumpidas por un reinicio quedan como error y se podan las antiguas"""
+    epub_jobs.recover()
+
+
+@router.on_event("shutdown")
+def stop_training_jobs():
+    """Al apagar el servidor se detienen los entrenamientos (se reanudan desde su checkpoint)"""
+    training_jobs.shutdown()
+
 
 class TrainingRequest(BaseModel):
     """Request para iniciar entrenamiento"""
@@ -37,6 +89,26 @@ class TrainingRequest(BaseModel):
     batch_size: int = 4
     learning_rate: float = 5e-5
     base_model: Optional[str] = None
+    pack: bool = False
+    resume: bool = True
+    priority: int = 0
+    lora: bool = False
+    lora_r: int = DEFAULT_LORA_R
+    evaluate: bool = True
+    gradient_accumulation_steps: int = 1
+    streaming: bool = False
+
+
+class JobPriorityRequest(BaseModel):
+    """Request para cambiar la prioridad de un entrenamiento en cola"""
+    priority: int
+
+
+class DuplicateMergeRequest(BaseModel):
+    """Request para fusionar poemas casi duplicados"""
+    threshold: float = DEFAULT_THRESHOLD
+    cluster_ids: Optional[List[str]] = None
+    dataset: Optional[str] = None
 
 
 class DatasetInfo(BaseModel):
@@ -74,10 +146,11 @@ async def list_datasets():
     # Buscar archivos de poemas
     for file_path in DATA_DIR.glob("*.txt"):
         try:
-            stat = file_path.stat()
             # Intentar contar poemas (aproximado)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            async with get_dataset_lock(file_path).read():
+                stat = file_path.stat()
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
                 # Contar separadores (soporta === POEMA === y === POEMA X ===)
                 separator_pattern = r'===+\s*POEMA\s*(?:\d+)?\s*===+'
                 has_separators = bool(re.search(separator_pattern, content, re.IGNORECASE))
@@ -130,13 +203,18 @@ async def rename_dataset(filename: str, new_name: str = Form(...)):
         raise HTTPException(status_code=403, detail="No se puede renombrar el dataset principal poems.txt")
     
     try:
-        file_path.rename(new_file_path)
+        async with write_locked(file_path, new_file_path):
+            if new_file_path.exists():
+                raise HTTPException(status_code=400, detail="Ya existe un dataset con ese nombre")
+            os.replace(file_path, new_file_path)
         return {
             "success": True,
             "message": f"Dataset renombrado a {new_name}",
             "old_name": filename,
             "new_name": new_name
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al renombrar: {str(e)}")
 
@@ -146,146 +224,76 @@ def _extract_poems_free_format(content: str) -> List[Dict]:
     Extrae poemas de formato libre sin cargar el modelo
     Optimizado para visualización (más permisivo que entrenamiento)
     """
-    import re
-    
-    poems = []
-    content_lines = content.split('\n')
-    
-    # Buscar donde terminan los metadatos iniciales
-    start_idx = 0
-    for i, line in enumerate(content_lines[:200]):
-        line_upper = line.strip().upper()
-        if any(keyword in line_upper for keyword in ['AL LECTOR', 'SPLEEN', 'BENDICIÓN', 'EL ALBATROS', 'PRÓLOGO']):
-            start_idx = i
-            break
-    
-    if start_idx > 0:
-        content_lines = content_lines[start_idx:]
-    
-    current_poem_lines = []
-    empty_line_count = 0
-    poem_index = 0
-    
-    for i, line in enumerate(content_lines):
-        line_stripped = line.strip()
-        
-        if not line_stripped:
-            empty_line_count += 1
-            # Si hay 3+ líneas vacías consecutivas, probablemente es fin de poema
-            if empty_line_count >= 3 and current_poem_lines:
-                poem_text = '\n'.join(current_poem_lines).strip()
-                if poem_text and len(poem_text) > 20:
-                    poems.append({
-                        "id": poem_index,
-                        "text": poem_text,
-                        "length": len(poem_text)
-                    })
-                    poem_index += 1
-                current_poem_lines = []
-                empty_line_count = 0
-        else:
-            # Filtrar metadatos obvios
-            line_lower = line_stripped.lower()
-            is_metadata = (
-                re.match(r'^\d{4}\s*\.?\s*$', line_stripped) or  # Años solos
-                (line_stripped.isupper() and len(line_stripped) < 50 and i < 50) or  # Títulos de sección al inicio
-                any(word in line_lower for word in ['charles baudelaire', 'las flores del mal', 'epublibre', 'editor digital'])
-            )
-            
-            if not is_metadata:
-                empty_line_count = 0
-                current_poem_lines.append(line)
-    
-    # Agregar último poema
-    if current_poem_lines:
-        poem_text = '\n'.join(current_poem_lines).strip()
-        if poem_text and len(poem_text) > 20:
-            poems.append({
-                "id": poem_index,
-                "text": poem_text,
-                "length": len(poem_text)
-            })
-    
-    return poems
+    return [
+        {"id": i, "text": span.text, "length": len(span.text)}
+        for i, span in enumerate(segment_poems(content, ADMIN_RULES))
+    ]
+
 
+_SEPARATOR_PATTERN = r'===+\s*POEMA\s*(?:\d+)?\s*===+'
+_SEPARATOR_LINE_PATTERN = re.compile(r'^===+\s*POEMA\s*(?:\d+)?\s*===+$', re.IGNORECASE)
+_NUMBER_LINE_PATTERN = re.compile(r'^\d+$')
 
-def _extract_poems_free_format_with_positions(content: str) -> Tuple[List[Dict], List[Tuple[int, int]]]:
+
+def _split_separated_poems(content: str) -> List[Tuple[Optional[int], str, str]]:
     """
-    Extrae poemas de formato libre y retorna también sus posiciones (start_line, end_line)
-    para poder reconstruir el archivo correctamente
+    Divide un dataset con separadores === POEMA === en bloques
+    (id, texto guardado, texto mostrado).
+
+    El texto mostrado omite las líneas que son solo números; el id es el del
+    panel (None si el bloque no se muestra como poema). Listar, editar, borrar
+    y fusionar duplicados usan esta misma numeración.
     """
-    import re
-    
-    poems = []
-    positions = []
-    content_lines = content.split('\n')
-    original_lines = content_lines.copy()
-    
-    # Buscar donde terminan los metadatos iniciales
-    start_idx = 0
-    for i, line in enumerate(content_lines[:200]):
-        line_upper = line.strip().upper()
-        if any(keyword in line_upper for keyword in ['AL LECTOR', 'SPLEEN', 'BENDICIÓN', 'EL ALBATROS', 'PRÓLOGO']):
-            start_idx = i
-            break
-    
-    if start_idx > 0:
-        content_lines = content_lines[start_idx:]
-        offset = start_idx
-    else:
-        offset = 0
-    
-    current_poem_lines = []
-    current_start_line = offset
-    empty_line_count = 0
+    blocks = []
     poem_index = 0
-    
-    for i, line in enumerate(content_lines):
-        line_stripped = line.strip()
-        actual_line_num = i + offset
-        
-        if not line_stripped:
-            empty_line_count += 1
-            # Si hay 3+ líneas vacías consecutivas, probablemente es fin de poema
-            if empty_line_count >= 3 and current_poem_lines:
-                poem_text = '\n'.join(current_poem_lines).strip()
-                if poem_text and len(poem_text) > 20:
-                    poems.append({
-                        "id": poem_index,
-                        "text": poem_text,
-                        "length": len(poem_text)
-                    })
-                    positions.append((current_start_line, actual_line_num - 3))
-                    poem_index += 1
-                current_poem_lines = []
-                empty_line_count = 0
+    for poem_raw in re.split(_SEPARATOR_PATTERN, content, flags=re.IGNORECASE):
+        lines = [line.strip() for line in poem_raw.split('\n') if line.strip()]
+        lines = [line for line in lines if not _SEPARATOR_LINE_PATTERN.match(line)]
+        shown = '\n'.join(line for line in lines if not _NUMBER_LINE_PATTERN.match(line))
+        if shown and len(shown) > 10:
+            blocks.append((poem_index, '\n'.join(lines), shown))
+            poem_index += 1
         else:
-            # Filtrar metadatos obvios
-            line_lower = line_stripped.lower()
-            is_metadata = (
-                re.match(r'^\d{4}\s*\.?\s*$', line_stripped) or  # Años solos
-                (line_stripped.isupper() and len(line_stripped) < 50 and i < 50) or  # Títulos de sección al inicio
-                any(word in line_lower for word in ['charles baudelaire', 'las flores del mal', 'epublibre', 'editor digital'])
-            )
-            
-            if not is_metadata:
-                if not current_poem_lines:
-                    current_start_line = actual_line_num
-                empty_line_count = 0
-                current_poem_lines.append(line)
-    
-    # Agregar último poema
-    if current_poem_lines:
-        poem_text = '\n'.join(current_poem_lines).strip()
-        if poem_text and len(poem_text) > 20:
-            poems.append({
-                "id": poem_index,
-                "text": poem_text,
-                "length": len(poem_text)
-            })
-            positions.append((current_start_line, len(original_lines)))
-    
-    return poems, positions
+            blocks.append((None, '\n'.join(lines), shown))
+    return blocks
+
+
+def _join_separated_poems(texts: List[str]) -> str:
+    """Reconstruye un dataset con separadores en formato estándar (omite bloques vacíos o muy cortos)"""
+    separator = "=== POEMA ==="
+    texts = [text for text in texts if text and len(text) > 10]
+    return "\n\n".join(separator + "\n\n" + text + "\n" for text in texts)
+
+
+def _parse_dataset_poems(content: str) -> List[Dict]:
+    """
+    Extrae los poemas de un dataset tal como se muestran en el panel
+    (soporta === POEMA ===, === POEMA X === y formato libre)
+    """
+    if not re.search(_SEPARATOR_PATTERN, content, re.IGNORECASE):
+        # Formato libre: usar función optimizada (sin cargar modelo)
+        return _extract_poems_free_format(content)
+    
+    return [
+        {"id": poem_id, "text": shown, "length": len(shown)}
+        for poem_id, _, shown in _split_separated_poems(content)
+        if poem_id is not None
+    ]
+
+
+def _check_poem_etag(content: str, poem_id: int, if_match: Optional[str]):
+    """
+    Control de concurrencia optimista: verifica que el poema no haya cambiado
+    desde que el cliente lo leyó (cabecera If-Match con el ETag del poema)
+    """
+    if not if_match:
+        return
+    current = next((p for p in _parse_dataset_poems(content) if p["id"] == poem_id), None)
+    if current is None or not etag_matches(if_match, compute_etag(current["text"])):
+        raise HTTPException(
+            status_code=412,
+            detail="El poema fue modificado por otra operación. Recarga el dataset e inténtalo de nuevo."
+        )
 
 
 @router.get("/api/datasets/{filename}/poems")
@@ -312,53 +320,24 @@ async def get_dataset_poems(
     page = max(1, page)
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Detectar formato: ¿tiene separadores con === POEMA ===?
-        # Buscar tanto "=== POEMA ===" como "=== POEMA X ===" para compatibilidad
-        separator = "=== POEMA ==="
-        separator_pattern = r'===+\s*POEMA\s*(?:\d+)?\s*===+'
-        has_separators = bool(re.search(separator_pattern, content, re.IGNORECASE))
+        async with get_dataset_lock(file_path).read():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
         
-        if has_separators:
-            # Formato con separadores explícitos (soporta === POEMA === y === POEMA X ===)
-            # Dividir por cualquier variante del separador
-            poems_raw = re.split(separator_pattern, content, flags=re.IGNORECASE)
-            
-            all_poems = []
-            poem_index = 0
-            for poem_raw in poems_raw:
-                poem_text = poem_raw.strip()
-                # Filtrar líneas que son solo el separador o metadatos
-                lines = [line.strip() for line in poem_text.split('\n') if line.strip()]
-                # Eliminar líneas que son solo separadores o números
-                filtered_lines = [
-                    line for line in lines 
-                    if not re.match(r'^===+\s*POEMA\s*(?:\d+)?\s*===+$', line, re.IGNORECASE)
-                    and not re.match(r'^\d+$', line)
-                ]
-                poem_text = '\n'.join(filtered_lines).strip()
-                
-                if poem_text and len(poem_text) > 10:
-                    all_poems.append({
-                        "id": poem_index,
-                        "text": poem_text,
-                        "length": len(poem_text)
-                    })
-                    poem_index += 1
-        else:
-            # Formato libre: usar función optimizada (sin cargar modelo)
-            all_poems = _extract_poems_free_format(content)
+        all_poems = _parse_dataset_poems(content)
+        dataset_etag = compute_etag(content)
         
         # Paginación
         total = len(all_poems)
         start_idx = (page - 1) * per_page
         end_idx = start_idx + per_page
         poems_page = all_poems[start_idx:end_idx]
+        for poem in poems_page:
+            poem["etag"] = compute_etag(poem["text"])
         
-        return {
+        return JSONResponse({
             "filename": filename,
+            "etag": dataset_etag,
             "poems": poems_page,
             "pagination": {
                 "page": page,
@@ -366,7 +345,7 @@ async def get_dataset_poems(
                 "total": total,
                 "total_pages": (total + per_page - 1) // per_page if total > 0 else 0
             }
-        }
+        }, headers={"ETag": f'"{dataset_etag}"'})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al leer el dataset: {str(e)}")
 
@@ -380,38 +359,11 @@ async def get_poem_by_id(filename: str, poem_id: int):
         raise HTTPException(status_code=404, detail="Dataset no encontrado")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Detectar formato (soporta === POEMA === y === POEMA X ===)
-        separator = "=== POEMA ==="
-        separator_pattern = r'===+\s*POEMA\s*(?:\d+)?\s*===+'
-        has_separators = bool(re.search(separator_pattern, content, re.IGNORECASE))
+        async with get_dataset_lock(file_path).read():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
         
-        if has_separators:
-            # Dividir por cualquier variante del separador
-            poems_raw = re.split(separator_pattern, content, flags=re.IGNORECASE)
-            all_poems = []
-            poem_index = 0
-            for poem_raw in poems_raw:
-                poem_text = poem_raw.strip()
-                # Filtrar líneas que son solo separadores
-                lines = [line.strip() for line in poem_text.split('\n') if line.strip()]
-                filtered_lines = [
-                    line for line in lines 
-                    if not re.match(r'^===+\s*POEMA\s*(?:\d+)?\s*===+$', line, re.IGNORECASE)
-                    and not re.match(r'^\d+$', line)
-                ]
-                poem_text = '\n'.join(filtered_lines).strip()
-                if poem_text and len(poem_text) > 10:
-                    all_poems.append({
-                        "id": poem_index,
-                        "text": poem_text,
-                        "length": len(poem_text)
-                    })
-                    poem_index += 1
-        else:
-            all_poems = _extract_poems_free_format(content)
+        all_poems = _parse_dataset_poems(content)
         
         # Buscar poema por ID
         poem = next((p for p in all_poems if p["id"] == poem_id), None)
@@ -419,7 +371,9 @@ async def get_poem_by_id(filename: str, poem_id: int):
         if poem is None:
             raise HTTPException(status_code=404, detail=f"Poema con ID {poem_id} no encontrado")
         
-        return poem
+        # El ETag permite detectar ediciones concurrentes al guardar (If-Match)
+        poem["etag"] = compute_etag(poem["text"])
+        return JSONResponse(poem, headers={"ETag": f'"{poem["etag"]}"'})
     except HTTPException:
         raise
     except Exception as e:
@@ -427,8 +381,18 @@ async def get_poem_by_id(filename: str, poem_id: int):
 
 
 @router.put("/api/datasets/{filename}/poems/{poem_id}")
-async def update_poem(filename: str, poem_id: int, poem: str = Form(...)):
-    """Actualiza un poema específico en un dataset"""
+async def update_poem(
+    filename: str,
+    poem_id: int,
+    poem: str = Form(...),
+    if_match: Optional[str] = Header(None)
+):
+    """
+    Actualiza un poema específico en un dataset
+    
+    Si se envía la cabecera If-Match con el ETag del poema, la actualización
+    solo se aplica si nadie lo modificó entretanto (412 en caso contrario).
+    """
     file_path = DATA_DIR / filename
     
     if not file_path.exists():
@@ -438,71 +402,44 @@ async def update_poem(filename: str, poem_id: int, poem: str = Form(...)):
         raise HTTPException(status_code=400, detail="El poema no puede estar vacío")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            content_lines = content.split('\n')
+        async with get_dataset_lock(file_path).write():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
         
-        # Detectar formato (soporta === POEMA === y === POEMA X ===)
-        separator = "=== POEMA ==="
-        separator_pattern = r'===+\s*POEMA\s*(?:\d+)?\s*===+'
-        has_separators = bool(re.search(separator_pattern, content, re.IGNORECASE))
+            # Detectar formato (soporta === POEMA === y === POEMA X ===)
+            has_separators = bool(re.search(_SEPARATOR_PATTERN, content, re.IGNORECASE))
         
-        if has_separators:
-            # Formato con separadores (dividir por cualquier variante)
-            poems_raw = re.split(separator_pattern, content, flags=re.IGNORECASE)
-            valid_poems = []
-            for poem_raw in poems_raw:
-                poem_text = poem_raw.strip()
-                # Filtrar líneas que son solo separadores
-                lines = [line.strip() for line in poem_text.split('\n') if line.strip()]
-                filtered_lines = [
-                    line for line in lines 
-                    if not re.match(r'^===+\s*POEMA\s*(?:\d+)?\s*===+$', line, re.IGNORECASE)
-                ]
-                poem_text = '\n'.join(filtered_lines).strip()
-                if poem_text and len(poem_text) > 10:
-                    valid_poems.append(poem_text)
-            
-            if poem_id < 0 or poem_id >= len(valid_poems):
-                raise HTTPException(status_code=404, detail="Poema no encontrado")
-            
-            # Actualizar el poema específico
-            valid_poems[poem_id] = poem.strip()
-            
-            # Reconstruir el contenido con formato estándar
-            new_content = ""
-            for i, poem_text in enumerate(valid_poems):
-                if i > 0:
-                    new_content += "\n\n"
-                new_content += separator + "\n\n" + poem_text + "\n"
-        else:
-            # Formato libre: usar función con posiciones
-            extracted_poems, positions = _extract_poems_free_format_with_positions(content)
-            
-            if poem_id < 0 or poem_id >= len(extracted_poems):
-                raise HTTPException(status_code=404, detail="Poema no encontrado")
-            
-            # Obtener posición del poema a actualizar
-            start_line, end_line = positions[poem_id]
+            # Rechazar si el poema cambió desde que el cliente lo leyó
+            _check_poem_etag(content, poem_id, if_match)
+        
+            if has_separators:
+                # Formato con separadores: mismos ids que al listar
+                blocks = _split_separated_poems(content)
+                if not any(block_id == poem_id for block_id, _, _ in blocks):
+                    raise HTTPException(status_code=404, detail="Poema no encontrado")
             
-            # Reconstruir: antes del poema + nuevo poema + después del poema
-            before_lines = content_lines[:start_line]
-            after_lines = content_lines[end_line:]
+                # Actualizar el poema específico y reconstruir con formato estándar
+                new_content = _join_separated_poems([
+                    poem.strip() if block_id == poem_id else text
+                    for block_id, text, _ in blocks
+                ])
+            else:
+                # Formato libre: reemplazar exactamente el rango del poema
+                spans = segment_poems(content, ADMIN_RULES)
             
-            # Nuevo poema con separación adecuada
-            new_poem_lines = poem.strip().split('\n')
+                if poem_id < 0 or poem_id >= len(spans):
+                    raise HTTPException(status_code=404, detail="Poema no encontrado")
             
-            # Reconstruir manteniendo estructura
-            new_content_lines = before_lines + new_poem_lines + [''] + [''] + after_lines
-            new_content = '\n'.join(new_content_lines)
+                span = spans[poem_id]
+                new_content = content[:span.start] + poem.strip() + content[span.end:]
         
-        # Escribir de vuelta
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
+            # Escribir de vuelta (atómico: temporal + os.replace)
+            atomic_write_text(file_path, new_content)
         
         return {
             "success": True,
-            "message": f"Poema {poem_id} actualizado en {filename}"
+            "message": f"Poema {poem_id} actualizado en {filename}",
+            "etag": compute_etag(poem.strip())
         }
     except HTTPException:
         raise
@@ -510,9 +447,48 @@ async def update_poem(filename: str, poem_id: int, poem: str = Form(...)):
         raise HTTPException(status_code=500, detail=f"Error al actualizar el poema: {str(e)}")
 
 
+def _remove_poems(content: str, poem_ids: List[int]) -> Tuple[str, int]:
+    """
+    Elimina varios poemas (por ID) del contenido de un dataset
+
+    Returns:
+        Tupla (nuevo_contenido, poemas_eliminados)
+    """
+    # Detectar formato (soporta === POEMA === y === POEMA X ===)
+    if re.search(_SEPARATOR_PATTERN, content, re.IGNORECASE):
+        # Formato con separadores: mismos ids que al listar (_parse_dataset_poems)
+        poem_ids = set(poem_ids)
+        blocks = _split_separated_poems(content)
+        kept = [text for block_id, text, _ in blocks if block_id is None or block_id not in poem_ids]
+        deleted_count = len(blocks) - len(kept)
+        
+        if deleted_count == 0:
+            return content, 0
+        
+        # Reconstruir el contenido con formato estándar
+        return _join_separated_poems(kept), deleted_count
+    
+    # Formato libre: eliminar los rangos de los poemas seleccionados
+    spans = segment_poems(content, ADMIN_RULES)
+    deleted_spans = [spans[poem_id] for poem_id in set(poem_ids) if 0 <= poem_id < len(spans)]
+    
+    # Reconstruir en una pasada conservando el texto entre poemas
+    parts = []
+    cursor = 0
+    for span in sorted(deleted_spans):
+        parts.append(content[cursor:span.start])
+        cursor = span.end
+    parts.append(content[cursor:])
+    return ''.join(parts), len(deleted_spans)
+
+
 @router.delete("/api/datasets/{filename}/poems/batch-delete")
-async def delete_poems_batch(filename: str, request: Request):
-    """Elimina múltiples poemas de un dataset"""
+async def delete_poems_batch(filename: str, request: Request, if_match: Optional[str] = Header(None)):
+    """
+    Elimina múltiples poemas de un dataset
+    
+    Acepta If-Match con el ETag del dataset (devuelto al listar sus poemas).
+    """
     try:
         body = await request.json()
         poem_ids = body.get('poem_ids', [])
@@ -528,79 +504,29 @@ async def delete_poems_batch(filename: str, request: Request):
         raise HTTPException(status_code=404, detail="Dataset no encontrado")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            content_lines = content.split('\n')
+        async with get_dataset_lock(file_path).write():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
         
-        # Detectar formato (soporta === POEMA === y === POEMA X ===)
-        separator = "=== POEMA ==="
-        separator_pattern = r'===+\s*POEMA\s*(?:\d+)?\s*===+'
-        has_separators = bool(re.search(separator_pattern, content, re.IGNORECASE))
+            # Rechazar si el dataset cambió desde que el cliente lo leyó
+            if not etag_matches(if_match, compute_etag(content)):
+                raise HTTPException(
+                    status_code=412,
+                    detail="El dataset fue modificado por otra operación. Recarga e inténtalo de nuevo."
+                )
         
-        if has_separators:
-            # Formato con separadores (dividir por cualquier variante)
-            poems_raw = re.split(separator_pattern, content, flags=re.IGNORECASE)
-            valid_poems = []
-            for poem_raw in poems_raw:
-                poem_text = poem_raw.strip()
-                # Filtrar líneas que son solo separadores
-                lines = [line.strip() for line in poem_text.split('\n') if line.strip()]
-                filtered_lines = [
-                    line for line in lines 
-                    if not re.match(r'^===+\s*POEMA\s*(?:\d+)?\s*===+$', line, re.IGNORECASE)
-                ]
-                poem_text = '\n'.join(filtered_lines).strip()
-                if poem_text and len(poem_text) > 10:
-                    valid_poems.append(poem_text)
-            
-            # Eliminar poemas seleccionados (ordenar IDs descendente para evitar problemas de índice)
-            poem_ids_sorted = sorted(set(poem_ids), reverse=True)
-            deleted_count = 0
-            for poem_id in poem_ids_sorted:
-                if 0 <= poem_id < len(valid_poems):
-                    valid_poems.pop(poem_id)
-                    deleted_count += 1
-            
+            new_content, deleted_count = _remove_poems(content, poem_ids)
             if deleted_count == 0:
                 raise HTTPException(status_code=404, detail="No se encontraron poemas válidos para eliminar")
-            
-            # Reconstruir el contenido con formato estándar
-            new_content = ""
-            for i, poem_text in enumerate(valid_poems):
-                if i > 0:
-                    new_content += "\n\n"
-                new_content += separator + "\n\n" + poem_text + "\n"
-        else:
-            # Formato libre: usar función con posiciones
-            extracted_poems, positions = _extract_poems_free_format_with_positions(content)
-            
-            # Eliminar poemas seleccionados (ordenar IDs descendente)
-            poem_ids_sorted = sorted(set(poem_ids), reverse=True)
-            deleted_positions = []
-            for poem_id in poem_ids_sorted:
-                if 0 <= poem_id < len(positions):
-                    deleted_positions.append(positions[poem_id])
-                    del positions[poem_id]
-                    del extracted_poems[poem_id]
-            
-            if not deleted_positions:
-                raise HTTPException(status_code=404, detail="No se encontraron poemas válidos para eliminar")
-            
-            # Reconstruir: eliminar las líneas de los poemas eliminados
-            deleted_positions.sort(key=lambda x: x[0], reverse=True)  # Ordenar por línea de inicio descendente
-            for start_line, end_line in deleted_positions:
-                content_lines = content_lines[:start_line] + content_lines[end_line:]
-            
-            new_content = '\n'.join(content_lines)
         
-        # Escribir de vuelta
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
+            # Escribir de vuelta (atómico: temporal + os.replace)
+            atomic_write_text(file_path, new_content)
         
         return {
             "success": True,
             "message": f"{deleted_count} poema(s) eliminado(s) de {filename}",
-            "deleted_count": deleted_count
+            "deleted_count": deleted_count,
+            "etag": compute_etag(new_content)
         }
     except HTTPException:
         raise
@@ -609,76 +535,45 @@ async def delete_poems_batch(filename: str, request: Request):
 
 
 @router.delete("/api/datasets/{filename}/poems/{poem_id}")
-async def delete_poem(filename: str, poem_id: int):
-    """Elimina un poema específico de un dataset"""
+async def delete_poem(filename: str, poem_id: int, if_match: Optional[str] = Header(None)):
+    """Elimina un poema específico de un dataset (acepta If-Match con el ETag del poema)"""
     file_path = DATA_DIR / filename
     
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="Dataset no encontrado")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            content_lines = content.split('\n')
+        async with get_dataset_lock(file_path).write():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
         
-        # Detectar formato (soporta === POEMA === y === POEMA X ===)
-        separator = "=== POEMA ==="
-        separator_pattern = r'===+\s*POEMA\s*(?:\d+)?\s*===+'
-        has_separators = bool(re.search(separator_pattern, content, re.IGNORECASE))
+            # Detectar formato (soporta === POEMA === y === POEMA X ===)
+            has_separators = bool(re.search(_SEPARATOR_PATTERN, content, re.IGNORECASE))
         
-        if has_separators:
-            # Formato con separadores (dividir por cualquier variante)
-            poems_raw = re.split(separator_pattern, content, flags=re.IGNORECASE)
-            valid_poems = []
-            for poem_raw in poems_raw:
-                poem_text = poem_raw.strip()
-                # Filtrar líneas que son solo separadores
-                lines = [line.strip() for line in poem_text.split('\n') if line.strip()]
-                filtered_lines = [
-                    line for line in lines 
-                    if not re.match(r'^===+\s*POEMA\s*(?:\d+)?\s*===+$', line, re.IGNORECASE)
-                ]
-                poem_text = '\n'.join(filtered_lines).strip()
-                if poem_text and len(poem_text) > 10:
-                    valid_poems.append(poem_text)
-            
-            if poem_id < 0 or poem_id >= len(valid_poems):
-                raise HTTPException(status_code=404, detail="Poema no encontrado")
-            
-            # Eliminar el poema específico
-            valid_poems.pop(poem_id)
-            
-            # Reconstruir el contenido con formato estándar
-            new_content = ""
-            for i, poem_text in enumerate(valid_poems):
-                if i > 0:
-                    new_content += "\n\n"
-                new_content += separator + "\n\n" + poem_text + "\n"
-        else:
-            # Formato libre: usar función con posiciones
-            extracted_poems, positions = _extract_poems_free_format_with_positions(content)
-            
-            if poem_id < 0 or poem_id >= len(extracted_poems):
-                raise HTTPException(status_code=404, detail="Poema no encontrado")
-            
-            # Obtener posición del poema a eliminar
-            start_line, end_line = positions[poem_id]
+            # Rechazar si el poema cambió desde que el cliente lo leyó
+            _check_poem_etag(content, poem_id, if_match)
+        
+            if has_separators:
+                new_content, deleted_count = _remove_poems(content, [poem_id])
+                if deleted_count == 0:
+                    raise HTTPException(status_code=404, detail="Poema no encontrado")
+            else:
+                # Formato libre: eliminar exactamente el rango del poema
+                spans = segment_poems(content, ADMIN_RULES)
             
-            # Reconstruir: antes del poema + después del poema (sin el poema eliminado)
-            before_lines = content_lines[:start_line]
-            after_lines = content_lines[end_line:]
+                if poem_id < 0 or poem_id >= len(spans):
+                    raise HTTPException(status_code=404, detail="Poema no encontrado")
             
-            # Reconstruir manteniendo estructura
-            new_content_lines = before_lines + after_lines
-            new_content = '\n'.join(new_content_lines)
+                span = spans[poem_id]
+                new_content = content[:span.start] + content[span.end:]
         
-        # Escribir de vuelta
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
+            # Escribir de vuelta (atómico: temporal + os.replace)
+            atomic_write_text(file_path, new_content)
         
         return {
             "success": True,
-            "message": f"Poema {poem_id} eliminado de {filename}"
+            "message": f"Poema {poem_id} eliminado de {filename}",
+            "etag": compute_etag(new_content)
         }
     except HTTPException:
         raise
@@ -697,46 +592,218 @@ async def clean_dataset(filename: str):
         raise HTTPException(status_code=404, detail="Dataset no encontrado")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Limpiar notas de pie de página (números entre corchetes)
-        cleaned_content = re.sub(r'\[\d+\]', '', content)
-        cleaned_content = re.sub(r'\s*\[\d+\]\s*', ' ', cleaned_content)
-        
-        # Limpiar espacios múltiples
-        cleaned_content = re.sub(r' +', ' ', cleaned_content)
-        cleaned_content = re.sub(r'\n{3,}', '\n\n', cleaned_content)
-        
-        # Escribir de vuelta
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(cleaned_content)
+        async with get_dataset_lock(file_path).write():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            
+            # Limpiar notas de pie de página (números entre corchetes)
+            cleaned_content = re.sub(r'\[\d+\]', '', content)
+            cleaned_content = re.sub(r'\s*\[\d+\]\s*', ' ', cleaned_content)
+            
+            # Limpiar espacios múltiples
+            cleaned_content = re.sub(r' +', ' ', cleaned_content)
+            cleaned_content = re.sub(r'\n{3,}', '\n\n', cleaned_content)
+            
+            # Escribir de vuelta (atómico: temporal + os.replace)
+            atomic_write_text(file_path, cleaned_content)
         
         return {
             "success": True,
-            "message": f"Dataset {filename} limpiado correctamente"
+            "message": f"Dataset {filename} limpiado correctamente",
+            "etag": compute_etag(cleaned_content)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al limpiar el dataset: {str(e)}")
 
 
+def _find_duplicate_clusters(snapshots: Dict[str, str], threshold: float) -> List[Dict]:
+    """
+    Agrupa los poemas casi duplicados de varios datasets (MinHash + LSH)
+
+    Args:
+        snapshots: nombre del dataset -> contenido
+        threshold: Similitud de Jaccard estimada mínima
+
+    Returns:
+        Grupos con sus miembros (dataset, poem_id, etag...), el índice del que
+        se conserva al fusionar y un id estable mientras los poemas no cambien
+    """
+    index = NearDuplicateIndex(threshold=threshold)
+    poems_by_key = {}
+    for dataset_name in sorted(snapshots):
+        for poem in _parse_dataset_poems(snapshots[dataset_name]):
+            key = (dataset_name, poem["id"])
+            poems_by_key[key] = poem["text"]
+            index.add(key, poem["text"])
+    
+    clusters = []
+    for cluster in index.clusters():
+        members = []
+        for dataset_name, poem_id in cluster["keys"]:
+            text = poems_by_key[(dataset_name, poem_id)]
+            members.append({
+                "dataset": dataset_name,
+                "poem_id": poem_id,
+                "etag": compute_etag(text),
+                "length": len(text),
+                "preview": text[:200]
+            })
+        cluster_id = compute_etag("|".join(f"{m['dataset']}:{m['poem_id']}:{m['etag']}" for m in members))
+        clusters.append({
+            "id": cluster_id,
+            "similarity": cluster["similarity"],
+            "keep": pick_canonical([poems_by_key[key] for key in cluster["keys"]]),
+            "members": members
+        })
+    return clusters
+
+
+def _duplicate_scan_paths(dataset: Optional[str]) -> List[Path]:
+    """Datasets a analizar: uno concreto o todo data/"""
+    if dataset:
+        # Solo un .txt de data/ (el nombre llega en la query o en el cuerpo, no en la ruta)
+        if Path(dataset).name != dataset or not dataset.endswith('.txt'):
+            raise HTTPException(status_code=400, detail="Nombre de dataset inválido")
+        file_path = DATA_DIR / dataset
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail="Dataset no encontrado")
+        return [file_path]
+    return sorted(DATA_DIR.glob("*.txt"))
+
+
+@router.get("/api/duplicates")
+async def find_duplicates(
+    threshold: float = Query(DEFAULT_THRESHOLD, gt=0.0, le=1.0),
+    dataset: Optional[str] = None
+):
+    """
+    Informa de los grupos de poemas casi duplicados en los datasets
+    (mismo poema de distintas ediciones, cambios menores de puntuación...)
+    """
+    snapshots = {}
+    for file_path in _duplicate_scan_paths(dataset):
+        async with get_dataset_lock(file_path).read():
+            with open(file_path, 'r', encoding='utf-8') as f:
+                snapshots[file_path.name] = f.read()
+    
+    # El cálculo es CPU: fuera del event loop
+    clusters = await asyncio.to_thread(_find_duplicate_clusters, snapshots, threshold)
+    return {
+        "threshold": threshold,
+        "datasets_scanned": len(snapshots),
+        "clusters": clusters,
+        "duplicates_count": sum(len(c["members"]) - 1 for c in clusters)
+    }
+
+
+@router.post("/api/duplicates/merge")
+async def merge_duplicates(request: DuplicateMergeRequest):
+    """
+    Fusiona grupos de casi duplicados: conserva un poema por grupo (el más largo)
+    y elimina el resto de sus datasets.
+
+    Los grupos se recalculan con los datasets bloqueados; si se indican
+    `cluster_ids` (del informe), solo se fusionan esos y los que hayan cambiado
+    desde el informe se devuelven en `stale`.
+    """
+    if not 0.0 < request.threshold <= 1.0:
+        raise HTTPException(status_code=400, detail="El umbral debe estar entre 0 y 1")
+    
+    paths = _duplicate_scan_paths(request.dataset)
+    try:
+        async with write_locked(*paths):
+            snapshots = {}
+            for file_path in paths:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    snapshots[file_path.name] = f.read()
+            
+            clusters = await asyncio.to_thread(_find_duplicate_clusters, snapshots, request.threshold)
+            stale = []
+            if request.cluster_ids is not None:
+                current_ids = {c["id"] for c in clusters}
+                stale = [cid for cid in request.cluster_ids if cid not in current_ids]
+                clusters = [c for c in clusters if c["id"] in set(request.cluster_ids)]
+            
+            # Poemas a eliminar por dataset
+            to_remove: Dict[str, List[int]] = {}
+            for cluster in clusters:
+                for i, member in enumerate(cluster["members"]):
+                    if i != cluster["keep"]:
+                        to_remove.setdefault(member["dataset"], []).append(member["poem_id"])
+            
+            removed_count = 0
+            etags = {}
+            for dataset_name, poem_ids in to_remove.items():
+                new_content, deleted = _remove_poems(snapshots[dataset_name], poem_ids)
+                if deleted:
+                    atomic_write_text(DATA_DIR / dataset_name, new_content)
+                    removed_count += deleted
+                    etags[dataset_name] = compute_etag(new_content)
+        
+        return {
+            "success": True,
+            "message": f"{len(clusters)} grupo(s) fusionado(s), {removed_count} poema(s) eliminado(s)",
+            "merged_clusters": [c["id"] for c in clusters],
+            "removed_count": removed_count,
+            "stale": stale,
+            "etags": etags
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al fusionar duplicados: {str(e)}")
+
+
 @router.post("/api/datasets/upload")
 async def upload_dataset(file: UploadFile = File(...)):
-    """Sube un nuevo dataset"""
+    """Sube un nuevo dataset (por bloques, sin cargarlo entero en memoria)"""
     if not file.filename.endswith('.txt'):
         raise HTTPException(status_code=400, detail="Solo se permiten archivos .txt")
     
     file_path = DATA_DIR / file.filename
     
-    # Guardar archivo
-    with open(file_path, 'wb') as f:
-        content = await file.read()
-        f.write(content)
+    # Guardar archivo: copiar por bloques a un temporal del mismo directorio y confirmar con os.replace
+    try:
+        temp_path, size, sha256 = await stream_upload_to_temp(file, directory=DATA_DIR, suffix='.part')
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    try:
+        async with get_dataset_lock(file_path).write():
+            os.replace(temp_path, file_path)
+    except Exception as e:
+        os.unlink(temp_path)
+        raise HTTPException(status_code=500, detail=f"Error al guardar el dataset: {str(e)}")
     
     return {
         "success": True,
         "message": f"Dataset {file.filename} subido correctamente",
-        "path": str(file_path)
+        "path": str(file_path),
+        "size": size,
+        "sha256": sha256
+    }
+
+
+def _epub_output_filename(epub_filename: str, dataset_name: Optional[str]) -> str:
+    """Nombre del dataset .txt generado a partir de un EPUB"""
+    if dataset_name:
+        output_filename = dataset_name.strip()
+        if not output_filename.endswith('.txt'):
+            output_filename = output_filename + '.txt'
+        return output_filename
+    # Usar el nombre del EPUB sin extensión
+    return Path(epub_filename).stem + '.txt'
+
+
+def _epub_job_response(job: Dict) -> Dict:
+    """Respuesta estándar al encolar una conversión EPUB"""
+    return {
+        "success": True,
+        "message": "Conversión de EPUB iniciada",
+        "job_id": job["job_id"],
+        "filename": job["filename"],
+        "status_url": f"/admin/api/jobs/{job['job_id']}",
+        "events_url": f"/admin/api/jobs/{job['job_id']}/events"
     }
 
 
@@ -746,7 +813,10 @@ async def upload_and_convert_epub(
     dataset_name: str = Form(None)
 ):
     """
-    Sube un archivo EPUB y lo convierte a dataset .txt
+    Sube un archivo EPUB y lanza su conversión a dataset .txt en segundo plano
+    
+    Devuelve un job_id de inmediato; el progreso por capítulo se consulta en
+    /api/jobs/{job_id} o se sigue por SSE en /api/jobs/{job_id}/events.
     
     Args:
         file: Archivo EPUB a procesar
@@ -756,74 +826,181 @@ async def upload_and_convert_epub(
     if not file.filename.endswith('.epub'):
         raise HTTPException(status_code=400, detail="Solo se permiten archivos .epub")
     
-    import tempfile
-    
     # Crear nombre del dataset
-    if dataset_name:
-        output_filename = dataset_name.strip()
-        if not output_filename.endswith('.txt'):
-            output_filename = output_filename + '.txt'
-    else:
-        # Usar el nombre del EPUB sin extensión
-        output_filename = Path(file.filename).stem + '.txt'
-    
+    output_filename = _epub_output_filename(file.filename, dataset_name)
     output_path = DATA_DIR / output_filename
     
-    # Verificar si ya existe
-    if output_path.exists():
+    # Verificar si ya existe (o si ya se está generando)
+    if output_path.exists() or epub_jobs.is_pending(output_path):
         raise HTTPException(
             status_code=400, 
             detail=f"Ya existe un dataset con el nombre {output_filename}. Por favor, elige otro nombre."
         )
     
-    # Guardar EPUB temporalmente
+    # Guardar EPUB temporalmente (por bloques); el trabajo lo borra al terminar
     temp_epub_path = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.epub') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_epub_path = temp_file.name
-        
-        # Procesar EPUB
-        processor = EPUBProcessor()
-        poems = processor.process_epub_file(temp_epub_path)
-        
-        if not poems:
-            raise HTTPException(
-                status_code=400,
-                detail="No se encontraron poemas en el archivo EPUB. Verifica que el archivo contenga poesías."
-            )
-        
-        # Guardar como dataset .txt con formato estándar (sin números)
-        separator = "=== POEMA ==="
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for poem in poems:
-                poem_cleaned = poem.strip()
-                if poem_cleaned:
-                    f.write(separator + "\n\n")
-                    f.write(poem_cleaned)
-                    f.write("\n\n\n")
-        
-        return {
-            "success": True,
-            "message": f"EPUB convertido correctamente. {len(poems)} poemas extraídos.",
-            "filename": output_filename,
-            "poems_count": len(poems),
-            "path": str(output_path)
-        }
-    except HTTPException:
-        raise
+        temp_epub_path, _, _ = await stream_upload_to_temp(file, suffix='.epub')
+        job = await epub_jobs.submit(temp_epub_path, output_path, file.filename)
+        return _epub_job_response(job)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         import traceback
         traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Error al procesar EPUB: {str(e)}")
-    finally:
-        # Limpiar archivo temporal
+        # Limpiar archivo temporal si no llegó a encolarse
         if temp_epub_path and os.path.exists(temp_epub_path):
             try:
                 os.unlink(temp_epub_path)
             except:
                 pass
+        raise HTTPException(status_code=500, detail=f"Error al procesar EPUB: {str(e)}")
+
+
+@router.post("/api/uploads")
+async def create_upload(
+    filename: str = Form(...),
+    total_size: Optional[int] = Form(None),
+    dataset_name: Optional[str] = Form(None)
+):
+    """
+    Inicia una subida reanudable por partes (para corpus muy grandes)
+    
+    Protocolo:
+        1. POST /api/uploads -> upload_id
+        2. PUT /api/uploads/{upload_id}?offset=N con los bytes de la parte como cuerpo
+        3. GET /api/uploads/{upload_id} para conocer el offset tras una interrupción
+        4. POST /api/uploads/{upload_id}/complete (opcionalmente con sha256 para verificar)
+    
+    Los .txt se guardan como dataset; los .epub se convierten al completar.
+    """
+    if filename.endswith('.txt'):
+        kind = "dataset"
+    elif filename.endswith('.epub'):
+        kind = "epub"
+    else:
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos .txt o .epub")
+    
+    if Path(filename).name != filename:
+        raise HTTPException(status_code=400, detail="Nombre de archivo inválido")
+    
+    try:
+        info = upload_store.create(filename, kind, total_size=total_size, dataset_name=dataset_name)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    return {"success": True, **info}
+
+
+@router.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Estado de una subida reanudable (offset = bytes ya recibidos)"""
+    info = upload_store.get(upload_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Subida no encontrada")
+    return info
+
+
+@router.put("/api/uploads/{upload_id}")
+async def upload_part(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """Recibe una parte de una subida reanudable (cuerpo binario), escrita por bloques"""
+    part_path = UPLOADS_DIR / f"{upload_id}.part"
+    try:
+        async with get_dataset_lock(part_path).write():
+            info = await upload_store.append(upload_id, offset, request.stream())
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Subida no encontrada")
+    except UploadOffsetError as e:
+        return JSONResponse(
+            status_code=409,
+            content={"detail": str(e), "offset": e.expected_offset}
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    return {"success": True, "upload_id": upload_id, "offset": info["offset"]}
+
+
+@router.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, sha256: Optional[str] = Form(None)):
+    """Finaliza una subida reanudable y la convierte en dataset"""
+    part_path = UPLOADS_DIR / f"{upload_id}.part"
+    async with get_dataset_lock(part_path).write():
+        try:
+            info, completed_path, digest = await upload_store.finalize(upload_id, expected_sha256=sha256)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Subida no encontrada")
+        except UploadOffsetError as e:
+            raise HTTPException(status_code=409, detail=f"Subida incompleta: recibidos {e.expected_offset} bytes")
+        except UploadChecksumError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
+    try:
+        if info["kind"] == "dataset":
+            file_path = DATA_DIR / info["filename"]
+            async with get_dataset_lock(file_path).write():
+                os.replace(completed_path, file_path)
+            return {
+                "success": True,
+                "message": f"Dataset {info['filename']} subido correctamente",
+                "path": str(file_path),
+                "size": info["offset"],
+                "sha256": digest
+            }
+        
+        output_filename = _epub_output_filename(info["filename"], info.get("dataset_name"))
+        output_path = DATA_DIR / output_filename
+        if output_path.exists() or epub_jobs.is_pending(output_path):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Ya existe un dataset con el nombre {output_filename}. Por favor, elige otro nombre."
+            )
+        # El trabajo se queda con el archivo y lo borra al terminar
+        job = await epub_jobs.submit(str(completed_path), output_path, info["filename"])
+        return {**_epub_job_response(job), "sha256": digest}
+    except HTTPException:
+        if completed_path.exists():
+            completed_path.unlink()
+        raise
+    except Exception as e:
+        if completed_path.exists():
+            completed_path.unlink()
+        raise HTTPException(status_code=500, detail=f"Error al completar la subida: {str(e)}")
+
+
+@router.delete("/api/uploads/{upload_id}")
+async def cancel_upload(upload_id: str):
+    """Cancela una subida reanudable y borra los datos recibidos"""
+    if not upload_store.discard(upload_id):
+        raise HTTPException(status_code=404, detail="Subida no encontrada")
+    return {"success": True, "message": "Subida cancelada"}
+
+
+@router.get("/api/jobs")
+async def list_jobs():
+    """Lista los trabajos de conversión EPUB"""
+    return {"jobs": epub_jobs.list()}
+
+
+@router.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Estado de un trabajo de conversión (progreso por capítulo)"""
+    job = epub_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+
+@router.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Progreso de un trabajo de conversión como Server-Sent Events"""
+    if epub_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return StreamingResponse(
+        epub_jobs.events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
 
 
 @router.post("/api/datasets/{filename}/add-poem")
@@ -837,38 +1014,40 @@ async def add_poem_to_dataset(filename: str, poem: str = Form(...)):
     if not poem or not poem.strip():
         raise HTTPException(status_code=400, detail="El poema no puede estar vacío")
     
-    # Leer el contenido actual
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al leer el dataset: {str(e)}")
-    
     # Agregar el nuevo poema con separador
     poem_cleaned = poem.strip()
     separator = "=== POEMA ==="
     
-    # Si el archivo está vacío, no agregar separador al inicio
-    if content.strip():
-        # Si el archivo no termina en nueva línea, agregar una
-        if not content.endswith('\n'):
-            content += '\n'
-        new_content = content + "\n\n" + separator + "\n\n" + poem_cleaned + "\n"
-    else:
-        # Archivo vacío, agregar solo el poema con separador al inicio
-        new_content = separator + "\n\n" + poem_cleaned + "\n"
-    
-    # Escribir de vuelta
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al escribir el dataset: {str(e)}")
+    # Leer-modificar-escribir bajo el lock del dataset para no perder ediciones concurrentes
+    async with get_dataset_lock(file_path).write():
+        # Leer el contenido actual
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al leer el dataset: {str(e)}")
+        
+        # Si el archivo está vacío, no agregar separador al inicio
+        if content.strip():
+            # Si el archivo no termina en nueva línea, agregar una
+            if not content.endswith('\n'):
+                content += '\n'
+            new_content = content + "\n\n" + separator + "\n\n" + poem_cleaned + "\n"
+        else:
+            # Archivo vacío, agregar solo el poema con separador al inicio
+            new_content = separator + "\n\n" + poem_cleaned + "\n"
+        
+        # Escribir de vuelta (atómico: temporal + os.replace)
+        try:
+            atomic_write_text(file_path, new_content)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al escribir el dataset: {str(e)}")
     
     return {
         "success": True,
         "message": f"Poema agregado a {filename}",
-        "poem_length": len(poem_cleaned)
+        "poem_length": len(poem_cleaned),
+        "etag": compute_etag(new_content)
     }
 
 
@@ -884,15 +1063,15 @@ async def create_dataset(name: str = Form(...)):
     
     file_path = DATA_DIR / safe_name
     
-    if file_path.exists():
-        raise HTTPException(status_code=400, detail="El dataset ya existe")
-    
-    # Crear archivo vacío
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write("")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al crear el dataset: {str(e)}")
+    async with get_dataset_lock(file_path).write():
+        if file_path.exists():
+            raise HTTPException(status_code=400, detail="El dataset ya existe")
+        
+        # Crear archivo vacío
+        try:
+            atomic_write_text(file_path, "")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al crear el dataset: {str(e)}")
     
     return {
         "success": True,
@@ -912,11 +1091,71 @@ async def delete_dataset(filename: str):
     if file_path.name == "poems.txt":  # Proteger el dataset principal
         raise HTTPException(status_code=400, detail="No se puede eliminar el dataset principal")
     
-    file_path.unlink()
+    async with get_dataset_lock(file_path).write():
+        file_path.unlink(missing_ok=True)
     
     return {"success": True, "message": f"Dataset {filename} eliminado"}
 
 
+def _evaluation_summary(model_dir: Path) -> Optional[Dict]:
+    """Cifras principales de evaluation.json (None si el modelo no se evaluó)"""
+    report = read_report(str(model_dir))
+    if not report:
+        return None
+    suite = report.get("directive_suite") or {}
+    return {
+        "perplexity": (report.get("held_out") or {}).get("perplexity"),
+        "concept_hit_rate": suite.get("concept_hit_rate"),
+        "latency_p50": (suite.get("latency_seconds") or {}).get("p50"),
+        "tokens_per_sec": suite.get("tokens_per_sec"),
+        "evaluated_at": report.get("evaluated_at"),
+    }
+
+
+@router.get("/api/models/{model_name}/evaluation")
+async def get_model_evaluation(model_name: str):
+    """Informe de evaluación completo de un modelo"""
+    model_dir = MODELS_DIR / model_name
+    if not model_dir.exists():
+        raise HTTPException(status_code=404, detail="Modelo no encontrado")
+    report = read_report(str(model_dir))
+    if report is None:
+        raise HTTPException(status_code=404, detail="El modelo no tiene informe de evaluación")
+    return report
+
+
+class ReloadRequest(BaseModel):
+    """Request para desplegar un modelo en las réplicas de inferencia"""
+    model_name: Optional[str] = None  # None = el TRAINED_MODEL_PATH de cada réplica
+
+
+@router.post("/api/serving/reload")
+async def reload_serving_model(request: ReloadRequest):
+    """Pide a las réplicas de inferencia que carguen un modelo (o recarguen el actual)"""
+    model_path = None
+    if request.model_name:
+        model_dir = MODELS_DIR / request.model_name
+        if not ((model_dir / "config.json").exists() or is_adapter_dir(model_dir)):
+            raise HTTPException(status_code=404, detail="Modelo no encontrado")
+        model_path = str(model_dir)
+    reload_request = request_reload(model_path)
+    return {
+        "success": True,
+        "message": "Recarga solicitada: las réplicas la aplicarán en unos segundos",
+        "request": reload_request
+    }
+
+
+@router.get("/api/serving")
+async def get_serving_status():
+    """Última petición de recarga y estado de cada réplica de inferencia"""
+    reload_request = read_reload_request()
+    replicas = list_replicas()
+    for replica in replicas:
+        replica["up_to_date"] = reload_request is None or replica.get("request_id") == reload_request.get("id")
+    return {"request": reload_request, "replicas": replicas}
+
+
 @router.get("/api/models")
 async def list_models():
     """Lista todos los modelos entrenados"""
@@ -928,7 +1167,7 @@ async def list_models():
     for model_dir in MODELS_DIR.iterdir():
         if model_dir.is_dir():
             config_path = model_dir / "config.json"
-            if config_path.exists():
+            if config_path.exists() or is_adapter_dir(model_dir):
                 try:
                     stat = model_dir.stat()
                     # Calcular tamaño del modelo
@@ -938,8 +1177,12 @@ async def list_models():
                         "name": model_dir.name,
                         "path": str(model_dir),
                         "size": total_size,
+                        # Los adaptadores LoRA se sirven sobre su modelo base
+                        "type": "full" if config_path.exists() else "lora",
+                        "base_model": None if config_path.exists() else adapter_base_model(model_dir),
                         "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                        "modified": datetime.fromtimestamp(stat.st_mtime).isoformat()
+                        "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                        "evaluation": _evaluation_summary(model_dir)
                     })
                 except Exception as e:
                     print(f"Error al leer modelo {model_dir}: {e}")
@@ -947,108 +1190,171 @@ async def list_models():
     return {"models": models}
 
 
+def _get_training_job(job_id: Optional[str] = None) -> Dict:
+    """Trabajo pedido, o el actual si no se indica (404 si no existe)"""
+    job = training_jobs.get(job_id) if job_id else training_jobs.current()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Entrenamiento no encontrado")
+    return job
+
+
+def _with_progress(job: Dict) -> Dict:
+    """Añade al trabajo su último punto de métricas (paso, loss, throughput, ETA...)"""
+    buffer = training_jobs.metrics_for(job["job_id"])
+    latest = buffer.latest() if buffer else None
+    if latest:
+        job["progress"] = latest
+    return job
+
+
 @router.post("/api/train")
 async def start_training(request: TrainingRequest):
-    """Inicia el entrenamiento de un modelo"""
-    # Verificar que el archivo existe
-    poems_file = Path(request.poems_file)
-    if not poems_file.exists():
-        raise HTTPException(status_code=404, detail=f"Archivo no encontrado: {request.poems_file}")
-    
-    # Verificar que no hay un entrenamiento en curso
-    training_status_file = MODELS_DIR / ".training_status.json"
-    if training_status_file.exists():
-        with open(training_status_file, 'r') as f:
-            status = json.load(f)
-            if status.get("status") == "training":
-                raise HTTPException(status_code=400, detail="Ya hay un entrenamiento en curso")
-    
-    # Iniciar entrenamiento en background (usar threading o asyncio)
-    import threading
-    
-    def train_model():
-        try:
-            # Actualizar estado
-            status = {
-                "status": "training",
-                "started_at": datetime.now().isoformat(),
-                "poems_file": request.poems_file,
-                "output_dir": request.output_dir
-            }
-            with open(training_status_file, 'w') as f:
-                json.dump(status, f)
-            
-            # Entrenar
-            trainer = PoetryTrainer(
-                base_model=request.base_model,
-                output_dir=request.output_dir
-            )
-            trainer.train_from_file(
-                poems_file=str(poems_file),
-                num_epochs=request.epochs,
-                batch_size=request.batch_size,
-                learning_rate=request.learning_rate
-            )
-            
-            # Actualizar estado a completado
-            status["status"] = "completed"
-            status["completed_at"] = datetime.now().isoformat()
-            with open(training_status_file, 'w') as f:
-                json.dump(status, f)
-        except Exception as e:
-            # Actualizar estado a error
-            status = {
-                "status": "error",
-                "error": str(e),
-                "failed_at": datetime.now().isoformat()
-            }
-            with open(training_status_file, 'w') as f:
-                json.dump(status, f)
-    
-    # Iniciar en thread separado
-    thread = threading.Thread(target=train_model, daemon=True)
-    thread.start()
-    
+    """Encola un entrenamiento (empieza en cuanto haya capacidad)"""
+    job = await create_training_job(request)
     return {
         "success": True,
-        "message": "Entrenamiento iniciado",
-        "training_id": "current"
+        "message": "Entrenamiento iniciado" if job["status"] == "training" else "Entrenamiento en cola",
+        "training_id": job["job_id"],
+        "job": job
+    }
+
+
+@router.get("/api/training/jobs")
+async def list_training_jobs():
+    """Entrenamientos en curso, en cola (en orden de ejecución) y terminados"""
+    return {
+        "jobs": [_with_progress(job) for job in training_jobs.list()],
+        "max_concurrent": training_jobs.max_concurrent,
+        "cores_per_job": training_jobs.cores_per_job
     }
 
 
+@router.post("/api/training/jobs")
+async def create_training_job(request: TrainingRequest):
+    """
+    Encola un entrenamiento. `output_dir` puede contener "{job_id}" para que
+    cada trabajo (p. ej. de un barrido de hiperparámetros) tenga su directorio.
+    """
+    if not Path(request.poems_file).exists():
+        raise HTTPException(status_code=404, detail=f"Archivo no encontrado: {request.poems_file}")
+    params = request.dict(exclude={"priority"})
+    # El registro se escribe y el proceso se lanza fuera del event loop
+    return await asyncio.to_thread(training_jobs.submit, params, request.priority)
+
+
+@router.get("/api/training/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """Estado de un entrenamiento"""
+    return _with_progress(_get_training_job(job_id))
+
+
+@router.post("/api/training/jobs/{job_id}/cancel")
+async def cancel_training_job(job_id: str):
+    """Cancela un entrenamiento: sale de la cola o se detiene al terminar el paso en curso"""
+    try:
+        job = await asyncio.to_thread(training_jobs.cancel, job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Entrenamiento no encontrado")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    message = (
+        "Entrenamiento retirado de la cola" if job["status"] == "cancelled"
+        else "Cancelación solicitada: el entrenamiento se detendrá al terminar el paso en curso"
+    )
+    return {"success": True, "message": message, "job": job}
+
+
+@router.post("/api/training/jobs/{job_id}/priority")
+async def set_training_job_priority(job_id: str, request: JobPriorityRequest):
+    """Cambia la prioridad de un entrenamiento en cola (mayor = antes)"""
+    try:
+        job = await asyncio.to_thread(training_jobs.set_priority, job_id, request.priority)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Entrenamiento no encontrado")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "job": job}
+
+
+@router.get("/api/training/jobs/{job_id}/log")
+async def get_training_job_log(job_id: str, offset: int = Query(0, ge=0)):
+    """Salida del entrenamiento desde el byte `offset` (para seguirla por polling)"""
+    _get_training_job(job_id)
+    log_path = training_jobs.log_path(job_id)
+    if not log_path.exists():
+        return {"content": "", "offset": offset}
+    with open(log_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    return {"content": data.decode('utf-8', errors='replace'), "offset": offset + len(data)}
+
+
 @router.get("/api/training/status")
 async def get_training_status():
-    """Obtiene el estado del entrenamiento actual"""
-    training_status_file = MODELS_DIR / ".training_status.json"
-    
-    if not training_status_file.exists():
+    """Estado del entrenamiento actual (el último lanzado en curso, o el siguiente en cola, o el último)"""
+    job = training_jobs.current()
+    if job is None:
         return {"status": "idle", "message": "No hay entrenamiento en curso"}
-    
-    with open(training_status_file, 'r') as f:
-        status = json.load(f)
-    
-    return status
+    return _with_progress(job)
+
+
+@router.get("/api/training/metrics")
+async def get_training_metrics(
+    since: int = Query(0, ge=0),
+    job_id: Optional[str] = Query(None)
+):
+    """
+    Puntos de métricas del entrenamiento (por defecto el actual) con seq mayor
+    que `since` (el cliente pasa el `last_seq` de la respuesta anterior)
+    """
+    job = _get_training_job(job_id)
+    buffer = training_jobs.metrics_for(job["job_id"])
+    return {
+        "run_id": job["job_id"],
+        "metrics": buffer.since(since) if buffer else [],
+        "last_seq": buffer.last_seq if buffer else 0
+    }
+
+
+async def _training_metric_events(job_id: str, since: int, poll_interval: float = 1.0):
+    """Eventos SSE con cada punto nuevo de métricas; termina cuando el trabajo acaba"""
+    while True:
+        buffer = training_jobs.metrics_for(job_id)
+        for point in (buffer.since(since) if buffer else []):
+            since = point["seq"]
+            yield f"id: {since}\ndata: {json.dumps(point)}\n\n"
+        job = training_jobs.get(job_id) or {}
+        status = job.get("status", "idle")
+        if status not in ACTIVE_STATES and not training_jobs.is_running(job_id):
+            yield f"event: end\ndata: {json.dumps({'job_id': job_id, 'status': status})}\n\n"
+            return
+        await asyncio.sleep(poll_interval)
+
+
+@router.get("/api/training/metrics/events")
+async def stream_training_metrics(
+    since: int = Query(0, ge=0),
+    job_id: Optional[str] = Query(None),
+    last_event_id: Optional[str] = Header(None)
+):
+    """Métricas del entrenamiento en vivo como Server-Sent Events (reanuda con Last-Event-ID)"""
+    job = _get_training_job(job_id)
+    if last_event_id and last_event_id.isdigit():
+        since = max(since, int(last_event_id))
+    return StreamingResponse(
+        _training_metric_events(job["job_id"], since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
 
 
 @router.post("/api/training/cancel")
 async def cancel_training():
     """Cancela el entrenamiento actual"""
-    training_status_file = MODELS_DIR / ".training_status.json"
-    
-    if not training_status_file.exists():
+    job = training_jobs.current()
+    if job is None or job["status"] not in ACTIVE_STATES:
         raise HTTPException(status_code=400, detail="No hay entrenamiento en curso")
-    
-    # Marcar como cancelado (el entrenamiento debería verificar esto periódicamente)
-    with open(training_status_file, 'r') as f:
-        status = json.load(f)
-    
-    status["status"] = "cancelled"
-    status["cancelled_at"] = datetime.now().isoformat()
-    
-    with open(training_status_file, 'w') as f:
-        json.dump(status, f)
-    
-    return {"success": True, "message": "Entrenamiento cancelado"}
+    return await cancel_training_job(job["job_id"])
 
 
 @router.delete("/api/models/{model_name}")
@@ -1064,6 +1370,7 @@ async def delete_model(model_name: str):
         raise HTTPException(status_code=400, detail="No se puede eliminar el modelo principal")
     
     shutil.rmtree(model_path)
+    get_catalog().remove(model_name)
     
     return {"success": True, "message": f"Modelo {model_name} eliminado"}
 
@@ -1077,7 +1384,7 @@ async def get_stats():
             "total_size": sum(f.stat().st_size for f in DATA_DIR.glob("*.txt"))
         },
         "models": {
-            "count": len([d for d in MODELS_DIR.iterdir() if d.is_dir() and (d / "config.json").exists()]),
+            "count": len([d for d in MODELS_DIR.iterdir() if d.is_dir() and ((d / "config.json").exists() or is_adapter_dir(d))]),
             "total_size": sum(
                 sum(f.stat().st_size for f in d.rglob('*') if f.is_file())
                 for d in MODELS_DIR.iterdir()
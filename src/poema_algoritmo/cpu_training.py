@@ -0,0 +1,126 @@
+"""
+Perfil de entrenamiento en CPU
+
+Sin GPU, el rendimiento depende de repartir bien los núcleos: hilos intra-op de
+torch (multiplicaciones de matrices), procesos del DataLoader (preparar lotes en
+paralelo) y, con `torchrun`, varios procesos DDP (uno por socket o grupo de
+núcleos, cada uno con sus hilos). En CPUs con instrucciones bf16 (AVX-512 BF16,
+AMX) el autocast a bf16 acelera las capas lineales.
+
+Configuración (variables de entorno; los argumentos de la CLI tienen prioridad):
+    TRAINING_NUM_THREADS:        hilos intra-op por proceso (por defecto, núcleos / procesos locales)
+    TRAINING_INTEROP_THREADS:    hilos inter-op (por defecto, los de torch)
+    TRAINING_DATALOADER_WORKERS: procesos del DataLoader (por defecto, 1 cada 8 núcleos, máx. 2)
+    TRAINING_BF16:               "true" para autocast a bf16 (solo si la CPU lo soporta)
+
+Con varios procesos:
+    torchrun --nproc_per_node=2 -m poema_algoritmo.train_model data/poems.txt
+"""
+import inspect
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import torch
+from transformers import TrainingArguments
+
+from .training_metrics import available_cores
+
+_TRAINING_ARGUMENTS = inspect.signature(TrainingArguments).parameters
+
+
+def local_world_size() -> int:
+    """Procesos de entrenamiento en esta máquina (torchrun define LOCAL_WORLD_SIZE)"""
+    return int(os.getenv("LOCAL_WORLD_SIZE", "1"))
+
+
+def is_main_process() -> bool:
+    """True en el proceso principal (el único con torchrun que guarda y evalúa)"""
+    return int(os.getenv("RANK", "0")) == 0
+
+
+def bf16_supported() -> bool:
+    """True si la CPU tiene instrucciones bf16 nativas (si no, el autocast es más lento)"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name, "").strip()
+    return int(value) if value else None
+
+
+@dataclass(frozen=True)
+class CPUTrainingProfile:
+    """Hilos, DataLoader y precisión para entrenar en CPU (None = automático)"""
+    num_threads: Optional[int] = None
+    interop_threads: Optional[int] = None
+    dataloader_workers: Optional[int] = None
+    bf16: bool = False
+
+    @classmethod
+    def from_env(cls, **overrides) -> "CPUTrainingProfile":
+        """Perfil de las variables TRAINING_*; `overrides` (no None) tiene prioridad"""
+        values = {
+            "num_threads": _env_int("TRAINING_NUM_THREADS"),
+            "interop_threads": _env_int("TRAINING_INTEROP_THREADS"),
+            "dataloader_workers": _env_int("TRAINING_DATALOADER_WORKERS"),
+            "bf16": os.getenv("TRAINING_BF16", "false").lower() == "true",
+        }
+        values.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**values)
+
+    def resolved(self) -> "CPUTrainingProfile":
+        """Perfil con los valores automáticos calculados para esta máquina"""
+        # Núcleos de este proceso: con torchrun se reparten entre los procesos locales
+        cores = max(1, available_cores() // local_world_size())
+        workers = self.dataloader_workers
+        if workers is None:
+            # Los lotes ya están tokenizados: pocos workers bastan y cada uno quita un núcleo
+            workers = min(2, cores // 8)
+        threads = self.num_threads or max(1, cores - workers)
+        bf16 = self.bf16
+        if bf16 and not bf16_supported():
+            print("⚠ La CPU no tiene instrucciones bf16: se entrena en fp32")
+            bf16 = False
+        return CPUTrainingProfile(threads, self.interop_threads, workers, bf16)
+
+    def apply(self):
+        """Configura los hilos de torch (llamar antes de entrenar)"""
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        if self.interop_threads:
+            try:
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError:
+                # Solo se puede fijar antes del primer trabajo en paralelo
+                print("⚠ No se pudieron cambiar los hilos inter-op (ya en uso)")
+
+    def training_arguments(self) -> Dict:
+        """Argumentos de TrainingArguments para este perfil"""
+        arguments = {
+            "dataloader_num_workers": self.dataloader_workers or 0,
+            "bf16": self.bf16,
+            # Sin GPU (`use_cpu` en transformers >= 4.36, antes `no_cuda`)
+            ("use_cpu" if "use_cpu" in _TRAINING_ARGUMENTS else "no_cuda"): True,
+        }
+        if self.dataloader_workers and "dataloader_persistent_workers" in _TRAINING_ARGUMENTS:
+            # No relanzar los workers en cada época
+            arguments["dataloader_persistent_workers"] = True
+        if int(os.getenv("WORLD_SIZE", "1")) > 1:
+            # DDP en CPU: gloo; GPT-2 usa todos sus parámetros en cada paso
+            arguments["ddp_backend"] = "gloo"
+            arguments["ddp_find_unused_parameters"] = False
+        return arguments
+
+    def describe(self) -> str:
+        parts = [
+            f"{self.num_threads} hilos",
+            f"{self.dataloader_workers} workers del DataLoader",
+            "bf16" if self.bf16 else "fp32",
+        ]
+        if local_world_size() > 1:
+            parts.append(f"{local_world_size()} procesos locales (DDP)")
+        return ", ".join(parts)
@@ -0,0 +1,147 @@
+"""
+Almacenamiento seguro de datasets: locks por dataset, escrituras atómicas y ETags
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from contextlib import asynccontextmanager, AsyncExitStack
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+
+class AsyncRWLock:
+    """
+    Lock de lectura/escritura para asyncio.
+    Varios lectores pueden entrar a la vez; un escritor entra solo.
+    Los escritores en espera tienen prioridad para evitar inanición.
+    """
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @asynccontextmanager
+    async def read(self):
+        """Adquiere el lock en modo lectura"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and self._waiting_writers == 0)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        """Adquiere el lock en modo escritura (exclusivo)"""
+        async with self._cond:
+            self._waiting_writers += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and self._readers == 0)
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+# Un lock por dataset (clave: ruta absoluta del archivo)
+_dataset_locks: Dict[str, AsyncRWLock] = {}
+
+
+def get_dataset_lock(path: Union[str, Path]) -> AsyncRWLock:
+    """Obtiene (o crea) el lock asociado a un dataset"""
+    key = str(Path(path).resolve())
+    lock = _dataset_locks.get(key)
+    if lock is None:
+        lock = AsyncRWLock()
+        _dataset_locks[key] = lock
+    return lock
+
+
+@asynccontextmanager
+async def write_locked(*paths: Union[str, Path]):
+    """
+    Adquiere en modo escritura los locks de varios datasets.
+    Se ordenan por ruta para que dos operaciones cruzadas no se bloqueen mutuamente.
+    """
+    async with AsyncExitStack() as stack:
+        for key in sorted({str(Path(path).resolve()) for path in paths}):
+            await stack.enter_async_context(get_dataset_lock(key).write())
+        yield
+
+
+def _current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Permisos de un archivo nuevo, como los crearía open() (se lee al importar:
+# os.umask no es seguro entre hilos)
+_NEW_FILE_MODE = 0o666 & ~_current_umask()
+
+
+def atomic_write_bytes(path: Union[str, Path], data: bytes):
+    """
+    Escribe un archivo de forma atómica: primero en un temporal del mismo
+    directorio y luego os.replace. Un lector concurrente (p.ej. el hilo de
+    entrenamiento) ve el archivo anterior o el nuevo, nunca uno a medias.
+
+    El archivo conserva sus permisos (mkstemp crea el temporal con 0600).
+    """
+    path = Path(path)
+    try:
+        mode = path.stat().st_mode & 0o7777
+    except FileNotFoundError:
+        mode = _NEW_FILE_MODE
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_text(path: Union[str, Path], content: str, encoding: str = 'utf-8'):
+    """Versión de texto de atomic_write_bytes"""
+    atomic_write_bytes(path, content.encode(encoding))
+
+
+def compute_etag(text: str) -> str:
+    """Calcula un ETag estable a partir del contenido"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def etag_matches(if_match: Optional[str], etag: str) -> bool:
+    """
+    Comprueba una cabecera If-Match contra el ETag actual.
+    Sin cabecera (o '*') siempre coincide, para mantener compatibilidad.
+    """
+    if not if_match:
+        return True
+    candidates = [value.strip() for value in if_match.split(',')]
+    for candidate in candidates:
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate.strip('"') == etag:
+            return True
+    return False
@@ -0,0 +1,83 @@
+"""
+Formato de ejemplos de entrenamiento con directrices (sin red, sin estado)
+
+Cada poema se convierte en un ejemplo "Tema / Instrucción + poema" para que el
+modelo aprenda a seguir directrices. Son funciones puras: la variante elegida
+depende solo del texto del poema y de la semilla, así que el resultado es el
+mismo en cualquier proceso y orden (apto para `Dataset.map` con `num_proc`).
+"""
+import zlib
+from typing import List
+
+# Subir al cambiar el formato de los ejemplos (invalida la caché tokenizada)
+DIRECTIVES_VERSION = "1"
+
+# Proporción de ejemplos con formato de instrucciones (el resto, poema sin formato)
+DIRECTIVE_RATIO = 0.8
+
+# Palabras clave comunes en poesía para detectar temas
+EMOTION_KEYWORDS = ('triste', 'alegre', 'melancólico', 'nostálgico', 'amoroso', 'oscuro', 'sereno')
+STYLE_KEYWORDS = ('soneto', 'haiku', 'verso libre', 'romántico', 'moderno')
+STOP_WORDS = frozenset({'el', 'la', 'los', 'las', 'un', 'una', 'de', 'del', 'en', 'y', 'que', 'a'})
+
+
+def detect_concept(poem: str) -> str:
+    """Concepto principal: la primera línea si parece un título, si no palabras significativas"""
+    first_line = poem.split('\n', 1)[0].strip()
+
+    # Estrategia 1: Si la primera línea es corta, es probablemente un título/concepto
+    if first_line and len(first_line.split()) <= 5 and len(first_line) < 50:
+        return first_line
+
+    # Estrategia 2: Extraer palabras clave del poema (1-2 palabras significativas)
+    words = poem.split()[:5]
+    meaningful_words = [w for w in words if w.lower() not in STOP_WORDS and len(w) > 3]
+    if meaningful_words:
+        return ' '.join(meaningful_words[:2])
+
+    # Fallback: usar primeras palabras
+    return ' '.join(poem.split()[:3]) or "poesía"
+
+
+def directive_variants(poem: str) -> List[str]:
+    """Todas las variantes de formato de instrucción aplicables a un poema"""
+    concept = detect_concept(poem)
+    poem_lower = poem.lower()
+    emotion = next((e for e in EMOTION_KEYWORDS if e in poem_lower), None)
+    style = next((s for s in STYLE_KEYWORDS if s in poem_lower), None)
+
+    variants = [
+        # Simple
+        f"Tema: {concept}\n\nPoema sobre {concept}:\n\n{poem}",
+        # Con instrucción explícita
+        f"Escribe un poema sobre {concept}:\n\n{poem}",
+    ]
+    # Con formato estructurado
+    if emotion:
+        variants.append(f"Tema: {concept}\nTono: {emotion}\n\nPoema sobre {concept}:\n\n{poem}")
+    if style:
+        variants.append(f"Tema: {concept}\nEstilo: {style}\n\nPoema sobre {concept}:\n\n{poem}")
+    # Instrucción en lenguaje natural
+    instruction = f"escribe un poema sobre {concept}"
+    if emotion:
+        instruction += f" {emotion}"
+    variants.append(f"Instrucción: {instruction}\n\nPoema:\n\n{poem}")
+    return variants
+
+
+def format_training_example(poem: str, seed: int = 42) -> str:
+    """
+    Ejemplo de entrenamiento para un poema: con probabilidad DIRECTIVE_RATIO una
+    de sus variantes con directrices, si no el poema tal cual. La elección se
+    deriva de un hash del poema y la semilla (determinista, sin RNG global).
+    """
+    digest = zlib.crc32(poem.encode('utf-8'), seed & 0xFFFFFFFF)
+    if (digest & 0xFFFF) >= DIRECTIVE_RATIO * 0x10000:
+        return poem
+    variants = directive_variants(poem)
+    return variants[(digest >> 16) % len(variants)]
+
+
+def format_training_examples(poems: List[str], seed: int = 42) -> List[str]:
+    """Versión por lotes de format_training_example (para `Dataset.map(batched=True)`)"""
+    return [format_training_example(poem, seed) for poem in poems]
@@ -0,0 +1,128 @@
+"""
+Destilación: un modelo alumno más pequeño aprende de los logits del modelo afinado
+
+El alumno es un GPT-2 con menos capas (y opcionalmente menos cabezas de
+atención) que se inicializa con los embeddings y con capas repartidas del
+profesor, y se entrena con una mezcla de:
+- KL entre las distribuciones del profesor y del alumno suavizadas con una
+  temperatura (el alumno imita qué tokens considera probables el profesor);
+- la pérdida de lenguaje normal sobre el corpus.
+
+El resultado es un GPT2LMHeadModel corriente (`config.json` + pesos): se sirve
+igual que cualquier modelo entrenado.
+"""
+import copy
+import re
+from typing import List, Optional
+
+import torch
+import torch.nn.functional as F
+from transformers import GPT2LMHeadModel, Trainer
+
+# Peso de la pérdida de destilación frente a la de lenguaje
+DEFAULT_DISTILL_ALPHA = 0.5
+# Temperatura con la que se suavizan ambas distribuciones
+DEFAULT_DISTILL_TEMPERATURE = 2.0
+
+_LAYER_KEY = re.compile(r"^transformer\.h\.(\d+)\.(.+)$")
+
+
+def distilled_output_dir(teacher_dir: str) -> str:
+    """Directorio por defecto del alumno: `models/<nombre>-distilled`"""
+    return teacher_dir.rstrip("/\\") + "-distilled"
+
+
+def select_teacher_layers(teacher_layers: int, student_layers: int) -> List[int]:
+    """Capas del profesor repartidas uniformemente (incluye la primera y la última)"""
+    if student_layers == 1:
+        return [teacher_layers - 1]
+    step = (teacher_layers - 1) / (student_layers - 1)
+    return [round(i * step) for i in range(student_layers)]
+
+
+def build_student(
+    teacher: GPT2LMHeadModel,
+    num_layers: Optional[int] = None,
+    num_heads: Optional[int] = None
+) -> GPT2LMHeadModel:
+    """
+    Crea el alumno a partir del profesor
+
+    Args:
+        teacher: Modelo afinado
+        num_layers: Capas del alumno (None = la mitad de las del profesor)
+        num_heads: Cabezas de atención (None = las del profesor)
+    """
+    config = copy.deepcopy(teacher.config)
+    num_layers = num_layers or max(1, config.n_layer // 2)
+    if not 1 <= num_layers <= config.n_layer:
+        raise ValueError(f"El alumno debe tener entre 1 y {config.n_layer} capas")
+    if num_heads:
+        if config.n_embd % num_heads:
+            raise ValueError(f"El número de cabezas debe dividir n_embd ({config.n_embd})")
+        config.n_head = num_heads
+    layers = select_teacher_layers(config.n_layer, num_layers)
+    config.n_layer = num_layers
+
+    student = GPT2LMHeadModel(config)
+
+    # Mismas dimensiones: se copian embeddings, capas elegidas y la normalización final.
+    # Con otro número de cabezas las matrices miden lo mismo (solo cambia cómo se reparten)
+    teacher_state = teacher.state_dict()
+    student_state = student.state_dict()
+    for key, value in student_state.items():
+        source = key
+        match = _LAYER_KEY.match(key)
+        if match:
+            source = f"transformer.h.{layers[int(match.group(1))]}.{match.group(2)}"
+        if source in teacher_state and teacher_state[source].shape == value.shape:
+            student_state[key] = teacher_state[source].clone()
+    student.load_state_dict(student_state)
+
+    teacher_params = sum(p.numel() for p in teacher.parameters())
+    student_params = sum(p.numel() for p in student.parameters())
+    print(f"  Alumno: {num_layers} capas (del profesor: {layers}), {config.n_head} cabezas, "
+          f"{student_params:,} parámetros ({student_params / teacher_params:.0%} del profesor)")
+    return student
+
+
+class DistillationTrainer(Trainer):
+    """Trainer cuya pérdida mezcla la KL con el profesor y la pérdida de lenguaje"""
+
+    def __init__(
+        self,
+        *args,
+        teacher_model: GPT2LMHeadModel,
+        alpha: float = DEFAULT_DISTILL_ALPHA,
+        temperature: float = DEFAULT_DISTILL_TEMPERATURE,
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.alpha = alpha
+        self.temperature = temperature
+        self.teacher_model = teacher_model.to(self.args.device)
+        self.teacher_model.eval()
+        for parameter in self.teacher_model.parameters():
+            parameter.requires_grad_(False)
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        outputs = model(**inputs)
+        with torch.no_grad():
+            teacher_logits = self.teacher_model(
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs.get("attention_mask")
+            ).logits
+
+        # Solo las posiciones que predicen un token real (sin relleno)
+        mask = inputs["labels"][:, 1:] != -100
+        student_logits = outputs.logits[:, :-1][mask] / self.temperature
+        teacher_logits = teacher_logits[:, :-1][mask] / self.temperature
+        distill_loss = F.kl_div(
+            F.log_softmax(student_logits.float(), dim=-1),
+            F.log_softmax(teacher_logits.float(), dim=-1),
+            log_target=True,
+            reduction="batchmean"
+        ) * (self.temperature ** 2)
+
+        loss = self.alpha * distill_loss + (1 - self.alpha) * outputs.loss
+        return (loss, outputs) if return_outputs else loss
@@ -0,0 +1,101 @@
+"""
+Caché de EPUBs procesados, direccionada por contenido
+
+La clave es el SHA-256 del archivo EPUB más la versión del extractor: un
+libro ya procesado (aunque se haya renombrado o movido) no se vuelve a
+parsear, y cambiar la lógica de extracción invalida la caché automáticamente.
+
+Cada entrada es un JSONL comprimido con gzip: una cabecera y una línea por
+capítulo con su texto y los poemas extraídos.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+# Directorio de la caché (EPUB_CACHE_DIR vacío la desactiva)
+DEFAULT_CACHE_DIR = os.getenv("EPUB_CACHE_DIR", "data/.epub_cache")
+
+# Bloque de lectura para calcular el hash
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Registro de un capítulo: (texto limpio, poemas extraídos)
+ChapterRecord = Tuple[str, List[str]]
+
+
+def file_sha256(path: Union[str, Path]) -> str:
+    """SHA-256 de un archivo, leído por bloques"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class EPUBCache:
+    """Caché en disco de capítulos y poemas por (sha256 del EPUB, versión del extractor)"""
+
+    def __init__(self, directory: Union[str, Path], version: str):
+        self.directory = Path(directory)
+        self.version = version
+
+    def _path(self, digest: str) -> Path:
+        # Subdirectorio por prefijo para no acumular miles de archivos en uno
+        return self.directory / digest[:2] / f"{digest}-v{self.version}.jsonl.gz"
+
+    def get(self, digest: str) -> Optional[List[ChapterRecord]]:
+        """Capítulos cacheados del EPUB (None si no están o la entrada está dañada)"""
+        path = self._path(digest)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if header.get("sha256") != digest or header.get("extractor_version") != self.version:
+                    return None
+                records = []
+                for line in f:
+                    record = json.loads(line)
+                    records.append((record["text"], record["poems"]))
+        except (OSError, EOFError, ValueError, KeyError):
+            return None
+        if len(records) != header.get("chapters"):
+            return None
+        return records
+
+    def put(self, digest: str, records: List[ChapterRecord], source: Optional[str] = None):
+        """Guarda los capítulos de un EPUB (atómico: temporal + os.replace)"""
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = {
+            "sha256": digest,
+            "extractor_version": self.version,
+            "source": source,
+            "chapters": len(records),
+            "poems": sum(len(poems) for _, poems in records),
+            "created": datetime.now().isoformat()
+        }
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                for text, poems in records:
+                    f.write(json.dumps({"text": text, "poems": poems}, ensure_ascii=False) + "\n")
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def stats(self) -> Dict:
+        """Número de entradas y tamaño total de la caché"""
+        entries = list(self.directory.glob("*/*.jsonl.gz")) if self.directory.exists() else []
+        return {
+            "directory": str(self.directory),
+            "entries": len(entries),
+            "size": sum(p.stat().st_size for p in entries)
+        }
@@ -0,0 +1,310 @@
+"""
+Conversión de EPUBs en segundo plano (pool de procesos) con progreso por capítulo
+
+Configuración (variables de entorno):
+    EPUB_WORKERS:           conversiones simultáneas (default: la mitad de los núcleos)
+    EPUB_JOBS_KEEP:         registros de trabajos terminados que se conservan (default 100)
+    EPUB_JOBS_MAX_AGE_DAYS: días que se conserva un trabajo terminado (default 7; 0 = sin límite)
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Union
+
+from .dataset_store import atomic_write_text, get_dataset_lock
+
+# Conversiones simultáneas (procesos del pool)
+EPUB_WORKERS = int(os.getenv("EPUB_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+# Registros de trabajos terminados que se conservan en el directorio de trabajos
+EPUB_JOBS_KEEP = int(os.getenv("EPUB_JOBS_KEEP", "100"))
+EPUB_JOBS_MAX_AGE_DAYS = float(os.getenv("EPUB_JOBS_MAX_AGE_DAYS", "7") or 0)
+
+# Estados finales de un trabajo
+FINISHED_STATES = ("completed", "error")
+
+
+def _write_status(status_path: Union[str, Path], status: Dict):
+    """Guarda el estado de un trabajo (atómico, legible desde otros procesos)"""
+    atomic_write_text(status_path, json.dumps(status, ensure_ascii=False))
+
+
+def read_job_status(status_path: Union[str, Path]) -> Optional[Dict]:
+    """Lee el estado de un trabajo (None si no existe)"""
+    try:
+        with open(status_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def run_epub_conversion(epub_path: str, temp_output_path: str, status_path: str) -> int:
+    """
+    Convierte un EPUB a dataset dentro de un proceso del pool.
+    Escribe el resultado en `temp_output_path`; el proceso principal lo confirma.
+
+    Returns:
+        Número de poemas extraídos
+    """
+    from .epub_processor import EPUBProcessor
+
+    status = read_job_status(status_path) or {}
+    status.update({"status": "running", "started_at": datetime.now().isoformat()})
+    _write_status(status_path, status)
+
+    def on_chapter(done: int, total: int, poems_found: int):
+        status.update({
+            "chapters_done": done,
+            "chapters_total": total,
+            "poems_count": poems_found,
+            "progress": round(done / total, 4) if total else 0.0
+        })
+        _write_status(status_path, status)
+
+    processor = EPUBProcessor()
+    poems = processor.process_epub_file(epub_path, progress_callback=on_chapter)
+
+    if not poems:
+        raise ValueError("No se encontraron poemas en el archivo EPUB. Verifica que el archivo contenga poesías.")
+
+    # Guardar como dataset .txt con formato estándar (sin números)
+    separator = "=== POEMA ==="
+    parts = []
+    for poem in poems:
+        poem_cleaned = poem.strip()
+        if poem_cleaned:
+            parts.append(separator + "\n\n" + poem_cleaned + "\n\n\n")
+    with open(temp_output_path, 'w', encoding='utf-8') as f:
+        f.write("".join(parts))
+
+    return len(poems)
+
+
+class EPUBJobManager:
+    """
+    Lanza conversiones EPUB -> dataset en un pool de procesos para no bloquear
+    el event loop del servidor. Cada trabajo tiene un id y un archivo de estado
+    JSON (como .training_status.json) que se actualiza capítulo a capítulo.
+    """
+
+    _ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(
+        self,
+        jobs_dir: Union[str, Path],
+        max_workers: int = EPUB_WORKERS,
+        keep_jobs: int = EPUB_JOBS_KEEP,
+        max_age_days: float = EPUB_JOBS_MAX_AGE_DAYS
+    ):
+        self.jobs_dir = Path(jobs_dir)
+        self.max_workers = max_workers
+        self.keep_jobs = keep_jobs
+        self.max_age_days = max_age_days
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks = set()
+        self._pending_outputs = set()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # "spawn" evita heredar hilos y estado del servidor web al hacer fork
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _status_path(self, job_id: str) -> Path:
+        if not self._ID_PATTERN.match(job_id):
+            raise KeyError(job_id)
+        return self.jobs_dir / f"{job_id}.json"
+
+    def recover(self):
+        """
+        Al arrancar el servidor: los trabajos que figuraban en cola o convirtiéndose
+        murieron con el proceso anterior, así que se marcan como error y se borran
+        sus temporales (el EPUB subido y el dataset a medio escribir). Después se
+        eliminan los registros terminados más antiguos.
+        """
+        for status_path in self._status_paths():
+            status = read_job_status(status_path)
+            if status and status.get("status") not in FINISHED_STATES:
+                for key in ("temp_output_path", "temp_epub_path"):
+                    if status.get(key):
+                        Path(status[key]).unlink(missing_ok=True)
+                status.update({
+                    "status": "error",
+                    "error": "La conversión se interrumpió al reiniciarse el servidor",
+                    "failed_at": datetime.now().isoformat()
+                })
+                _write_status(status_path, status)
+        self.prune()
+
+    def prune(self) -> int:
+        """
+        Borra los registros de trabajos terminados hace más de `max_age_days`
+        y, de los restantes, los que excedan `keep_jobs` (los más antiguos)
+
+        Returns:
+            Número de registros borrados
+        """
+        finished = []
+        for status_path in self._status_paths():
+            status = read_job_status(status_path)
+            if status and status.get("status") in FINISHED_STATES:
+                finished_at = status.get("completed_at") or status.get("failed_at") or status.get("created_at", "")
+                finished.append((finished_at, status_path))
+        finished.sort(reverse=True)
+
+        expired = finished[max(0, self.keep_jobs):]
+        if self.max_age_days > 0:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+            expired += [item for item in finished[:max(0, self.keep_jobs)] if item[0] < cutoff]
+        for _, status_path in expired:
+            try:
+                status_path.unlink()
+            except FileNotFoundError:
+                pass
+        return len(expired)
+
+    def _status_paths(self) -> List[Path]:
+        if not self.jobs_dir.exists():
+            return []
+        return [p for p in self.jobs_dir.glob("*.json") if self._ID_PATTERN.match(p.stem)]
+
+    def is_pending(self, output_path: Union[str, Path]) -> bool:
+        """Indica si ya hay una conversión en curso hacia ese dataset"""
+        return str(Path(output_path).resolve()) in self._pending_outputs
+
+    async def submit(
+        self,
+        epub_path: str,
+        output_path: Path,
+        source_filename: str,
+        delete_source: bool = True
+    ) -> Dict:
+        """
+        Encola una conversión y devuelve su estado inicial (con job_id) de inmediato
+
+        Args:
+            epub_path: EPUB a convertir
+            output_path: Dataset .txt de destino
+            source_filename: Nombre original del EPUB (informativo)
+            delete_source: Si True, borra `epub_path` al terminar
+        """
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        status_path = self._status_path(job_id)
+        temp_output_path = output_path.parent / f".{output_path.name}.{job_id}.tmp"
+        status = {
+            "job_id": job_id,
+            "type": "epub_conversion",
+            "status": "queued",
+            "source": source_filename,
+            "filename": output_path.name,
+            "chapters_done": 0,
+            "chapters_total": None,
+            "poems_count": 0,
+            "progress": 0.0,
+            "created_at": datetime.now().isoformat(),
+            # Temporales del trabajo: recover() los borra si el servidor se reinicia a medias
+            "temp_output_path": str(temp_output_path),
+            "temp_epub_path": str(epub_path) if delete_source else None
+        }
+        _write_status(status_path, status)
+
+        output_key = str(output_path.resolve())
+        self._pending_outputs.add(output_key)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._get_executor(),
+            run_epub_conversion,
+            epub_path,
+            str(temp_output_path),
+            str(status_path)
+        )
+        task = asyncio.create_task(
+            self._finalize(job_id, future, output_path, temp_output_path, epub_path, delete_source)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return status
+
+    async def _finalize(
+        self,
+        job_id: str,
+        future,
+        output_path: Path,
+        temp_output_path: Path,
+        epub_path: str,
+        delete_source: bool
+    ):
+        """Espera al proceso hijo y confirma el dataset bajo el lock del dataset"""
+        status_path = self._status_path(job_id)
+        try:
+            poems_count = await future
+            async with get_dataset_lock(output_path).write():
+                if output_path.exists():
+                    raise FileExistsError(f"Ya existe un dataset con el nombre {output_path.name}")
+                os.replace(temp_output_path, output_path)
+            status = read_job_status(status_path) or {"job_id": job_id}
+            status.update({
+                "status": "completed",
+                "poems_count": poems_count,
+                "progress": 1.0,
+                "completed_at": datetime.now().isoformat(),
+                "message": f"EPUB convertido correctamente. {poems_count} poemas extraídos."
+            })
+        except Exception as e:
+            status = read_job_status(status_path) or {"job_id": job_id}
+            status.update({
+                "status": "error",
+                "error": str(e),
+                "failed_at": datetime.now().isoformat()
+            })
+        finally:
+            self._pending_outputs.discard(str(output_path.resolve()))
+            if temp_output_path.exists():
+                temp_output_path.unlink()
+            if delete_source and os.path.exists(epub_path):
+                try:
+                    os.unlink(epub_path)
+                except OSError:
+                    pass
+        _write_status(status_path, status)
+        self.prune()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Estado de un trabajo (None si no existe)"""
+        try:
+            return read_job_status(self._status_path(job_id))
+        except KeyError:
+            return None
+
+    def list(self) -> List[Dict]:
+        """Todos los trabajos conocidos, más recientes primero"""
+        jobs = [read_job_status(p) for p in self._status_paths()]
+        jobs = [job for job in jobs if job]
+        jobs.sort(key=lambda job: job.get("created_at", ""), reverse=True)
+        return jobs
+
+    async def events(self, job_id: str, poll_interval: float = 0.5) -> AsyncIterator[str]:
+        """Eventos SSE con el estado del trabajo cada vez que cambia, hasta que termina"""
+        last = None
+        while True:
+            status = self.get(job_id)
+            if status is None:
+                yield f"event: error\ndata: {json.dumps({'detail': 'Trabajo no encontrado'})}\n\n"
+                return
+            if status != last:
+                yield f"data: {json.dumps(status, ensure_ascii=False)}\n\n"
+                last = status
+            if status.get("status") in FINISHED_STATES:
+                return
+            await asyncio.sleep(poll_interval)
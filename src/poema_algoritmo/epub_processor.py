@@ -1,57 +1,95 @@
 """
 Procesador de archivos EPUB para extraer poesías
 """
-import ebooklib
-from ebooklib import epub
-from bs4 import BeautifulSoup
 import re
 import os
-from typing import List, Optional
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Optional, Tuple
+
+from .epub_cache import DEFAULT_CACHE_DIR, ChapterRecord, EPUBCache, file_sha256
+from .html_text import HTML_BACKENDS, get_html_backend
+from .near_duplicates import deduplicate_poems
+from .segmentation import (
+    EPUB_RULES, EPUB_SEPARATED_RULES, SEPARATOR_PATTERN, PoemSegmenter, PoemSpan, has_separators,
+)
+
+# Versión del extractor: subirla al cambiar la extracción de texto o la
+# segmentación invalida las entradas de la caché de EPUBs
+EXTRACTOR_VERSION = "1"
+
+
+def _read_documents(epub_path: str) -> list:
+    """Documentos HTML de un EPUB (ebooklib se importa al leer el primer libro)"""
+    import ebooklib
+    from ebooklib import epub
+
+    book = epub.read_epub(epub_path)
+    return [item for item in book.get_items() if item.get_type() == ebooklib.ITEM_DOCUMENT]
 
 
 class EPUBProcessor:
     """Procesa archivos EPUB para extraer poesías"""
     
-    def __init__(self):
+    # En modo paralelo, los libros de este tamaño o más se reparten por capítulos
+    SPLIT_BOOK_BYTES = 1024 * 1024
+    # Mínimo de documentos por tarea al repartir un libro (evita tareas diminutas)
+    MIN_DOCUMENTS_PER_TASK = 8
+    
+    def __init__(self, html_backend: Optional[str] = None, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        """
+        Args:
+            html_backend: Extractor de texto HTML ("stream" o "bs4");
+                          None = EPUB_HTML_BACKEND o "stream"
+            cache_dir: Directorio de la caché de EPUBs procesados; None o "" la desactiva
+        """
         self.poems = []
+        self.html_backend = html_backend
+        self.html_to_text = get_html_backend(html_backend)
+        # Ambos backends HTML producen el mismo texto, así que no forman parte de la clave
+        self.cache = EPUBCache(cache_dir, EXTRACTOR_VERSION) if cache_dir else None
+    
+    def _cache_lookup(self, epub_path: str) -> Tuple[Optional[str], Optional[List[ChapterRecord]]]:
+        """(sha256, capítulos cacheados) de un EPUB; (None, None) sin caché"""
+        if self.cache is None:
+            return None, None
+        digest = file_sha256(epub_path)
+        return digest, self.cache.get(digest)
+    
+    def count_documents(self, epub_path: str) -> int:
+        """Número de documentos (capítulos/secciones HTML) de un EPUB"""
+        return len(_read_documents(epub_path))
     
-    def extract_text_from_epub(self, epub_path: str) -> List[str]:
+    def extract_text_from_epub(self, epub_path: str, start: int = 0, end: Optional[int] = None) -> List[str]:
         """
         Extrae todo el texto de un archivo EPUB
         
         Args:
             epub_path: Ruta al archivo EPUB
+            start: Índice del primer documento a procesar
+            end: Índice (exclusivo) del último documento; None = hasta el final
             
         Returns:
             Lista de strings con el contenido de cada capítulo/sección
         """
         try:
-            book = epub.read_epub(epub_path)
             chapters = []
+            documents = _read_documents(epub_path)
             
-            for item in book.get_items():
-                if item.get_type() == ebooklib.ITEM_DOCUMENT:
-                    try:
-                        # Parsear el contenido HTML
-                        content = item.get_content()
-                        if content:
-                            soup = BeautifulSoup(content, 'html.parser')
-                            
-                            # Extraer texto preservando saltos de línea
-                            # Eliminar scripts y estilos
-                            for script in soup(["script", "style"]):
-                                script.decompose()
-                            
-                            # Obtener texto preservando estructura
-                            text = soup.get_text(separator='\n')
-                            
-                            # Limpiar el texto (más permisivo)
-                            text = self._clean_text(text)
-                            if text and len(text.strip()) > 30:  # Filtrar textos muy cortos
-                                chapters.append(text)
-                    except Exception as e:
-                        print(f"  Advertencia: Error al procesar un documento: {e}")
-                        continue
+            for item in documents[start:end]:
+                try:
+                    content = item.get_content()
+                    if content:
+                        # Extraer texto (sin scripts ni estilos) preservando saltos de línea
+                        text = self.html_to_text(content)
+                        
+                        # Limpiar el texto (más permisivo)
+                        text = self._clean_text(text)
+                        if text and len(text.strip()) > 30:  # Filtrar textos muy cortos
+                            chapters.append(text)
+                except Exception as e:
+                    print(f"  Advertencia: Error al procesar un documento: {e}")
+                    continue
             
             return chapters
             
@@ -71,140 +109,163 @@ class EPUBProcessor:
         Returns:
             Lista de poesías extraídas
         """
-        poems = []
-        
-        # PRIMERO: Detectar si hay separadores explícitos === POEMA === o === POEMA X ===
-        separator_pattern = r'===+\s*POEMA\s+\d+\s*===+|===+\s*POEMA\s*===+'
-        if re.search(separator_pattern, text, re.IGNORECASE):
-            # Dividir por separadores explícitos
-            parts = re.split(separator_pattern, text, flags=re.IGNORECASE)
-            for part in parts:
-                part = part.strip()
-                if not part:
-                    continue
-                
-                # Limpiar el poema
-                cleaned_poem = self._clean_poem(part)
-                if cleaned_poem and len(cleaned_poem) > 30:
-                    poems.append(cleaned_poem)
-            
-            # Si encontramos poemas con separadores, retornarlos (ya limpios y únicos)
-            if poems:
-                # Eliminar duplicados
-                unique_poems = []
-                seen = set()
-                for poem in poems:
-                    poem_hash = hash(poem[:100])  # Primeros 100 caracteres
-                    if poem_hash not in seen:
-                        seen.add(poem_hash)
-                        unique_poems.append(poem)
-                return unique_poems
-        
-        # SEGUNDO: Si no hay separadores, usar lógica de detección por estructura
-        # Dividir por líneas vacías dobles o más (párrafos/poemas)
-        paragraphs = re.split(r'\n\s*\n+', text)
-        
-        for para in paragraphs:
-            para = para.strip()
-            if not para:
-                continue
-            
-            # Dividir en líneas
-            lines = [line.strip() for line in para.split('\n') if line.strip()]
-            
-            # Filtrar líneas muy largas que probablemente son prosa
-            valid_lines = []
-            for line in lines:
-                # Si una línea es muy larga (más de 150 caracteres), probablemente es prosa
-                if len(line) > 150:
-                    # Si hay líneas válidas antes, guardarlas como poema
-                    if len(valid_lines) >= 3:
-                        poem = '\n'.join(valid_lines)
-                        if len(poem) > 30:
-                            poems.append(poem)
-                    valid_lines = []
-                else:
-                    valid_lines.append(line)
-            
-            # Si quedaron líneas válidas al final
-            if len(valid_lines) >= 3:
-                poem = '\n'.join(valid_lines)
-                if len(poem) > 30:
-                    poems.append(poem)
-            
-            # También intentar detectar poemas por estructura (múltiples líneas cortas)
-            if len(lines) >= 3:
-                # Calcular estadísticas de las líneas
-                line_lengths = [len(line) for line in lines]
-                avg_length = sum(line_lengths) / len(line_lengths)
-                max_length = max(line_lengths)
-                
-                # Criterios más flexibles para poesía:
-                # - Al menos 3 líneas
-                # - Línea promedio no muy larga (menos de 120 caracteres)
-                # - No todas las líneas son muy largas
-                if avg_length < 120 and max_length < 200:
-                    poem = '\n'.join(lines)
-                    # Filtrar si es demasiado corto o demasiado largo (probablemente prosa)
-                    if 30 < len(poem) < 2000:
-                        poems.append(poem)
+        # Con separadores explícitos (=== POEMA ===) solo cortan ellos; si no
+        # sale ningún poema así, cada párrafo es un poema y las líneas de prosa
+        # (muy largas) lo cortan
+        spans: List[PoemSpan] = []
+        if has_separators(text):
+            # Un separador dentro de una línea también corta (aquí no hacen falta offsets)
+            separated = SEPARATOR_PATTERN.sub(lambda m: f'\n{m.group(0)}\n', text)
+            spans = PoemSegmenter(EPUB_SEPARATED_RULES).segment(separated)
+        if not spans:
+            spans = PoemSegmenter(EPUB_RULES).segment(text)
         
-        # Eliminar duplicados y limpiar
+        # Eliminar duplicados (primeros 100 caracteres)
         unique_poems = []
         seen = set()
-        for poem in poems:
-            poem_clean = self._clean_poem(poem)
-            # Usar hash para detectar duplicados similares
-            poem_hash = hash(poem_clean[:100])  # Primeros 100 caracteres
-            if poem_hash not in seen and len(poem_clean) > 30:
+        for span in spans:
+            poem_hash = hash(span.text[:100])
+            if poem_hash not in seen:
                 seen.add(poem_hash)
-                unique_poems.append(poem_clean)
+                unique_poems.append(span.text)
         
         return unique_poems
     
-    def process_epub_file(self, epub_path: str) -> List[str]:
+    def process_epub_file(
+        self,
+        epub_path: str,
+        progress_callback: Optional[Callable[[int, int, int], None]] = None
+    ) -> List[str]:
         """
         Procesa un archivo EPUB completo y extrae todas las poesías
         
         Args:
             epub_path: Ruta al archivo EPUB
+            progress_callback: Opcional, se llama tras cada capítulo con
+                               (capítulos_procesados, total_capítulos, poesías_hasta_ahora)
             
         Returns:
             Lista de poesías extraídas
         """
         print(f"Procesando: {epub_path}")
-        chapters = self.extract_text_from_epub(epub_path)
-        print(f"  Capítulos/secciones encontrados: {len(chapters)}")
+        digest, cached = self._cache_lookup(epub_path)
+        if cached is not None:
+            chapters = [text for text, _ in cached]
+            print(f"  Capítulos/secciones encontrados: {len(chapters)} (caché)")
+        else:
+            chapters = self.extract_text_from_epub(epub_path)
+            print(f"  Capítulos/secciones encontrados: {len(chapters)}")
+        if progress_callback:
+            progress_callback(0, len(chapters), 0)
         
         all_poems = []
+        records = []
         for i, chapter in enumerate(chapters, 1):
-            poems = self.extract_poems_from_text(chapter)
+            poems = cached[i - 1][1] if cached is not None else self.extract_poems_from_text(chapter)
+            records.append((chapter, poems))
             if poems:
                 print(f"    Capítulo {i}: {len(poems)} poesías")
                 all_poems.extend(poems)
+            if progress_callback:
+                progress_callback(i, len(chapters), len(all_poems))
+        
+        if cached is None and digest and records:
+            self.cache.put(digest, records, source=os.path.basename(epub_path))
         
         print(f"  ✓ Total extraídas: {len(all_poems)} poesías")
         return all_poems
     
-    def process_directory(self, directory: str) -> List[str]:
+    def process_directory(self, directory: str, workers: int = 1) -> List[str]:
         """
         Procesa todos los archivos EPUB en un directorio
         
         Args:
             directory: Directorio con archivos EPUB
+            workers: Número de procesos. Con más de 1 se reparten los libros (y los
+                     capítulos de los libros grandes) en un pool de procesos
             
         Returns:
-            Lista de todas las poesías extraídas
+            Lista de todas las poesías extraídas (mismo orden con cualquier número de workers)
         """
-        all_poems = []
-        epub_files = [f for f in os.listdir(directory) if f.endswith('.epub')]
+        # Orden alfabético para que el resultado sea determinista
+        epub_files = sorted(f for f in os.listdir(directory) if f.endswith('.epub'))
         
         print(f"Encontrados {len(epub_files)} archivos EPUB")
         
-        for epub_file in epub_files:
+        if workers > 1 and epub_files:
+            all_poems = self._process_directory_parallel(directory, epub_files, workers)
+        else:
+            all_poems = []
+            for epub_file in epub_files:
+                epub_path = os.path.join(directory, epub_file)
+                poems = self.process_epub_file(epub_path)
+                all_poems.extend(poems)
+        
+        # El mismo poema puede aparecer en varias ediciones: quitar casi duplicados
+        unique_poems = deduplicate_poems(all_poems)
+        if len(unique_poems) < len(all_poems):
+            print(f"Eliminados {len(all_poems) - len(unique_poems)} poemas casi duplicados entre libros")
+        return unique_poems
+    
+    def _process_directory_parallel(self, directory: str, epub_files: List[str], workers: int) -> List[str]:
+        """
+        Procesa los EPUB en un pool de procesos.
+        Cada tarea es un rango de documentos de un libro; los resultados se
+        combinan por (libro, primer documento), así que el orden no depende
+        de qué proceso termine antes. Los libros ya cacheados no generan tareas.
+        """
+        results = {}  # (índice del libro, primer documento) -> capítulos
+        digests = {}  # índice del libro -> sha256 (libros a procesar y cachear)
+        tasks = []  # (índice del libro, ruta, inicio, fin)
+        for book_index, epub_file in enumerate(epub_files):
             epub_path = os.path.join(directory, epub_file)
-            poems = self.process_epub_file(epub_path)
-            all_poems.extend(poems)
+            digest, cached = self._cache_lookup(epub_path)
+            if cached is not None:
+                results[(book_index, 0)] = cached
+                continue
+            digests[book_index] = digest
+            if os.path.getsize(epub_path) >= self.SPLIT_BOOK_BYTES:
+                # Libro grande: repartir sus capítulos entre los workers
+                total = self.count_documents(epub_path)
+                per_task = max(self.MIN_DOCUMENTS_PER_TASK, math.ceil(total / workers))
+                for start in range(0, total, per_task):
+                    tasks.append((book_index, epub_path, start, start + per_task))
+            else:
+                tasks.append((book_index, epub_path, 0, None))
+        
+        print(
+            f"Procesando en paralelo: {len(tasks)} tareas con {workers} procesos "
+            f"({len(epub_files) - len(digests)} libros en caché)"
+        )
+        
+        if tasks:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(_process_epub_range, epub_path, start, end, self.html_backend): (book_index, start)
+                    for book_index, epub_path, start, end in tasks
+                }
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+        
+        # Combinar en orden determinista (libro, rango)
+        all_poems = []
+        poems_per_book = [0] * len(epub_files)
+        records_per_book = {book_index: [] for book_index in digests}
+        for book_index, start in sorted(results):
+            records = results[(book_index, start)]
+            if book_index in records_per_book:
+                records_per_book[book_index].extend(records)
+            for _, poems in records:
+                poems_per_book[book_index] += len(poems)
+                all_poems.extend(poems)
+        
+        # Guardar en caché los libros recién procesados
+        for book_index, records in records_per_book.items():
+            if self.cache is not None and records:
+                self.cache.put(digests[book_index], records, source=epub_files[book_index])
+        
+        for epub_file, count in zip(epub_files, poems_per_book):
+            print(f"  ✓ {epub_file}: {count} poesías")
         
         return all_poems
     
@@ -276,14 +337,23 @@ class EPUBProcessor:
         if len(line) < 30 and line.isupper():
             return True
         return False
-    
-    def _clean_poem(self, poem: str) -> str:
-        """Limpia y formatea un poema"""
-        # Eliminar líneas vacías múltiples
-        lines = [line.strip() for line in poem.split('\n') if line.strip()]
-        # Unir líneas manteniendo estructura
-        cleaned = '\n'.join(lines)
-        return cleaned
+
+
+def _process_epub_range(
+    epub_path: str,
+    start: int,
+    end: Optional[int],
+    html_backend: Optional[str] = None
+) -> List[ChapterRecord]:
+    """
+    Extrae los capítulos y sus poesías de un rango de documentos de un EPUB
+    (se ejecuta en un proceso del pool; la caché la gestiona el proceso principal)
+    """
+    processor = EPUBProcessor(html_backend, cache_dir=None)
+    return [
+        (chapter, processor.extract_poems_from_text(chapter))
+        for chapter in processor.extract_text_from_epub(epub_path, start, end)
+    ]
 
 
 def main():
@@ -294,15 +364,27 @@ def main():
     parser.add_argument('input', help='Archivo EPUB o directorio con EPUBs')
     parser.add_argument('-o', '--output', default='data/poems.txt', 
                        help='Archivo de salida (default: data/poems.txt)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                       help='Procesos en paralelo para directorios (default: 1, 0 = todos los núcleos)')
+    parser.add_argument('--html-backend', choices=sorted(HTML_BACKENDS), default=None,
+                       help='Extractor de texto HTML (default: EPUB_HTML_BACKEND o "stream")')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                       help=f'Caché de EPUBs ya procesados (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Procesar todos los EPUB sin usar la caché')
     
     args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
     
-    processor = EPUBProcessor()
+    processor = EPUBProcessor(
+        html_backend=args.html_backend,
+        cache_dir=None if args.no_cache else args.cache_dir
+    )
     
     if os.path.isfile(args.input):
         poems = processor.process_epub_file(args.input)
     elif os.path.isdir(args.input):
-        poems = processor.process_directory(args.input)
+        poems = processor.process_directory(args.input, workers=workers)
     else:
         print(f"Error: {args.input} no es un archivo ni un directorio válido")
         return
@@ -0,0 +1,291 @@
+"""
+Evaluación de modelos: conjunto de validación determinista, perplejidad y
+batería fija de directrices
+
+El conjunto de validación se elige con un hash de cada poema (no con un
+barajado): el mismo poema cae siempre en el mismo lado aunque el corpus crezca
+o cambie de orden, así que las cifras de modelos distintos son comparables.
+
+`evaluate_model` carga un modelo de `models/` con PoemGenerator, calcula la
+perplejidad sobre la validación y pasa la batería de directrices (acierto del
+concepto, latencia por percentiles y tokens/s). El informe se guarda en
+`evaluation.json` junto al modelo. torch solo se importa al evaluar: el panel
+lee los informes sin cargarlo.
+
+Uso:
+    poetry run python -m poema_algoritmo.evaluation models/poetry_model data/poems.txt
+"""
+import json
+import math
+import os
+import statistics
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .dataset_store import atomic_write_text
+
+# Fracción de poemas reservada para validación
+HELD_OUT_FRACTION = float(os.getenv("EVAL_HELD_OUT_FRACTION", "0.05"))
+
+# Informe que se guarda junto a cada modelo
+REPORT_FILENAME = "evaluation.json"
+
+# Batería fija de directrices: (directriz, concepto que debe aparecer en el poema)
+DIRECTIVE_SUITE: List[Tuple[str, str]] = [
+    ("casa", "casa"),
+    ("mar", "mar"),
+    ("escribe un poema triste sobre la lluvia", "lluvia"),
+    ("soneto romántico sobre el amor", "amor"),
+    ("verso libre sobre la ciudad, alegre y moderno", "ciudad"),
+    ("poema melancólico sobre el otoño", "otoño"),
+    ("haiku sobre la luna", "luna"),
+    ("poema corto sobre la memoria", "memoria"),
+    ("oda a la noche, con naturaleza", "noche"),
+    ("poema nostálgico sobre la infancia", "infancia"),
+]
+
+
+def is_held_out(poem: str, fraction: float = HELD_OUT_FRACTION, seed: int = 42) -> bool:
+    """True si el poema pertenece al conjunto de validación"""
+    bucket = zlib.crc32(f"{seed}:{poem}".encode("utf-8")) % 10000
+    return bucket < fraction * 10000
+
+
+def split_held_out(
+    poems: List[str],
+    fraction: float = HELD_OUT_FRACTION,
+    seed: int = 42
+) -> Tuple[List[str], List[str]]:
+    """Separa (entrenamiento, validación) de forma determinista"""
+    train, held_out = [], []
+    for poem in poems:
+        (held_out if is_held_out(poem, fraction, seed) else train).append(poem)
+    return train, held_out
+
+
+def perplexity(
+    model,
+    tokenizer,
+    texts: List[str],
+    max_length: int = 512,
+    batch_size: int = 8,
+    device=None
+) -> Optional[float]:
+    """
+    Perplejidad de `model` sobre `texts` (exp de la pérdida media por token)
+
+    Los textos se ordenan por longitud y se evalúan por lotes sin gradientes;
+    los tokens de relleno no cuentan. None si no hay tokens que evaluar.
+    """
+    import torch
+
+    device = device or next(model.parameters()).device
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    encoded = [
+        tokenizer(text, truncation=True, max_length=max_length)["input_ids"]
+        for text in texts
+    ]
+    # Lotes de longitud parecida: menos relleno
+    encoded = sorted((ids for ids in encoded if len(ids) > 1), key=len)
+
+    was_training = model.training
+    model.eval()
+    total_loss = 0.0
+    total_tokens = 0
+    try:
+        with torch.no_grad():
+            for start in range(0, len(encoded), batch_size):
+                batch = encoded[start:start + batch_size]
+                width = max(len(ids) for ids in batch)
+                input_ids = torch.full((len(batch), width), pad_id, dtype=torch.long)
+                attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+                for row, ids in enumerate(batch):
+                    input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+                    attention_mask[row, :len(ids)] = 1
+                input_ids = input_ids.to(device)
+                attention_mask = attention_mask.to(device)
+
+                logits = model(input_ids=input_ids, attention_mask=attention_mask).logits
+                # Cada posición predice el token siguiente
+                shift_logits = logits[:, :-1].float()
+                shift_labels = input_ids[:, 1:]
+                shift_mask = attention_mask[:, 1:].bool()
+                losses = torch.nn.functional.cross_entropy(
+                    shift_logits.reshape(-1, shift_logits.size(-1)),
+                    shift_labels.reshape(-1),
+                    reduction="none"
+                ).view_as(shift_labels)
+                total_loss += losses[shift_mask].sum().item()
+                total_tokens += int(shift_mask.sum().item())
+    finally:
+        model.train(was_training)
+
+    if total_tokens == 0:
+        return None
+    return math.exp(total_loss / total_tokens)
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    """Percentil por rango más cercano de una lista ordenada"""
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_directive_suite(
+    generator,
+    suite: Sequence[Tuple[str, str]] = DIRECTIVE_SUITE,
+    max_length: int = 520,
+    temperature: float = 0.7,
+    seed: int = 0
+) -> Dict:
+    """
+    Genera un poema por directriz con el modelo local (sin LM Studio)
+
+    Returns:
+        Tasa de acierto del concepto, latencias (p50/p90/p99) y tokens/s, más el
+        detalle de cada directriz
+    """
+    import torch
+
+    results = []
+    for index, (directive, concept) in enumerate(suite):
+        # Misma semilla por directriz: ejecuciones repetidas son comparables
+        torch.manual_seed(seed + index)
+        start = time.perf_counter()
+        poem, _ = generator.generate(
+            directive,
+            max_length=max_length,
+            temperature=temperature,
+            use_agent=True,
+            prefer_lm_studio=False
+        )
+        latency = time.perf_counter() - start
+        tokens = len(generator.tokenizer(poem)["input_ids"]) if generator.tokenizer else 0
+        results.append({
+            "directive": directive,
+            "concept": concept,
+            "concept_hit": concept.lower() in poem.lower(),
+            "latency_seconds": round(latency, 4),
+            "tokens": tokens,
+        })
+
+    latencies = sorted(r["latency_seconds"] for r in results)
+    total_time = sum(latencies)
+    return {
+        "directives": len(results),
+        "concept_hit_rate": round(sum(r["concept_hit"] for r in results) / len(results), 4) if results else None,
+        "latency_seconds": {
+            "mean": round(statistics.mean(latencies), 4),
+            "p50": _percentile(latencies, 50),
+            "p90": _percentile(latencies, 90),
+            "p99": _percentile(latencies, 99),
+        } if latencies else None,
+        "tokens_per_sec": round(sum(r["tokens"] for r in results) / total_time, 1) if total_time else None,
+        "results": results,
+    }
+
+
+def evaluate_model(
+    model_path: str,
+    poems: Optional[List[str]] = None,
+    max_length: int = 512,
+    batch_size: int = 8,
+    run_suite: bool = True,
+    save: bool = True
+) -> Dict:
+    """
+    Evalúa un modelo (completo o adaptador LoRA) y guarda el informe junto a él
+
+    Args:
+        model_path: Directorio del modelo en models/
+        poems: Corpus; se evalúa la perplejidad sobre su conjunto de validación
+        max_length: Longitud máxima (tokens) al calcular la perplejidad
+        batch_size: Tamaño de lote al calcular la perplejidad
+        run_suite: Si True, pasa la batería de directrices
+        save: Si True, escribe `evaluation.json` en el directorio del modelo
+
+    Raises:
+        RuntimeError: si el modelo no se pudo cargar
+    """
+    from .poem_generator import PoemGenerator
+
+    generator = PoemGenerator(use_lm_studio=False, model_path=model_path)
+    if not generator.loaded_from(model_path):
+        raise RuntimeError(f"No se pudo cargar el modelo {model_path}")
+
+    report: Dict = {
+        "model": model_path,
+        "base_model": generator.switcher.base_model_name,
+        "adapter": generator.default_adapter,
+        "device": str(generator.device),
+        "evaluated_at": datetime.now().isoformat(),
+    }
+
+    if poems:
+        _, held_out = split_held_out(poems)
+        adapter = generator.default_adapter
+        with generator.switcher.use(adapter, generator.adapters.get(adapter)) as model:
+            start = time.perf_counter()
+            ppl = perplexity(model, generator.tokenizer, held_out, max_length=max_length,
+                             batch_size=batch_size, device=generator.device)
+            elapsed = time.perf_counter() - start
+        report["held_out"] = {
+            "poems": len(held_out),
+            "fraction": HELD_OUT_FRACTION,
+            "perplexity": round(ppl, 4) if ppl is not None else None,
+            "seconds": round(elapsed, 2),
+        }
+
+    if run_suite:
+        report["directive_suite"] = run_directive_suite(generator)
+
+    if save:
+        atomic_write_text(Path(model_path) / REPORT_FILENAME, json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def read_report(model_path: str) -> Optional[Dict]:
+    """Informe de evaluación guardado junto al modelo (None si no hay)"""
+    try:
+        with open(Path(model_path) / REPORT_FILENAME, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def main():
+    """Evalúa un modelo desde línea de comandos"""
+    import argparse
+
+    from .train_model import PoetryTrainer
+
+    parser = argparse.ArgumentParser(description='Evaluar un modelo de poesía')
+    parser.add_argument('model', help='Directorio del modelo (p. ej. models/poetry_model)')
+    parser.add_argument('poems_file', nargs='?', default=None,
+                       help='Corpus para la perplejidad (se usa su conjunto de validación)')
+    parser.add_argument('--max-length', type=int, default=512,
+                       help='Longitud máxima al calcular la perplejidad (default: 512)')
+    parser.add_argument('--no-suite', action='store_true',
+                       help='No pasar la batería de directrices')
+    args = parser.parse_args()
+
+    poems = PoetryTrainer.load_poems(args.poems_file) if args.poems_file else None
+    report = evaluate_model(args.model, poems, max_length=args.max_length, run_suite=not args.no_suite)
+
+    held_out = report.get("held_out")
+    if held_out:
+        print(f"Perplejidad (validación, {held_out['poems']} poemas): {held_out['perplexity']}")
+    suite = report.get("directive_suite")
+    if suite:
+        print(f"Acierto del concepto: {suite['concept_hit_rate']:.0%}")
+        print(f"Latencia p50/p90/p99: {suite['latency_seconds']['p50']:.2f} / "
+              f"{suite['latency_seconds']['p90']:.2f} / {suite['latency_seconds']['p99']:.2f} s")
+        print(f"Tokens/s: {suite['tokens_per_sec']}")
+    print(f"✓ Informe guardado en {Path(args.model) / REPORT_FILENAME}")
+
+
+if __name__ == "__main__":
+    main()
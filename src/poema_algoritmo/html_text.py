@@ -0,0 +1,170 @@
+"""
+Extracción de texto de documentos HTML/XHTML de EPUBs con backends intercambiables
+
+- "stream": basado en eventos de html.parser, sin construir el árbol DOM (por defecto)
+- "bs4": BeautifulSoup + get_text (implementación original)
+
+Ambos producen el mismo texto: cada nodo de texto separado por '\n',
+sin el contenido de <script> y <style>.
+"""
+import os
+import re
+from html.entities import html5, name2codepoint
+from html.parser import HTMLParser
+from typing import Callable, Dict, Union
+
+# Backend usado si no se indica otro (configurable con EPUB_HTML_BACKEND)
+DEFAULT_HTML_BACKEND = os.getenv("EPUB_HTML_BACKEND", "stream")
+
+# Espacios ASCII que BeautifulSoup considera "solo espacio en blanco"
+_ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+_XML_ENCODING_PATTERN = re.compile(rb'^\s*<\?xml[^>]*encoding=["\']([A-Za-z0-9._-]+)["\']')
+
+
+def _decode(content: Union[bytes, str]) -> str:
+    """Decodifica un documento del EPUB (BOM, declaración XML o UTF-8)"""
+    if isinstance(content, str):
+        return content
+    if content.startswith(b'\xef\xbb\xbf'):
+        return content[3:].decode('utf-8', errors='replace')
+    if content.startswith((b'\xff\xfe', b'\xfe\xff')):
+        return content.decode('utf-16', errors='replace')
+    match = _XML_ENCODING_PATTERN.match(content)
+    if match:
+        try:
+            return content.decode(match.group(1).decode('ascii'), errors='replace')
+        except LookupError:
+            pass
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return content.decode('windows-1252', errors='replace')
+
+
+class _TextCollector(HTMLParser):
+    """
+    Recoge los nodos de texto igual que BeautifulSoup con html.parser:
+    el texto contiguo se une en un nodo, los nodos de solo espacios se reducen
+    a '\n' o ' ' (salvo dentro de <pre>/<textarea>) y se omiten comentarios,
+    declaraciones e instrucciones de procesamiento.
+    """
+
+    SKIP_TAGS = {"script", "style"}
+    PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+
+    def __init__(self):
+        # Las referencias se resuelven a mano para replicar a BeautifulSoup
+        super().__init__(convert_charrefs=False)
+        self.parts = []
+        self._buffer = []
+        self._skip_depth = 0
+        self._preserve_depth = 0
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer)
+        self._buffer = []
+        if self._skip_depth or not data:
+            return
+        if not self._preserve_depth and not data.strip(_ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        self.parts.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self.PRESERVE_WHITESPACE_TAGS and self._preserve_depth:
+            self._preserve_depth -= 1
+
+    def handle_data(self, data):
+        self._buffer.append(data)
+
+    def handle_charref(self, name):
+        try:
+            code = int(name[1:], 16) if name[:1] in ('x', 'X') else int(name)
+        except ValueError:
+            self._buffer.append(f"&#{name};")
+            return
+        data = None
+        if code < 256:
+            # Referencias numéricas que en realidad apuntan a windows-1252
+            try:
+                data = bytes([code]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self._buffer.append(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name):
+        character = html5.get(f"{name};")
+        if character is None and name in name2codepoint:
+            character = chr(name2codepoint[name])
+        self._buffer.append(character if character is not None else f"&{name}")
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        # <![CDATA[...]]> cuenta como texto (igual que CData en BeautifulSoup)
+        self._flush()
+        if data.upper().startswith('CDATA['):
+            self._buffer.append(data[len('CDATA['):])
+            self._flush()
+
+    def get_text(self) -> str:
+        self.close()
+        self._flush()
+        return '\n'.join(self.parts)
+
+
+def html_to_text_stream(content: Union[bytes, str]) -> str:
+    """Extrae el texto en una sola pasada de eventos, sin construir el DOM"""
+    collector = _TextCollector()
+    collector.feed(_decode(content))
+    return collector.get_text()
+
+
+def html_to_text_bs4(content: Union[bytes, str]) -> str:
+    """Extrae el texto con BeautifulSoup (árbol completo)"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    # Eliminar scripts y estilos
+    for script in soup(["script", "style"]):
+        script.decompose()
+    # Obtener texto preservando estructura
+    return soup.get_text(separator='\n')
+
+
+HTML_BACKENDS: Dict[str, Callable[[Union[bytes, str]], str]] = {
+    "stream": html_to_text_stream,
+    "bs4": html_to_text_bs4,
+}
+
+
+def get_html_backend(name: str = None) -> Callable[[Union[bytes, str]], str]:
+    """Devuelve la función de extracción para un backend"""
+    name = name or DEFAULT_HTML_BACKEND
+    if name not in HTML_BACKENDS:
+        raise ValueError(f"Backend HTML desconocido: {name}. Opciones: {', '.join(HTML_BACKENDS)}")
+    return HTML_BACKENDS[name]
@@ -3,10 +3,14 @@ Cliente para integrar LM Studio con el sistema de poesía
 LM Studio expone una API compatible con OpenAI en localhost
 """
 import os
+import time
 import requests
 from typing import Optional, Dict, Any
 import json
 
+from .serving_metrics import LM_STUDIO_REQUESTS_TOTAL, PHASE_SECONDS
+from .tracing import span
+
 
 class LMStudioClient:
     """
@@ -46,7 +50,8 @@ class LMStudioClient:
         prompt: str,
         max_tokens: int = 200,
         temperature: float = 0.7,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        operation: str = "generate"
     ) -> Optional[str]:
         """
         Genera texto usando LM Studio
@@ -56,6 +61,7 @@ class LMStudioClient:
             max_tokens: Máximo número de tokens a generar
             temperature: Temperatura para la generación
             system_prompt: Prompt del sistema (opcional)
+            operation: Nombre de la operación en las métricas
             
         Returns:
             Texto generado o None si hay error
@@ -68,6 +74,19 @@ class LMStudioClient:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
         
+        with span(f"lm_studio.{operation}", operation=operation, max_tokens=max_tokens,
+                  prompt_chars=len(prompt)) as current:
+            outcome = "error"
+            try:
+                text, outcome = self._chat(messages, max_tokens, temperature, current)
+                return text
+            finally:
+                current.set_attribute("outcome", outcome)
+                LM_STUDIO_REQUESTS_TOTAL.inc(operation=operation, outcome=outcome)
+    
+    def _chat(self, messages: list, max_tokens: int, temperature: float, current) -> tuple:
+        """Petición a /chat/completions; devuelve (texto o None, resultado para métricas y trazas)"""
+        start = time.perf_counter()
         try:
             response = requests.post(
                 f"{self.base_url}/chat/completions",
@@ -83,16 +102,22 @@ class LMStudioClient:
             
             if response.status_code == 200:
                 data = response.json()
+                usage = data.get("usage") or {}
+                current.set_attribute("prompt_tokens", usage.get("prompt_tokens"))
+                current.set_attribute("completion_tokens", usage.get("completion_tokens"))
                 if "choices" in data and len(data["choices"]) > 0:
-                    return data["choices"][0]["message"]["content"].strip()
+                    return data["choices"][0]["message"]["content"].strip(), "ok"
+                return None, "empty"
             else:
                 print(f"Error en LM Studio: {response.status_code} - {response.text}")
-                return None
+                return None, "http_error"
                 
         except requests.exceptions.RequestException as e:
             print(f"Error al conectar con LM Studio: {e}")
             self.available = False
-            return None
+            return None, "connection_error"
+        finally:
+            PHASE_SECONDS.observe(time.perf_counter() - start, phase="lm_studio")
     
     def interpret_directive(self, user_input: str) -> Optional[Dict[str, Any]]:
         """
@@ -126,7 +151,8 @@ Responde SOLO con el JSON, sin texto adicional."""
             prompt=user_prompt,
             system_prompt=system_prompt,
             max_tokens=300,
-            temperature=0.3  # Baja temperatura para respuestas más deterministas
+            temperature=0.3,  # Baja temperatura para respuestas más deterministas
+            operation="interpret_directive"
         )
         
         if not response:
@@ -194,6 +220,7 @@ Responde SOLO con el poema, sin explicaciones adicionales."""
             prompt=user_prompt,
             system_prompt=system_prompt,
             max_tokens=max_tokens,
-            temperature=temperature
+            temperature=temperature,
+            operation="generate_poem"
         )
 
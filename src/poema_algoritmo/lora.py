@@ -0,0 +1,188 @@
+"""
+Adaptadores LoRA: entrenamiento eficiente en parámetros y cambio de adaptador en inferencia
+
+En modo LoRA solo se entrenan matrices de rango bajo añadidas a las capas de
+atención/proyección de GPT-2; el resto del modelo queda congelado. Cada
+entrenamiento guarda solo el adaptador (unos MB, `adapter_config.json` +
+`adapter_model.safetensors`) en lugar de una copia completa del modelo, y el
+generador carga el modelo base una vez y cambia de adaptador por petición.
+
+Requiere la librería `peft` (extra opcional: `pip install peft`).
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+from .model_catalog import resolve_model
+from .serving_metrics import ADAPTER_CACHE_TOTAL, QUEUE_DEPTH
+from .tracing import span
+
+# Capas de GPT-2 donde se insertan los adaptadores (atención y proyecciones)
+DEFAULT_LORA_TARGETS = ("c_attn", "c_proj")
+DEFAULT_LORA_R = 8
+DEFAULT_LORA_ALPHA = 16
+DEFAULT_LORA_DROPOUT = 0.05
+
+# Adaptadores cargados a la vez en el generador (los menos usados se descargan)
+MAX_LOADED_ADAPTERS = int(os.getenv("MAX_LOADED_ADAPTERS", "8"))
+
+ADAPTER_CONFIG = "adapter_config.json"
+
+
+def _import_peft():
+    try:
+        import peft
+    except ImportError as e:
+        raise ImportError(
+            "El modo LoRA necesita la librería 'peft' (pip install peft)"
+        ) from e
+    return peft
+
+
+def is_adapter_dir(path: Union[str, Path]) -> bool:
+    """True si el directorio contiene un adaptador (y no un modelo completo)"""
+    path = Path(path)
+    return (path / ADAPTER_CONFIG).exists() and not (path / "config.json").exists()
+
+
+def adapter_base_model(path: Union[str, Path]) -> Optional[str]:
+    """Modelo base con el que se entrenó el adaptador (de adapter_config.json)"""
+    try:
+        with open(Path(path) / ADAPTER_CONFIG, 'r', encoding='utf-8') as f:
+            return json.load(f).get("base_model_name_or_path")
+    except (OSError, ValueError):
+        return None
+
+
+def adapter_matches_base(path: Union[str, Path], base_model_name: str) -> bool:
+    """True si el adaptador se entrenó sobre `base_model_name` (o no lo indica)"""
+    base = adapter_base_model(path)
+    # Un nombre de Hugging Face y su directorio del catálogo son el mismo modelo
+    return not base or (
+        os.path.normpath(resolve_model(base)) == os.path.normpath(resolve_model(base_model_name))
+    )
+
+
+def find_adapters(models_dir: Union[str, Path]) -> Dict[str, str]:
+    """Adaptadores de un directorio de modelos: {nombre: ruta}"""
+    models_dir = Path(models_dir)
+    if not models_dir.is_dir():
+        return {}
+    return {
+        entry.name: str(entry)
+        for entry in sorted(models_dir.iterdir())
+        if entry.is_dir() and is_adapter_dir(entry)
+    }
+
+
+def apply_lora(
+    model,
+    r: int = DEFAULT_LORA_R,
+    alpha: int = DEFAULT_LORA_ALPHA,
+    dropout: float = DEFAULT_LORA_DROPOUT,
+    target_modules: Sequence[str] = DEFAULT_LORA_TARGETS
+):
+    """
+    Envuelve el modelo con adaptadores LoRA: solo sus parámetros quedan entrenables
+
+    Returns:
+        PeftModel (save_pretrained guarda solo el adaptador)
+    """
+    peft = _import_peft()
+    config = peft.LoraConfig(
+        task_type=peft.TaskType.CAUSAL_LM,
+        r=r,
+        lora_alpha=alpha,
+        lora_dropout=dropout,
+        target_modules=list(target_modules),
+        # GPT-2 usa Conv1D (pesos transpuestos respecto a nn.Linear)
+        fan_in_fan_out=True,
+    )
+    model = peft.get_peft_model(model, config)
+    trainable = sum(p.numel() for p in model.parameters() if p.requires_grad)
+    total = sum(p.numel() for p in model.parameters())
+    print(f"  LoRA: {trainable:,} parámetros entrenables de {total:,} ({trainable / total:.2%})")
+    return model
+
+
+class AdapterSwitcher:
+    """
+    Modelo base con varios adaptadores LoRA cargados bajo demanda.
+
+    `use(nombre)` es un context manager que activa el adaptador durante la
+    generación (None = modelo base sin adaptador). El cambio es global al
+    modelo, así que se serializa con un lock. Se mantienen como mucho
+    `max_loaded` adaptadores en memoria (LRU).
+    """
+
+    def __init__(self, base_model, base_model_name: str, max_loaded: int = MAX_LOADED_ADAPTERS):
+        self.base_model = base_model
+        self.base_model_name = base_model_name
+        self.max_loaded = max(1, max_loaded)
+        self.model = base_model
+        self._loaded: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def loaded(self) -> List[str]:
+        return list(self._loaded)
+
+    def _load(self, name: str, path: str):
+        if not adapter_matches_base(path, self.base_model_name):
+            raise ValueError(
+                f"El adaptador '{name}' se entrenó sobre '{adapter_base_model(path)}', "
+                f"no sobre '{self.base_model_name}'"
+            )
+        peft = _import_peft()
+        if not self._loaded:
+            self.model = peft.PeftModel.from_pretrained(self.base_model, path, adapter_name=name)
+            self.model.eval()
+        else:
+            self.model.load_adapter(path, adapter_name=name)
+        self._loaded[name] = path
+
+        # Descargar el menos usado si se supera el máximo
+        while len(self._loaded) > self.max_loaded:
+            evicted, _ = self._loaded.popitem(last=False)
+            self.model.delete_adapter(evicted)
+
+    @contextmanager
+    def use(self, name: Optional[str] = None, path: Optional[str] = None):
+        """
+        Activa un adaptador durante el bloque y devuelve el modelo a usar
+
+        Args:
+            name: Nombre del adaptador (None = modelo base)
+            path: Directorio del adaptador (necesario la primera vez que se usa)
+        """
+        # Las peticiones que esperan al lock son la cola de generación
+        QUEUE_DEPTH.inc()
+        try:
+            with span("model_lock_wait"):
+                self._lock.acquire()
+        finally:
+            QUEUE_DEPTH.dec()
+        try:
+            if name is None:
+                # Sin adaptador: el PeftModel desactiva las capas LoRA temporalmente
+                context = self.model.disable_adapter() if self._loaded else nullcontext()
+                with context:
+                    yield self.model
+                return
+            if name not in self._loaded:
+                if path is None:
+                    raise KeyError(name)
+                ADAPTER_CACHE_TOTAL.inc(result="miss")
+                with span("adapter_load", adapter=name):
+                    self._load(name, path)
+            else:
+                ADAPTER_CACHE_TOTAL.inc(result="hit")
+            self._loaded.move_to_end(name)
+            self.model.set_adapter(name)
+            yield self.model
+        finally:
+            self._lock.release()
@@ -1,33 +1,88 @@
-from fastapi import FastAPI, HTTPException
+"""
+Servidor web de la plataforma de poesía
+
+`create_app` construye la aplicación con la parte de generación (página
+principal y /api/*), la del panel de administración (/admin) o ambas, para que
+cada una se despliegue y dimensione por separado. La de generación no importa
+el panel ni la pila de entrenamiento:
+
+    uvicorn --factory poema_algoritmo.main:create_serving_app --workers 4
+    uvicorn --factory poema_algoritmo.main:create_admin_app --port 8001
+    poema serve --role inference
+
+`uvicorn poema_algoritmo.main:app` sirve la aplicación de APP_ROLE (por defecto
+la completa). torch y transformers se importan al crear el generador (primera
+petición), no al arrancar. Las réplicas de generación recargan el modelo cuando
+el panel lo pide (ver serving_control).
+"""
+from fastapi import APIRouter, FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from typing import Optional
 import os
+import threading
+import time
 
-from .poem_generator import PoemGenerator
-from .admin import router as admin_router
+from .serving_metrics import CONTENT_TYPE, IN_FLIGHT, REGISTRY, REQUEST_SECONDS
+from .tracing import start_trace
 
-app = FastAPI(title="Plataforma de Poesía con Agente Inteligente")
+APP_TITLE = "Plataforma de Poesía con Agente Inteligente"
 
-# Registrar router de administración
-app.include_router(admin_router)
+# Partes que incluye la aplicación según el rol
+APP_ROLES = {
+    "all": {"inference": True, "admin": True},
+    "inference": {"inference": True, "admin": False},
+    "admin": {"inference": False, "admin": True},
+}
+APP_ROLE = os.getenv("APP_ROLE", "all").strip().lower()
 
-# Montar archivos estáticos
-static_dir = os.path.join(os.path.dirname(__file__), "static")
-if os.path.exists(static_dir):
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
+# Endpoints de generación (la parte que escala con las réplicas de inferencia)
+router = APIRouter()
 
 # Inicializar el generador de poemas (lazy loading para evitar cargar modelo al inicio)
 poem_generator = None
+# Modelo que sirve esta réplica (None = TRAINED_MODEL_PATH); lo cambia una recarga
+serving_model_path = None
+_generator_lock = threading.Lock()
 
 def get_poem_generator():
     """Obtiene o crea el generador de poemas (lazy initialization)"""
     global poem_generator
     if poem_generator is None:
-        poem_generator = PoemGenerator()
+        with _generator_lock:
+            if poem_generator is None:
+                from .poem_generator import PoemGenerator
+                poem_generator = PoemGenerator(model_path=serving_model_path)
     return poem_generator
 
+def reload_poem_generator(model_path: Optional[str] = None):
+    """
+    Carga `model_path` en un generador nuevo y lo pone en servicio
+
+    Las peticiones en curso terminan con el generador anterior. Si el generador
+    aún no se ha creado, solo cambia el modelo que cargará la primera petición.
+
+    Raises:
+        RuntimeError: si el modelo no se pudo cargar (se sigue con el anterior)
+    """
+    global poem_generator, serving_model_path
+    with _generator_lock:
+        if poem_generator is None:
+            serving_model_path = model_path
+            return
+    
+    from .poem_generator import PoemGenerator
+    # Se carga fuera del cerrojo: mientras tanto se sigue generando con el anterior
+    generator = PoemGenerator(model_path=model_path)
+    if model_path and not generator.loaded_from(model_path):
+        raise RuntimeError(f"No se pudo cargar el modelo {model_path}")
+    with _generator_lock:
+        poem_generator = generator
+        serving_model_path = model_path
+
 class PoemRequest(BaseModel):
     input_text: str
     max_sentences: Optional[int] = 8  # Número de frases objetivo
@@ -35,8 +90,9 @@ class PoemRequest(BaseModel):
     temperature: Optional[float] = 0.7  # Reducido para mejor coherencia
     use_agent: Optional[bool] = True  # Usar agente para interpretar directrices
     prefer_lm_studio: Optional[bool] = True  # Preferir LM Studio si está disponible
+    adapter: Optional[str] = None  # Adaptador LoRA (None = el por defecto, "" = modelo base)
 
-@app.get("/", response_class=HTMLResponse)
+@router.get("/", response_class=HTMLResponse)
 async def read_root():
     """Servir la página principal"""
     html_path = os.path.join(os.path.dirname(__file__), "static", "index.html")
@@ -50,7 +106,7 @@ async def read_root():
     </html>
     """
 
-@app.post("/api/generate")
+@router.post("/api/generate")
 async def generate_poem(request: PoemRequest):
     """
     Generar un poema basado en el input del usuario.
@@ -62,6 +118,27 @@ async def generate_poem(request: PoemRequest):
     - "soneto romántico sobre el amor, corto y con naturaleza"
     - "verso libre sobre la ciudad, alegre y moderno"
     """
+    start = time.perf_counter()
+    status = "error"
+    with IN_FLIGHT.track(), start_trace(
+        "POST /api/generate", use_agent=request.use_agent, prefer_lm_studio=request.prefer_lm_studio,
+        input_chars=len(request.input_text or "")
+    ) as trace:
+        try:
+            response = await _generate_poem(request)
+            status = "ok"
+            response.headers.update(trace.timing_headers())
+            return response
+        except HTTPException as e:
+            status = "client_error" if e.status_code < 500 else "error"
+            e.headers = {**(e.headers or {}), **trace.timing_headers()}
+            raise
+        finally:
+            trace.root.set_attribute("status", status)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, status=status)
+
+async def _generate_poem(request: PoemRequest):
+    """Cuerpo de /api/generate (la generación corre en el pool de hilos, no en el bucle de eventos)"""
     try:
         if not request.input_text or not request.input_text.strip():
             raise HTTPException(status_code=400, detail="El texto de entrada no puede estar vacío")
@@ -74,13 +151,15 @@ async def generate_poem(request: PoemRequest):
         else:
             calculated_max_length = request.max_length or 200
         
-        generator = get_poem_generator()
-        poem, directive = generator.generate(
+        generator = await run_in_threadpool(get_poem_generator)
+        poem, directive = await run_in_threadpool(
+            generator.generate,
             prompt=request.input_text,
             max_length=calculated_max_length,
             temperature=request.temperature,
             use_agent=request.use_agent,
-            prefer_lm_studio=request.prefer_lm_studio
+            prefer_lm_studio=request.prefer_lm_studio,
+            adapter=request.adapter
         )
         
         response_data = {
@@ -100,15 +179,31 @@ async def generate_poem(request: PoemRequest):
             }
         
         return JSONResponse(response_data)
+    except HTTPException:
+        raise
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Adaptador no encontrado: {request.adapter}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al generar el poema: {str(e)}")
 
-@app.get("/api/health")
+@router.get("/api/adapters")
+async def list_adapters():
+    """Adaptadores LoRA disponibles para el modelo base cargado"""
+    return get_poem_generator().list_adapters()
+
+@router.get("/metrics")
+async def metrics():
+    """Métricas de generación en formato Prometheus"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@router.get("/api/health")
 async def health_check():
     """Endpoint de salud"""
     return {"status": "ok", "message": "Plataforma de poesía funcionando"}
 
-@app.get("/api/lm-studio-status")
+@router.get("/api/lm-studio-status")
 async def lm_studio_status():
     """Verifica el estado de LM Studio"""
     try:
@@ -129,6 +224,141 @@ async def lm_studio_status():
             "message": f"Error al verificar: {str(e)}"
         }
 
-if __name__ == "__main__":
+def create_app(inference: bool = True, admin: bool = True, watch_reloads: bool = True) -> FastAPI:
+    """
+    Construye la aplicación web
+
+    Args:
+        inference: Si True, incluye la generación de poemas
+        admin: Si True, incluye el panel de administración (datasets y entrenamiento)
+        watch_reloads: Si True (y con generación), aplica las recargas que pida el panel;
+                       con varios workers las vigila el proceso principal
+    """
+    if not inference and not admin:
+        raise ValueError("La aplicación necesita la parte de generación, la de administración o ambas")
+    
+    watcher = None
+    if inference and watch_reloads:
+        from .serving_control import ReloadWatcher
+        watcher = ReloadWatcher(reload_poem_generator)
+    
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if inference:
+            # Con varios workers, /metrics suma los de todos
+            REGISTRY.enable_multiprocess()
+        if watcher is not None:
+            watcher.start()
+        try:
+            yield
+        finally:
+            if watcher is not None:
+                watcher.stop()
+    
+    app = FastAPI(title=APP_TITLE, lifespan=lifespan)
+    app.state.reload_watcher = watcher
+    
+    if inference:
+        app.include_router(router)
+    else:
+        @app.get("/api/health")
+        async def admin_health_check():
+            """Endpoint de salud"""
+            return {"status": "ok", "message": "Panel de administración funcionando"}
+    
+    if admin:
+        # El panel arrastra la cola de entrenamientos y el procesado de EPUBs
+        from .admin import router as admin_router
+        app.include_router(admin_router)
+    
+    # Montar archivos estáticos
+    static_dir = os.path.join(os.path.dirname(__file__), "static")
+    if os.path.exists(static_dir):
+        app.mount("/static", StaticFiles(directory=static_dir), name="static")
+    return app
+
+def create_app_for_role(role: str) -> FastAPI:
+    """Aplicación de un rol: "all", "inference" o "admin" """
+    if role not in APP_ROLES:
+        raise ValueError(f"Rol desconocido: {role} (opciones: {', '.join(APP_ROLES)})")
+    return create_app(**APP_ROLES[role])
+
+def create_serving_app() -> FastAPI:
+    """Aplicación solo de generación (para `uvicorn --factory`)"""
+    return create_app_for_role("inference")
+
+def create_admin_app() -> FastAPI:
+    """Aplicación solo de administración (para `uvicorn --factory`)"""
+    return create_app_for_role("admin")
+
+_app = None
+
+def __getattr__(name):
+    # `app` se construye al pedirlo (uvicorn main:app), no al importar el módulo:
+    # la CLI y create_serving_app no cargan el panel
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app_for_role(APP_ROLE)
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def main():
+    """
+    CLI `poema`:
+        poema [serve] [--host H] [--port P] [--role R] [--workers N]   servidor web (por defecto)
+        poema models pull|list|scan|remove               catálogo local de modelos
+    """
+    import argparse
+    import sys
+
+    from .model_catalog import add_models_parser, run_models_command
+
+    parser = argparse.ArgumentParser(prog="poema", description="Plataforma de poesía")
+    subparsers = parser.add_subparsers(dest="command")
+    serve = subparsers.add_parser("serve", help="Arrancar el servidor web (por defecto)")
+    serve.add_argument("--host", default="0.0.0.0", help="Dirección (default: 0.0.0.0)")
+    serve.add_argument("--port", type=int, default=8000, help="Puerto (default: 8000)")
+    serve.add_argument("--role", choices=list(APP_ROLES), default=APP_ROLE,
+                       help="Partes a servir: all, inference (solo generación) o admin (default: APP_ROLE o all)")
+    serve.add_argument("--workers", type=int, default=None,
+                       help="Workers de generación que comparten el modelo (solo --role inference; "
+                            "default: SERVING_WORKERS o 1)")
+    serve.add_argument("--no-preload", action="store_true",
+                       help="Con varios workers, que cada uno cargue su propia copia del modelo")
+    serve.add_argument("--share-memory", action="store_true",
+                       help="Con varios workers, mover los pesos a memoria compartida")
+    add_models_parser(subparsers)
+    # `poema` sin subcomando equivale a `poema serve`
+    parser.set_defaults(host="0.0.0.0", port=8000, role=APP_ROLE, workers=None,
+                        no_preload=False, share_memory=False)
+    args = parser.parse_args()
+
+    if args.command == "models":
+        sys.exit(run_models_command(args))
+
+    from .serving_workers import SERVING_WORKERS, PreforkServer
+
+    role = args.role
+    workers = args.workers or SERVING_WORKERS
+    if workers > 1:
+        if role != "inference":
+            # El panel (cola de entrenamientos) debe ser un único proceso
+            parser.error("--workers > 1 solo con --role inference (el panel se sirve aparte)")
+        sys.exit(PreforkServer(
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            preload=not args.no_preload,
+            share_memory=args.share_memory
+        ).run())
+
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(
+        create_app_for_role(role),
+        host=args.host,
+        port=args.port
+    )
+
+if __name__ == "__main__":
+    main()
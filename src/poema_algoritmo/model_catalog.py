@@ -0,0 +1,274 @@
+"""
+Catálogo local de modelos
+
+Un manifiesto JSON (`models/catalog.json`) asocia cada nombre de modelo (de
+Hugging Face, como "DeepESP/gpt2-spanish", o de un modelo entrenado, como
+"poetry_model") con su directorio local. Resolver un nombre es una consulta a un
+diccionario más un `stat`: ni se cargan tokenizers para ver si un modelo existe
+ni se pregunta a la red. El manifiesto se relee solo si cambió en disco.
+
+Los modelos base se descargan una vez con la CLI:
+
+    poema models pull                       # modelos base por defecto
+    poema models pull DeepESP/gpt2-spanish  # uno concreto
+    poema models list
+    poema models scan                       # registra los modelos de models/
+
+Los entrenamientos registran su modelo al terminar. En modo sin red
+(USE_LOCAL_MODELS_ONLY, HF_HUB_OFFLINE o TRANSFORMERS_OFFLINE) solo se usan el
+catálogo y la caché de huggingface_hub.
+
+Configuración:
+    MODEL_CATALOG: ruta del manifiesto (default: models/catalog.json)
+    MODEL_HUB_DIR: directorio de los modelos descargados (default: models/hub)
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from .dataset_store import atomic_write_text
+
+CATALOG_PATH = Path(os.getenv("MODEL_CATALOG", "models/catalog.json"))
+HUB_DIR = Path(os.getenv("MODEL_HUB_DIR", "models/hub"))
+
+# Modelos base, en orden de preferencia (español primero, GPT-2 inglés como último recurso)
+BASE_MODEL_CANDIDATES = ("DeepESP/gpt2-spanish", "gpt2")
+
+# Archivos que se descargan de cada modelo (sin pesos de TensorFlow/Flax/ONNX)
+PULL_PATTERNS = ["*.json", "*.txt", "*.model", "*.safetensors", "pytorch_model*.bin"]
+
+
+def offline_mode() -> bool:
+    """True si no se debe usar la red para buscar modelos"""
+    return any(
+        os.getenv(name, "").lower() in ("1", "true")
+        for name in ("USE_LOCAL_MODELS_ONLY", "HF_HUB_OFFLINE", "TRANSFORMERS_OFFLINE")
+    )
+
+
+def cached_snapshot(repo_id: str) -> Optional[str]:
+    """Directorio del modelo en la caché de huggingface_hub, si está (sin red)"""
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return None
+    config_path = try_to_load_from_cache(repo_id, "config.json")
+    return os.path.dirname(config_path) if isinstance(config_path, str) else None
+
+
+class ModelCatalog:
+    """Manifiesto nombre -> directorio local de los modelos disponibles"""
+
+    def __init__(self, path: Union[str, Path] = CATALOG_PATH, hub_dir: Union[str, Path] = HUB_DIR):
+        self.path = Path(path)
+        self.hub_dir = Path(hub_dir)
+        self._entries: Dict[str, Dict] = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Relee el manifiesto si cambió en disco (otro proceso pudo registrar modelos)"""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            self._entries, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f).get("models", {})
+        except (OSError, ValueError) as e:
+            print(f"⚠ No se pudo leer el catálogo de modelos {self.path}: {e}")
+            self._entries = {}
+        self._mtime = mtime
+
+    def _save(self):
+        content = json.dumps({"version": 1, "models": self._entries}, ensure_ascii=False, indent=2)
+        atomic_write_text(self.path, content)
+        self._mtime = self.path.stat().st_mtime_ns
+
+    def entries(self) -> Dict[str, Dict]:
+        """Copia de todas las entradas del catálogo"""
+        with self._lock:
+            self._refresh()
+            return {name: dict(entry) for name, entry in self._entries.items()}
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Entrada de un modelo (None si no está registrado)"""
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(name)
+            return dict(entry) if entry else None
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Directorio local de un modelo registrado (None si no está o ya no existe)"""
+        entry = self.get(name)
+        if entry and os.path.isdir(entry["path"]):
+            return entry["path"]
+        return None
+
+    def register(self, name: str, path: Union[str, Path], kind: str, **info):
+        """
+        Añade o actualiza un modelo
+
+        Args:
+            name: Nombre con el que se resuelve (repo de Hugging Face o nombre del modelo)
+            path: Directorio local del modelo
+            kind: "base", "full", "lora" o "distilled"
+            info: Datos adicionales (modelo base, revisión...)
+        """
+        with self._lock:
+            self._refresh()
+            self._entries[name] = {
+                "path": str(path),
+                "kind": kind,
+                **{key: value for key, value in info.items() if value is not None},
+                "registered_at": datetime.now().isoformat(),
+            }
+            self._save()
+
+    def remove(self, name: str) -> bool:
+        """Quita un modelo del catálogo (no borra sus archivos)"""
+        with self._lock:
+            self._refresh()
+            if self._entries.pop(name, None) is None:
+                return False
+            self._save()
+            return True
+
+    def pull(self, repo_id: str, revision: Optional[str] = None) -> str:
+        """
+        Descarga un modelo de Hugging Face a `hub_dir` y lo registra
+
+        Returns:
+            Directorio local del modelo
+        """
+        from huggingface_hub import snapshot_download
+
+        local_dir = self.hub_dir / repo_id.replace("/", "--")
+        snapshot_download(
+            repo_id,
+            revision=revision,
+            local_dir=str(local_dir),
+            allow_patterns=PULL_PATTERNS,
+        )
+        self.register(repo_id, local_dir, kind="base", revision=revision)
+        return str(local_dir)
+
+    def scan(self, models_dir: Union[str, Path] = "models") -> List[str]:
+        """Registra los modelos entrenados (completos o adaptadores) de un directorio"""
+        from .lora import adapter_base_model, is_adapter_dir
+
+        models_dir = Path(models_dir)
+        if not models_dir.is_dir():
+            return []
+        registered = []
+        for entry in sorted(models_dir.iterdir()):
+            if is_adapter_dir(entry):
+                self.register(entry.name, entry, kind="lora", base_model=adapter_base_model(entry))
+            elif (entry / "config.json").exists():
+                kind = "distilled" if (entry / "distillation.json").exists() else "full"
+                self.register(entry.name, entry, kind=kind)
+            else:
+                continue
+            registered.append(entry.name)
+        return registered
+
+
+_catalog: Optional[ModelCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> ModelCatalog:
+    """Catálogo compartido del proceso"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ModelCatalog()
+        return _catalog
+
+
+def resolve_model(name: str) -> str:
+    """Directorio local de `name` si está en el catálogo; si no, `name` tal cual"""
+    return get_catalog().resolve(name) or name
+
+
+def find_base_model(candidates: Sequence[str] = BASE_MODEL_CANDIDATES) -> Optional[Tuple[str, str]]:
+    """
+    Primer modelo base disponible sin red: (nombre, directorio local)
+
+    Busca en el catálogo y, si no está, en la caché de huggingface_hub.
+    """
+    catalog = get_catalog()
+    for name in candidates:
+        path = catalog.resolve(name)
+        if path:
+            return name, path
+    for name in candidates:
+        path = cached_snapshot(name)
+        if path:
+            return name, path
+    return None
+
+
+def add_models_parser(subparsers):
+    """Añade el subcomando `models` a la CLI `poema`"""
+    parser = subparsers.add_parser("models", help="Gestionar el catálogo local de modelos")
+    commands = parser.add_subparsers(dest="models_command", required=True)
+
+    pull = commands.add_parser("pull", help="Descargar modelos base y registrarlos")
+    pull.add_argument("names", nargs="*", default=list(BASE_MODEL_CANDIDATES),
+                      help=f"Modelos de Hugging Face (default: {' '.join(BASE_MODEL_CANDIDATES)})")
+    pull.add_argument("--revision", default=None, help="Rama, etiqueta o commit a descargar")
+
+    commands.add_parser("list", help="Mostrar los modelos del catálogo")
+
+    scan = commands.add_parser("scan", help="Registrar los modelos entrenados de un directorio")
+    scan.add_argument("models_dir", nargs="?", default="models", help="Directorio de modelos (default: models)")
+
+    remove = commands.add_parser("remove", help="Quitar un modelo del catálogo (no borra archivos)")
+    remove.add_argument("name", help="Nombre del modelo")
+
+
+def run_models_command(args) -> int:
+    """Ejecuta `poema models ...`; devuelve el código de salida"""
+    catalog = get_catalog()
+
+    if args.models_command == "pull":
+        failed = 0
+        for name in args.names:
+            print(f"Descargando {name}...")
+            try:
+                path = catalog.pull(name, revision=args.revision)
+                print(f"✓ {name} -> {path}")
+            except Exception as e:
+                print(f"✗ No se pudo descargar {name}: {e}")
+                failed += 1
+        return 1 if failed else 0
+
+    if args.models_command == "list":
+        entries = catalog.entries()
+        if not entries:
+            print("El catálogo está vacío (usa `poema models pull` o `poema models scan`)")
+        for name, entry in sorted(entries.items()):
+            status = "" if os.path.isdir(entry["path"]) else "  (no encontrado)"
+            print(f"{name:<35} {entry['kind']:<10} {entry['path']}{status}")
+        return 0
+
+    if args.models_command == "scan":
+        registered = catalog.scan(args.models_dir)
+        print(f"✓ {len(registered)} modelos registrados: {', '.join(registered) or '-'}")
+        return 0
+
+    if args.models_command == "remove":
+        if not catalog.remove(args.name):
+            print(f"✗ {args.name} no está en el catálogo")
+            return 1
+        print(f"✓ {args.name} quitado del catálogo")
+        return 0
+
+    return 1
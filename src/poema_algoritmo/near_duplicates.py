@@ -0,0 +1,218 @@
+"""
+Detección de poemas casi duplicados con MinHash + LSH
+
+Cada poema se normaliza (minúsculas, sin puntuación) y se reduce a un
+conjunto de shingles de palabras. Su firma MinHash estima la similitud de
+Jaccard entre poemas, y el índice LSH (bandas de la firma) solo compara los
+pares que comparten alguna banda, así que el coste es prácticamente lineal
+en el número de poemas en lugar de cuadrático.
+"""
+import hashlib
+import re
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Número de funciones hash de la firma y bandas del índice (filas por banda = NUM_PERM // BANDS)
+NUM_PERM = 128
+BANDS = 16
+# Similitud de Jaccard estimada a partir de la cual dos poemas son "el mismo"
+DEFAULT_THRESHOLD = 0.8
+# Palabras por shingle
+SHINGLE_SIZE = 3
+
+_PUNCTUATION_PATTERN = re.compile(r'[^\w\s]+')
+
+
+def normalize_poem(text: str) -> List[str]:
+    """Palabras del poema en minúsculas y sin puntuación"""
+    return _PUNCTUATION_PATTERN.sub(' ', text.lower()).split()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Conjunto de n-gramas de palabras (como bytes) del poema normalizado"""
+    words = normalize_poem(text)
+    if len(words) <= size:
+        return {' '.join(words).encode('utf-8')} if words else set()
+    return {' '.join(words[i:i + size]).encode('utf-8') for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """
+    Calcula firmas MinHash de `num_perm` posiciones con una sola permutación
+    (one-permutation hashing): cada shingle se hashea una vez con BLAKE2b, el
+    hash elige la posición (bin) y se guarda el mínimo de cada una. Las
+    posiciones vacías (poemas cortos) se rellenan con la siguiente ocupada
+    (densificación por rotación). Es determinista entre procesos, a diferencia
+    de hash(), y el coste es lineal en el número de shingles.
+    """
+
+    # Desplazamiento por posición al rellenar bins vacíos (mayor que cualquier valor de un bin)
+    _ROTATION_OFFSET = 1 << 64
+
+    def __init__(self, num_perm: int = NUM_PERM, shingle_size: int = SHINGLE_SIZE):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        """Firma MinHash del poema (tupla vacía si no tiene palabras)"""
+        num_perm = self.num_perm
+        empty = self._ROTATION_OFFSET
+        mins = [empty] * num_perm
+        for shingle in shingles(text, self.shingle_size):
+            value = int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), 'little')
+            position, value = value % num_perm, value // num_perm
+            if value < mins[position]:
+                mins[position] = value
+        filled = [i for i, value in enumerate(mins) if value != empty]
+        if not filled:
+            return ()
+        if len(filled) < num_perm:
+            # Cada bin vacío toma el valor del siguiente ocupado (circular) más un desplazamiento por distancia
+            signature = []
+            next_filled = 0
+            for i in range(num_perm):
+                if mins[i] != empty:
+                    signature.append(mins[i])
+                    continue
+                while next_filled < len(filled) and filled[next_filled] < i:
+                    next_filled += 1
+                source = filled[next_filled % len(filled)]
+                signature.append(mins[source] + ((source - i) % num_perm) * empty)
+            return tuple(signature)
+        return tuple(mins)
+
+
+def estimate_jaccard(signature_a: Tuple[int, ...], signature_b: Tuple[int, ...]) -> float:
+    """Similitud de Jaccard estimada: fracción de posiciones iguales de las firmas"""
+    if not signature_a or not signature_b:
+        return 0.0
+    equal = sum(1 for a, b in zip(signature_a, signature_b) if a == b)
+    return equal / len(signature_a)
+
+
+class NearDuplicateIndex:
+    """
+    Índice LSH sobre firmas MinHash.
+
+    Los poemas se añaden con una clave arbitraria; `clusters()` agrupa (con
+    union-find) los que superan el umbral de similitud estimada.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEFAULT_THRESHOLD,
+        num_perm: int = NUM_PERM,
+        bands: int = BANDS
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self.keys: List[Hashable] = []
+        self.signatures: List[Tuple[int, ...]] = []
+        self._buckets: List[Dict[Tuple[int, ...], List[int]]] = [defaultdict(list) for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: Hashable, text: str) -> int:
+        """Añade un poema y devuelve su posición en el índice"""
+        signature = self.hasher.signature(text)
+        index = len(self.keys)
+        self.keys.append(key)
+        self.signatures.append(signature)
+        if signature:
+            for band in range(self.bands):
+                band_key = signature[band * self.rows:(band + 1) * self.rows]
+                self._buckets[band][band_key].append(index)
+        return index
+
+    def candidate_pairs(self) -> Iterable[Tuple[int, int]]:
+        """Pares (i, j), i < j, que comparten al menos una banda (sin repetir)"""
+        seen = set()
+        for buckets in self._buckets:
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                for a in range(len(members)):
+                    for b in range(a + 1, len(members)):
+                        pair = (members[a], members[b])
+                        if pair not in seen:
+                            seen.add(pair)
+                            yield pair
+
+    def similar_pairs(self) -> List[Tuple[int, int, float]]:
+        """Pares candidatos cuya similitud estimada supera el umbral"""
+        pairs = []
+        for i, j in self.candidate_pairs():
+            similarity = estimate_jaccard(self.signatures[i], self.signatures[j])
+            if similarity >= self.threshold:
+                pairs.append((i, j, similarity))
+        return pairs
+
+    def clusters(self) -> List[Dict]:
+        """
+        Grupos de casi duplicados (solo los de 2 o más poemas), en orden de inserción
+
+        Returns:
+            Lista de {"members": [posiciones], "keys": [claves], "similarity": mínima de los pares}
+        """
+        parent = list(range(len(self.keys)))
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        min_similarity: Dict[int, float] = {}
+        pairs = self.similar_pairs()
+        for i, j, _ in pairs:
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+        for i, _, similarity in pairs:
+            root = find(i)
+            min_similarity[root] = min(min_similarity.get(root, 1.0), similarity)
+
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for index in range(len(self.keys)):
+            groups[find(index)].append(index)
+
+        return [
+            {
+                "members": members,
+                "keys": [self.keys[m] for m in members],
+                "similarity": round(min_similarity.get(root, 1.0), 4)
+            }
+            for root, members in sorted(groups.items())
+            if len(members) > 1
+        ]
+
+
+def deduplicate_poems(poems: List[str], threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    Elimina casi duplicados conservando, de cada grupo, la primera aparición
+
+    Args:
+        poems: Lista de poemas
+        threshold: Similitud de Jaccard estimada a partir de la cual se consideran iguales
+    """
+    index = NearDuplicateIndex(threshold=threshold)
+    for i, poem in enumerate(poems):
+        index.add(i, poem)
+    duplicates = set()
+    for cluster in index.clusters():
+        duplicates.update(cluster["members"][1:])
+    return [poem for i, poem in enumerate(poems) if i not in duplicates]
+
+
+def pick_canonical(texts: List[str]) -> int:
+    """Posición del poema que se conserva al fusionar un grupo: el más largo (el primero si empatan)"""
+    best: Optional[int] = None
+    for i, text in enumerate(texts):
+        if best is None or len(text) > len(texts[best]):
+            best = i
+    return best or 0
@@ -1,15 +1,46 @@
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
-import torch
 import os
+import time
 from .poetry_agent import PoetryAgent
 from .lm_studio_client import LMStudioClient
+from .lora import AdapterSwitcher, adapter_base_model, adapter_matches_base, find_adapters, is_adapter_dir
+from .model_catalog import BASE_MODEL_CANDIDATES, find_base_model, offline_mode, resolve_model
+from .serving_metrics import (BACKEND_TOTAL, CONCEPT_MISSING_TOTAL, CONCEPT_RETRIES_TOTAL, FALLBACK_TOTAL,
+                              PHASE_SECONDS)
+from .tracing import set_trace_attribute, span
+
+
+def _record_backend(backend: str, fallback_reason: str = None):
+    """Cuenta el backend que generó el poema (y el motivo si es un respaldo) en métricas y traza"""
+    BACKEND_TOTAL.inc(backend=backend)
+    set_trace_attribute("backend", backend)
+    if fallback_reason:
+        _record_fallback(fallback_reason)
+
+
+def _record_fallback(reason: str):
+    FALLBACK_TOTAL.inc(reason=reason)
+    set_trace_attribute("fallback_reason", reason)
+
 
 class PoemGenerator:
     """Generador de poemas usando modelos de lenguaje"""
     
-    def __init__(self, use_lm_studio: bool = True):
+    def __init__(self, use_lm_studio: bool = True, model_path: str = None):
+        """
+        Args:
+            use_lm_studio: Si True, usa LM Studio cuando esté disponible
+            model_path: Modelo entrenado a cargar (por defecto, TRAINED_MODEL_PATH)
+        """
+        self.model_path = model_path
         self.model = None
         self.tokenizer = None
+        # Adaptadores LoRA: el modelo base se carga una vez y se cambia de adaptador por petición
+        self.adapters_dir = os.getenv("ADAPTERS_DIR", "models")
+        self.switcher = None
+        self.adapters = None
+        self.default_adapter = None
+        # torch y transformers se importan al crear el generador, no al importar el módulo
+        import torch
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.agent = PoetryAgent(use_lm_studio=use_lm_studio)  # Agente para interpretar directrices
         
@@ -29,14 +60,33 @@ class PoemGenerator:
     
     def _load_model(self):
         """Cargar el modelo de generación de texto"""
-        # Verificar si hay una variable de entorno para usar solo modelos locales
-        use_local_only = os.getenv("USE_LOCAL_MODELS_ONLY", "false").lower() == "true"
+        from transformers import GPT2LMHeadModel, GPT2Tokenizer
         
-        # Verificar si hay un modelo entrenado localmente
-        trained_model_path = os.getenv("TRAINED_MODEL_PATH", "models/poetry_model")
+        # Modo sin red (USE_LOCAL_MODELS_ONLY, HF_HUB_OFFLINE o TRANSFORMERS_OFFLINE)
+        use_local_only = offline_mode()
+        
+        # Verificar si hay un modelo entrenado localmente (ruta o nombre del catálogo)
+        trained_model_path = resolve_model(self.model_path or os.getenv("TRAINED_MODEL_PATH", "models/poetry_model"))
         
         try:
-            # PRIMERO: Intentar cargar modelo entrenado localmente (si existe)
+            # PRIMERO: Si el modelo entrenado es un adaptador LoRA, cargar su base y activarlo por defecto
+            if is_adapter_dir(trained_model_path):
+                try:
+                    base_model = resolve_model(adapter_base_model(trained_model_path))
+                    print(f"Intentando cargar adaptador LoRA {trained_model_path} sobre {base_model}")
+                    self.tokenizer = GPT2Tokenizer.from_pretrained(trained_model_path)
+                    self.model = GPT2LMHeadModel.from_pretrained(base_model, local_files_only=use_local_only)
+                    self._init_adapters(base_model)
+                    self.default_adapter = os.path.basename(os.path.normpath(trained_model_path))
+                    # Puede estar fuera de ADAPTERS_DIR
+                    self.adapters.setdefault(self.default_adapter, trained_model_path)
+                    print(f"✓ Adaptador '{self.default_adapter}' cargado sobre: {base_model}")
+                    return
+                except Exception as e:
+                    print(f"  Error al cargar el adaptador: {e}")
+                    print("  Intentando con modelos pre-entrenados...")
+            
+            # Si no: Intentar cargar modelo entrenado localmente (si existe)
             if os.path.exists(trained_model_path) and os.path.exists(
                 os.path.join(trained_model_path, "config.json")
             ):
@@ -50,57 +100,37 @@ class PoemGenerator:
                     if self.tokenizer.pad_token is None:
                         self.tokenizer.pad_token = self.tokenizer.eos_token
                     
+                    self._init_adapters(trained_model_path)
                     print(f"✓ Modelo entrenado cargado desde: {trained_model_path}")
                     return
                 except Exception as e:
                     print(f"  Error al cargar modelo entrenado: {e}")
                     print("  Intentando con modelos pre-entrenados...")
             
-            # SEGUNDO: Intentar cargar modelos pre-entrenados
-            cache_dir = os.path.expanduser("~/.cache/huggingface/transformers")
-            
-            # Lista de modelos a intentar (en orden de preferencia)
-            models_to_try = [
-                "datasets/gpt2-spanish",
-                "DeepESP/gpt2-spanish",
-                "gpt2"
-            ]
-            
-            for model_name in models_to_try:
+            # SEGUNDO: Modelos pre-entrenados ya descargados (catálogo o caché), sin red
+            found = find_base_model()
+            if found:
+                model_name, local_path = found
                 try:
-                    # Si solo queremos modelos locales, verificar que existan en caché
-                    if use_local_only:
-                        # Verificar si el modelo está en caché
-                        model_path = os.path.join(cache_dir, model_name.replace("/", "--"))
-                        if not os.path.exists(model_path):
-                            print(f"Modelo {model_name} no encontrado en caché local, saltando...")
-                            continue
-                    
-                    # Intentar cargar el modelo (desde caché si existe, o descargar si no)
-                    self.tokenizer = GPT2Tokenizer.from_pretrained(
-                        model_name,
-                        local_files_only=use_local_only
-                    )
-                    self.model = GPT2LMHeadModel.from_pretrained(
-                        model_name,
-                        local_files_only=use_local_only
-                    )
-                    self.model.to(self.device)
-                    self.model.eval()
-                    
-                    # Configurar tokenizer
-                    if self.tokenizer.pad_token is None:
-                        self.tokenizer.pad_token = self.tokenizer.eos_token
-                    
-                    print(f"✓ Modelo cargado: {model_name}")
-                    if use_local_only:
-                        print("  (modo solo-local activado)")
+                    self.tokenizer = GPT2Tokenizer.from_pretrained(local_path, local_files_only=True)
+                    self.model = GPT2LMHeadModel.from_pretrained(local_path, local_files_only=True)
+                    self._init_adapters(local_path)
+                    print(f"✓ Modelo cargado: {model_name} ({local_path})")
                     return
-                    
                 except Exception as e:
-                    if use_local_only:
-                        print(f"  Modelo {model_name} no disponible localmente")
-                    continue
+                    print(f"  Error al cargar {model_name} desde {local_path}: {e}")
+            
+            # TERCERO: Descargar (solo con red; `poema models pull` evita esta espera al arrancar)
+            if not use_local_only:
+                for model_name in BASE_MODEL_CANDIDATES:
+                    try:
+                        self.tokenizer = GPT2Tokenizer.from_pretrained(model_name)
+                        self.model = GPT2LMHeadModel.from_pretrained(model_name)
+                        self._init_adapters(model_name)
+                        print(f"✓ Modelo cargado: {model_name}")
+                        return
+                    except Exception:
+                        continue
             
             # Si llegamos aquí, no se pudo cargar ningún modelo
             if use_local_only:
@@ -114,7 +144,41 @@ class PoemGenerator:
             print("Usando generación básica como fallback")
             self.model = None
     
-    def generate(self, prompt: str, max_length: int = 200, temperature: float = 0.7, use_agent: bool = True, prefer_lm_studio: bool = True) -> tuple:
+    def _init_adapters(self, base_model_name: str):
+        """Prepara el cambio de adaptadores sobre el modelo base recién cargado"""
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model.to(self.device)
+        self.model.eval()
+        self.switcher = AdapterSwitcher(self.model, base_model_name)
+        self.adapters = {}
+        self._refresh_adapters()
+    
+    def _refresh_adapters(self):
+        """Busca en ADAPTERS_DIR los adaptadores entrenados sobre el modelo base cargado"""
+        for name, path in find_adapters(self.adapters_dir).items():
+            if adapter_matches_base(path, self.switcher.base_model_name):
+                self.adapters.setdefault(name, path)
+    
+    def loaded_from(self, model_path: str) -> bool:
+        """True si el modelo cargado es `model_path` (y no uno de los modelos de respaldo)"""
+        if self.model is None:
+            return False
+        model_path = resolve_model(model_path)
+        if self.default_adapter is not None:
+            return os.path.normpath(self.adapters[self.default_adapter]) == os.path.normpath(model_path)
+        return os.path.normpath(self.switcher.base_model_name) == os.path.normpath(model_path)
+    
+    def list_adapters(self) -> dict:
+        """Adaptadores disponibles para el modelo base cargado"""
+        return {
+            "base_model": self.switcher.base_model_name if self.model is not None else None,
+            "default": self.default_adapter,
+            "adapters": sorted(self.adapters or {}),
+            "loaded": self.switcher.loaded if self.model is not None else [],
+        }
+    
+    def generate(self, prompt: str, max_length: int = 200, temperature: float = 0.7, use_agent: bool = True, prefer_lm_studio: bool = True, adapter: str = None) -> tuple:
         """
         Generar un poema basado en el prompt
         
@@ -123,19 +187,37 @@ class PoemGenerator:
             max_length: Longitud máxima del poema
             temperature: Temperatura para la generación
             use_agent: Si True, usa el agente para interpretar directrices
+            adapter: Adaptador LoRA a usar (None = el por defecto; "" = modelo base)
             
         Returns:
             Tupla (poema, directiva) donde directiva contiene la interpretación del agente
+            
+        Raises:
+            KeyError: si el adaptador pedido no existe
         """
         
         if self.model is None:
             # Fallback: generación básica con plantilla
+            _record_backend("template", fallback_reason="no_model")
             return self._generate_fallback(prompt), None
         
+        adapter = self.default_adapter if adapter is None else (adapter or None)
+        if adapter is not None and adapter not in self.adapters:
+            # Puede haberse entrenado después de arrancar el servidor
+            self._refresh_adapters()
+            if adapter not in self.adapters:
+                raise KeyError(adapter)
+        set_trace_attribute("adapter", adapter)
+        
+        return self._generate(adapter, prompt, max_length, temperature, use_agent, prefer_lm_studio)
+    
+    def _generate(self, adapter: str, prompt: str, max_length: int, temperature: float, use_agent: bool, prefer_lm_studio: bool) -> tuple:
+        """Generación con LM Studio o con el modelo local (el base o con el adaptador indicado)"""
         try:
             # Usar el agente para interpretar las directrices
             if use_agent:
-                structured_prompt, directive = self.agent.generate_prompt(prompt)
+                with PHASE_SECONDS.time(phase="directive_parse"):
+                    structured_prompt, directive = self.agent.generate_prompt(prompt)
                 concept = directive.main_concept.lower()
             else:
                 # Modo simple: usar el prompt directamente
@@ -162,6 +244,7 @@ class PoemGenerator:
                     )
                     if lm_poem:
                         print("✓ Poema generado con LM Studio")
+                        _record_backend("lm_studio")
                         return lm_poem, directive
                 else:
                     # Generación simple con LM Studio
@@ -169,200 +252,27 @@ class PoemGenerator:
                         prompt=structured_prompt,
                         max_tokens=max_length,
                         temperature=temperature,
-                        system_prompt="Eres un poeta experto. Escribe poemas en español de alta calidad."
+                        system_prompt="Eres un poeta experto. Escribe poemas en español de alta calidad.",
+                        operation="chat"
                     )
                     if lm_poem:
                         print("✓ Poema generado con LM Studio")
+                        _record_backend("lm_studio")
                         return lm_poem, directive
             
-            # Si LM Studio no está disponible o no se prefiere, usar modelo local
-            prompt_text = structured_prompt
-            
-            # Tokenizar
-            inputs = self.tokenizer.encode(prompt_text, return_tensors="pt")
-            inputs = inputs.to(self.device)
+                _record_fallback("lm_studio_failed")
             
-            # Generar con parámetros mejorados para mayor coherencia y seguimiento del prompt
-            # Calcular max_new_tokens (tokens nuevos, sin contar el prompt)
-            prompt_length = inputs.shape[1]
-            max_new_tokens = max_length - prompt_length if max_length > prompt_length else max_length
-            
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    inputs,
-                    max_new_tokens=max_new_tokens,  # Usar max_new_tokens en lugar de max_length
-                    temperature=temperature,
-                    do_sample=True,
-                    top_p=0.85,  # Reducido para seguir más el prompt
-                    top_k=35,  # Reducido para seguir más el prompt
-                    repetition_penalty=1.3,  # Aumentado de 1.2 para evitar repeticiones
-                    no_repeat_ngram_size=3,  # Evitar repetición de trigramas
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    eos_token_id=self.tokenizer.eos_token_id,  # Detener en token de fin
-                    num_return_sequences=1,
-                    early_stopping=True
+            # Si LM Studio no está disponible o no se prefiere, usar modelo local.
+            # Solo esta parte usa el modelo compartido: el lock no cubre al agente ni a LM Studio
+            with self.switcher.use(adapter, self.adapters.get(adapter)) as model:
+                poem, retry_count, postprocess_seconds = self._generate_local(
+                    model, structured_prompt, prompt, concept, max_length, temperature
                 )
             
-            # Decodificar
-            generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
-            # Extraer solo el poema generado (sin el prompt)
-            # Limpiar el prompt de manera más agresiva
-            poem = generated_text
-            
-            # Lista de variantes del prompt a eliminar (ordenadas de más específicas a menos específicas)
-            prompt_variants = [
-                prompt_text,  # El prompt exacto usado
-                f"Tema: {concept}\n\nPoema sobre {concept}:\n\n{concept.capitalize()} es",
-                f"Tema: {concept}\n\nPoema sobre {concept}:\n\n",
-                f"Poema sobre {concept}:\n\n",
-                f"Escribe un poema sobre {concept}:\n\n",
-                f"Poema sobre {prompt}:\n\n",
-                f"Escribe un poema sobre {prompt}:\n\n",
-            ]
-            
-            # Eliminar todas las variantes del prompt
-            for variant in prompt_variants:
-                if variant in poem:
-                    poem = poem.replace(variant, "").strip()
-            
-            # Limpiar caracteres residuales al inicio (comillas, comas, espacios)
-            import re
-            # Eliminar comillas al inicio
-            poem = re.sub(r'^["\'«»]+', '', poem)
-            # Eliminar comas seguidas de espacios al inicio
-            poem = re.sub(r'^,\s*', '', poem)
-            # Eliminar puntos y comas al inicio
-            poem = re.sub(r'^[.;]\s*', '', poem)
-            # Eliminar espacios múltiples al inicio
-            poem = poem.lstrip()
-            
-            # Limpiar repeticiones del prompt al inicio (patrones como "En X, X,")
-            poem_lines = poem.split('\n')
-            cleaned_lines = []
-            for i, line in enumerate(poem_lines):
-                line_lower = line.lower().strip()
-                # Detectar líneas que son repeticiones del prompt
-                if i < 2:  # Solo verificar las primeras 2 líneas
-                    # Patrones comunes de repetición
-                    if any(pattern in line_lower for pattern in [
-                        f"en {concept.lower()}, {concept.lower()},",
-                        f"{concept.lower()}, {concept.lower()},",
-                        f"poema sobre {concept.lower()}",
-                        f"tema: {concept.lower()}",
-                    ]) and len(line.split(',')) > 2:  # Si tiene muchas comas, probablemente es repetición
-                        continue  # Saltar esta línea
-                cleaned_lines.append(line)
-            
-            poem = '\n'.join(cleaned_lines).strip()
-            
-            # Limpiar líneas que empiezan con el prompt repetido
-            lines = poem.split('\n')
-            final_lines = []
-            for line in lines:
-                line_stripped = line.strip()
-                # Si la línea es muy similar al prompt o concepto, saltarla
-                if line_stripped and len(line_stripped) < 100:
-                    line_lower = line_stripped.lower()
-                    # Detectar si es una variación del prompt
-                    if (concept and concept.lower() in line_lower and 
-                        any(word in line_lower for word in ['poema', 'tema', 'sobre', 'escribe']) and
-                        line_lower.count(concept.lower()) > 1):  # Si el concepto aparece más de una vez
-                        continue
-                final_lines.append(line)
-            
-            poem = '\n'.join(final_lines).strip()
-            
-            # Validar que el concepto aparezca en el poema
-            # Si no aparece, hacer múltiples intentos con diferentes estrategias
-            max_retries = 3
-            retry_count = 0
-            concept_words = concept.split() if concept else []
-            
-            while retry_count < max_retries:
-                # Verificar si el concepto o sus palabras clave aparecen
-                poem_lower = poem.lower()
-                concept_found = False
-                
-                if concept and len(concept) > 2:
-                    # Verificar concepto completo
-                    if concept in poem_lower:
-                        concept_found = True
-                    # Verificar palabras individuales del concepto (si tiene más de una palabra)
-                    elif len(concept_words) > 1:
-                        # Al menos 2 palabras del concepto deben aparecer
-                        words_found = sum(1 for word in concept_words if len(word) > 3 and word in poem_lower)
-                        if words_found >= min(2, len(concept_words)):
-                            concept_found = True
-                    # Si es una sola palabra, debe aparecer
-                    elif len(concept_words) == 1 and concept_words[0] in poem_lower:
-                        concept_found = True
-                
-                if concept_found or not concept or len(poem) < 20:
-                    break
-                
-                # Si el concepto no aparece, regenerar con estrategias más agresivas
-                retry_count += 1
-                print(f"⚠ Concepto '{concept}' no encontrado en el poema. Reintento {retry_count}/{max_retries}...")
-                
-                # Estrategia: prompt más enfático y temperatura más baja
-                if retry_count == 1:
-                    # Primera regeneración: prompt más directo
-                    prompt_text = f"Tema: {concept}\n\nPoema sobre {concept}:\n\nEn la {concept}, la {concept} es"
-                elif retry_count == 2:
-                    # Segunda regeneración: aún más directo
-                    prompt_text = f"{concept.capitalize()}. Poema sobre {concept}:\n\n{concept.capitalize()}, {concept},"
-                else:
-                    # Tercera regeneración: forzar inicio con el concepto
-                    prompt_text = f"{concept.capitalize()} es el tema. Escribe un poema:\n\n{concept.capitalize()}"
-                
-                inputs = self.tokenizer.encode(prompt_text, return_tensors="pt")
-                inputs = inputs.to(self.device)
-                
-                # Calcular max_new_tokens para el retry también
-                prompt_length_retry = inputs.shape[1]
-                max_new_tokens_retry = max_length - prompt_length_retry if max_length > prompt_length_retry else max_length
-                
-                with torch.no_grad():
-                    outputs = self.model.generate(
-                        inputs,
-                        max_new_tokens=max_new_tokens_retry,
-                        temperature=max(0.4, temperature - 0.3),  # Reducir temperatura significativamente
-                        do_sample=True,
-                        top_p=0.75,  # Más restrictivo
-                        top_k=25,  # Más restrictivo
-                        repetition_penalty=1.3,
-                        no_repeat_ngram_size=3,
-                        pad_token_id=self.tokenizer.eos_token_id,
-                        eos_token_id=self.tokenizer.eos_token_id,
-                        num_return_sequences=1,
-                        early_stopping=True
-                    )
-                
-                generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-                poem = generated_text
-                
-                # Limpiar caracteres residuales al inicio
-                import re
-                poem = re.sub(r'^["\'«»]+', '', poem)
-                poem = re.sub(r'^,\s*', '', poem)
-                poem = re.sub(r'^[.;]\s*', '', poem)
-                poem = poem.lstrip()
-                
-                # Limpiar el prompt
-                for prompt_variant in [
-                    prompt_text,
-                    f"Tema: {concept}\n\nPoema sobre {concept}:\n\n",
-                    f"{concept.capitalize()}. Poema sobre {concept}:\n\n",
-                ]:
-                    if prompt_variant in poem:
-                        poem = poem.replace(prompt_variant, "").strip()
-                        break
-                
-                poem = self._format_poem(poem)
-            
             # Si después de todos los intentos el concepto no aparece, intentar una última estrategia
+            postprocess_start = time.perf_counter()
             if concept and concept not in poem.lower() and len(poem) > 20:
+                CONCEPT_MISSING_TOTAL.inc()
                 print(f"⚠ Advertencia: El concepto '{concept}' no aparece claramente en el poema generado")
                 # En lugar de agregar una línea mal formateada, intentar insertar el concepto de manera natural
                 # Solo si el poema tiene al menos algunas líneas
@@ -394,14 +304,238 @@ class PoemGenerator:
             # Limpiar y formatear
             # Convertir max_length (tokens) a caracteres aproximados (1 token ≈ 4 caracteres en español)
             max_chars = int(max_length * 4) if max_length else None
-            poem = self._format_poem(poem, max_length_chars=max_chars)
-            
+            with span("format_poem", max_chars=max_chars):
+                poem = self._format_poem(poem, max_length_chars=max_chars)
+            postprocess_seconds += time.perf_counter() - postprocess_start
+            PHASE_SECONDS.observe(postprocess_seconds, phase="postprocess")
+            
+            set_trace_attribute("concept_retries", retry_count)
+            set_trace_attribute("concept_found", not concept or concept in poem.lower())
+            _record_backend("local")
             return poem, directive
             
         except Exception as e:
             print(f"Error en la generación: {e}")
+            _record_backend("template", fallback_reason="error")
             return self._generate_fallback(prompt), None
     
+    def _generate_local(self, model, prompt_text: str, prompt: str, concept: str, max_length: int, temperature: float) -> tuple:
+        """
+        Tokenización, model.generate y reintentos por concepto con el modelo local
+        (se llama con el lock del modelo tomado)
+        
+        Returns:
+            Tupla (poema, reintentos, segundos de postproceso)
+        """
+        import torch
+        
+        # Tokenizar
+        with PHASE_SECONDS.time(phase="tokenize"), span("tokenize") as current:
+            inputs = self.tokenizer.encode(prompt_text, return_tensors="pt")
+            inputs = inputs.to(self.device)
+            current.set_attribute("prompt_tokens", inputs.shape[1])
+        
+        # Generar con parámetros mejorados para mayor coherencia y seguimiento del prompt
+        # Calcular max_new_tokens (tokens nuevos, sin contar el prompt)
+        prompt_length = inputs.shape[1]
+        max_new_tokens = max_length - prompt_length if max_length > prompt_length else max_length
+        
+        with torch.no_grad(), PHASE_SECONDS.time(phase="generate"), \
+                span("model.generate", input_tokens=prompt_length, max_new_tokens=max_new_tokens,
+                     temperature=temperature) as current:
+            outputs = model.generate(
+                inputs,
+                max_new_tokens=max_new_tokens,  # Usar max_new_tokens en lugar de max_length
+                temperature=temperature,
+                do_sample=True,
+                top_p=0.85,  # Reducido para seguir más el prompt
+                top_k=35,  # Reducido para seguir más el prompt
+                repetition_penalty=1.3,  # Aumentado de 1.2 para evitar repeticiones
+                no_repeat_ngram_size=3,  # Evitar repetición de trigramas
+                pad_token_id=self.tokenizer.eos_token_id,
+                eos_token_id=self.tokenizer.eos_token_id,  # Detener en token de fin
+                num_return_sequences=1,
+                early_stopping=True
+            )
+            current.set_attribute("new_tokens", outputs.shape[1] - prompt_length)
+        
+        # Decodificar (la limpieza, hasta los reintentos, cuenta como postproceso)
+        postprocess_start = time.perf_counter()
+        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        
+        with span("postprocess"):
+            poem = self._clean_generated(generated_text, prompt_text, concept, prompt)
+        postprocess_seconds = time.perf_counter() - postprocess_start
+        
+        # Validar que el concepto aparezca en el poema
+        # Si no aparece, hacer múltiples intentos con diferentes estrategias
+        max_retries = 3
+        retry_count = 0
+        concept_words = concept.split() if concept else []
+        
+        while retry_count < max_retries:
+            # Verificar si el concepto o sus palabras clave aparecen
+            poem_lower = poem.lower()
+            concept_found = False
+            
+            if concept and len(concept) > 2:
+                # Verificar concepto completo
+                if concept in poem_lower:
+                    concept_found = True
+                # Verificar palabras individuales del concepto (si tiene más de una palabra)
+                elif len(concept_words) > 1:
+                    # Al menos 2 palabras del concepto deben aparecer
+                    words_found = sum(1 for word in concept_words if len(word) > 3 and word in poem_lower)
+                    if words_found >= min(2, len(concept_words)):
+                        concept_found = True
+                # Si es una sola palabra, debe aparecer
+                elif len(concept_words) == 1 and concept_words[0] in poem_lower:
+                    concept_found = True
+            
+            if concept_found or not concept or len(poem) < 20:
+                break
+            
+            # Si el concepto no aparece, regenerar con estrategias más agresivas
+            retry_count += 1
+            CONCEPT_RETRIES_TOTAL.inc()
+            print(f"⚠ Concepto '{concept}' no encontrado en el poema. Reintento {retry_count}/{max_retries}...")
+            
+            with PHASE_SECONDS.time(phase="concept_retry"), span("concept_retry", attempt=retry_count):
+                poem = self._regenerate_with_concept(model, concept, retry_count, max_length, temperature)
+        
+        return poem, retry_count, postprocess_seconds
+    
+    def _regenerate_with_concept(self, model, concept: str, attempt: int, max_length: int, temperature: float) -> str:
+        """Reintento `attempt` (1-3) con un prompt que fuerza el concepto y temperatura más baja"""
+        import torch
+        
+        # Estrategia: prompt más enfático y temperatura más baja
+        if attempt == 1:
+            # Primera regeneración: prompt más directo
+            prompt_text = f"Tema: {concept}\n\nPoema sobre {concept}:\n\nEn la {concept}, la {concept} es"
+        elif attempt == 2:
+            # Segunda regeneración: aún más directo
+            prompt_text = f"{concept.capitalize()}. Poema sobre {concept}:\n\n{concept.capitalize()}, {concept},"
+        else:
+            # Tercera regeneración: forzar inicio con el concepto
+            prompt_text = f"{concept.capitalize()} es el tema. Escribe un poema:\n\n{concept.capitalize()}"
+        
+        inputs = self.tokenizer.encode(prompt_text, return_tensors="pt")
+        inputs = inputs.to(self.device)
+        
+        # Calcular max_new_tokens para el retry también
+        prompt_length_retry = inputs.shape[1]
+        max_new_tokens_retry = max_length - prompt_length_retry if max_length > prompt_length_retry else max_length
+        
+        with torch.no_grad(), span("model.generate", input_tokens=prompt_length_retry,
+                                       max_new_tokens=max_new_tokens_retry) as current:
+            outputs = model.generate(
+                inputs,
+                max_new_tokens=max_new_tokens_retry,
+                temperature=max(0.4, temperature - 0.3),  # Reducir temperatura significativamente
+                do_sample=True,
+                top_p=0.75,  # Más restrictivo
+                top_k=25,  # Más restrictivo
+                repetition_penalty=1.3,
+                no_repeat_ngram_size=3,
+                pad_token_id=self.tokenizer.eos_token_id,
+                eos_token_id=self.tokenizer.eos_token_id,
+                num_return_sequences=1,
+                early_stopping=True
+            )
+            current.set_attribute("new_tokens", outputs.shape[1] - prompt_length_retry)
+        
+        generated_text = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+        poem = generated_text
+        
+        # Limpiar caracteres residuales al inicio
+        import re
+        poem = re.sub(r'^["\'«»]+', '', poem)
+        poem = re.sub(r'^,\s*', '', poem)
+        poem = re.sub(r'^[.;]\s*', '', poem)
+        poem = poem.lstrip()
+        
+        # Limpiar el prompt
+        for prompt_variant in [
+            prompt_text,
+            f"Tema: {concept}\n\nPoema sobre {concept}:\n\n",
+            f"{concept.capitalize()}. Poema sobre {concept}:\n\n",
+        ]:
+            if prompt_variant in poem:
+                poem = poem.replace(prompt_variant, "").strip()
+                break
+        
+        return self._format_poem(poem)
+    
+    def _clean_generated(self, generated_text: str, prompt_text: str, concept: str, prompt: str) -> str:
+        """Quita del texto generado el prompt y sus repeticiones al inicio"""
+        # Extraer solo el poema generado (sin el prompt)
+        # Limpiar el prompt de manera más agresiva
+        poem = generated_text
+        
+        # Lista de variantes del prompt a eliminar (ordenadas de más específicas a menos específicas)
+        prompt_variants = [
+            prompt_text,  # El prompt exacto usado
+            f"Tema: {concept}\n\nPoema sobre {concept}:\n\n{concept.capitalize()} es",
+            f"Tema: {concept}\n\nPoema sobre {concept}:\n\n",
+            f"Poema sobre {concept}:\n\n",
+            f"Escribe un poema sobre {concept}:\n\n",
+            f"Poema sobre {prompt}:\n\n",
+            f"Escribe un poema sobre {prompt}:\n\n",
+        ]
+        
+        # Eliminar todas las variantes del prompt
+        for variant in prompt_variants:
+            if variant in poem:
+                poem = poem.replace(variant, "").strip()
+        
+        # Limpiar caracteres residuales al inicio (comillas, comas, espacios)
+        import re
+        # Eliminar comillas al inicio
+        poem = re.sub(r'^["\'«»]+', '', poem)
+        # Eliminar comas seguidas de espacios al inicio
+        poem = re.sub(r'^,\s*', '', poem)
+        # Eliminar puntos y comas al inicio
+        poem = re.sub(r'^[.;]\s*', '', poem)
+        # Eliminar espacios múltiples al inicio
+        poem = poem.lstrip()
+        
+        # Limpiar repeticiones del prompt al inicio (patrones como "En X, X,")
+        poem_lines = poem.split('\n')
+        cleaned_lines = []
+        for i, line in enumerate(poem_lines):
+            line_lower = line.lower().strip()
+            # Detectar líneas que son repeticiones del prompt
+            if i < 2:  # Solo verificar las primeras 2 líneas
+                # Patrones comunes de repetición
+                if any(pattern in line_lower for pattern in [
+                    f"en {concept.lower()}, {concept.lower()},",
+                    f"{concept.lower()}, {concept.lower()},",
+                    f"poema sobre {concept.lower()}",
+                    f"tema: {concept.lower()}",
+                ]) and len(line.split(',')) > 2:  # Si tiene muchas comas, probablemente es repetición
+                    continue  # Saltar esta línea
+            cleaned_lines.append(line)
+        
+        poem = '\n'.join(cleaned_lines).strip()
+        
+        # Limpiar líneas que empiezan con el prompt repetido
+        lines = poem.split('\n')
+        final_lines = []
+        for line in lines:
+            line_stripped = line.strip()
+            # Si la línea es muy similar al prompt o concepto, saltarla
+            if line_stripped and len(line_stripped) < 100:
+                line_lower = line_stripped.lower()
+                # Detectar si es una variación del prompt
+                if (concept and concept.lower() in line_lower and 
+                    any(word in line_lower for word in ['poema', 'tema', 'sobre', 'escribe']) and
+                    line_lower.count(concept.lower()) > 1):  # Si el concepto aparece más de una vez
+                    continue
+            final_lines.append(line)
+        
+        return '\n'.join(final_lines).strip()
+    
     def _generate_fallback(self, prompt: str) -> str:
         """Generación básica cuando no hay modelo disponible"""
         # Plantillas de poemas básicos
@@ -6,6 +6,8 @@ import os
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
+from .tracing import span
+
 
 @dataclass
 class PoetryDirective:
@@ -107,6 +109,14 @@ class PoetryAgent:
         Returns:
             PoetryDirective con la información interpretada
         """
+        with span("directive_parse", input_chars=len(user_input)) as current:
+            directive, source = self._parse_directive(user_input)
+            current.set_attribute("source", source)
+            current.set_attribute("main_concept", directive.main_concept)
+            return directive
+    
+    def _parse_directive(self, user_input: str) -> Tuple[PoetryDirective, str]:
+        """parse_directive; devuelve también quién interpretó ("lm_studio" o "rules")"""
         # Intentar usar LM Studio primero si está disponible
         if self.lm_studio_client and self.lm_studio_client.is_available():
             lm_interpretation = self.lm_studio_client.interpret_directive(user_input)
@@ -121,7 +131,7 @@ class PoetryAgent:
                     constraints=lm_interpretation.get("constraints", [])
                 )
                 if directive.main_concept:
-                    return directive
+                    return directive, "lm_studio"
                 # Si LM Studio no pudo extraer el concepto, continuar con método basado en reglas
         
         # Método basado en reglas (fallback o si LM Studio no está disponible)
@@ -146,7 +156,7 @@ class PoetryAgent:
         # 6. Extraer restricciones
         directive.constraints = self._extract_constraints(input_lower)
         
-        return directive
+        return directive, "rules"
     
     def _extract_main_concept(self, original: str, lower: str) -> str:
         """Extrae el concepto principal del input"""
@@ -0,0 +1,347 @@
+"""
+Segmentación de poemas en texto libre (motor único para entrenamiento, admin y EPUB)
+
+Recorre el texto una sola vez, línea a línea, con patrones precompilados.
+Cada línea se clasifica una vez (vacía, separador, año, metadato, título,
+prosa o contenido) y una máquina de estados decide dónde empieza y termina
+cada poema. Solo se mira hacia delante para confirmar un cierre por líneas
+vacías (un número acotado de líneas, así que el recorrido sigue siendo lineal
+y apto para leer en streaming).
+
+El resultado son spans (inicio, fin, texto) con offsets de caracteres en el
+texto original, de modo que el panel puede editar o borrar un poema
+reemplazando exactamente ese rango.
+"""
+import re
+from collections import deque
+from dataclasses import dataclass, replace
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Pattern, Tuple
+
+# Separador explícito: === POEMA === o === POEMA X ===
+SEPARATOR_PATTERN = re.compile(r'===+\s*POEMA\s*(?:\d+)?\s*===+', re.IGNORECASE)
+
+# Años solos, p. ej. "1857", "1857." o "1844 (?)"
+_YEAR_PATTERN = re.compile(r'^\d{4}\s*[.()?]*\s*$')
+# Variantes más estrictas de entrenamiento ("1844 (?)") y del panel ("1857.")
+_TRAINING_YEAR_PATTERN = re.compile(r'^\d{4}\s*[\(\)\?]*\s*$')
+_ADMIN_YEAR_PATTERN = re.compile(r'^\d{4}\s*\.?\s*$')
+_LEADING_YEAR_PATTERN = re.compile(r'^\d{4}')
+_TITLE_FORBIDDEN_ENDINGS = (',', '.', ';', ':')
+
+# Clases de línea
+BLANK, SEPARATOR, YEAR, METADATA, TITLE, PROSE, CONTENT = range(7)
+
+
+class PoemSpan(NamedTuple):
+    """Un poema detectado: offsets [start, end) en el texto original y su texto limpio"""
+    start: int
+    end: int
+    text: str
+
+
+@dataclass(frozen=True)
+class SegmentationRules:
+    """Reglas de segmentación (cada llamador usa un preset)"""
+    # Líneas vacías consecutivas que cierran un poema (None = nunca)
+    blank_lines_to_break: Optional[int] = 3
+    # Si True, el cierre por líneas vacías solo se confirma si en las siguientes
+    # `confirm_lookahead_lines` líneas (saltando vacías y metadatos) hay un título o un año;
+    # si no, se conservan `max_kept_blank_lines` líneas vacías y la racha vuelve a cero
+    confirm_blank_break: bool = False
+    confirm_lookahead_lines: int = 5
+    # Líneas vacías que se conservan dentro del poema entre estrofas
+    max_kept_blank_lines: int = 0
+    # Si True, las líneas en mayúsculas tipo título cierran el poema anterior
+    titles_start_poems: bool = False
+    # Líneas más largas que esto se consideran prosa y cortan el poema (None = sin límite)
+    long_line_limit: Optional[int] = None
+    # Las líneas === POEMA === cortan el poema
+    separators: bool = True
+    # Años solos (se ignoran, y tras una racha de vacías confirman el cierre; None = son contenido)
+    year_pattern: Optional[Pattern] = _YEAR_PATTERN
+    # Patrón de metadatos (se aplica con match sobre la línea en minúsculas)
+    metadata_pattern: Optional[Pattern] = None
+    # Encabezados en mayúsculas de menos de N caracteres en las primeras M líneas son metadatos
+    heading_max_chars: int = 0
+    heading_max_line: int = 0
+    # Marcadores de inicio del contenido (se buscan en las primeras líneas)
+    start_markers: Tuple[str, ...] = ()
+    start_search_lines: int = 0
+    # Si True, cada línea se guarda sin espacios al inicio/fin
+    strip_lines: bool = True
+    # Filtros del poema resultante (min_lines cuenta también las vacías conservadas)
+    min_lines: int = 1
+    min_chars: int = 0
+    max_chars: Optional[int] = None
+    # Además de los trozos, emitir el bloque entero (entre líneas vacías, prosa incluida)
+    # si ninguna línea llega a `block_max_line` caracteres y la media queda por debajo
+    # de `block_max_avg`; el bloque debe tener menos de `block_max_chars` caracteres
+    block_max_line: Optional[int] = None
+    block_max_avg: int = 0
+    block_max_chars: Optional[int] = None
+
+
+def _compile_prefixes(*alternatives: str) -> Pattern:
+    return re.compile('|'.join(f'(?:{alt})' for alt in alternatives))
+
+
+# Entrenamiento: títulos separan poemas y las estrofas se conservan
+TRAINING_RULES = SegmentationRules(
+    blank_lines_to_break=3,
+    confirm_blank_break=True,
+    max_kept_blank_lines=2,
+    titles_start_poems=True,
+    year_pattern=_TRAINING_YEAR_PATTERN,
+    metadata_pattern=_compile_prefixes(
+        r'(prólogo|prologo|prefacio|preface|dedicatoria|dedication)',
+        r'(traductor|translator|autor|author|editor|publisher)',
+        r'(parte|part|capítulo|chapter)\s+\d+',
+        r'(índice|index|tabla de contenidos)',
+        r'al (lector|reader)',
+        r'(con los sentimientos|dedico|dedica)',
+        r'(charles|baudelaire|neruda|whitman|rilke|rimbaud)',
+        r'\d{4}\s*\.?\s*$',
+    ),
+    start_markers=('AL LECTOR', 'SPLEEN', 'BENDICIÓN', 'EL ALBATROS'),
+    start_search_lines=100,
+    min_lines=3,
+)
+
+# Panel de administración: más permisivo, pensado para visualizar y editar
+ADMIN_RULES = SegmentationRules(
+    blank_lines_to_break=3,
+    year_pattern=_ADMIN_YEAR_PATTERN,
+    metadata_pattern=re.compile(r'.*(?:charles baudelaire|las flores del mal|epublibre|editor digital)'),
+    heading_max_chars=50,
+    heading_max_line=50,
+    start_markers=('AL LECTOR', 'SPLEEN', 'BENDICIÓN', 'EL ALBATROS', 'PRÓLOGO'),
+    start_search_lines=200,
+    strip_lines=False,
+    min_chars=20,
+)
+
+# Capítulos de EPUB ya limpios: cada párrafo es un poema y las líneas largas son prosa;
+# los años forman parte del poema y un párrafo de líneas cortas también se emite entero
+EPUB_RULES = SegmentationRules(
+    blank_lines_to_break=1,
+    long_line_limit=150,
+    separators=False,
+    year_pattern=None,
+    min_lines=3,
+    min_chars=30,
+    block_max_line=200,
+    block_max_avg=120,
+    block_max_chars=2000,
+)
+
+# Capítulos de EPUB con separadores explícitos: solo cortan los separadores
+EPUB_SEPARATED_RULES = replace(
+    EPUB_RULES, blank_lines_to_break=None, long_line_limit=None, separators=True,
+    min_lines=1, block_max_line=None,
+)
+
+
+def has_separators(text: str) -> bool:
+    """Indica si el texto usa separadores explícitos === POEMA ==="""
+    return SEPARATOR_PATTERN.search(text) is not None
+
+
+class PoemSegmenter:
+    """Máquina de estados de una pasada que emite un PoemSpan por poema"""
+
+    def __init__(self, rules: SegmentationRules = ADMIN_RULES):
+        self.rules = rules
+
+    def _find_start_line(self, lines: List[str]) -> int:
+        """Primera línea (dentro de las iniciales) con un marcador de inicio; 0 si no hay"""
+        markers = self.rules.start_markers
+        if not markers:
+            return 0
+        for i, line in enumerate(lines[:self.rules.start_search_lines]):
+            line_upper = line.strip().upper()
+            if any(marker in line_upper for marker in markers):
+                return i
+        return 0
+
+    def _is_title(self, stripped: str) -> bool:
+        return (
+            len(stripped) < 100 and
+            stripped.isupper() and
+            not stripped.endswith(_TITLE_FORBIDDEN_ENDINGS) and
+            len(stripped.split()) < 15 and
+            not _LEADING_YEAR_PATTERN.match(stripped)
+        )
+
+    def _classify(self, stripped: str, line_number: int) -> int:
+        """Clasifica una línea (ya sin espacios) una sola vez"""
+        rules = self.rules
+        if not stripped:
+            return BLANK
+        if rules.separators and stripped[0] == '=' and SEPARATOR_PATTERN.fullmatch(stripped):
+            return SEPARATOR
+        if rules.year_pattern is not None and rules.year_pattern.match(stripped):
+            return YEAR
+        if rules.metadata_pattern is not None and rules.metadata_pattern.match(stripped.lower()):
+            return METADATA
+        if (
+            line_number < rules.heading_max_line and
+            len(stripped) < rules.heading_max_chars and
+            stripped.isupper()
+        ):
+            return METADATA
+        if rules.titles_start_poems and self._is_title(stripped):
+            return TITLE
+        if rules.long_line_limit is not None and len(stripped) > rules.long_line_limit:
+            return PROSE
+        return CONTENT
+
+    def _make_span(
+        self, start: int, end: int, lines: List[str], max_chars: Optional[int] = None,
+    ) -> Optional[PoemSpan]:
+        rules = self.rules
+        max_chars = rules.max_chars if max_chars is None else max_chars
+        text = '\n'.join(lines).strip()
+        if not text or len(text) <= rules.min_chars:
+            return None
+        if max_chars is not None and len(text) >= max_chars:
+            return None
+        if len(lines) < rules.min_lines:
+            return None
+        return PoemSpan(start, end, text)
+
+    def _make_block_span(self, start: int, end: int, lines: List[str]) -> Optional[PoemSpan]:
+        """Bloque entero si sus líneas son cortas (ver block_max_line)"""
+        rules = self.rules
+        if rules.block_max_line is None or not lines:
+            return None
+        lengths = [len(line) for line in lines]
+        if max(lengths) >= rules.block_max_line or sum(lengths) / len(lengths) >= rules.block_max_avg:
+            return None
+        return self._make_span(start, end, lines, rules.block_max_chars)
+
+    def iter_spans(self, text: str) -> Iterator[PoemSpan]:
+        """Recorre el texto una vez y emite los poemas en orden"""
+        return self.iter_line_spans(text.split('\n'))
+
+    def iter_line_spans(self, lines: Iterable[str]) -> Iterator[PoemSpan]:
+        """
+        Igual que iter_spans pero sobre un iterable de líneas (sin el salto final),
+        p. ej. un archivo leído de forma perezosa: solo se retienen las líneas
+        iniciales donde se buscan los marcadores de inicio y el poema en curso.
+        """
+        rules = self.rules
+        break_after = rules.blank_lines_to_break
+        lines = iter(lines)
+        head = list(islice(lines, rules.start_search_lines)) if rules.start_markers else []
+        first_line = self._find_start_line(head)
+
+        offset = sum(len(line) + 1 for line in head[:first_line])
+        source = chain(head[first_line:], lines)
+        # Líneas ya leídas al confirmar un cierre, pendientes de procesar
+        pending: deque = deque()
+        poem_lines: List[str] = []
+        poem_start = poem_end = 0
+        # Bloque en curso (solo si se emiten bloques enteros)
+        track_blocks = rules.block_max_line is not None
+        block_lines: List[str] = []
+        block_start = block_end = 0
+        blank_run = 0
+        line_number = -1
+
+        while True:
+            if pending:
+                line = pending.popleft()
+            else:
+                line = next(source, None)
+                if line is None:
+                    break
+            line_number += 1
+            line_start = offset
+            offset += len(line) + 1
+            stripped = line.strip()
+            kind = self._classify(stripped, line_number)
+
+            if kind == BLANK:
+                blank_run += 1
+                if break_after is None or blank_run < break_after:
+                    if poem_lines and blank_run <= rules.max_kept_blank_lines:
+                        poem_lines.append('')
+                    continue
+                if rules.confirm_blank_break and not self._break_confirmed(source, pending, line_number):
+                    # Separación larga entre estrofas: el poema sigue
+                    if poem_lines:
+                        poem_lines.extend([''] * rules.max_kept_blank_lines)
+                        blank_run = 0
+                    continue
+                if poem_lines:
+                    span = self._make_span(poem_start, poem_end, poem_lines)
+                    if span:
+                        yield span
+                    poem_lines = []
+                if block_lines:
+                    span = self._make_block_span(block_start, block_end, block_lines)
+                    if span:
+                        yield span
+                    block_lines = []
+                blank_run = 0
+                continue
+
+            if track_blocks:
+                if not block_lines:
+                    block_start = line_start
+                block_lines.append(stripped)
+                block_end = line_start + len(line)
+
+            if kind in (YEAR, METADATA):
+                # Se ignoran sin interrumpir la racha de líneas vacías
+                continue
+
+            if kind in (SEPARATOR, TITLE, PROSE):
+                if poem_lines:
+                    span = self._make_span(poem_start, poem_end, poem_lines)
+                    if span:
+                        yield span
+                    poem_lines = []
+                blank_run = 0
+                continue
+
+            # CONTENT
+            if not poem_lines:
+                poem_start = line_start
+            poem_lines.append(stripped if rules.strip_lines else line)
+            poem_end = line_start + len(line)
+            blank_run = 0
+
+        if poem_lines:
+            span = self._make_span(poem_start, poem_end, poem_lines)
+            if span:
+                yield span
+        if block_lines:
+            span = self._make_block_span(block_start, block_end, block_lines)
+            if span:
+                yield span
+
+    def _break_confirmed(self, source: Iterator[str], pending: deque, line_number: int) -> bool:
+        """Mira las siguientes líneas: el cierre se confirma si lo primero significativo es un título o un año"""
+        window = self.rules.confirm_lookahead_lines
+        while len(pending) < window:
+            line = next(source, None)
+            if line is None:
+                break
+            pending.append(line)
+        for i, line in enumerate(islice(pending, window), start=1):
+            kind = self._classify(line.strip(), line_number + i)
+            if kind in (BLANK, METADATA):
+                continue
+            return kind in (YEAR, TITLE)
+        return False
+
+    def segment(self, text: str) -> List[PoemSpan]:
+        """Lista de poemas del texto"""
+        return list(self.iter_spans(text))
+
+
+def segment_poems(text: str, rules: SegmentationRules = ADMIN_RULES) -> List[PoemSpan]:
+    """Atajo: segmenta `text` con las reglas indicadas"""
+    return PoemSegmenter(rules).segment(text)
@@ -0,0 +1,189 @@
+"""
+Recarga del modelo en las réplicas de inferencia (protocolo por sistema de archivos)
+
+El panel de administración y las réplicas que generan poemas pueden ser
+procesos (o máquinas) distintos que comparten el directorio `models/`. Para
+desplegar un modelo recién entrenado, el panel escribe una petición de recarga
+en `models/.serving/reload.json` (id único + modelo). Cada réplica comprueba
+cada pocos segundos si el archivo cambió (un `stat`), carga el modelo nuevo en
+segundo plano mientras sigue sirviendo con el anterior, y deja constancia del
+resultado en `models/.serving/replicas/<réplica>.json`, que el panel muestra.
+
+Una réplica que arranca adopta la última petición, así que las réplicas nuevas
+sirven el mismo modelo que las existentes.
+
+Configuración:
+    SERVING_CONTROL_DIR:     directorio compartido (default: models/.serving)
+    SERVING_RELOAD_INTERVAL: segundos entre comprobaciones (default: 5)
+    SERVING_AUTO_RELOAD:     "true" para pedir la recarga al terminar cada entrenamiento
+"""
+import json
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+from .dataset_store import atomic_write_text
+
+CONTROL_DIR = Path(os.getenv("SERVING_CONTROL_DIR", "models/.serving"))
+RELOAD_INTERVAL = float(os.getenv("SERVING_RELOAD_INTERVAL", "5"))
+AUTO_RELOAD = os.getenv("SERVING_AUTO_RELOAD", "false").lower() == "true"
+
+RELOAD_FILE = "reload.json"
+REPLICAS_DIR = "replicas"
+
+
+def request_reload(model_path: Optional[str] = None, control_dir: Union[str, Path] = CONTROL_DIR) -> Dict:
+    """
+    Pide a todas las réplicas que recarguen el modelo
+
+    Args:
+        model_path: Modelo a servir (ruta o nombre del catálogo); None = el de
+                    TRAINED_MODEL_PATH de cada réplica, releído del disco
+
+    Returns:
+        La petición escrita
+    """
+    request = {
+        "id": uuid.uuid4().hex[:12],
+        "model_path": model_path,
+        "requested_at": datetime.now().isoformat(),
+    }
+    Path(control_dir).mkdir(parents=True, exist_ok=True)
+    atomic_write_text(Path(control_dir) / RELOAD_FILE, json.dumps(request, ensure_ascii=False, indent=2))
+    return request
+
+
+def read_reload_request(control_dir: Union[str, Path] = CONTROL_DIR) -> Optional[Dict]:
+    """Última petición de recarga (None si nunca se pidió)"""
+    try:
+        with open(Path(control_dir) / RELOAD_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_replicas(control_dir: Union[str, Path] = CONTROL_DIR) -> List[Dict]:
+    """Estado que ha comunicado cada réplica en marcha"""
+    replicas = []
+    for path in sorted((Path(control_dir) / REPLICAS_DIR).glob("*.json")):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                replicas.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return replicas
+
+
+class ReloadWatcher:
+    """
+    Vigila las peticiones de recarga desde una réplica de inferencia
+
+    Args:
+        on_reload: Se llama con el `model_path` de cada petición nueva (en el
+                   hilo de vigilancia); si lanza una excepción, la réplica sigue
+                   con el modelo anterior y lo comunica
+        control_dir: Directorio compartido con el panel
+        interval: Segundos entre comprobaciones
+    """
+
+    def __init__(
+        self,
+        on_reload: Callable[[Optional[str]], None],
+        control_dir: Union[str, Path] = CONTROL_DIR,
+        interval: float = RELOAD_INTERVAL
+    ):
+        self.on_reload = on_reload
+        self.control_dir = Path(control_dir)
+        self.interval = interval
+        self.replica_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.applied_id = None
+        self._mtime = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self) -> bool:
+        """Aplica la última petición si es nueva; True si se aplicó alguna"""
+        try:
+            mtime = (self.control_dir / RELOAD_FILE).stat().st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        request = read_reload_request(self.control_dir)
+        if not request or request.get("id") == self.applied_id:
+            return False
+        # Se marca como aplicada aunque falle: una petición rota no se reintenta en bucle
+        self.applied_id = request.get("id")
+        try:
+            self.on_reload(request.get("model_path"))
+            self._report(request, "ok")
+            print(f"✓ Réplica {self.replica_id}: recarga {self.applied_id} aplicada")
+        except Exception as e:
+            self._report(request, "error", str(e))
+            print(f"⚠ Réplica {self.replica_id}: no se pudo aplicar la recarga {self.applied_id}: {e}")
+        return True
+
+    def adopt(self) -> Optional[str]:
+        """
+        Da por aplicada la última petición sin llamar a `on_reload` (al arrancar,
+        antes de cargar el modelo); devuelve su modelo
+        """
+        try:
+            self._mtime = (self.control_dir / RELOAD_FILE).stat().st_mtime_ns
+        except OSError:
+            self._mtime = None
+        request = read_reload_request(self.control_dir)
+        self.applied_id = request.get("id") if request else None
+        self._report(request, "ok")
+        return request.get("model_path") if request else None
+
+    def _report(self, request: Optional[Dict], status: str, error: Optional[str] = None):
+        report = {
+            "replica": self.replica_id,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "request_id": request.get("id") if request else None,
+            "model_path": request.get("model_path") if request else None,
+            "status": status,
+            "error": error,
+            "updated_at": datetime.now().isoformat(),
+        }
+        try:
+            (self.control_dir / REPLICAS_DIR).mkdir(parents=True, exist_ok=True)
+            atomic_write_text(
+                self.control_dir / REPLICAS_DIR / f"{self.replica_id}.json",
+                json.dumps(report, ensure_ascii=False, indent=2)
+            )
+        except OSError as e:
+            print(f"⚠ No se pudo escribir el estado de la réplica: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        """Adopta la última petición y empieza a vigilar (hilo en segundo plano)"""
+        if self._thread is not None:
+            return
+        if not self.check():
+            self._report(read_reload_request(self.control_dir), "ok")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reload-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Deja de vigilar y se quita de la lista de réplicas"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+        try:
+            (self.control_dir / REPLICAS_DIR / f"{self.replica_id}.json").unlink()
+        except OSError:
+            pass
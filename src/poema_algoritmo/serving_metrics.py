@@ -0,0 +1,296 @@
+"""
+Métricas de generación en formato Prometheus (`GET /metrics`)
+
+Contadores, gauges e histogramas mínimos (sin dependencias) con el formato de
+texto de Prometheus 0.0.4. Las métricas del camino de generación están
+definidas aquí y se actualizan desde main, poem_generator, lora y
+lm_studio_client.
+
+Con varios workers (serving_workers), cada proceso guarda periódicamente sus
+valores en METRICS_MULTIPROC_DIR y `/metrics`, lo atienda el worker que lo
+atienda, suma los de todos: contadores e histogramas de todos los procesos
+(también de los que ya terminaron) y gauges solo de los que siguen vivos.
+
+Configuración:
+    METRICS_MULTIPROC_DIR:    directorio compartido entre workers (lo fija `poema serve --workers`)
+    METRICS_FLUSH_INTERVAL:   segundos entre volcados de cada worker (default: 2)
+"""
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .dataset_store import atomic_write_text
+
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "2"))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latencias de generación: de milisegundos (plantillas) a minutos (CPU lenta)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} necesita las etiquetas {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {"kind": self.kind, "samples": json.loads(json.dumps(samples))}
+
+
+class Counter(_Metric):
+    """Valor que solo crece (peticiones, reintentos...)"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja (peticiones en curso, cola...)"""
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Suma 1 mientras dura el bloque"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Distribución de valores (latencias) en buckets acumulados"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [contadores por bucket (no acumulados)..., suma, número de observaciones]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observa la duración del bloque en segundos"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+class Registry:
+    """Métricas del proceso y su exposición en formato Prometheus"""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.multiproc_dir: Optional[Path] = None
+        self._flusher = None
+
+    def register(self, metric: _Metric):
+        self.metrics.append(metric)
+
+    def snapshot(self) -> Dict:
+        return {"pid": os.getpid(), "metrics": {m.name: m.snapshot() for m in self.metrics}}
+
+    # --- Varios procesos -------------------------------------------------
+
+    def enable_multiprocess(self, directory: Optional[str] = None):
+        """Comparte las métricas con los demás workers a través de `directory`"""
+        directory = directory or os.getenv("METRICS_MULTIPROC_DIR")
+        if not directory:
+            return
+        self.multiproc_dir = Path(directory)
+        self.multiproc_dir.mkdir(parents=True, exist_ok=True)
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            self._flusher.start()
+
+    def flush(self):
+        """Guarda los valores de este proceso para los demás workers"""
+        if self.multiproc_dir is not None:
+            atomic_write_text(self.multiproc_dir / f"{os.getpid()}.json", json.dumps(self.snapshot()))
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠ No se pudieron guardar las métricas: {e}")
+
+    def _collect(self) -> List[Dict]:
+        """Instantáneas de todos los procesos (la de este, siempre al día)"""
+        if self.multiproc_dir is None:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in self.multiproc_dir.glob("*.json"):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    # --- Exposición ------------------------------------------------------
+
+    def render(self) -> str:
+        """Texto para `GET /metrics`"""
+        merged: Dict[str, Dict[Tuple[str, ...], object]] = {m.name: {} for m in self.metrics}
+        for snapshot in self._collect():
+            alive = _pid_alive(snapshot.get("pid"))
+            for metric in self.metrics:
+                data = snapshot["metrics"].get(metric.name)
+                if not data or (metric.kind == "gauge" and not alive):
+                    continue
+                values = merged[metric.name]
+                for key, value in data["samples"]:
+                    key = tuple(key)
+                    if metric.kind == "histogram":
+                        current = values.get(key)
+                        values[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                    else:
+                        values[key] = values.get(key, 0) + value
+
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in sorted(merged[metric.name].items()):
+                if metric.kind != "histogram":
+                    lines.append(f"{metric.name}{_format_labels(metric.labelnames, key)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets, value):
+                    cumulative += count
+                    labels = _format_labels(metric.labelnames + ("le",), key + (_format_value(bound),))
+                    lines.append(f"{metric.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f"{metric.name}_sum{labels} {_format_value(value[-2])}")
+                lines.append(f"{metric.name}_count{labels} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if pid is None or pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+REGISTRY = Registry()
+
+# --- Métricas de generación -------------------------------------------------
+
+REQUEST_SECONDS = Histogram(
+    "poema_generate_request_seconds",
+    "Latencia de extremo a extremo de POST /api/generate",
+    ["status"],
+)
+PHASE_SECONDS = Histogram(
+    "poema_generation_phase_seconds",
+    "Duración de cada fase de la generación (directive_parse, lm_studio, tokenize, generate, "
+    "postprocess, concept_retry); lm_studio puede solaparse con directive_parse",
+    ["phase"],
+)
+BACKEND_TOTAL = Counter(
+    "poema_generation_backend_total",
+    "Poemas generados por backend (lm_studio, local, template)",
+    ["backend"],
+)
+FALLBACK_TOTAL = Counter(
+    "poema_generation_fallback_total",
+    "Veces que se recurrió a un backend de respaldo, por motivo",
+    ["reason"],
+)
+CONCEPT_RETRIES_TOTAL = Counter(
+    "poema_concept_retries_total",
+    "Regeneraciones porque el concepto no aparecía en el poema",
+)
+CONCEPT_MISSING_TOTAL = Counter(
+    "poema_concept_missing_total",
+    "Poemas en los que el concepto seguía sin aparecer tras los reintentos",
+)
+LM_STUDIO_REQUESTS_TOTAL = Counter(
+    "poema_lm_studio_requests_total",
+    "Peticiones a LM Studio por operación y resultado",
+    ["operation", "outcome"],
+)
+ADAPTER_CACHE_TOTAL = Counter(
+    "poema_adapter_cache_total",
+    "Uso de adaptadores LoRA ya cargados en memoria (hit) o que hubo que cargar (miss)",
+    ["result"],
+)
+IN_FLIGHT = Gauge(
+    "poema_requests_in_flight",
+    "Peticiones de generación en curso (incluidas las que esperan turno)",
+)
+QUEUE_DEPTH = Gauge(
+    "poema_generation_queue_depth",
+    "Peticiones esperando a que el modelo local quede libre",
+)
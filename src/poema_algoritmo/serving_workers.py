@@ -0,0 +1,257 @@
+"""
+Varios workers de generación que comparten el modelo (preload + fork)
+
+Con `uvicorn --workers N` cada worker es un proceso nuevo que carga su propia
+copia de GPT-2. Aquí el proceso principal carga el modelo una vez, congela sus
+objetos (`gc.freeze`, para que el recolector no toque las páginas heredadas) y
+crea los workers con `fork`: los pesos se comparten copy-on-write y, como en
+inferencia nadie los escribe, cada worker extra apenas añade memoria propia.
+Con `share_memory=True` los pesos se mueven además a memoria compartida
+(`Module.share_memory()`), que no depende de que las páginas no se toquen.
+
+Todos los workers aceptan conexiones del mismo socket. El proceso principal no
+genera: vigila los workers (relanza los que mueren, también desde el modelo
+compartido) y las peticiones de recarga del panel; al recargar, carga el modelo
+nuevo y sustituye los workers uno a uno.
+
+Un worker que muere nada más arrancar (ruta del modelo errónea, fallo al
+importar...) se relanza con una espera creciente; tras varios fallos de
+arranque seguidos el servidor se detiene con código 1 en lugar de relanzarlo
+indefinidamente.
+
+Configuración:
+    SERVING_WORKERS:               número de workers (default: 1)
+    SERVING_THREADS_PER_WORKER:    hilos de torch por worker (default: núcleos / workers)
+    SERVING_WORKER_MIN_UPTIME:     segundos; un worker que muere antes falló al arrancar (default: 10)
+    SERVING_MAX_STARTUP_FAILURES:  fallos de arranque seguidos tras los que se detiene (default: 5)
+
+Uso:
+    poema serve --role inference --workers 4
+"""
+import gc
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from .training_metrics import available_cores
+
+SERVING_WORKERS = int(os.getenv("SERVING_WORKERS", "1") or 1)
+SERVING_THREADS_PER_WORKER = int(os.getenv("SERVING_THREADS_PER_WORKER", "0") or 0)
+
+SERVING_WORKER_MIN_UPTIME = float(os.getenv("SERVING_WORKER_MIN_UPTIME", "10") or 10)
+SERVING_MAX_STARTUP_FAILURES = int(os.getenv("SERVING_MAX_STARTUP_FAILURES", "5") or 5)
+
+# Segundos entre comprobaciones del proceso principal
+SUPERVISOR_TICK = 0.5
+# Espera máxima antes de relanzar un worker que falló al arrancar
+MAX_RESPAWN_DELAY = 30.0
+
+
+def worker_threads(workers: int) -> int:
+    """Hilos de torch por worker: los núcleos repartidos (sin sobresuscribir la CPU)"""
+    return SERVING_THREADS_PER_WORKER or max(1, available_cores() // max(1, workers))
+
+
+class PreforkServer:
+    """
+    Servidor de generación con `workers` procesos creados con fork
+
+    Args:
+        host: Dirección
+        port: Puerto
+        workers: Número de workers
+        preload: Si True, el modelo se carga en el proceso principal y se
+                 comparte; si False, cada worker carga el suyo (como uvicorn --workers)
+        share_memory: Mover los pesos a memoria compartida antes del fork
+        log_level: Nivel de log de uvicorn
+    """
+
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        workers: int = SERVING_WORKERS,
+        preload: bool = True,
+        share_memory: bool = False,
+        log_level: str = "info"
+    ):
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.preload = preload
+        self.share_memory = share_memory
+        self.log_level = log_level
+        self.threads = worker_threads(self.workers)
+        self.socket = None
+        # pid -> momento en que se creó el worker
+        self._children: Dict[int, float] = {}
+        # Momentos en que toca relanzar workers caídos
+        self._respawn_at: List[float] = []
+        self._startup_failures = 0
+        self._stopping = False
+        self.exit_code = 0
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _load_shared_model(self):
+        """Carga el generador en el proceso principal y lo prepara para compartirlo"""
+        from . import main
+
+        generator = main.get_poem_generator()
+        if self.share_memory and generator.model is not None:
+            generator.model.share_memory()
+        # Lo cargado hasta aquí queda fuera del recolector: sus páginas no se copian en los workers
+        gc.collect()
+        gc.freeze()
+
+    def _reload(self, model_path: Optional[str]):
+        """Carga el modelo pedido por el panel y sustituye los workers uno a uno"""
+        from . import main
+
+        if not self.preload:
+            # Cada worker tiene su modelo: basta con relanzarlos (cargan el nuevo al arrancar)
+            main.serving_model_path = model_path
+        else:
+            gc.unfreeze()
+            try:
+                main.reload_poem_generator(model_path)
+            finally:
+                # Vuelve a congelar (y compartir) el generador que quede en servicio
+                self._load_shared_model()
+        for pid in list(self._children):
+            self._spawn()
+            self._terminate(pid)
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException as e:
+                print(f"✗ Worker {os.getpid()}: {e}", flush=True)
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = time.monotonic()
+
+    def _terminate(self, pid: int):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        self._children.pop(pid, None)
+
+    def _run_worker(self):
+        """Cuerpo de cada worker (proceso hijo)"""
+        import torch
+        import uvicorn
+
+        from . import main
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, signal.SIG_DFL)
+        torch.set_num_threads(self.threads)
+        if not self.preload:
+            main.get_poem_generator()
+        # El proceso principal vigila las recargas por todos los workers
+        app = main.create_app(inference=True, admin=False, watch_reloads=False)
+        server = uvicorn.Server(uvicorn.Config(app, log_level=self.log_level))
+        server.run(sockets=[self.socket])
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_worker_exit(self, pid: int, status: int):
+        """Programa el relevo de un worker caído, con espera si murió al arrancar"""
+        now = time.monotonic()
+        uptime = now - self._children.pop(pid)
+        if uptime >= SERVING_WORKER_MIN_UPTIME:
+            self._startup_failures = 0
+            print(f"⚠ Worker {pid} terminado (estado {status}); se relanza")
+            self._respawn_at.append(now)
+            return
+        self._startup_failures += 1
+        if self._startup_failures >= SERVING_MAX_STARTUP_FAILURES:
+            print(f"✗ Los workers fallan al arrancar ({self._startup_failures} veces seguidas); "
+                  f"se detiene el servidor")
+            self._stopping = True
+            self.exit_code = 1
+            return
+        delay = min(SUPERVISOR_TICK * 2 ** self._startup_failures, MAX_RESPAWN_DELAY)
+        print(f"⚠ Worker {pid} falló al arrancar (estado {status}, {uptime:.1f} s); "
+              f"se relanza en {delay:.1f} s")
+        self._respawn_at.append(now + delay)
+
+    def run(self) -> int:
+        """
+        Carga el modelo, lanza los workers y los vigila hasta recibir SIGINT/SIGTERM
+
+        Returns:
+            Código de salida (1 si se detuvo porque los workers no arrancan)
+        """
+        from . import main
+        from .serving_control import RELOAD_INTERVAL, ReloadWatcher
+
+        self.socket = self._bind()
+        # Métricas compartidas entre los workers de este servidor (ver serving_metrics)
+        metrics_dir = None
+        if not os.getenv("METRICS_MULTIPROC_DIR"):
+            metrics_dir = tempfile.mkdtemp(prefix="poema-metrics-")
+            os.environ["METRICS_MULTIPROC_DIR"] = metrics_dir
+        # Sin hilos en el proceso principal: hacer fork desde un proceso con hilos no es seguro
+        watcher = ReloadWatcher(self._reload)
+        # El modelo desplegado por el panel, si lo hay, se carga desde el principio
+        main.serving_model_path = watcher.adopt()
+        if self.preload:
+            self._load_shared_model()
+        print(f"Servidor en http://{self.host}:{self.port}: {self.workers} workers, "
+              f"{self.threads} hilos cada uno, modelo {'compartido' if self.preload else 'por worker'}")
+
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        for _ in range(self.workers):
+            self._spawn()
+
+        last_check = time.monotonic()
+        try:
+            while not self._stopping:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    pid, status = 0, 0
+                if pid and pid in self._children:
+                    self._on_worker_exit(pid, status)
+                now = time.monotonic()
+                due = [at for at in self._respawn_at if at <= now]
+                if due and not self._stopping:
+                    self._respawn_at = [at for at in self._respawn_at if at > now]
+                    for _ in due:
+                        self._spawn()
+                if time.monotonic() - last_check >= RELOAD_INTERVAL:
+                    last_check = time.monotonic()
+                    watcher.check()
+                time.sleep(SUPERVISOR_TICK)
+        finally:
+            for pid in list(self._children):
+                self._terminate(pid)
+            while True:
+                try:
+                    os.wait()
+                except ChildProcessError:
+                    break
+            watcher.stop()
+            self.socket.close()
+            if metrics_dir:
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+        return self.exit_code
@@ -318,8 +318,19 @@ async function uploadEPUB(file, datasetName = null) {
         const data = await response.json();
         
         if (response.ok) {
-            alert(`✓ ${data.message}\nDataset creado: ${data.filename}`);
-            loadDatasets();
+            // La conversión corre en segundo plano: seguir su progreso por capítulo
+            const job = await watchJob(data.job_id, (status) => {
+                if (status.chapters_total) {
+                    uploadArea.querySelector('p').textContent =
+                        `Procesando EPUB... capítulo ${status.chapters_done}/${status.chapters_total} (${status.poems_count} poemas)`;
+                }
+            });
+            if (job.status === 'completed') {
+                alert(`✓ ${job.message}\nDataset creado: ${job.filename}`);
+                loadDatasets();
+            } else {
+                alert(`✗ Error: ${job.error}`);
+            }
         } else {
             alert(`✗ Error: ${data.detail}`);
         }
@@ -334,6 +345,25 @@ async function uploadEPUB(file, datasetName = null) {
     }
 }
 
+function watchJob(jobId, onProgress) {
+    // Sigue un trabajo en segundo plano por SSE hasta que termina
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`/admin/api/jobs/${jobId}/events`);
+        source.onmessage = (event) => {
+            const status = JSON.parse(event.data);
+            onProgress(status);
+            if (status.status === 'completed' || status.status === 'error') {
+                source.close();
+                resolve(status);
+            }
+        };
+        source.addEventListener('error', (event) => {
+            source.close();
+            reject(new Error('Se perdió la conexión con el trabajo'));
+        });
+    });
+}
+
 async function deleteDataset(filename) {
     if (!confirm(`¿Estás seguro de eliminar ${filename}?`)) {
         return;
@@ -504,7 +534,8 @@ document.getElementById('training-form').addEventListener('submit', async (e) =>
         epochs: parseInt(document.getElementById('epochs').value),
         batch_size: parseInt(document.getElementById('batch-size').value),
         learning_rate: parseFloat(document.getElementById('learning-rate').value),
-        base_model: document.getElementById('base-model').value || null
+        base_model: document.getElementById('base-model').value || null,
+        lora: document.getElementById('lora').checked
     };
     
     if (!formData.poems_file) {
@@ -524,12 +555,13 @@ document.getElementById('training-form').addEventListener('submit', async (e) =>
         const data = await response.json();
         
         if (response.ok) {
-            alert('✓ Entrenamiento iniciado');
+            alert(`✓ ${data.message}`);
             loadTrainingStatus();
+            watchTrainingMetrics();
             // Actualizar estado cada 5 segundos
             const interval = setInterval(() => {
                 loadTrainingStatus().then(status => {
-                    if (status.status !== 'training') {
+                    if (!status || (status.status !== 'training' && status.status !== 'queued')) {
                         clearInterval(interval);
                     }
                 });
@@ -543,6 +575,7 @@ document.getElementById('training-form').addEventListener('submit', async (e) =>
 });
 
 async function loadTrainingStatus() {
+    loadTrainingJobs();
     try {
         const response = await fetch('/admin/api/training/status');
         const data = await response.json();
@@ -572,8 +605,13 @@ async function loadTrainingStatus() {
             html += `<p style="color: red;"><strong>Error:</strong> ${data.error}</p>`;
         }
         
+        if (data.status === 'cancelled' && data.resumable) {
+            html += `<p>Se guardó un checkpoint: al volver a entrenar con el mismo directorio de salida se reanudará.</p>`;
+        }
+        
         if (data.status === 'training') {
             html += `<button class="btn-danger" onclick="cancelTraining()">Cancelar Entrenamiento</button>`;
+            watchTrainingMetrics();
         }
         
         contentDiv.innerHTML = html;
@@ -584,8 +622,77 @@ async function loadTrainingStatus() {
     }
 }
 
+async function loadTrainingJobs() {
+    try {
+        const response = await fetch('/admin/api/training/jobs');
+        const data = await response.json();
+        const container = document.getElementById('training-jobs');
+        const listDiv = document.getElementById('training-jobs-list');
+        
+        if (data.jobs.length === 0) {
+            container.style.display = 'none';
+            return;
+        }
+        container.style.display = 'block';
+        
+        listDiv.innerHTML = data.jobs.slice(0, 20).map(job => {
+            const params = job.params || {};
+            const meta = [
+                getStatusLabel(job.status),
+                job.queue_position ? `posición ${job.queue_position}` : '',
+                `prioridad ${job.priority}`,
+                `${params.poems_file} → ${job.output_dir}`,
+                job.progress ? `paso ${job.progress.step}/${job.progress.max_steps}` : '',
+                job.cancel_requested ? 'cancelando...' : ''
+            ].filter(Boolean).join(' | ');
+            const active = job.status === 'queued' || job.status === 'training';
+            return `
+                <div class="dataset-item">
+                    <div class="dataset-info">
+                        <span class="dataset-name">${job.job_id.slice(0, 8)}</span>
+                        <div class="dataset-meta">${meta}</div>
+                    </div>
+                    <div class="dataset-actions">
+                        ${job.status === 'queued' ? `
+                            <button class="btn-secondary" onclick="changeTrainingJobPriority('${job.job_id}', ${job.priority + 1})">↑</button>
+                            <button class="btn-secondary" onclick="changeTrainingJobPriority('${job.job_id}', ${job.priority - 1})">↓</button>
+                        ` : ''}
+                        ${active && !job.cancel_requested ? `<button class="btn-danger" onclick="cancelTrainingJob('${job.job_id}')">Cancelar</button>` : ''}
+                    </div>
+                </div>
+            `;
+        }).join('');
+    } catch (err) {
+        console.error('Error al cargar la cola de entrenamientos:', err);
+    }
+}
+
+async function cancelTrainingJob(jobId) {
+    if (!confirm('¿Cancelar este entrenamiento?')) {
+        return;
+    }
+    const response = await fetch(`/admin/api/training/jobs/${jobId}/cancel`, { method: 'POST' });
+    const data = await response.json();
+    alert(response.ok ? `✓ ${data.message}` : `✗ Error: ${data.detail}`);
+    loadTrainingStatus();
+}
+
+async function changeTrainingJobPriority(jobId, priority) {
+    const response = await fetch(`/admin/api/training/jobs/${jobId}/priority`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ priority })
+    });
+    if (!response.ok) {
+        const data = await response.json();
+        alert(`✗ Error: ${data.detail}`);
+    }
+    loadTrainingJobs();
+}
+
 function getStatusLabel(status) {
     const labels = {
+        'queued': '⏳ En cola',
         'training': '🔄 Entrenando...',
         'completed': '✓ Completado',
         'error': '✗ Error',
@@ -595,6 +702,109 @@ function getStatusLabel(status) {
     return labels[status] || status;
 }
 
+// Métricas en vivo: puntos recibidos por SSE y curvas dibujadas en canvas
+let trainingMetricsSource = null;
+let trainingMetricsRun = null;
+let trainingMetricsPoints = [];
+
+function watchTrainingMetrics() {
+    if (trainingMetricsSource) {
+        return;
+    }
+    // since=0: el buffer solo guarda el entrenamiento actual, así se recuperan sus curvas
+    trainingMetricsSource = new EventSource('/admin/api/training/metrics/events?since=0');
+    trainingMetricsSource.onmessage = (event) => {
+        const point = JSON.parse(event.data);
+        if (point.run_id !== trainingMetricsRun) {
+            trainingMetricsRun = point.run_id;
+            trainingMetricsPoints = [];
+        }
+        trainingMetricsPoints.push(point);
+        renderTrainingMetrics();
+    };
+    trainingMetricsSource.addEventListener('end', () => {
+        trainingMetricsSource.close();
+        trainingMetricsSource = null;
+        loadTrainingStatus();
+    });
+    trainingMetricsSource.addEventListener('error', () => {
+        // Conexión perdida: se vuelve a abrir en el siguiente refresco de estado
+        trainingMetricsSource.close();
+        trainingMetricsSource = null;
+    });
+}
+
+function formatDuration(seconds) {
+    const h = Math.floor(seconds / 3600);
+    const m = Math.floor((seconds % 3600) / 60);
+    const s = Math.floor(seconds % 60);
+    return h > 0 ? `${h}h ${m}m` : `${m}m ${s}s`;
+}
+
+function renderTrainingMetrics() {
+    const container = document.getElementById('training-metrics');
+    const logs = trainingMetricsPoints.filter(p => p.event === 'log');
+    if (trainingMetricsPoints.length === 0) {
+        container.style.display = 'none';
+        return;
+    }
+    container.style.display = 'block';
+    
+    const last = trainingMetricsPoints[trainingMetricsPoints.length - 1];
+    const parts = [`Paso ${last.step}/${last.max_steps}`, `época ${Number(last.epoch).toFixed(2)}`];
+    const lastLog = logs[logs.length - 1];
+    if (lastLog) {
+        if (lastLog.loss != null) parts.push(`loss ${lastLog.loss.toFixed(4)}`);
+        if (lastLog.learning_rate != null) parts.push(`lr ${lastLog.learning_rate.toExponential(2)}`);
+        if (lastLog.tokens_per_sec != null) parts.push(`${Math.round(lastLog.tokens_per_sec)} tokens/s`);
+        if (lastLog.samples_per_sec != null) parts.push(`${lastLog.samples_per_sec.toFixed(2)} ejemplos/s`);
+        if (lastLog.eta_seconds != null) parts.push(`ETA ${formatDuration(lastLog.eta_seconds)}`);
+    }
+    const evals = trainingMetricsPoints.filter(p => p.event === 'eval');
+    if (evals.length > 0) parts.push(`eval loss ${evals[evals.length - 1].eval_loss.toFixed(4)}`);
+    if (last.memory_mb != null) parts.push(`${Math.round(last.memory_mb)} MB`);
+    document.getElementById('training-metrics-summary').textContent = parts.join(' · ');
+    
+    drawMetricChart(document.getElementById('chart-loss'), logs, 'loss', '#00C2C7');
+    drawMetricChart(document.getElementById('chart-throughput'), logs, 'tokens_per_sec', '#D0258F');
+}
+
+function drawMetricChart(canvas, points, key, color) {
+    const ctx = canvas.getContext('2d');
+    const { width, height } = canvas;
+    const pad = 28;
+    ctx.clearRect(0, 0, width, height);
+    
+    const data = points.filter(p => p[key] != null).map(p => [p.step, p[key]]);
+    if (data.length === 0) {
+        return;
+    }
+    const xs = data.map(d => d[0]);
+    const ys = data.map(d => d[1]);
+    const xMin = Math.min(...xs), xMax = Math.max(...xs);
+    const yMin = Math.min(...ys), yMax = Math.max(...ys);
+    const x = v => pad + (xMax === xMin ? 0.5 : (v - xMin) / (xMax - xMin)) * (width - 2 * pad);
+    const y = v => height - pad - (yMax === yMin ? 0.5 : (v - yMin) / (yMax - yMin)) * (height - 2 * pad);
+    
+    // Escala: valores mínimo y máximo
+    ctx.fillStyle = '#E6E6EA';
+    ctx.font = '10px Inter, sans-serif';
+    ctx.fillText(yMax.toPrecision(4), 2, pad - 8);
+    ctx.fillText(yMin.toPrecision(4), 2, height - 8);
+    
+    ctx.strokeStyle = color;
+    ctx.lineWidth = 1.5;
+    ctx.beginPath();
+    data.forEach(([step, value], i) => {
+        if (i === 0) {
+            ctx.moveTo(x(step), y(value));
+        } else {
+            ctx.lineTo(x(step), y(value));
+        }
+    });
+    ctx.stroke();
+}
+
 async function cancelTraining() {
     if (!confirm('¿Estás seguro de cancelar el entrenamiento?')) {
         return;
@@ -608,7 +818,7 @@ async function cancelTraining() {
         const data = await response.json();
         
         if (response.ok) {
-            alert('✓ Entrenamiento cancelado');
+            alert(`✓ ${data.message}`);
             loadTrainingStatus();
         } else {
             alert(`✗ Error: ${data.detail}`);
@@ -721,6 +931,9 @@ function formatBytes(bytes) {
 let currentDataset = null;
 let currentPage = 1;
 let totalPages = 1;
+// ETags para control de concurrencia optimista (If-Match)
+let currentDatasetEtag = null;
+let poemEtags = {};
 
 async function viewDataset(filename, page = 1) {
     currentDataset = filename;
@@ -738,6 +951,9 @@ async function viewDataset(filename, page = 1) {
         const data = await response.json();
         
         totalPages = data.pagination?.total_pages || 1;
+        currentDatasetEtag = data.etag || null;
+        poemEtags = {};
+        data.poems.forEach(poem => { poemEtags[poem.id] = poem.etag; });
         
         if (data.poems.length === 0) {
             poemsList.innerHTML = '<p>No hay poemas en este dataset</p>';
@@ -927,7 +1143,8 @@ async function deleteSelectedPoems() {
         const response = await fetch(`/admin/api/datasets/${currentDataset}/poems/batch-delete`, {
             method: 'DELETE',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                ...(currentDatasetEtag ? { 'If-Match': `"${currentDatasetEtag}"` } : {})
             },
             body: JSON.stringify({ poem_ids: selectedIds })
         });
@@ -1002,6 +1219,7 @@ async function editPoem(poemId) {
         // Guardar referencia al modal
         window.currentEditModal = modal;
         window.currentEditPoemId = poemId;
+        window.currentEditEtag = poem.etag || null;
         
     } catch (err) {
         alert(`✗ Error al cargar poema: ${err.message}`);
@@ -1013,6 +1231,7 @@ function closeEditModal() {
         window.currentEditModal.remove();
         window.currentEditModal = null;
         window.currentEditPoemId = null;
+        window.currentEditEtag = null;
     }
 }
 
@@ -1033,6 +1252,7 @@ async function savePoem(poemId) {
         
         const updateResponse = await fetch(`/admin/api/datasets/${currentDataset}/poems/${poemId}`, {
             method: 'PUT',
+            headers: window.currentEditEtag ? { 'If-Match': `"${window.currentEditEtag}"` } : {},
             body: formData
         });
         
@@ -1060,7 +1280,8 @@ async function deletePoem(poemId) {
     
     try {
         const response = await fetch(`/admin/api/datasets/${currentDataset}/poems/${poemId}`, {
-            method: 'DELETE'
+            method: 'DELETE',
+            headers: poemEtags[poemId] ? { 'If-Match': `"${poemEtags[poemId]}"` } : {}
         });
         
         const data = await response.json();
@@ -0,0 +1,190 @@
+"""
+Entrenamiento en streaming: corpus más grandes que la memoria
+
+En lugar de cargar todos los poemas en una lista y tokenizarlos de antemano,
+`StreamingPoemDataset` (un IterableDataset de torch) lee los archivos línea a
+línea, segmenta los poemas sobre la marcha, los baraja con un buffer de tamaño
+fijo y los tokeniza por lotes pequeños. La memoria depende del buffer, no del
+tamaño del corpus.
+
+- Los archivos se reparten entre los workers del DataLoader (cada worker lee
+  los suyos); si hay menos archivos que workers, todos leen todos y cada uno se
+  queda con un poema de cada N.
+- Los poemas del conjunto de validación (hash determinista, ver evaluation)
+  se saltan, así que la validación es la misma que en el modo normal.
+- Con varios procesos (torchrun), accelerate reparte los lotes entre ellos.
+- La eliminación de casi duplicados necesita todos los poemas a la vez: en
+  streaming no se aplica (conviene deduplicar el dataset antes desde el panel).
+"""
+import os
+import random
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+from torch.utils.data import IterableDataset, get_worker_info
+
+from .directives import format_training_examples
+from .evaluation import is_held_out
+from .segmentation import PoemSegmenter, TRAINING_RULES
+
+# Poemas en el buffer de barajado (más = mejor mezcla, más memoria)
+DEFAULT_SHUFFLE_BUFFER = int(os.getenv("STREAMING_SHUFFLE_BUFFER", "10000"))
+# Poemas que se tokenizan en cada llamada al tokenizer rápido
+TOKENIZE_BATCH_SIZE = 256
+# Bytes que se miran al principio de un archivo para detectar separadores ===
+FORMAT_PROBE_BYTES = 64 * 1024
+
+
+def expand_poem_files(poems_files: str) -> List[str]:
+    """Archivos de una lista separada por comas; los directorios aportan sus *.txt"""
+    files = []
+    for entry in (part.strip() for part in poems_files.split(',')):
+        if not entry:
+            continue
+        path = Path(entry)
+        if path.is_dir():
+            files.extend(str(p) for p in sorted(path.rglob('*.txt')))
+        elif path.exists():
+            files.append(str(path))
+        else:
+            print(f"  ⚠ Archivo no encontrado: {entry}")
+    return files
+
+
+def _iter_lines(file_path: str) -> Iterator[str]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield line[:-1] if line.endswith('\n') else line
+
+
+def iter_poems_from_file(file_path: str) -> Iterator[str]:
+    """
+    Poemas de un archivo, leídos de forma perezosa con las mismas reglas que
+    PoetryTrainer.load_poems_from_file (separadores === o formato libre)
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        has_separators = '===' in f.read(FORMAT_PROBE_BYTES)
+
+    if not has_separators:
+        from .train_model import PoetryTrainer
+
+        for span in PoemSegmenter(TRAINING_RULES).iter_line_spans(_iter_lines(file_path)):
+            if PoetryTrainer._is_valid_poem(span.text):
+                yield span.text
+        return
+
+    # Formato con separadores: cada bloque entre líneas === es un poema
+    block: List[str] = []
+    for line in _iter_lines(file_path):
+        if '===' in line:
+            poem = '\n'.join(block).strip()
+            if len(poem) > 50:
+                yield poem
+            block = []
+        elif line.strip():
+            block.append(line)
+    poem = '\n'.join(block).strip()
+    if len(poem) > 50:
+        yield poem
+
+
+def iter_poems(files: Sequence[str]) -> Iterator[str]:
+    """Poemas de varios archivos, en orden"""
+    for file_path in files:
+        yield from iter_poems_from_file(file_path)
+
+
+def count_training_poems(files: Sequence[str]) -> int:
+    """Poemas de entrenamiento (sin la validación): una pasada sin retener nada"""
+    return sum(1 for poem in iter_poems(files) if not is_held_out(poem))
+
+
+def collect_held_out(files: Sequence[str], limit: int = 1000) -> List[str]:
+    """Los primeros `limit` poemas del conjunto de validación"""
+    return list(islice((poem for poem in iter_poems(files) if is_held_out(poem)), limit))
+
+
+def shuffle_buffer(items: Iterator, size: int, rng: random.Random) -> Iterator:
+    """Barajado aproximado con un buffer de `size` elementos (memoria acotada)"""
+    buffer = []
+    for item in items:
+        if len(buffer) < size:
+            buffer.append(item)
+            continue
+        index = rng.randrange(size)
+        yield buffer[index]
+        buffer[index] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+class StreamingPoemDataset(IterableDataset):
+    """
+    Ejemplos tokenizados (input_ids, length) leídos en streaming de varios archivos
+
+    Args:
+        files: Archivos de poemas
+        tokenizer: Tokenizer del modelo (preferiblemente el rápido)
+        max_length: Longitud máxima de secuencia
+        directive_seed: Semilla del formato con directrices; None deja los poemas tal cual
+        buffer_size: Poemas del buffer de barajado (0 = sin barajar)
+        seed: Semilla del barajado (se combina con la época y el worker)
+    """
+
+    def __init__(
+        self,
+        files: Sequence[str],
+        tokenizer,
+        max_length: int,
+        directive_seed: Optional[int] = None,
+        buffer_size: int = DEFAULT_SHUFFLE_BUFFER,
+        seed: int = 42
+    ):
+        self.files = list(files)
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.directive_seed = directive_seed
+        self.buffer_size = buffer_size
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        """El Trainer la llama en cada época: otro orden de barajado"""
+        self.epoch = epoch
+
+    def _shard_poems(self) -> Iterator[str]:
+        """Poemas de entrenamiento que le tocan a este worker"""
+        info = get_worker_info()
+        worker_id, num_workers = (info.id, info.num_workers) if info else (0, 1)
+        if len(self.files) >= num_workers:
+            # Cada worker lee sus propios archivos
+            poems = iter_poems(self.files[worker_id::num_workers])
+        else:
+            # Menos archivos que workers: todos leen todo y se reparten los poemas
+            poems = islice(iter_poems(self.files), worker_id, None, num_workers)
+        return (poem for poem in poems if not is_held_out(poem))
+
+    def __iter__(self):
+        info = get_worker_info()
+        worker_id = info.id if info else 0
+        rng = random.Random(f"{self.seed}-{self.epoch}-{worker_id}")
+
+        poems = self._shard_poems()
+        if self.buffer_size > 1:
+            poems = shuffle_buffer(poems, self.buffer_size, rng)
+
+        eos_token = self.tokenizer.eos_token
+        while True:
+            batch = list(islice(poems, TOKENIZE_BATCH_SIZE))
+            if not batch:
+                return
+            if self.directive_seed is not None:
+                batch = format_training_examples(batch, self.directive_seed)
+            tokenized = self.tokenizer(
+                [text + eos_token for text in batch],
+                truncation=True,
+                max_length=self.max_length,
+            )
+            for ids in tokenized["input_ids"]:
+                yield {"input_ids": ids, "length": len(ids)}
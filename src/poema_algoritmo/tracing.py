@@ -0,0 +1,297 @@
+"""
+Trazas por petición de generación (spans al estilo OpenTelemetry)
+
+Cada `POST /api/generate` abre una traza y las etapas de la generación abren
+spans dentro de ella: interpretación de la directriz (`PoetryAgent`), llamadas
+a LM Studio, tokenización, `model.generate`, limpieza, reintentos por concepto
+y `_format_poem`, con atributos como tokens, backend o número de reintentos.
+Las duraciones por etapa se devuelven en las cabeceras `Server-Timing` y
+`X-Timing` de la respuesta; la traza completa se exporta, si se configura, a un
+archivo JSON lines o a un colector OTLP/HTTP (formato JSON de OTLP, sin
+depender de la librería de OpenTelemetry).
+
+Fuera de una petición (scripts, evaluación) `span()` no hace nada.
+
+La exportación corre en un hilo propio, así que no retrasa la respuesta; si el
+colector no responde, las trazas se descartan (la cola tiene un máximo).
+
+Configuración:
+    TRACING_EXPORTER:       none (default), jsonl u otlp
+    TRACING_FILE:           archivo del exportador jsonl (default: logs/traces.jsonl)
+    TRACING_OTLP_ENDPOINT:  colector OTLP/HTTP (default: OTEL_EXPORTER_OTLP_ENDPOINT o http://localhost:4318)
+    TRACING_SERVICE_NAME:   service.name de las trazas (default: poema-algoritmo)
+"""
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = Path(os.getenv("TRACING_FILE", "logs/traces.jsonl"))
+TRACING_OTLP_ENDPOINT = os.getenv(
+    "TRACING_OTLP_ENDPOINT", os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+).rstrip("/")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "poema-algoritmo")
+
+EXPORTERS = ("none", "jsonl", "otlp")
+
+# Trazas pendientes de exportar como máximo (las demás se descartan)
+MAX_PENDING_TRACES = 1000
+
+
+class Span:
+    """Una etapa de la traza: nombre, duración y atributos"""
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self):
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        self.end_ns = self.start_ns + int(self.duration_ms * 1_000_000)
+        self.trace._finish(self)
+
+    def to_dict(self) -> Dict:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Span de los que se abren fuera de una petición"""
+
+    def set_attribute(self, key: str, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """Los spans de una petición"""
+
+    def __init__(self, name: str, attributes: Dict):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = Span(self, name, None, attributes)
+
+    def _finish(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def stage_durations(self) -> Dict[str, float]:
+        """Milisegundos por etapa (sumando las que se repiten, como los reintentos)"""
+        durations: Dict[str, float] = {}
+        for span in self.spans:
+            if span is not self.root:
+                durations[span.name] = durations.get(span.name, 0.0) + span.duration_ms
+        # Antes de cerrar la traza (al preparar las cabeceras) el total es lo transcurrido
+        root_ms = self.root.duration_ms
+        durations["total"] = root_ms if root_ms is not None else (time.perf_counter() - self.root._start) * 1000
+        return durations
+
+    def timing_headers(self) -> Dict[str, str]:
+        """Cabeceras `Server-Timing` (estándar), `X-Timing` (legible: etapa=ms) y `X-Trace-Id`"""
+        durations = self.stage_durations()
+        server_timing = [f"{_metric_name(name)};dur={ms:.1f}" for name, ms in durations.items()]
+        server_timing.append(f'trace;desc="{self.trace_id}"')
+        return {
+            "Server-Timing": ", ".join(server_timing),
+            "X-Timing": ", ".join(f"{name}={ms:.1f}ms" for name, ms in durations.items()),
+            "X-Trace-Id": self.trace_id,
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "start_ns": self.root.start_ns,
+            "duration_ms": round(self.root.duration_ms, 3) if self.root.duration_ms is not None else None,
+            "attributes": self.root.attributes,
+            "spans": [span.to_dict() for span in self.spans if span is not self.root],
+        }
+
+
+def _metric_name(name: str) -> str:
+    # Server-Timing solo admite tokens HTTP como nombre
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("poema_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("poema_span", default=None)
+
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """
+    Abre la traza de una petición (el span raíz) y la exporta al terminar
+
+    Las etapas que se ejecuten dentro, también en el pool de hilos (que copia
+    el contexto), se añaden a esta traza.
+    """
+    trace = Trace(name, attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except BaseException:
+        trace.root.status = "error"
+        raise
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        trace.root.end()
+        _exporter.submit(trace)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Span de una etapa dentro de la traza en curso (no hace nada sin traza)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+    parent = _current_span.get()
+    current = Span(trace, name, parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.set_attribute("error", str(e) or type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def set_trace_attribute(key: str, value):
+    """Atributo del span raíz (backend usado, reintentos...)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.root.set_attribute(key, value)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+# --- Exportación ----------------------------------------------------------
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict) -> List[Dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def to_otlp(traces: List[Trace]) -> Dict:
+    """Cuerpo de `POST /v1/traces` (OTLP/HTTP con codificación JSON)"""
+    spans = []
+    for trace in traces:
+        for item in trace.spans:
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": item.span_id,
+                "parentSpanId": item.parent_id or "",
+                "name": item.name,
+                "kind": 2 if item is trace.root else 1,  # SERVER / INTERNAL
+                "startTimeUnixNano": str(item.start_ns),
+                "endTimeUnixNano": str(item.end_ns),
+                "attributes": _otlp_attributes(item.attributes),
+                "status": {"code": 2 if item.status == "error" else 1},
+            })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": TRACING_SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "poema_algoritmo"}, "spans": spans}],
+        }]
+    }
+
+
+class TraceExporter:
+    """Exporta las trazas terminadas desde un hilo en segundo plano"""
+
+    def __init__(self, exporter: str = TRACING_EXPORTER):
+        if exporter not in EXPORTERS:
+            print(f"⚠ TRACING_EXPORTER desconocido: {exporter} (opciones: {', '.join(EXPORTERS)})")
+            exporter = "none"
+        self.exporter = exporter
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=MAX_PENDING_TRACES)
+        self._thread = None
+        self._pid = None
+
+    def submit(self, trace: Trace):
+        if self.exporter == "none":
+            return
+        # El hilo se crea en el proceso que exporta (los workers nacen con fork)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=MAX_PENDING_TRACES)
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.export(batch)
+            except Exception as e:
+                print(f"⚠ No se pudieron exportar {len(batch)} trazas: {e}")
+
+    def export(self, traces: List[Trace]):
+        if self.exporter == "jsonl":
+            TRACING_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(TRACING_FILE, 'a', encoding='utf-8') as f:
+                for trace in traces:
+                    f.write(json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n")
+        elif self.exporter == "otlp":
+            import requests
+
+            response = requests.post(f"{TRACING_OTLP_ENDPOINT}/v1/traces", json=to_otlp(traces), timeout=5)
+            response.raise_for_status()
+
+
+_exporter = TraceExporter()
@@ -1,19 +1,52 @@
 """
 Script para entrenar un modelo de generación de poesía
 """
+import inspect
+import json
+import math
 import os
 import re
 import torch
 from transformers import (
+    AutoTokenizer,
     GPT2LMHeadModel,
-    GPT2Tokenizer,
     Trainer,
     TrainingArguments,
-    DataCollatorForLanguageModeling
 )
 from datasets import Dataset
 from typing import List, Optional
 
+from .cpu_training import CPUTrainingProfile, is_main_process, local_world_size
+from .directives import DIRECTIVE_RATIO
+from .evaluation import HELD_OUT_FRACTION, evaluate_model, split_held_out
+from .distillation import (
+    DEFAULT_DISTILL_ALPHA,
+    DEFAULT_DISTILL_TEMPERATURE,
+    DistillationTrainer,
+    build_student,
+    distilled_output_dir,
+)
+from .lora import DEFAULT_LORA_ALPHA, DEFAULT_LORA_DROPOUT, DEFAULT_LORA_R, apply_lora
+from .model_catalog import BASE_MODEL_CANDIDATES, find_base_model, get_catalog, offline_mode, resolve_model
+from .near_duplicates import deduplicate_poems
+from .training_data import DEFAULT_NUM_PROC, DEFAULT_TOKEN_CACHE_DIR, DynamicPaddingCollator, load_or_tokenize
+from .segmentation import PoemSegmenter, TRAINING_RULES
+from .streaming_data import (
+    DEFAULT_SHUFFLE_BUFFER,
+    StreamingPoemDataset,
+    collect_held_out,
+    count_training_poems,
+    expand_poem_files,
+)
+from .training_callbacks import CancellationCallback, MetricsCallback, TrainingTokenCounter
+from .training_state import find_latest_checkpoint, is_cancel_requested, remove_checkpoints
+
+# `evaluation_strategy` se renombró a `eval_strategy` en transformers 4.41
+EVAL_STRATEGY_ARG = (
+    "eval_strategy" if "eval_strategy" in inspect.signature(TrainingArguments).parameters
+    else "evaluation_strategy"
+)
+
 
 class PoetryTrainer:
     """Entrenador de modelos para generación de poesía"""
@@ -22,21 +55,92 @@ class PoetryTrainer:
         self,
         base_model: str = None,
         output_dir: str = "models/poetry_model",
-        max_length: int = 512
+        max_length: int = 512,
+        pack: bool = False,
+        token_cache_dir: Optional[str] = DEFAULT_TOKEN_CACHE_DIR,
+        seed: int = 42,
+        num_proc: Optional[int] = None,
+        status_file: Optional[str] = None,
+        metrics_buffer=None,
+        lora: bool = False,
+        lora_r: int = DEFAULT_LORA_R,
+        lora_alpha: int = DEFAULT_LORA_ALPHA,
+        lora_dropout: float = DEFAULT_LORA_DROPOUT,
+        distill_from: Optional[str] = None,
+        student_layers: Optional[int] = None,
+        student_heads: Optional[int] = None,
+        distill_alpha: float = DEFAULT_DISTILL_ALPHA,
+        distill_temperature: float = DEFAULT_DISTILL_TEMPERATURE,
+        cpu_profile: Optional[CPUTrainingProfile] = None
     ):
+        """
+        Args:
+            base_model: Modelo base (None = intenta uno en español, luego gpt2)
+            output_dir: Directorio donde guardar el modelo entrenado
+            max_length: Longitud máxima de secuencia (tokens)
+            pack: Si True, empaqueta varios poemas cortos en cada secuencia
+            token_cache_dir: Caché de datasets tokenizados; None o "" la desactiva
+            seed: Semilla del formato con directrices (mismos datos -> mismos ejemplos)
+            num_proc: Procesos para formatear y tokenizar (None = TOKENIZE_NUM_PROC o todos los núcleos)
+            status_file: Archivo de estado a vigilar; si pasa a "cancelled" el entrenamiento se detiene
+            metrics_buffer: MetricsBuffer donde registrar las métricas en vivo (opcional)
+            lora: Si True, entrena y guarda solo un adaptador LoRA (el modelo base queda congelado)
+            lora_r: Rango de las matrices LoRA
+            lora_alpha: Escala de LoRA (alpha / r)
+            lora_dropout: Dropout de las capas LoRA
+            distill_from: Modelo afinado (profesor) a destilar en un alumno más pequeño
+            student_layers: Capas del alumno (None = la mitad de las del profesor)
+            student_heads: Cabezas de atención del alumno (None = las del profesor)
+            distill_alpha: Peso de la pérdida de destilación frente a la de lenguaje
+            distill_temperature: Temperatura de la destilación
+            cpu_profile: Hilos, workers y bf16 al entrenar sin GPU (None = variables TRAINING_*)
+        """
+        if distill_from and lora:
+            raise ValueError("La destilación entrena un modelo completo: no se combina con LoRA")
+        
         self.output_dir = output_dir
         self.max_length = max_length
+        self.pack = pack
+        self.token_cache_dir = token_cache_dir
+        self.seed = seed
+        self.num_proc = num_proc
+        self.status_file = status_file
+        self.metrics_buffer = metrics_buffer
+        self.lora = lora
+        self.teacher = None
+        self.distill_alpha = distill_alpha
+        self.distill_temperature = distill_temperature
+        self.train_metrics = {}
+        
+        # Sin GPU: repartir los núcleos entre hilos de torch y workers del DataLoader
+        self.cpu_profile = None
+        if not torch.cuda.is_available():
+            self.cpu_profile = (cpu_profile or CPUTrainingProfile.from_env()).resolved()
+            self.cpu_profile.apply()
+            print(f"Entrenamiento en CPU: {self.cpu_profile.describe()}")
+            # Con torchrun cada proceso tokeniza con su parte de los núcleos
+            if num_proc is None and local_world_size() > 1:
+                self.num_proc = max(1, DEFAULT_NUM_PROC // local_world_size())
+        
+        # Al destilar, el tokenizer y la arquitectura salen del profesor
+        if distill_from:
+            base_model = distill_from
         
         # Si no se especifica modelo base, intentar cargar uno en español primero
         if base_model is None:
             base_model = self._get_best_spanish_model()
+        else:
+            # Nombres registrados en el catálogo: directorio local, sin consultar la red
+            base_model = resolve_model(base_model)
         
         self.base_model = base_model
         
         # Cargar modelo y tokenizer base
         print(f"Cargando modelo base: {base_model}")
-        self.tokenizer = GPT2Tokenizer.from_pretrained(base_model)
-        self.model = GPT2LMHeadModel.from_pretrained(base_model)
+        # Tokenizer rápido (Rust): tokeniza los lotes de `Dataset.map` en una sola llamada
+        local_only = offline_mode()
+        self.tokenizer = AutoTokenizer.from_pretrained(base_model, use_fast=True, local_files_only=local_only)
+        self.model = GPT2LMHeadModel.from_pretrained(base_model, local_files_only=local_only)
         
         # Configurar tokenizer
         if self.tokenizer.pad_token is None:
@@ -45,32 +149,44 @@ class PoetryTrainer:
         # Aumentar tamaño del vocabulario si es necesario
         self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
         
+        # Destilación: el modelo cargado es el profesor y se entrena un alumno más pequeño
+        if distill_from:
+            print("Creando modelo alumno para destilación...")
+            self.teacher = self.model
+            self.model = build_student(self.teacher, num_layers=student_layers, num_heads=student_heads)
+        
+        # Modo LoRA: solo se entrenan (y guardan) los adaptadores
+        if lora:
+            self.model = apply_lora(self.model, r=lora_r, alpha=lora_alpha, dropout=lora_dropout)
+        
         print(f"✓ Modelo cargado. Vocabulario: {len(self.tokenizer)} tokens")
     
     def _get_best_spanish_model(self) -> str:
         """
-        Intenta encontrar el mejor modelo base en español disponible.
-        Si no encuentra ninguno, usa GPT2 como fallback.
+        Busca el mejor modelo base disponible en local (catálogo o caché de Hugging Face).
+        Sin ninguno local, descarga el modelo en español (o falla si no hay red).
         """
-        spanish_models = [
-            "DeepESP/gpt2-spanish",
-            "datasets/gpt2-spanish",
-        ]
+        found = find_base_model()
+        if found:
+            name, path = found
+            print(f"✓ Modelo base local: {name} ({path})")
+            if name == "gpt2":
+                print("  Nota: GPT2 es un modelo en inglés; para mejores resultados descarga uno en español:")
+                print(f"  poema models pull {BASE_MODEL_CANDIDATES[0]}")
+            return path
+        
+        if offline_mode():
+            raise RuntimeError(
+                "No hay modelos base en local y el modo sin red está activado. "
+                "Descárgalos antes con: poema models pull"
+            )
         
-        for model_name in spanish_models:
-            try:
-                # Intentar cargar el tokenizer para verificar si existe
-                tokenizer = GPT2Tokenizer.from_pretrained(model_name)
-                print(f"✓ Modelo en español encontrado: {model_name}")
-                return model_name
-            except Exception:
-                continue
-        
-        print("⚠ No se encontró modelo en español. Usando GPT2 (inglés) como base.")
-        print("  Nota: Para mejores resultados, considera usar un modelo base en español.")
-        return "gpt2"
+        print(f"⚠ No hay modelos base en el catálogo local: se descargará {BASE_MODEL_CANDIDATES[0]}")
+        print("  (usa `poema models pull` para tenerlo preparado)")
+        return BASE_MODEL_CANDIDATES[0]
     
-    def load_poems_from_file(self, file_path: str) -> List[str]:
+    @staticmethod
+    def load_poems_from_file(file_path: str) -> List[str]:
         """
         Carga poesías desde un archivo de texto
         Soporta múltiples formatos automáticamente
@@ -105,12 +221,19 @@ class PoetryTrainer:
                         poems.append(poem)
         else:
             # Formato libre: detectar poemas por estructura
-            poems = self._extract_poems_from_free_format(content)
+            poems = PoetryTrainer._extract_poems_from_free_format(content)
+        
+        # Eliminar casi duplicados (ediciones distintas, cambios de puntuación...)
+        unique_poems = deduplicate_poems(poems)
+        if len(unique_poems) < len(poems):
+            print(f"  Eliminados {len(poems) - len(unique_poems)} poemas casi duplicados")
+        poems = unique_poems
         
         print(f"✓ Cargadas {len(poems)} poesías desde {file_path}")
         return poems
     
-    def _extract_poems_from_free_format(self, content: str) -> List[str]:
+    @staticmethod
+    def _extract_poems_from_free_format(content: str) -> List[str]:
         """
         Extrae poemas de un formato libre (sin separadores explícitos)
         Agrupa correctamente todas las líneas de cada poema
@@ -121,175 +244,14 @@ class PoetryTrainer:
         Returns:
             Lista de poemas extraídos
         """
-        poems = []
-        
-        # Detectar y saltar prólogos/prefacios
-        lines = content.split('\n')
-        
-        # Buscar donde terminan los metadatos
-        start_idx = 0
-        for i, line in enumerate(lines[:100]):
-            line_upper = line.strip().upper()
-            if any(keyword in line_upper for keyword in ['AL LECTOR', 'SPLEEN', 'BENDICIÓN', 'EL ALBATROS']):
-                start_idx = i
-                break
-        
-        if start_idx > 0:
-            lines = lines[start_idx:]
-        
-        current_poem_lines = []
-        current_poem_title = None
-        empty_line_count = 0
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            # Detectar títulos (líneas en mayúsculas, cortas, solas)
-            is_title = (
-                line and
-                len(line) < 100 and 
-                line.isupper() and 
-                not line.endswith(',') and
-                not line.endswith('.') and
-                not line.endswith(';') and
-                not line.endswith(':') and
-                len(line.split()) < 15 and
-                not re.match(r'^\d{4}', line)  # No años
-            )
-            
-            # Detectar metadatos
-            is_metadata = self._is_metadata_line(line) if line else False
-            
-            # Detectar años solos (ej: "1844 (?)")
-            is_year = re.match(r'^\d{4}\s*[\(\)\?]*\s*$', line) if line else False
-            
-            if is_title and not is_metadata:
-                # Nuevo título encontrado: guardar poema anterior si existe
-                if current_poem_lines and len(current_poem_lines) >= 3:
-                    poem = '\n'.join(current_poem_lines).strip()
-                    if self._is_valid_poem(poem):
-                        poems.append(poem)
-                
-                # Iniciar nuevo poema
-                current_poem_title = line
-                current_poem_lines = []
-                empty_line_count = 0
-                i += 1
-                continue
-            
-            elif is_year or is_metadata:
-                # Año o metadata: ignorar y continuar
-                i += 1
-                continue
-            
-            elif not line:
-                # Línea vacía
-                empty_line_count += 1
-                
-                # Si hay muchas líneas vacías consecutivas (3+), verificar si es fin de poema
-                if empty_line_count >= 3:
-                    # Mirar adelante para ver si hay un año o título (fin de poema)
-                    # o si continúa el contenido (parte del poema)
-                    look_ahead = 5
-                    found_year_or_title = False
-                    
-                    for j in range(i + 1, min(i + 1 + look_ahead, len(lines))):
-                        next_line = lines[j].strip()
-                        if not next_line:
-                            continue
-                        
-                        # Verificar si es año o título
-                        is_next_year = re.match(r'^\d{4}\s*[\(\)\?]*\s*$', next_line)
-                        is_next_title = (
-                            next_line and
-                            len(next_line) < 100 and 
-                            next_line.isupper() and 
-                            not next_line.endswith(',') and
-                            not next_line.endswith('.') and
-                            not next_line.endswith(';') and
-                            not next_line.endswith(':') and
-                            len(next_line.split()) < 15 and
-                            not re.match(r'^\d{4}', next_line) and
-                            not self._is_metadata_line(next_line)
-                        )
-                        
-                        if is_next_year or is_next_title:
-                            found_year_or_title = True
-                            break
-                        
-                        # Si encontramos contenido de poema, no es el fin
-                        if next_line and not self._is_metadata_line(next_line):
-                            # Es contenido, no cerrar el poema
-                            found_year_or_title = False
-                            break
-                    
-                    # Solo cerrar si encontramos año o título adelante
-                    if found_year_or_title:
-                        # Guardar poema actual si tiene contenido
-                        if current_poem_lines and len(current_poem_lines) >= 3:
-                            poem = '\n'.join(current_poem_lines).strip()
-                            if self._is_valid_poem(poem):
-                                poems.append(poem)
-                        current_poem_lines = []
-                        current_poem_title = None
-                        empty_line_count = 0
-                    # Si no, es parte del poema (muchas líneas vacías entre estrofas)
-                    elif current_poem_lines:
-                        # Agregar líneas vacías para preservar estructura
-                        for _ in range(min(empty_line_count, 2)):
-                            current_poem_lines.append('')
-                        empty_line_count = 0
-                # Si es solo 1-2 líneas vacías, es parte del poema (separador de estrofa)
-                elif empty_line_count <= 2 and current_poem_lines:
-                    # Agregar línea vacía para preservar estructura
-                    current_poem_lines.append('')
-                i += 1
-                continue
-            
-            else:
-                # Línea de contenido: agregar al poema actual
-                empty_line_count = 0
-                current_poem_lines.append(line)
-                i += 1
-        
-        # Guardar último poema si existe
-        if current_poem_lines and len(current_poem_lines) >= 3:
-            poem = '\n'.join(current_poem_lines).strip()
-            if self._is_valid_poem(poem):
-                poems.append(poem)
-        
-        # Eliminar duplicados y limpiar
-        unique_poems = []
-        seen = set()
-        for poem in poems:
-            # Normalizar para comparación
-            poem_normalized = re.sub(r'\s+', ' ', poem.lower())[:300]
-            if poem_normalized not in seen:
-                seen.add(poem_normalized)
-                unique_poems.append(poem)
-        
-        return unique_poems
-    
-    def _is_metadata_line(self, line: str) -> bool:
-        """Detecta si una línea es metadatos"""
-        line_lower = line.lower()
-        metadata_patterns = [
-            r'^(prólogo|prologo|prefacio|preface|dedicatoria|dedication)',
-            r'^(traductor|translator|autor|author|editor|publisher)',
-            r'^\d{4}\s*\.?\s*$',  # Años solos
-            r'^(parte|part|capítulo|chapter)\s+\d+',
-            r'^(índice|index|tabla de contenidos)',
-            r'^al (lector|reader)',
-            r'^(con los sentimientos|dedico|dedica)',
-            r'^(charles|baudelaire|neruda|whitman|rilke|rimbaud)',
+        # Segmentación en una pasada: los títulos abren poema, las estrofas se conservan
+        return [
+            span.text for span in PoemSegmenter(TRAINING_RULES).iter_spans(content)
+            if PoetryTrainer._is_valid_poem(span.text)
         ]
-        for pattern in metadata_patterns:
-            if re.match(pattern, line_lower):
-                return True
-        return False
     
-    def _is_valid_poem(self, poem: str) -> bool:
+    @staticmethod
+    def _is_valid_poem(poem: str) -> bool:
         """Valida si un texto es un poema válido"""
         if len(poem) < 50:  # Muy corto
             return False
@@ -333,128 +295,21 @@ class PoetryTrainer:
         """
         print("Preparando dataset...")
         
-        # Si include_directives, crear ejemplos con formato de directrices
         if include_directives:
-            from .poetry_agent import PoetryAgent
-            import random
-            agent = PoetryAgent()
-            formatted_poems = []
-            
+            # Formato puro (sin agente ni red): se aplica dentro del map, en paralelo
             print("  Agregando formato con directrices para entrenar seguimiento de instrucciones...")
-            
-            # Palabras clave comunes en poesía para detectar temas
-            emotion_keywords = ['triste', 'alegre', 'melancólico', 'nostálgico', 'amoroso', 'oscuro', 'sereno']
-            style_keywords = ['soneto', 'haiku', 'verso libre', 'romántico', 'moderno']
-            
-            for poem in poems:
-                # Extraer conceptos y características del poema
-                lines = poem.split('\n')
-                poem_lower = poem.lower()
-                
-                # Detectar concepto principal (primeras palabras significativas)
-                first_line = lines[0].strip() if lines else ""
-                concept = None
-                
-                # Estrategia 1: Si la primera línea es corta, es probablemente un título/concepto
-                if first_line and len(first_line.split()) <= 5 and len(first_line) < 50:
-                    concept = first_line
-                else:
-                    # Estrategia 2: Extraer palabras clave del poema
-                    words = poem.split()[:5]
-                    # Filtrar palabras comunes
-                    stop_words = {'el', 'la', 'los', 'las', 'un', 'una', 'de', 'del', 'en', 'y', 'que', 'a'}
-                    meaningful_words = [w for w in words if w.lower() not in stop_words and len(w) > 3]
-                    if meaningful_words:
-                        concept = ' '.join(meaningful_words[:2])  # Tomar 1-2 palabras significativas
-                
-                if not concept:
-                    # Fallback: usar primeras palabras
-                    words = poem.split()[:3]
-                    concept = ' '.join(words) if words else "poesía"
-                
-                # Detectar características del poema
-                detected_emotion = None
-                detected_style = None
-                
-                for emotion in emotion_keywords:
-                    if emotion in poem_lower:
-                        detected_emotion = emotion
-                        break
-                
-                for style in style_keywords:
-                    if style in poem_lower:
-                        detected_style = style
-                        break
-                
-                # Crear múltiples variantes de formato de instrucción
-                variants = []
-                
-                # Variante 1: Simple
-                variants.append(f"Tema: {concept}\n\nPoema sobre {concept}:\n\n{poem}")
-                
-                # Variante 2: Con instrucción explícita
-                variants.append(f"Escribe un poema sobre {concept}:\n\n{poem}")
-                
-                # Variante 3: Con formato estructurado
-                if detected_emotion:
-                    variants.append(f"Tema: {concept}\nTono: {detected_emotion}\n\nPoema sobre {concept}:\n\n{poem}")
-                
-                if detected_style:
-                    variants.append(f"Tema: {concept}\nEstilo: {detected_style}\n\nPoema sobre {concept}:\n\n{poem}")
-                
-                # Variante 4: Instrucción en lenguaje natural
-                instruction = f"escribe un poema sobre {concept}"
-                if detected_emotion:
-                    instruction += f" {detected_emotion}"
-                variants.append(f"Instrucción: {instruction}\n\nPoema:\n\n{poem}")
-                
-                # Seleccionar una variante aleatoria
-                formatted_poems.append(random.choice(variants))
-            
-            # Mezclar: 80% con directrices, 20% sin directrices (para mantener flexibilidad)
-            mixed_poems = []
-            for i, poem in enumerate(poems):
-                if i < len(formatted_poems):
-                    # 80% con formato de instrucciones, 20% sin formato
-                    if random.random() < 0.8:
-                        mixed_poems.append(formatted_poems[i])
-                    else:
-                        mixed_poems.append(poem)
-                else:
-                    mixed_poems.append(poem)
-            
-            poems = mixed_poems
-            print(f"  ✓ Dataset preparado con formato de instrucciones (80% con formato, 20% sin formato)")
-            print(f"  ✓ Variantes de formato: simple, estructurado, lenguaje natural")
-        
-        # Tokenizar todas las poesías
-        def tokenize_function(examples):
-            # Agregar token de fin de texto al final de cada poema
-            texts = [poem + self.tokenizer.eos_token for poem in examples['text']]
-            
-            # Tokenizar
-            tokenized = self.tokenizer(
-                texts,
-                truncation=True,
-                max_length=self.max_length,
-                padding='max_length',
-                return_tensors='pt'
-            )
-            
-            # Los labels son iguales a los input_ids (para language modeling)
-            tokenized['labels'] = tokenized['input_ids'].clone()
-            
-            return tokenized
-        
-        # Crear dataset
-        dataset_dict = {'text': poems}
-        dataset = Dataset.from_dict(dataset_dict)
-        
-        # Tokenizar
-        tokenized_dataset = dataset.map(
-            tokenize_function,
-            batched=True,
-            remove_columns=['text']
+            print(f"  ✓ {DIRECTIVE_RATIO:.0%} con formato de instrucciones; variantes: simple, estructurado, lenguaje natural")
+        
+        # Tokenizar sin padding (o cargar de la caché si ya se tokenizó lo mismo)
+        tokenized_dataset = load_or_tokenize(
+            poems,
+            self.tokenizer,
+            self.max_length,
+            pack=self.pack,
+            cache_dir=self.token_cache_dir,
+            # Semilla fija: los mismos poemas dan los mismos ejemplos (y aciertan en la caché tokenizada)
+            directive_seed=self.seed if include_directives else None,
+            num_proc=self.num_proc
         )
         
         print(f"✓ Dataset preparado: {len(tokenized_dataset)} ejemplos")
@@ -467,107 +322,249 @@ class PoetryTrainer:
         batch_size: int = 4,
         learning_rate: float = 5e-5,
         save_steps: int = 500,
-        eval_steps: Optional[int] = None
-    ):
+        eval_steps: Optional[int] = None,
+        resume: bool = True,
+        eval_dataset: Optional[Dataset] = None,
+        gradient_accumulation_steps: int = 1,
+        max_steps: Optional[int] = None
+    ) -> bool:
         """
         Entrena el modelo
         
         Args:
-            dataset: Dataset preparado
+            dataset: Dataset preparado (o StreamingPoemDataset, que requiere max_steps)
             num_epochs: Número de épocas
             batch_size: Tamaño del batch
             learning_rate: Tasa de aprendizaje
             save_steps: Guardar cada N pasos
-            eval_steps: Evaluar cada N pasos (opcional)
+            eval_steps: Evaluar cada N pasos (None = al final de cada época)
+            resume: Si True, continúa desde el último checkpoint-* de output_dir
+            eval_dataset: Conjunto de validación (la pérdida se registra como eval_loss)
+            gradient_accumulation_steps: Acumular gradientes de N batches (batch efectivo = N * batch_size)
+            max_steps: Pasos totales (obligatorio en streaming; None = según num_epochs)
+            
+        Returns:
+            True si terminó, False si se canceló (queda un checkpoint para reanudar)
         """
         print(f"\n{'='*60}")
         print("INICIANDO ENTRENAMIENTO")
         print(f"{'='*60}")
         print(f"Épocas: {num_epochs}")
         print(f"Batch size: {batch_size}")
+        if gradient_accumulation_steps > 1:
+            print(f"Acumulación de gradientes: {gradient_accumulation_steps} (batch efectivo: {batch_size * gradient_accumulation_steps})")
         print(f"Learning rate: {learning_rate}")
-        print(f"Ejemplos: {len(dataset)}")
+        streaming = isinstance(dataset, StreamingPoemDataset)
+        print(f"Ejemplos: {'streaming' if streaming else len(dataset)}")
+        if max_steps:
+            print(f"Pasos: {max_steps}")
+        if eval_dataset is not None:
+            print(f"Validación: {len(eval_dataset)}")
         print(f"{'='*60}\n")
         
         # Crear directorio de salida
         os.makedirs(self.output_dir, exist_ok=True)
         
+        cpu_arguments = self.cpu_profile.training_arguments() if self.cpu_profile else {}
+        if streaming:
+            # Los workers deben recrearse en cada época para ver la nueva semilla de barajado
+            cpu_arguments.pop("dataloader_persistent_workers", None)
+            # Se tokeniza dentro de los workers: sin hilos propios del tokenizer
+            os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        
         # Configurar argumentos de entrenamiento
         training_args = TrainingArguments(
             output_dir=self.output_dir,
             overwrite_output_dir=True,
             num_train_epochs=num_epochs,
+            max_steps=max_steps or -1,
             per_device_train_batch_size=batch_size,
             per_device_eval_batch_size=batch_size,
+            gradient_accumulation_steps=gradient_accumulation_steps,
             learning_rate=learning_rate,
             warmup_steps=100,
-            logging_steps=50,
+            # Logs frecuentes: cada uno es un punto de las curvas en vivo del panel
+            logging_steps=10,
             save_steps=save_steps,
             eval_steps=eval_steps,
+            **{EVAL_STRATEGY_ARG: ("steps" if eval_steps else "epoch") if eval_dataset is not None else "no"},
             save_total_limit=3,
             prediction_loss_only=True,
             remove_unused_columns=False,
             fp16=torch.cuda.is_available(),  # Usar FP16 si hay GPU
             dataloader_pin_memory=False,
+            # En CPU: workers del DataLoader, bf16 y DDP con gloo (torchrun)
+            **cpu_arguments,
+            # Batches de poemas de longitud parecida: menos relleno con padding dinámico
+            group_by_length=not self.pack and not streaming and "length" in dataset.column_names,
+            length_column_name="length",
         )
         
-        # Data collator
-        data_collator = DataCollatorForLanguageModeling(
-            tokenizer=self.tokenizer,
-            mlm=False,  # No masked language modeling, solo causal LM
+        # Padding dinámico por batch (causal LM, labels = input_ids sin el relleno)
+        data_collator = DynamicPaddingCollator(
+            pad_token_id=self.tokenizer.pad_token_id,
+            pad_to_multiple_of=8 if torch.cuda.is_available() else None
         )
         
-        # Crear trainer
-        trainer = Trainer(
+        # Cancelación cooperativa: se detiene al terminar un paso si el estado dice "cancelled"
+        callbacks = []
+        cancellation = None
+        if self.status_file:
+            cancellation = CancellationCallback(self.status_file)
+            callbacks.append(cancellation)
+        token_counter = None
+        if self.metrics_buffer is not None:
+            token_counter = TrainingTokenCounter(self.model)
+            callbacks.append(MetricsCallback(self.metrics_buffer, token_counter))
+        
+        # Crear trainer (al destilar, la pérdida incluye los logits del profesor)
+        trainer_kwargs = dict(
             model=self.model,
             args=training_args,
             data_collator=data_collator,
             train_dataset=dataset,
+            eval_dataset=eval_dataset,
+            callbacks=callbacks,
         )
+        if self.teacher is not None:
+            trainer = DistillationTrainer(
+                teacher_model=self.teacher,
+                alpha=self.distill_alpha,
+                temperature=self.distill_temperature,
+                **trainer_kwargs
+            )
+        else:
+            trainer = Trainer(**trainer_kwargs)
+        
+        # Reanudar desde el último checkpoint (entrenamiento cancelado, caído o reiniciado).
+        # El dataset es el mismo: formato determinista y caché tokenizada
+        checkpoint = find_latest_checkpoint(self.output_dir) if resume else None
+        if checkpoint:
+            print(f"Reanudando desde {checkpoint}")
         
         # Entrenar
         print("Iniciando entrenamiento...")
-        trainer.train()
+        try:
+            result = trainer.train(resume_from_checkpoint=checkpoint)
+        finally:
+            if token_counter is not None:
+                token_counter.remove()
+        self.train_metrics = result.metrics
+        
+        if cancellation is not None and cancellation.cancelled:
+            print(f"\n⚠ Entrenamiento cancelado en el paso {trainer.state.global_step}")
+            print(f"  Checkpoint guardado en {self.output_dir}; se reanudará desde ahí")
+            return False
+        
+        # Con torchrun solo el proceso principal guarda
+        if not trainer.is_world_process_zero():
+            return True
         
-        # Guardar modelo final
-        print(f"\nGuardando modelo en {self.output_dir}...")
+        # Guardar modelo final (en modo LoRA, solo el adaptador)
+        print(f"\nGuardando {'adaptador LoRA' if self.lora else 'modelo'} en {self.output_dir}...")
         trainer.save_model()
         self.tokenizer.save_pretrained(self.output_dir)
+        if self.teacher is not None:
+            self._save_distillation_info()
+        self._register_in_catalog()
+        
+        # Los checkpoints solo sirven para reanudar: un entrenamiento terminado no los necesita
+        # (y un checkpoint final haría que el siguiente entrenamiento "reanudara" uno acabado)
+        remove_checkpoints(self.output_dir)
         
         print(f"\n✓ Entrenamiento completado!")
         print(f"✓ Modelo guardado en: {self.output_dir}")
+        return True
+    
+    def _register_in_catalog(self):
+        """Registra el modelo guardado en el catálogo local (lo resuelven los workers sin buscarlo)"""
+        kind = "lora" if self.lora else "distilled" if self.teacher is not None else "full"
+        try:
+            get_catalog().register(
+                os.path.basename(os.path.normpath(self.output_dir)),
+                self.output_dir,
+                kind=kind,
+                base_model=self.base_model
+            )
+        except OSError as e:
+            print(f"⚠ No se pudo registrar el modelo en el catálogo: {e}")
+    
+    def _save_distillation_info(self):
+        """Guarda junto al alumno de qué profesor viene y con qué parámetros"""
+        info = {
+            "teacher": self.base_model,
+            "teacher_layers": self.teacher.config.n_layer,
+            "student_layers": self.model.config.n_layer,
+            "student_heads": self.model.config.n_head,
+            "alpha": self.distill_alpha,
+            "temperature": self.distill_temperature,
+        }
+        with open(os.path.join(self.output_dir, "distillation.json"), 'w', encoding='utf-8') as f:
+            json.dump(info, f, ensure_ascii=False, indent=2)
+    
+    @staticmethod
+    def load_poems(poems_file: str) -> List[str]:
+        """
+        Carga poesías de un archivo o de varios separados por comas
+        
+        Args:
+            poems_file: Archivo con poesías (o lista separada por comas; un directorio aporta sus *.txt)
+            
+        Returns:
+            Lista de poesías
+        """
+        if ',' not in poems_file and not os.path.isdir(poems_file):
+            return PoetryTrainer.load_poems_from_file(poems_file)
+        
+        # Varios archivos (los que no existen se avisan y se omiten): combinarlos
+        file_list = expand_poem_files(poems_file)
+        print(f"Cargando poemas de {len(file_list)} archivos...")
+        all_poems = []
+        for file_path in file_list:
+            poems = PoetryTrainer.load_poems_from_file(file_path)
+            all_poems.extend(poems)
+            print(f"  ✓ {len(poems)} poemas de {file_path}")
+        return all_poems
     
     def train_from_file(
         self,
         poems_file: str,
         num_epochs: int = 5,
         batch_size: int = 4,
-        learning_rate: float = 5e-5
-    ):
+        learning_rate: float = 5e-5,
+        resume: bool = True,
+        evaluate: bool = True,
+        gradient_accumulation_steps: int = 1,
+        streaming: bool = False
+    ) -> bool:
         """
         Entrena desde un archivo de poesías (método de conveniencia)
         
+        Un conjunto de validación determinista (HELD_OUT_FRACTION de los poemas)
+        queda fuera del entrenamiento; al terminar se evalúa el modelo y se
+        guarda el informe en `evaluation.json` junto a él.
+        
         Args:
             poems_file: Archivo con poesías (puede ser una lista de archivos separados por comas)
             num_epochs: Número de épocas
             batch_size: Tamaño del batch
             learning_rate: Tasa de aprendizaje
+            resume: Si True, continúa desde el último checkpoint-* de output_dir
+            evaluate: Si True, evalúa el modelo al terminar (perplejidad y batería de directrices)
+            gradient_accumulation_steps: Acumular gradientes de N batches
+            streaming: Si True, lee los poemas en streaming (ver train_streaming)
+            
+        Returns:
+            True si terminó, False si se canceló
         """
-        # Si hay múltiples archivos separados por comas, combinarlos
-        if ',' in poems_file:
-            file_list = [f.strip() for f in poems_file.split(',')]
-            print(f"Cargando poemas de {len(file_list)} archivos...")
-            all_poems = []
-            for file_path in file_list:
-                if os.path.exists(file_path):
-                    poems = self.load_poems_from_file(file_path)
-                    all_poems.extend(poems)
-                    print(f"  ✓ {len(poems)} poemas de {file_path}")
-                else:
-                    print(f"  ⚠ Archivo no encontrado: {file_path}")
-            poems = all_poems
-        else:
-            poems = self.load_poems_from_file(poems_file)
+        if streaming:
+            return self.train_streaming(
+                poems_file, num_epochs, batch_size, learning_rate,
+                resume=resume, evaluate=evaluate,
+                gradient_accumulation_steps=gradient_accumulation_steps
+            )
+        
+        poems = self.load_poems(poems_file)
         
         if len(poems) < 10:
             print("⚠ Advertencia: Muy pocas poesías. Se recomiendan al menos 50-100 para un buen entrenamiento.")
@@ -576,8 +573,123 @@ class PoetryTrainer:
         else:
             print(f"✓ Dataset con {len(poems)} poemas - tamaño adecuado")
         
-        dataset = self.prepare_dataset(poems)
-        self.train(dataset, num_epochs, batch_size, learning_rate)
+        # Validación determinista (hash de cada poema): la misma en cada reanudación y reentrenamiento
+        train_poems, held_out = split_held_out(poems)
+        if not train_poems:
+            train_poems, held_out = poems, []
+        print(f"  Validación: {len(held_out)} poemas ({HELD_OUT_FRACTION:.0%}) fuera del entrenamiento")
+        
+        dataset = self.prepare_dataset(train_poems)
+        eval_dataset = self.prepare_dataset(held_out) if held_out else None
+        
+        # Cancelado mientras se preparaban los datos
+        if self.status_file and is_cancel_requested(self.status_file):
+            print("⚠ Entrenamiento cancelado antes de empezar")
+            return False
+        
+        completed = self.train(
+            dataset, num_epochs, batch_size, learning_rate,
+            resume=resume, eval_dataset=eval_dataset,
+            gradient_accumulation_steps=gradient_accumulation_steps
+        )
+        
+        if completed and evaluate:
+            self._evaluate(poems)
+        
+        return completed
+    
+    def _evaluate(self, poems: List[str]):
+        """Evalúa el modelo guardado (solo el proceso principal) y escribe evaluation.json"""
+        if not is_main_process():
+            return
+        print("\nEvaluando el modelo...")
+        try:
+            report = evaluate_model(self.output_dir, poems, max_length=self.max_length)
+            held_out_report = report.get("held_out") or {}
+            suite = report.get("directive_suite") or {}
+            print(f"✓ Perplejidad (validación): {held_out_report.get('perplexity')}")
+            print(f"✓ Acierto del concepto: {suite.get('concept_hit_rate')}")
+        except Exception as e:
+            # El modelo ya está guardado: un fallo al evaluar no invalida el entrenamiento
+            print(f"⚠ Error al evaluar el modelo: {e}")
+    
+    def train_streaming(
+        self,
+        poems_file: str,
+        num_epochs: int = 5,
+        batch_size: int = 4,
+        learning_rate: float = 5e-5,
+        resume: bool = True,
+        evaluate: bool = True,
+        gradient_accumulation_steps: int = 1,
+        max_steps: Optional[int] = None,
+        shuffle_buffer: int = DEFAULT_SHUFFLE_BUFFER,
+        save_steps: int = 500
+    ) -> bool:
+        """
+        Entrena leyendo los poemas en streaming (memoria constante con corpus de varios GB)
+        
+        Args:
+            poems_file: Archivos separados por comas; un directorio aporta todos sus *.txt
+            num_epochs: Pasadas por el corpus (solo se usa para calcular max_steps)
+            batch_size: Tamaño del batch
+            learning_rate: Tasa de aprendizaje
+            resume: Si True, continúa desde el último checkpoint-* de output_dir
+            evaluate: Si True, evalúa el modelo al terminar
+            gradient_accumulation_steps: Acumular gradientes de N batches
+            max_steps: Pasos totales (None = contar los poemas en una pasada previa)
+            shuffle_buffer: Poemas del buffer de barajado
+            save_steps: Guardar (y evaluar la validación) cada N pasos
+            
+        Returns:
+            True si terminó, False si se canceló
+        """
+        files = expand_poem_files(poems_file)
+        if not files:
+            raise FileNotFoundError(f"No se encontraron archivos de poemas en {poems_file}")
+        print(f"Streaming de {len(files)} archivos (buffer de barajado: {shuffle_buffer} poemas)")
+        if self.pack:
+            print("⚠ El empaquetado no está disponible en streaming: se entrena un poema por secuencia")
+        
+        if max_steps is None:
+            # Una pasada sin retener los poemas: solo para saber cuántos pasos son num_epochs
+            print("Contando poemas (una pasada por el corpus)...")
+            count = count_training_poems(files)
+            world_size = int(os.getenv("WORLD_SIZE", "1"))
+            max_steps = max(1, math.ceil(count * num_epochs / (batch_size * gradient_accumulation_steps * world_size)))
+            print(f"✓ {count} poemas de entrenamiento -> {max_steps} pasos para {num_epochs} épocas")
+        
+        dataset = StreamingPoemDataset(
+            files,
+            self.tokenizer,
+            self.max_length,
+            directive_seed=self.seed,
+            buffer_size=shuffle_buffer,
+            seed=self.seed
+        )
+        # Validación: los primeros poemas del conjunto determinista (cabe en memoria)
+        held_out = collect_held_out(files)
+        eval_dataset = self.prepare_dataset(held_out) if held_out else None
+        print(f"  Validación: {len(held_out)} poemas fuera del entrenamiento")
+        
+        if self.status_file and is_cancel_requested(self.status_file):
+            print("⚠ Entrenamiento cancelado antes de empezar")
+            return False
+        
+        completed = self.train(
+            dataset, num_epochs, batch_size, learning_rate,
+            save_steps=save_steps,
+            eval_steps=save_steps,
+            resume=resume,
+            eval_dataset=eval_dataset,
+            gradient_accumulation_steps=gradient_accumulation_steps,
+            max_steps=max_steps
+        )
+        
+        if completed and evaluate:
+            self._evaluate(held_out)
+        
+        return completed
 
 
 def main():
@@ -585,9 +697,10 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='Entrenar modelo de poesía')
-    parser.add_argument('poems_file', help='Archivo con poesías (formato texto)')
-    parser.add_argument('-o', '--output', default='models/poetry_model',
-                       help='Directorio de salida (default: models/poetry_model)')
+    parser.add_argument('poems_file',
+                       help='Archivo con poesías (formato texto); varios separados por comas, o un directorio con *.txt')
+    parser.add_argument('-o', '--output', default=None,
+                       help='Directorio de salida (default: models/poetry_model, o <modelo>-distilled al destilar)')
     parser.add_argument('-b', '--base-model', default=None,
                        help='Modelo base (default: intenta usar modelo en español, luego gpt2)')
     parser.add_argument('-e', '--epochs', type=int, default=5,
@@ -598,24 +711,95 @@ def main():
                        help='Tasa de aprendizaje (default: 5e-5)')
     parser.add_argument('--max-length', type=int, default=512,
                        help='Longitud máxima de secuencia (default: 512)')
+    parser.add_argument('--pack', action='store_true',
+                       help='Empaquetar varios poemas cortos en cada secuencia')
+    parser.add_argument('--no-token-cache', action='store_true',
+                       help='Tokenizar siempre, sin usar la caché de datasets tokenizados')
+    parser.add_argument('--lora', action='store_true',
+                       help='Entrenar solo un adaptador LoRA (más rápido, guarda unos MB)')
+    parser.add_argument('--lora-r', type=int, default=DEFAULT_LORA_R,
+                       help=f'Rango de LoRA (default: {DEFAULT_LORA_R})')
+    parser.add_argument('--lora-alpha', type=int, default=DEFAULT_LORA_ALPHA,
+                       help=f'Alpha de LoRA (default: {DEFAULT_LORA_ALPHA})')
+    parser.add_argument('--distill-from', default=None,
+                       help='Destilar este modelo afinado en un alumno más pequeño (salida: <modelo>-distilled)')
+    parser.add_argument('--student-layers', type=int, default=None,
+                       help='Capas del alumno al destilar (default: la mitad del profesor)')
+    parser.add_argument('--student-heads', type=int, default=None,
+                       help='Cabezas de atención del alumno (default: las del profesor)')
+    parser.add_argument('--grad-accum', type=int, default=1,
+                       help='Acumular gradientes de N batches para emular batches mayores (default: 1)')
+    parser.add_argument('--threads', type=int, default=None,
+                       help='CPU: hilos de torch por proceso (default: núcleos / procesos locales)')
+    parser.add_argument('--dataloader-workers', type=int, default=None,
+                       help='CPU: procesos del DataLoader (default: 1 cada 8 núcleos, máx. 2)')
+    parser.add_argument('--bf16', action='store_true',
+                       help='CPU: autocast a bf16 (si la CPU tiene instrucciones bf16)')
+    parser.add_argument('--streaming', action='store_true',
+                       help='Leer los poemas en streaming (corpus mayores que la memoria; admite directorios)')
+    parser.add_argument('--shuffle-buffer', type=int, default=DEFAULT_SHUFFLE_BUFFER,
+                       help=f'Streaming: poemas del buffer de barajado (default: {DEFAULT_SHUFFLE_BUFFER})')
+    parser.add_argument('--max-steps', type=int, default=None,
+                       help='Streaming: pasos totales (default: contar los poemas y usar --epochs)')
+    parser.add_argument('--no-eval', action='store_true',
+                       help='No evaluar el modelo al terminar (perplejidad y batería de directrices)')
+    parser.add_argument('--no-resume', action='store_true',
+                       help='Empezar de cero aunque haya checkpoints en el directorio de salida')
+    parser.add_argument('--num-proc', type=int, default=None,
+                       help='Procesos para formatear y tokenizar (default: todos los núcleos)')
     
     args = parser.parse_args()
     
-    if not os.path.exists(args.poems_file):
-        print(f"Error: El archivo {args.poems_file} no existe")
-        return
+    # Acepta la misma lista que --streaming y load_poems (comas y directorios)
+    if not expand_poem_files(args.poems_file):
+        parser.error(f"no se encontraron archivos de poemas en {args.poems_file}")
+    
+    output_dir = args.output
+    if output_dir is None:
+        output_dir = distilled_output_dir(args.distill_from) if args.distill_from else 'models/poetry_model'
     
     trainer = PoetryTrainer(
         base_model=args.base_model,
-        output_dir=args.output,
-        max_length=args.max_length
+        output_dir=output_dir,
+        max_length=args.max_length,
+        pack=args.pack,
+        token_cache_dir=None if args.no_token_cache else DEFAULT_TOKEN_CACHE_DIR,
+        num_proc=args.num_proc,
+        lora=args.lora,
+        lora_r=args.lora_r,
+        lora_alpha=args.lora_alpha,
+        distill_from=args.distill_from,
+        student_layers=args.student_layers,
+        student_heads=args.student_heads,
+        cpu_profile=CPUTrainingProfile.from_env(
+            num_threads=args.threads,
+            dataloader_workers=args.dataloader_workers,
+            bf16=args.bf16 or None
+        )
     )
     
+    if args.streaming:
+        trainer.train_streaming(
+            poems_file=args.poems_file,
+            num_epochs=args.epochs,
+            batch_size=args.batch_size,
+            learning_rate=args.learning_rate,
+            resume=not args.no_resume,
+            evaluate=not args.no_eval,
+            gradient_accumulation_steps=args.grad_accum,
+            max_steps=args.max_steps,
+            shuffle_buffer=args.shuffle_buffer
+        )
+        return
+    
     trainer.train_from_file(
         poems_file=args.poems_file,
         num_epochs=args.epochs,
         batch_size=args.batch_size,
-        learning_rate=args.learning_rate
+        learning_rate=args.learning_rate,
+        resume=not args.no_resume,
+        evaluate=not args.no_eval,
+        gradient_accumulation_steps=args.grad_accum
     )
 
 
@@ -0,0 +1,176 @@
+"""
+Callbacks del Trainer
+
+- CancellationCallback: consulta el archivo de estado del entrenamiento y, si
+  alguien lo marcó como "cancelled", guarda un checkpoint y detiene el
+  entrenamiento al terminar el paso en curso.
+- MetricsCallback: un punto de métricas (loss, throughput, ETA, memoria) por
+  cada log del Trainer (y la pérdida de validación en cada evaluación), en un
+  MetricsBuffer que lee el panel.
+- TrainingTokenCounter: tokens reales que entran al modelo, para los tokens/s.
+"""
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import torch
+from transformers import TrainerCallback
+
+from .training_metrics import process_memory_mb
+from .training_state import is_cancel_requested
+
+
+class CancellationCallback(TrainerCallback):
+    """
+    Detiene el entrenamiento en el límite de un paso cuando el archivo de estado
+    dice "cancelled". El archivo se lee como mucho una vez cada `poll_interval`
+    segundos; al cancelar se fuerza un checkpoint para poder reanudar después.
+    """
+
+    def __init__(self, status_file: Path, poll_interval: float = 2.0):
+        self.status_file = Path(status_file)
+        self.poll_interval = poll_interval
+        self.cancelled = False
+        self._last_poll = 0.0
+
+    def _check(self, control, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return control
+        self._last_poll = now
+        if is_cancel_requested(self.status_file):
+            self.cancelled = True
+            control.should_save = True
+            control.should_training_stop = True
+        return control
+
+    def on_step_end(self, args, state, control, **kwargs):
+        return self._check(control)
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        return self._check(control, force=True)
+
+
+class MetricsCallback(TrainerCallback):
+    """
+    Registra en un MetricsBuffer un punto por cada log del Trainer: paso, época,
+    loss, learning rate, ejemplos/s y tokens/s desde el punto anterior, ETA y
+    memoria del proceso (y de la GPU si se usa).
+    """
+
+    def __init__(self, buffer, token_counter: Optional[Callable[[], int]] = None):
+        """
+        Args:
+            buffer: MetricsBuffer donde se añaden los puntos
+            token_counter: Devuelve los tokens reales (sin relleno) procesados hasta ahora
+        """
+        self.buffer = buffer
+        self.token_counter = token_counter
+        self._start_time = self._last_time = 0.0
+        self._start_step = self._last_step = 0
+        self._last_tokens = 0
+
+    def _tokens(self) -> int:
+        return self.token_counter() if self.token_counter else 0
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._start_time = self._last_time = time.monotonic()
+        # Al reanudar, global_step no empieza en 0
+        self._start_step = self._last_step = state.global_step
+        self._last_tokens = self._tokens()
+        self.buffer.append({
+            "event": "train_begin",
+            "step": state.global_step,
+            "max_steps": state.max_steps,
+            "epoch": state.epoch or 0.0,
+            "memory_mb": process_memory_mb(),
+        })
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        logs = logs or {}
+        if "eval_loss" in logs:
+            # Evaluación sobre la validación: su tiempo no cuenta para el throughput
+            self._last_time += logs.get("eval_runtime", 0.0)
+            self.buffer.append({
+                "event": "eval",
+                "step": state.global_step,
+                "max_steps": state.max_steps,
+                "epoch": round(state.epoch or 0.0, 4),
+                "eval_loss": logs["eval_loss"],
+                "memory_mb": process_memory_mb(),
+            })
+            return
+        now = time.monotonic()
+        elapsed = now - self._last_time
+        steps = state.global_step - self._last_step
+        tokens = self._tokens()
+
+        samples_per_step = args.train_batch_size * args.gradient_accumulation_steps * args.world_size
+        samples_per_sec = steps * samples_per_step / elapsed if elapsed > 0 and steps > 0 else None
+        tokens_per_sec = (tokens - self._last_tokens) / elapsed if elapsed > 0 and self.token_counter else None
+
+        # ETA con la velocidad media desde el inicio (más estable que la del último intervalo)
+        done = state.global_step - self._start_step
+        eta = None
+        if done > 0 and state.max_steps:
+            eta = (now - self._start_time) / done * max(0, state.max_steps - state.global_step)
+
+        point = {
+            "event": "log",
+            "step": state.global_step,
+            "max_steps": state.max_steps,
+            "epoch": round(state.epoch or 0.0, 4),
+            "loss": logs.get("loss", logs.get("train_loss")),
+            "learning_rate": logs.get("learning_rate"),
+            "samples_per_sec": round(samples_per_sec, 3) if samples_per_sec is not None else None,
+            "tokens_per_sec": round(tokens_per_sec, 1) if tokens_per_sec is not None else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "memory_mb": process_memory_mb(),
+        }
+        if torch.cuda.is_available():
+            point["gpu_memory_mb"] = round(torch.cuda.memory_allocated() / (1024 * 1024), 1)
+        self.buffer.append(point)
+
+        self._last_time, self._last_step, self._last_tokens = now, state.global_step, tokens
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self.buffer.append({
+            "event": "train_end",
+            "step": state.global_step,
+            "max_steps": state.max_steps,
+            "epoch": round(state.epoch or 0.0, 4),
+            "memory_mb": process_memory_mb(),
+        })
+
+
+class TrainingTokenCounter:
+    """
+    Cuenta los tokens reales (sin relleno) que entran al modelo al entrenar,
+    sumando la `attention_mask` de cada forward en modo entrenamiento.
+
+    Se engancha al modelo en el proceso principal: con dataloader_num_workers > 0
+    el collator corre en los workers del DataLoader y lo que cuente allí no llega
+    aquí. Llamarlo devuelve el total (para MetricsCallback).
+    """
+
+    def __init__(self, model):
+        self._total = 0
+        self._handle = model.register_forward_pre_hook(self._count, with_kwargs=True)
+
+    def _count(self, module, args, kwargs):
+        if not module.training:
+            return
+        mask = kwargs.get("attention_mask")
+        if mask is not None:
+            # Suma en el dispositivo: sin sincronizar la GPU en cada paso
+            self._total = self._total + mask.sum()
+            return
+        input_ids = kwargs.get("input_ids", args[0] if args else None)
+        if input_ids is not None:
+            self._total += input_ids.numel()
+
+    def __call__(self) -> int:
+        return int(self._total)
+
+    def remove(self):
+        self._handle.remove()
@@ -0,0 +1,228 @@
+"""
+Datos de entrenamiento tokenizados: caché en disco (Arrow), empaquetado y padding dinámico
+
+- La tokenización se guarda con `Dataset.save_to_disk` y se carga memory-mapped
+  con `load_from_disk`; la clave combina el hash de los textos, el tokenizer y
+  max_length, así que un reentrenamiento con los mismos datos no retokeniza.
+- Los ejemplos se guardan sin padding: el collator rellena cada batch solo
+  hasta su secuencia más larga (y con `group_by_length` los batches agrupan
+  poemas de longitud parecida).
+- Opcionalmente se empaquetan varios poemas cortos en una misma secuencia.
+- El formato con directrices y la tokenización corren en `Dataset.map` por
+  lotes y con `num_proc` procesos (el formato es una función pura).
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import torch
+from datasets import Dataset, load_from_disk
+
+from .directives import DIRECTIVES_VERSION, format_training_examples
+
+# Directorio de la caché de datasets tokenizados (TOKEN_CACHE_DIR vacío la desactiva)
+DEFAULT_TOKEN_CACHE_DIR = os.getenv("TOKEN_CACHE_DIR", "data/.token_cache")
+
+# Subir al cambiar el formato de los datos tokenizados o la segmentación de poemas (invalida la caché)
+TOKENIZATION_VERSION = "2"
+
+# Procesos para formatear y tokenizar (TOKENIZE_NUM_PROC; por defecto todos los núcleos)
+DEFAULT_NUM_PROC = int(os.getenv("TOKENIZE_NUM_PROC", "0")) or (os.cpu_count() or 1)
+# Por debajo de tantos ejemplos por proceso no compensa arrancar procesos
+MIN_EXAMPLES_PER_PROC = 5000
+# Ejemplos por lote de `Dataset.map`
+MAP_BATCH_SIZE = 1000
+
+
+def effective_num_proc(num_examples: int, num_proc: Optional[int] = None) -> int:
+    """Procesos a usar para `num_examples` ejemplos (1 si el dataset es pequeño)"""
+    num_proc = num_proc or DEFAULT_NUM_PROC
+    return max(1, min(num_proc, num_examples // MIN_EXAMPLES_PER_PROC))
+
+
+def dataset_fingerprint(
+    texts: List[str],
+    tokenizer,
+    max_length: int,
+    pack: bool,
+    directive_seed: Optional[int] = None
+) -> str:
+    """Clave de caché: textos + identidad del tokenizer + max_length + empaquetado + directrices"""
+    hasher = hashlib.sha256()
+    directives = "nodirectives" if directive_seed is None else f"directives-{DIRECTIVES_VERSION}-{directive_seed}"
+    header = "|".join([
+        TOKENIZATION_VERSION,
+        directives,
+        type(tokenizer).__name__,
+        str(getattr(tokenizer, "name_or_path", "")),
+        str(len(tokenizer)),
+        str(tokenizer.eos_token),
+        str(max_length),
+        "pack" if pack else "nopack",
+    ])
+    hasher.update(header.encode("utf-8"))
+    for text in texts:
+        hasher.update(b"\0")
+        hasher.update(text.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def pack_sequences(dataset: Dataset, max_length: int, num_proc: int = 1) -> Dataset:
+    """
+    Empaqueta poemas tokenizados consecutivos en secuencias de hasta `max_length`
+    tokens, sin partir ningún poema (cada uno termina en EOS, que hace de separador)
+    """
+    def pack(batch):
+        packed = []
+        current: List[int] = []
+        for ids in batch["input_ids"]:
+            if current and len(current) + len(ids) > max_length:
+                packed.append(current)
+                current = []
+            current = current + ids
+        if current:
+            packed.append(current)
+        return {
+            "input_ids": packed,
+            "attention_mask": [[1] * len(ids) for ids in packed],
+            "length": [len(ids) for ids in packed],
+        }
+
+    # Cada proceso empaqueta su fragmento: solo cambia dónde se corta entre fragmentos
+    return dataset.map(
+        pack,
+        batched=True,
+        batch_size=MAP_BATCH_SIZE,
+        num_proc=num_proc if num_proc > 1 else None,
+        remove_columns=dataset.column_names
+    )
+
+
+def tokenize_texts(
+    texts: List[str],
+    tokenizer,
+    max_length: int,
+    pack: bool = False,
+    directive_seed: Optional[int] = None,
+    num_proc: Optional[int] = None
+) -> Dataset:
+    """
+    Formatea (si `directive_seed` no es None) y tokeniza sin padding, con EOS al
+    final, guardando la longitud de cada ejemplo. Ambos pasos van en el mismo
+    `map` por lotes, repartido en `num_proc` procesos para datasets grandes.
+    """
+    eos_token = tokenizer.eos_token
+
+    def tokenize_function(examples):
+        batch = examples["text"]
+        if directive_seed is not None:
+            batch = format_training_examples(batch, directive_seed)
+        # Agregar token de fin de texto al final de cada poema
+        tokenized = tokenizer(
+            [text + eos_token for text in batch],
+            truncation=True,
+            max_length=max_length,
+        )
+        tokenized["length"] = [len(ids) for ids in tokenized["input_ids"]]
+        return tokenized
+
+    num_proc = effective_num_proc(len(texts), num_proc)
+    if num_proc > 1:
+        # Los procesos ya reparten el trabajo: evitar que el tokenizer rápido abra
+        # sus propios hilos (y los avisos/bloqueos tras el fork)
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    dataset = Dataset.from_dict({"text": texts})
+    tokenized = dataset.map(
+        tokenize_function,
+        batched=True,
+        batch_size=MAP_BATCH_SIZE,
+        num_proc=num_proc if num_proc > 1 else None,
+        remove_columns=["text"]
+    )
+    if pack:
+        tokenized = pack_sequences(tokenized, max_length, num_proc)
+    return tokenized
+
+
+def load_or_tokenize(
+    texts: List[str],
+    tokenizer,
+    max_length: int,
+    pack: bool = False,
+    cache_dir: Optional[str] = DEFAULT_TOKEN_CACHE_DIR,
+    directive_seed: Optional[int] = None,
+    num_proc: Optional[int] = None
+) -> Dataset:
+    """
+    Devuelve el dataset tokenizado desde la caché (memory-mapped) o lo tokeniza y lo guarda
+
+    Args:
+        texts: Poemas
+        tokenizer: Tokenizer del modelo base (preferiblemente el rápido)
+        max_length: Longitud máxima de secuencia
+        pack: Si True, empaqueta varios poemas por secuencia
+        cache_dir: Directorio de la caché; None o "" la desactiva
+        directive_seed: Semilla del formato con directrices; None deja los poemas tal cual
+        num_proc: Procesos para formatear y tokenizar (None = DEFAULT_NUM_PROC)
+    """
+    if not cache_dir:
+        return tokenize_texts(texts, tokenizer, max_length, pack, directive_seed, num_proc)
+
+    key = dataset_fingerprint(texts, tokenizer, max_length, pack, directive_seed)
+    path = Path(cache_dir) / key
+    if path.exists():
+        try:
+            dataset = load_from_disk(str(path))
+            print(f"  ✓ Dataset tokenizado cargado de la caché ({path})")
+            return dataset
+        except Exception as e:
+            print(f"  ⚠ Caché tokenizada inválida, se regenera: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+
+    dataset = tokenize_texts(texts, tokenizer, max_length, pack, directive_seed, num_proc)
+
+    # Guardar en un directorio temporal y renombrar: nunca queda una entrada a medias
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=path.parent, prefix=f".{key}.")
+    try:
+        dataset.save_to_disk(temp_dir)
+        os.replace(temp_dir, path)
+    except OSError:
+        # Otro proceso guardó la misma entrada a la vez: usar la suya
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    if path.exists():
+        return load_from_disk(str(path))
+    return dataset
+
+
+class DynamicPaddingCollator:
+    """
+    Rellena cada batch hasta su secuencia más larga (padding a la derecha).
+    Los labels son los input_ids con -100 en el relleno, así que el EOS final
+    sí se entrena aunque el tokenizer use EOS como token de padding.
+    """
+
+    def __init__(self, pad_token_id: int, pad_to_multiple_of: Optional[int] = None):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features: List[Dict]) -> Dict[str, torch.Tensor]:
+        lengths = [len(feature["input_ids"]) for feature in features]
+        max_len = max(lengths)
+        if self.pad_to_multiple_of:
+            multiple = self.pad_to_multiple_of
+            max_len = (max_len + multiple - 1) // multiple * multiple
+
+        input_ids = torch.full((len(features), max_len), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), max_len), dtype=torch.long)
+        labels = torch.full((len(features), max_len), -100, dtype=torch.long)
+        for i, (feature, length) in enumerate(zip(features, lengths)):
+            ids = torch.as_tensor(feature["input_ids"], dtype=torch.long)
+            input_ids[i, :length] = ids
+            attention_mask[i, :length] = 1
+            labels[i, :length] = ids
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
@@ -0,0 +1,394 @@
+"""
+Cola de trabajos de entrenamiento
+
+Cada entrenamiento es un trabajo con id, un registro JSON en
+`models/.training_jobs/<id>.json` (que el propio entrenamiento consulta para
+cancelarse), un log y su directorio de salida. Un planificador lanza los
+trabajos en cola por prioridad, de uno en uno o varios a la vez según los
+núcleos y la memoria disponibles, cada uno en su TrainingWorker con su propio
+conjunto de núcleos.
+
+Configuración (variables de entorno):
+    TRAINING_MAX_CONCURRENT: trabajos simultáneos (número, o "auto" según núcleos y memoria; default 1)
+    TRAINING_CORES_PER_JOB:  núcleos por trabajo (default: los disponibles / simultáneos)
+    TRAINING_JOB_MEMORY_MB:  memoria estimada por trabajo; no se lanza otro si no queda (default 4000)
+    TRAINING_CPU_AFFINITY, TRAINING_NUM_THREADS, TRAINING_MEMORY_LIMIT_MB: ver training_worker
+    SERVING_AUTO_RELOAD:     "true" para que las réplicas de inferencia carguen cada modelo terminado
+"""
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from .dataset_store import atomic_write_text
+from .lora import DEFAULT_LORA_R
+from .serving_control import AUTO_RELOAD, request_reload
+from .training_metrics import MetricsBuffer, available_memory_mb
+from .training_state import find_latest_checkpoint, read_status
+from .training_worker import ResourceLimits, TrainingWorker
+
+# Estados de un trabajo
+ACTIVE_STATES = ("queued", "training")
+FINISHED_STATES = ("completed", "cancelled", "error")
+
+# Trabajos terminados cuyas métricas se conservan en memoria
+METRICS_KEEP_JOBS = 20
+
+TRAINING_MAX_CONCURRENT = os.getenv("TRAINING_MAX_CONCURRENT", "1").strip().lower()
+TRAINING_CORES_PER_JOB = int(os.getenv("TRAINING_CORES_PER_JOB", "0") or 0)
+TRAINING_JOB_MEMORY_MB = int(os.getenv("TRAINING_JOB_MEMORY_MB", "4000") or 0)
+
+
+def _available_cores() -> List[int]:
+    """Núcleos que pueden usar los entrenamientos (TRAINING_CPU_AFFINITY o todos los del proceso)"""
+    limits = ResourceLimits.from_env()
+    if limits.cpu_affinity:
+        return limits.cpu_affinity
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class TrainingJobQueue:
+    """
+    Cola de entrenamientos con prioridad y planificador.
+
+    Todas las transiciones de estado pasan por un lock: las disparan las
+    peticiones (submit, cancel, prioridad) y los hilos supervisores de los
+    procesos al terminar.
+    """
+
+    _ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(
+        self,
+        jobs_dir: Union[str, Path],
+        max_concurrent: Union[int, str] = TRAINING_MAX_CONCURRENT,
+        cores_per_job: int = TRAINING_CORES_PER_JOB,
+        job_memory_mb: int = TRAINING_JOB_MEMORY_MB
+    ):
+        self.jobs_dir = Path(jobs_dir)
+        self.cores = _available_cores()
+        self.job_memory_mb = job_memory_mb
+
+        if str(max_concurrent) == "auto":
+            per_job = cores_per_job or min(4, len(self.cores))
+            by_cores = len(self.cores) // per_job
+            total_memory = available_memory_mb()
+            by_memory = int(total_memory // job_memory_mb) if total_memory and job_memory_mb else by_cores
+            self.max_concurrent = max(1, min(by_cores, by_memory))
+        else:
+            self.max_concurrent = max(1, int(max_concurrent))
+        self.cores_per_job = cores_per_job or max(1, len(self.cores) // self.max_concurrent)
+
+        self.metrics: Dict[str, MetricsBuffer] = {}
+        self._workers: Dict[str, TrainingWorker] = {}
+        self._job_cores: Dict[str, List[int]] = {}
+        self._lock = threading.RLock()
+        self._started = False
+        self._shutting_down = False
+
+    # ---------- registros ----------
+
+    def _path(self, job_id: str) -> Path:
+        if not self._ID_PATTERN.match(job_id):
+            raise KeyError(job_id)
+        return self.jobs_dir / f"{job_id}.json"
+
+    def log_path(self, job_id: str) -> Path:
+        """Archivo con la salida del entrenamiento del trabajo"""
+        self._path(job_id)
+        return self.jobs_dir / f"{job_id}.log"
+
+    def _write(self, job: Dict):
+        atomic_write_text(self._path(job["job_id"]), json.dumps(job, ensure_ascii=False))
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Registro de un trabajo (None si no existe)"""
+        try:
+            job = read_status(self._path(job_id))
+        except KeyError:
+            return None
+        return job or None
+
+    def _all(self) -> List[Dict]:
+        if not self.jobs_dir.exists():
+            return []
+        jobs = [read_status(path) for path in self.jobs_dir.glob("*.json")]
+        return [job for job in jobs if job.get("job_id")]
+
+    @staticmethod
+    def _queue_order(job: Dict):
+        # Mayor prioridad primero; a igual prioridad, el más antiguo
+        return (-job.get("priority", 0), job.get("created_at", ""))
+
+    def list(self) -> List[Dict]:
+        """Trabajos en cola (en orden de ejecución), en curso y terminados (más recientes primero)"""
+        jobs = self._all()
+        queued = sorted((j for j in jobs if j["status"] == "queued"), key=self._queue_order)
+        for position, job in enumerate(queued, 1):
+            job["queue_position"] = position
+        running = sorted((j for j in jobs if j["status"] == "training"), key=lambda j: j.get("started_at", ""))
+        finished = sorted(
+            (j for j in jobs if j["status"] in FINISHED_STATES),
+            key=lambda j: j.get("finished_at", j.get("created_at", "")),
+            reverse=True
+        )
+        return running + queued + finished
+
+    def current(self) -> Optional[Dict]:
+        """El trabajo "actual": el último lanzado en curso, si no el primero en cola, si no el último terminado"""
+        jobs = self.list()
+        running = [j for j in jobs if j["status"] == "training"]
+        if running:
+            return running[-1]
+        return jobs[0] if jobs else None
+
+    # ---------- operaciones ----------
+
+    def submit(self, params: Dict, priority: int = 0) -> Dict:
+        """
+        Encola un entrenamiento y devuelve su registro
+
+        Args:
+            params: Parámetros del entrenamiento (los de TrainingRequest); `output_dir`
+                    puede contener "{job_id}" para un directorio por trabajo
+            priority: Mayor = antes
+        """
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        params = dict(params)
+        params["output_dir"] = params["output_dir"].replace("{job_id}", job_id)
+        job = {
+            "job_id": job_id,
+            "type": "training",
+            "status": "queued",
+            "priority": priority,
+            "params": params,
+            "output_dir": params["output_dir"],
+            "log_file": str(self.log_path(job_id)),
+            "created_at": datetime.now().isoformat(),
+        }
+        with self._lock:
+            self._write(job)
+            self._schedule()
+            return self.get(job_id)
+
+    def cancel(self, job_id: str) -> Dict:
+        """
+        Cancela un trabajo: si está en cola sale de ella; si está entrenando se
+        pide la cancelación y se detiene al terminar el paso en curso
+
+        Raises:
+            KeyError: si el trabajo no existe
+            ValueError: si ya terminó
+        """
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job["status"] == "queued":
+                job.update({"status": "cancelled", "finished_at": datetime.now().isoformat()})
+            elif job["status"] == "training":
+                job.update({"cancel_requested": True, "cancel_requested_at": datetime.now().isoformat()})
+            else:
+                raise ValueError(f"El trabajo ya terminó ({job['status']})")
+            self._write(job)
+            return job
+
+    def set_priority(self, job_id: str, priority: int) -> Dict:
+        """
+        Cambia la prioridad de un trabajo en cola
+
+        Raises:
+            KeyError: si el trabajo no existe
+            ValueError: si ya no está en cola
+        """
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if job["status"] != "queued":
+                raise ValueError(f"Solo se puede cambiar la prioridad de trabajos en cola ({job['status']})")
+            job["priority"] = priority
+            self._write(job)
+            self._schedule()
+            return job
+
+    def metrics_for(self, job_id: str) -> Optional[MetricsBuffer]:
+        """Buffer de métricas en vivo del trabajo (None si no hay en memoria)"""
+        return self.metrics.get(job_id)
+
+    def is_running(self, job_id: str) -> bool:
+        worker = self._workers.get(job_id)
+        return worker is not None and worker.is_alive()
+
+    # ---------- planificador ----------
+
+    def start(self):
+        """
+        Arranca el planificador. Los trabajos que figuraban entrenando (el servidor
+        se reinició) vuelven a la cola: se reanudarán desde su checkpoint. Los que
+        tenían una cancelación pendiente que el proceso no llegó a ver se dan por
+        cancelados.
+        """
+        with self._lock:
+            for job in self._all():
+                if job["status"] not in ACTIVE_STATES or job["job_id"] in self._workers:
+                    continue
+                if job.get("cancel_requested"):
+                    self._mark_cancelled(job)
+                    self._write(job)
+                elif job["status"] == "training":
+                    job["status"] = "queued"
+                    job["restarts"] = job.get("restarts", 0) + 1
+                    job.pop("pid", None)
+                    self._write(job)
+            self._started = True
+            self._schedule()
+
+    def shutdown(self):
+        """Detiene los entrenamientos en curso; quedan en cola para reanudarse al volver a arrancar"""
+        with self._lock:
+            self._shutting_down = True
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.terminate("El entrenamiento se detuvo al apagar el servidor")
+
+    def _mark_cancelled(self, job: Dict):
+        """Cierra como cancelado un trabajo cuya cancelación se pidió mientras entrenaba"""
+        job["status"] = "cancelled"
+        job["finished_at"] = datetime.now().isoformat()
+        job["resumable"] = find_latest_checkpoint(job["output_dir"]) is not None
+        job.pop("pid", None)
+
+    def _free_cores(self) -> List[int]:
+        used = {core for cores in self._job_cores.values() for core in cores}
+        return [core for core in self.cores if core not in used]
+
+    def _can_start_another(self) -> bool:
+        if len(self._workers) >= self.max_concurrent:
+            return False
+        if not self._workers:
+            return True
+        # Con trabajos en marcha, lanzar otro solo si quedan núcleos y memoria
+        if len(self._free_cores()) < self.cores_per_job:
+            return False
+        memory = available_memory_mb()
+        return memory is None or not self.job_memory_mb or memory >= self.job_memory_mb
+
+    def _schedule(self):
+        """Lanza trabajos en cola mientras haya capacidad (con el lock tomado)"""
+        if not self._started or self._shutting_down:
+            return
+        busy_outputs = {
+            str(Path(job["output_dir"]).resolve())
+            for job in (self.get(job_id) for job_id in self._workers)
+            if job
+        }
+        queued = sorted((j for j in self._all() if j["status"] == "queued"), key=self._queue_order)
+        for job in queued:
+            if not self._can_start_another():
+                break
+            output_key = str(Path(job["output_dir"]).resolve())
+            if output_key in busy_outputs:
+                # Dos entrenamientos no pueden escribir en el mismo directorio a la vez
+                continue
+            busy_outputs.add(output_key)
+            self._launch(job)
+
+    def _launch(self, job: Dict):
+        job_id = job["job_id"]
+        params = job["params"]
+        cores = self._free_cores()[:self.cores_per_job] if self.max_concurrent > 1 else None
+        env_limits = ResourceLimits.from_env()
+        limits = ResourceLimits(
+            cpu_affinity=cores or env_limits.cpu_affinity,
+            num_threads=env_limits.num_threads or (len(cores) if cores else None),
+            memory_limit_mb=env_limits.memory_limit_mb,
+        )
+
+        buffer = self.metrics.setdefault(job_id, MetricsBuffer())
+        buffer.start_run(job_id)
+        self._prune_metrics()
+
+        worker = TrainingWorker(buffer, limits)
+        job.update({
+            "status": "training",
+            "started_at": datetime.now().isoformat(),
+            "cpu_affinity": limits.cpu_affinity,
+        })
+        # Ejecución nueva: las cancelaciones pendientes de la anterior ya se resolvieron
+        job.pop("cancel_requested", None)
+        job.pop("cancel_requested_at", None)
+        self._write(job)
+        try:
+            worker.start(
+                trainer_kwargs={
+                    "base_model": params.get("base_model"),
+                    "output_dir": job["output_dir"],
+                    "pack": params.get("pack", False),
+                    "lora": params.get("lora", False),
+                    "lora_r": params.get("lora_r", DEFAULT_LORA_R),
+                    "status_file": str(self._path(job_id))
+                },
+                train_kwargs={
+                    "poems_file": params["poems_file"],
+                    "num_epochs": params.get("epochs", 5),
+                    "batch_size": params.get("batch_size", 4),
+                    "learning_rate": params.get("learning_rate", 5e-5),
+                    "resume": params.get("resume", True),
+                    "evaluate": params.get("evaluate", True),
+                    "gradient_accumulation_steps": params.get("gradient_accumulation_steps", 1),
+                    "streaming": params.get("streaming", False)
+                },
+                on_exit=lambda outcome: self._on_exit(job_id, outcome),
+                log_path=str(self.log_path(job_id))
+            )
+        except Exception as e:
+            job.update({"status": "error", "error": str(e), "finished_at": datetime.now().isoformat()})
+            self._write(job)
+            return
+        self._workers[job_id] = worker
+        if cores:
+            self._job_cores[job_id] = cores
+        job["pid"] = worker.pid
+        self._write(job)
+
+    def _on_exit(self, job_id: str, outcome: Dict):
+        """Registra el resultado de un trabajo y lanza los siguientes (hilo supervisor)"""
+        with self._lock:
+            self._workers.pop(job_id, None)
+            self._job_cores.pop(job_id, None)
+            job = self.get(job_id) or {"job_id": job_id}
+            job["exit_code"] = outcome.get("exit_code")
+            if self._shutting_down and outcome["status"] == "error" and job.get("cancel_requested"):
+                # Se pidió cancelar antes del apagado: no se reanuda al arrancar
+                self._mark_cancelled(job)
+            elif self._shutting_down and outcome["status"] == "error":
+                # Apagado del servidor: vuelve a la cola y se reanuda al arrancar
+                job["status"] = "queued"
+            else:
+                job["status"] = outcome["status"]
+                job["finished_at"] = datetime.now().isoformat()
+                if outcome["status"] == "error":
+                    job["error"] = outcome.get("error")
+                if outcome["status"] != "completed":
+                    job["resumable"] = find_latest_checkpoint(job["output_dir"]) is not None
+                elif AUTO_RELOAD:
+                    # Desplegar el modelo recién entrenado en las réplicas de inferencia
+                    job["reload_request"] = request_reload(job["output_dir"])["id"]
+            job.pop("pid", None)
+            self._write(job)
+            self._schedule()
+
+    def _prune_metrics(self):
+        """Descarta las métricas en memoria de los trabajos terminados más antiguos"""
+        # Los buffers se crean en orden de lanzamiento: los primeros son los más antiguos
+        finished = [job_id for job_id in self.metrics if job_id not in self._workers]
+        for job_id in finished[:max(0, len(finished) - METRICS_KEEP_JOBS)]:
+            self.metrics.pop(job_id, None)
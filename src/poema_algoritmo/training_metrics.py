@@ -0,0 +1,104 @@
+"""
+Métricas del entrenamiento en vivo: buffer circular con número de secuencia
+
+El callback del Trainer añade un punto por cada log (paso, época, loss,
+learning rate, throughput, ETA, memoria) y el panel lee los puntos nuevos con
+`since(seq)`, por polling o por SSE. El buffer tiene tamaño fijo: un
+entrenamiento largo no hace crecer la memoria del servidor.
+"""
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+# Puntos que se conservan (los más antiguos se descartan)
+METRICS_BUFFER_SIZE = int(os.getenv("TRAINING_METRICS_BUFFER", "10000"))
+
+
+def process_memory_mb(pid: Optional[int] = None) -> Optional[float]:
+    """
+    Memoria residente (RSS) en MB del proceso `pid` (por defecto el actual).
+    Sin /proc solo se puede medir el proceso actual, y se devuelve su pico.
+    """
+    try:
+        with open(f'/proc/{pid or "self"}/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return round(resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if pid is not None and pid != os.getpid():
+        return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en bytes en macOS y en KB en Linux
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def available_memory_mb() -> Optional[float]:
+    """Memoria disponible del sistema en MB (MemAvailable de /proc/meminfo; None si no hay)"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def available_cores() -> int:
+    """Núcleos que puede usar este proceso (respeta la afinidad de CPU)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class MetricsBuffer:
+    """
+    Buffer circular de puntos de métricas, seguro entre hilos.
+
+    Cada punto recibe un `seq` creciente que no se reinicia entre
+    entrenamientos, así un cliente que pide `since(último seq)` nunca recibe
+    puntos repetidos ni se pierde el comienzo de un entrenamiento nuevo.
+    """
+
+    def __init__(self, maxlen: int = METRICS_BUFFER_SIZE):
+        self._points: deque = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.run_id: Optional[str] = None
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def start_run(self, run_id: str):
+        """Vacía el buffer para un entrenamiento nuevo (el seq sigue creciendo)"""
+        with self._lock:
+            self._points.clear()
+            self.run_id = run_id
+
+    def append(self, point: Dict) -> Dict:
+        """Añade un punto (se le asignan `seq`, `run_id` y `time`) y lo devuelve"""
+        with self._lock:
+            self._seq += 1
+            point = {"seq": self._seq, "run_id": self.run_id, "time": time.time(), **point}
+            self._points.append(point)
+            return point
+
+    def since(self, seq: int = 0) -> List[Dict]:
+        """Puntos con seq mayor que `seq`, en orden"""
+        with self._lock:
+            if not self._points or self._points[-1]["seq"] <= seq:
+                return []
+            return [point for point in self._points if point["seq"] > seq]
+
+    def latest(self) -> Optional[Dict]:
+        """Último punto registrado (None si el buffer está vacío)"""
+        with self._lock:
+            return self._points[-1] if self._points else None
@@ -0,0 +1,61 @@
+"""
+Estado del entrenamiento en disco: archivo de estado y checkpoints
+
+Sin dependencias de torch/transformers: lo usan tanto el proceso de
+entrenamiento (cancelación, reanudación) como el servidor.
+"""
+import json
+import re
+import shutil
+from pathlib import Path
+from typing import Optional
+
+_CHECKPOINT_PATTERN = re.compile(r'^checkpoint-(\d+)$')
+
+
+def read_status(status_file: Path) -> dict:
+    """Estado guardado en el archivo (vacío si no existe o no se puede leer)"""
+    try:
+        with open(status_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_cancel_requested(status_file: Optional[Path]) -> bool:
+    """True si el archivo de estado pide cancelar el entrenamiento ("cancelled" o cancel_requested)"""
+    if status_file is None:
+        return False
+    status = read_status(status_file)
+    return status.get("status") == "cancelled" or bool(status.get("cancel_requested"))
+
+
+def find_latest_checkpoint(output_dir: str) -> Optional[str]:
+    """
+    Ruta del `checkpoint-N` con mayor N que se guardó completo (tiene
+    trainer_state.json, que el Trainer escribe al final), o None si no hay
+    """
+    directory = Path(output_dir)
+    if not directory.is_dir():
+        return None
+    best_step, best_path = -1, None
+    for entry in directory.iterdir():
+        match = _CHECKPOINT_PATTERN.match(entry.name)
+        if match and entry.is_dir() and (entry / "trainer_state.json").exists():
+            step = int(match.group(1))
+            if step > best_step:
+                best_step, best_path = step, str(entry)
+    return best_path
+
+
+def remove_checkpoints(output_dir: str) -> int:
+    """Elimina los `checkpoint-N` de un entrenamiento terminado y devuelve cuántos había"""
+    directory = Path(output_dir)
+    if not directory.is_dir():
+        return 0
+    removed = 0
+    for entry in directory.iterdir():
+        if _CHECKPOINT_PATTERN.match(entry.name) and entry.is_dir():
+            shutil.rmtree(entry, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,237 @@
+"""
+Entrenamiento en un proceso aparte del servidor web
+
+El servidor no carga el modelo ni prepara datos: lanza un proceso "spawn"
+que ejecuta PoetryTrainer con límites de recursos (afinidad de CPU, hilos de
+torch y un techo de memoria) y le envía por una cola los puntos de métricas
+y el resultado. Si el proceso muere (OOM, señal), el servidor sigue atendiendo
+peticiones y marca el entrenamiento como fallido; el checkpoint permite
+reanudarlo.
+
+Configuración (variables de entorno):
+    TRAINING_CPU_AFFINITY:   núcleos del proceso, p. ej. "0-3,6" (vacío = todos)
+    TRAINING_NUM_THREADS:    hilos de torch (por defecto, los núcleos asignados)
+    TRAINING_MEMORY_LIMIT_MB: RSS máximo; si se supera el proceso se termina
+"""
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from .training_metrics import process_memory_mb
+
+# Cada cuánto se comprueba la memoria del proceso de entrenamiento
+MEMORY_CHECK_INTERVAL = 2.0
+
+
+def parse_cpu_list(value: str) -> List[int]:
+    """Lista de CPUs en formato "0-3,6" (como taskset/cgroups)"""
+    cpus = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    """Límites del proceso de entrenamiento (None = sin límite)"""
+    cpu_affinity: Optional[List[int]] = None
+    num_threads: Optional[int] = None
+    memory_limit_mb: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "ResourceLimits":
+        affinity = os.getenv("TRAINING_CPU_AFFINITY", "").strip()
+        threads = os.getenv("TRAINING_NUM_THREADS", "").strip()
+        memory = os.getenv("TRAINING_MEMORY_LIMIT_MB", "").strip()
+        return cls(
+            cpu_affinity=parse_cpu_list(affinity) if affinity else None,
+            num_threads=int(threads) if threads else None,
+            memory_limit_mb=int(memory) if memory else None,
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "cpu_affinity": self.cpu_affinity,
+            "num_threads": self.num_threads,
+            "memory_limit_mb": self.memory_limit_mb,
+        }
+
+
+class QueueMetricsSink:
+    """Sustituto de MetricsBuffer en el proceso hijo: envía cada punto por la cola"""
+
+    def __init__(self, events):
+        self.events = events
+
+    def append(self, point: Dict) -> Dict:
+        self.events.put(("metric", point))
+        return point
+
+
+def _apply_limits(limits: Dict):
+    """Afinidad de CPU e hilos; se llama antes de importar torch en el hijo"""
+    cpus = limits.get("cpu_affinity")
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    threads = limits.get("num_threads")
+    if not threads and hasattr(os, "sched_getaffinity"):
+        threads = len(os.sched_getaffinity(0))
+    if threads:
+        # Las librerías de BLAS leen estas variables al cargarse
+        for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[variable] = str(threads)
+        import torch
+        torch.set_num_threads(threads)
+
+
+def run_training_job(
+    trainer_kwargs: Dict,
+    train_kwargs: Dict,
+    limits: Dict,
+    events,
+    log_path: Optional[str] = None
+):
+    """
+    Punto de entrada del proceso de entrenamiento.
+
+    Envía por `events` tuplas ("metric", punto), ("result", {"completed": bool})
+    o ("error", {"error": str, "traceback": str}).
+    """
+    if log_path:
+        # La salida del entrenamiento (prints, barras de progreso) va al log del trabajo
+        log_file = open(log_path, 'a', buffering=1, encoding='utf-8')
+        sys.stdout = sys.stderr = log_file
+
+    try:
+        _apply_limits(limits)
+        from .train_model import PoetryTrainer
+
+        trainer = PoetryTrainer(metrics_buffer=QueueMetricsSink(events), **trainer_kwargs)
+        completed = trainer.train_from_file(**train_kwargs)
+        events.put(("result", {"completed": completed}))
+    except BaseException as e:
+        traceback.print_exc()
+        events.put(("error", {"error": str(e) or type(e).__name__, "traceback": traceback.format_exc()}))
+        sys.stdout.flush()
+        raise SystemExit(1)
+    finally:
+        sys.stdout.flush()
+
+
+class TrainingWorker:
+    """
+    Lanza y supervisa un proceso de entrenamiento.
+
+    Un hilo del servidor lee la cola de eventos (métricas -> MetricsBuffer),
+    vigila la memoria del proceso y, cuando termina, llama a `on_exit` con
+    el resultado: {"status": "completed" | "cancelled" | "error", ...}.
+    """
+
+    def __init__(self, metrics_buffer, limits: Optional[ResourceLimits] = None):
+        self.metrics_buffer = metrics_buffer
+        self.limits = limits or ResourceLimits.from_env()
+        self.process = None
+        self._terminate_reason: Optional[str] = None
+        self._context = multiprocessing.get_context("spawn")
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process is not None else None
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def start(
+        self,
+        trainer_kwargs: Dict,
+        train_kwargs: Dict,
+        on_exit: Callable[[Dict], None],
+        log_path: Optional[str] = None
+    ):
+        """
+        Inicia el entrenamiento en un proceso nuevo
+
+        Args:
+            trainer_kwargs: Argumentos de PoetryTrainer (sin metrics_buffer)
+            train_kwargs: Argumentos de PoetryTrainer.train_from_file
+            on_exit: Se llama (desde el hilo supervisor) con el resultado final
+            log_path: Archivo donde se escribe la salida del entrenamiento
+        """
+        if self.is_alive():
+            raise RuntimeError("Ya hay un proceso de entrenamiento en marcha")
+        self._terminate_reason = None
+        events = self._context.Queue()
+        # No daemon: el entrenamiento crea sus propios procesos (tokenización con num_proc)
+        self.process = self._context.Process(
+            target=run_training_job,
+            args=(trainer_kwargs, train_kwargs, self.limits.to_dict(), events, log_path),
+            name="poema-training",
+        )
+        self.process.start()
+        threading.Thread(
+            target=self._supervise, args=(self.process, events, on_exit), daemon=True
+        ).start()
+
+    def terminate(self, reason: str = "El entrenamiento se detuvo", timeout: float = 10.0):
+        """Termina el proceso (SIGTERM y, si no responde, SIGKILL); `reason` queda como error"""
+        process = self.process
+        if process is None or not process.is_alive():
+            return
+        self._terminate_reason = reason
+        process.terminate()
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _supervise(self, process, events, on_exit: Callable[[Dict], None]):
+        outcome: Optional[Dict] = None
+        memory_limit = self.limits.memory_limit_mb
+        last_check = 0.0
+
+        while True:
+            try:
+                kind, payload = events.get(timeout=0.5)
+            except queue.Empty:
+                if not process.is_alive():
+                    break
+            else:
+                if kind == "metric":
+                    self.metrics_buffer.append(payload)
+                elif kind == "result":
+                    outcome = {"status": "completed" if payload["completed"] else "cancelled"}
+                elif kind == "error":
+                    outcome = {"status": "error", **payload}
+
+            now = time.monotonic()
+            if memory_limit and outcome is None and now - last_check >= MEMORY_CHECK_INTERVAL:
+                last_check = now
+                rss = process_memory_mb(process.pid)
+                if rss is not None and rss > memory_limit:
+                    self.terminate(f"El entrenamiento superó el límite de memoria ({rss:.0f} MB > {memory_limit} MB)")
+
+        process.join()
+        if outcome is None and self._terminate_reason:
+            outcome = {"status": "error", "error": self._terminate_reason}
+        elif outcome is None:
+            # Muerto sin avisar: señal del sistema (p. ej. el OOM killer) o fallo al arrancar
+            outcome = {
+                "status": "error",
+                "error": f"El proceso de entrenamiento terminó inesperadamente (código {process.exitcode})"
+            }
+        outcome["exit_code"] = process.exitcode
+        events.close()
+        on_exit(outcome)
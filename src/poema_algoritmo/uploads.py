@@ -0,0 +1,250 @@
+"""
+Subidas de archivos por bloques: memoria acotada, hash incremental y sesiones reanudables
+
+La escritura, el hash y el fsync de cada bloque se hacen en un hilo
+(asyncio.to_thread) para no bloquear el event loop con subidas de varios GB.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Union
+
+# Tamaño de cada bloque leído/escrito (la memoria por subida queda acotada a esto)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Tamaño máximo por archivo (configurable con MAX_UPLOAD_SIZE_MB)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE_MB", "200")) * 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """El archivo supera el tamaño máximo permitido"""
+
+
+class UploadOffsetError(Exception):
+    """El bloque recibido no continúa donde terminó el anterior"""
+
+    def __init__(self, expected_offset: int):
+        super().__init__(f"Offset inesperado, se esperaba {expected_offset}")
+        self.expected_offset = expected_offset
+
+
+class UploadChecksumError(Exception):
+    """El SHA-256 calculado no coincide con el declarado por el cliente"""
+
+
+def _write_block(f, hasher, block: bytes):
+    f.write(block)
+    hasher.update(block)
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+async def stream_upload_to_temp(
+    upload,
+    directory: Optional[Union[str, Path]] = None,
+    suffix: str = "",
+    max_size: int = MAX_UPLOAD_SIZE
+) -> Tuple[str, int, str]:
+    """
+    Copia un UploadFile a un archivo temporal por bloques de tamaño fijo
+
+    Args:
+        upload: UploadFile (o cualquier objeto con `await read(n)`)
+        directory: Directorio del temporal (usar el del destino para poder hacer os.replace)
+        suffix: Extensión del temporal
+        max_size: Tamaño máximo en bytes
+
+    Returns:
+        Tupla (ruta_temporal, tamaño, sha256)
+    """
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload.", suffix=suffix)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(
+                        f"El archivo supera el tamaño máximo de {max_size // (1024 * 1024)} MB"
+                    )
+                await asyncio.to_thread(_write_block, f, hasher, chunk)
+            await asyncio.to_thread(_sync, f)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    return temp_path, size, hasher.hexdigest()
+
+
+class ResumableUploadStore:
+    """
+    Sesiones de subida reanudables por partes.
+
+    Cada sesión es un archivo `<id>.part` con los bytes recibidos y un `<id>.json`
+    con sus metadatos. El offset actual es el tamaño del `.part`, así que una
+    subida interrumpida (o un reinicio del servidor) se retoma desde ahí.
+    """
+
+    _ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self, directory: Union[str, Path], max_size: int = MAX_UPLOAD_SIZE):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        # Hash incremental por sesión: upload_id -> (offset cubierto, hasher)
+        self._hashers: Dict[str, Tuple[int, Any]] = {}
+
+    def _paths(self, upload_id: str) -> Tuple[Path, Path]:
+        if not self._ID_PATTERN.match(upload_id):
+            raise KeyError(upload_id)
+        return self.directory / f"{upload_id}.part", self.directory / f"{upload_id}.json"
+
+    def create(self, filename: str, kind: str, total_size: Optional[int] = None, **metadata) -> Dict:
+        """Crea una nueva sesión de subida"""
+        if total_size is not None and total_size > self.max_size:
+            raise UploadTooLargeError(
+                f"El archivo supera el tamaño máximo de {self.max_size // (1024 * 1024)} MB"
+            )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        part_path.touch()
+        info = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "kind": kind,
+            "total_size": total_size,
+            "created": datetime.now().isoformat(),
+            **metadata
+        }
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(info, f)
+        self._hashers[upload_id] = (0, hashlib.sha256())
+        return {**info, "offset": 0}
+
+    def get(self, upload_id: str) -> Optional[Dict]:
+        """Devuelve los metadatos y el offset actual de una sesión (None si no existe)"""
+        try:
+            part_path, meta_path = self._paths(upload_id)
+        except KeyError:
+            return None
+        if not meta_path.exists() or not part_path.exists():
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        info["offset"] = part_path.stat().st_size
+        return info
+
+    def _hasher_for(self, upload_id: str, part_path: Path, offset: int):
+        """Recupera el hash incremental; si se perdió (reinicio), lo reconstruye desde disco"""
+        cached = self._hashers.get(upload_id)
+        if cached and cached[0] == offset:
+            return cached[1]
+        hasher = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+                hasher.update(chunk)
+        return hasher
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict:
+        """
+        Añade una parte a la sesión a partir de `offset`
+
+        Raises:
+            KeyError: si la sesión no existe
+            UploadOffsetError: si `offset` no coincide con lo ya recibido
+            UploadTooLargeError: si se supera el tamaño máximo
+        """
+        info = self.get(upload_id)
+        if info is None:
+            raise KeyError(upload_id)
+        part_path, _ = self._paths(upload_id)
+        current = info["offset"]
+        if offset != current:
+            raise UploadOffsetError(current)
+
+        limit = self.max_size
+        if info.get("total_size") is not None:
+            limit = min(limit, info["total_size"])
+
+        # Tras un reinicio hay que releer el .part entero: fuera del event loop
+        hasher = await asyncio.to_thread(self._hasher_for, upload_id, part_path, current)
+        size = current
+        with open(part_path, 'ab') as f:
+            try:
+                # Los trozos del cuerpo son pequeños: se agrupan en bloques de UPLOAD_CHUNK_SIZE
+                block = bytearray()
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if size + len(block) + len(chunk) > limit:
+                        raise UploadTooLargeError(
+                            f"La parte supera el tamaño declarado o el máximo ({limit} bytes)"
+                        )
+                    block += chunk
+                    if len(block) >= UPLOAD_CHUNK_SIZE:
+                        await asyncio.to_thread(_write_block, f, hasher, bytes(block))
+                        size += len(block)
+                        block.clear()
+                if block:
+                    await asyncio.to_thread(_write_block, f, hasher, bytes(block))
+                    size += len(block)
+                await asyncio.to_thread(_sync, f)
+            except BaseException:
+                # Descartar la parte incompleta: el cliente reintenta desde el último offset bueno
+                # (truncar no lee datos, así que puede hacerse aquí aunque la tarea se esté cancelando)
+                f.flush()
+                f.truncate(current)
+                self._hashers.pop(upload_id, None)
+                raise
+        self._hashers[upload_id] = (size, hasher)
+        info["offset"] = size
+        return info
+
+    async def finalize(self, upload_id: str, expected_sha256: Optional[str] = None) -> Tuple[Dict, Path, str]:
+        """
+        Cierra la sesión y devuelve (metadatos, ruta del archivo completo, sha256).
+        El llamador es responsable de mover o borrar el archivo devuelto.
+        """
+        info = self.get(upload_id)
+        if info is None:
+            raise KeyError(upload_id)
+        part_path, meta_path = self._paths(upload_id)
+        if info.get("total_size") is not None and info["offset"] != info["total_size"]:
+            raise UploadOffsetError(info["offset"])
+
+        hasher = await asyncio.to_thread(self._hasher_for, upload_id, part_path, info["offset"])
+        sha256 = hasher.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise UploadChecksumError(f"SHA-256 no coincide (calculado {sha256})")
+
+        self._hashers.pop(upload_id, None)
+        meta_path.unlink(missing_ok=True)
+        info["sha256"] = sha256
+        return info, part_path, sha256
+
+    def discard(self, upload_id: str) -> bool:
+        """Cancela una sesión y borra sus archivos"""
+        try:
+            part_path, meta_path = self._paths(upload_id)
+        except KeyError:
+            return False
+        existed = meta_path.exists()
+        part_path.unlink(missing_ok=True)
+        meta_path.unlink(missing_ok=True)
+        self._hashers.pop(upload_id, None)
+        return existed
@@ -0,0 +1,83 @@
+"""Informe y fusión de poemas casi duplicados en el panel"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from poema_algoritmo import admin
+
+POEM = (
+    "Hay un lugar en el mar donde la noche\n"
+    "se queda quieta sobre las piedras\n"
+    "y el viento no sabe volver a casa"
+)
+
+DATASET = (
+    "=== POEMA ===\n\n1857\n1858\n1859\n\n"
+    f"=== POEMA ===\n\n{POEM}\n\n"
+    f"=== POEMA ===\n\n{POEM}.\ncon una línea más\n"
+)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(admin, "DATA_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(admin.router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("dataset", ["../pyproject.toml", "sub/poems.txt", "poems.json", "/etc/passwd"])
+def test_dataset_outside_data_dir_is_rejected(data_dir, client, dataset):
+    assert client.get("/admin/api/duplicates", params={"dataset": dataset}).status_code == 400
+    response = client.post("/admin/api/duplicates/merge", json={"dataset": dataset})
+    assert response.status_code == 400
+
+
+def test_number_only_blocks_do_not_shift_poem_ids():
+    blocks = admin._split_separated_poems(DATASET)
+    poems = admin._parse_dataset_poems(DATASET)
+
+    assert [block_id for block_id, _, _ in blocks] == [None, None, 0, 1]
+    new_content, deleted = admin._remove_poems(DATASET, [poems[0]["id"]])
+
+    assert deleted == 1
+    assert "1857" in new_content
+    assert [p["text"] for p in admin._parse_dataset_poems(new_content)] == [poems[1]["text"]]
+
+
+def test_merge_removes_duplicates_with_listing_ids(data_dir, client):
+    (data_dir / "poems.txt").write_text(DATASET, encoding="utf-8")
+
+    report = client.get("/admin/api/duplicates", params={"dataset": "poems.txt", "threshold": 0.5}).json()
+    assert len(report["clusters"]) == 1
+    cluster = report["clusters"][0]
+    assert [m["poem_id"] for m in cluster["members"]] == [0, 1]
+    assert cluster["keep"] == 1
+
+    response = client.post(
+        "/admin/api/duplicates/merge",
+        json={"dataset": "poems.txt", "threshold": 0.5, "cluster_ids": [cluster["id"]]}
+    ).json()
+
+    assert response["removed_count"] == 1
+    content = (data_dir / "poems.txt").read_text(encoding="utf-8")
+    assert "1857" in content
+    assert [p["text"] for p in admin._parse_dataset_poems(content)] == [f"{POEM}.\ncon una línea más"]
+
+
+def test_merge_reports_stale_clusters(data_dir, client):
+    (data_dir / "poems.txt").write_text(DATASET, encoding="utf-8")
+
+    response = client.post(
+        "/admin/api/duplicates/merge",
+        json={"dataset": "poems.txt", "threshold": 0.5, "cluster_ids": ["0123456789abcdef"]}
+    ).json()
+
+    assert response["removed_count"] == 0
+    assert response["stale"] == ["0123456789abcdef"]
+    assert (data_dir / "poems.txt").read_text(encoding="utf-8") == DATASET
@@ -0,0 +1,31 @@
+"""Escrituras atómicas de datasets"""
+import os
+import sys
+
+import pytest
+
+from poema_algoritmo.dataset_store import atomic_write_text
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="permisos POSIX")
+
+
+def test_atomic_write_keeps_file_mode(tmp_path):
+    path = tmp_path / "poems.txt"
+    path.write_text("antes", encoding="utf-8")
+    os.chmod(path, 0o640)
+
+    atomic_write_text(path, "después")
+
+    assert path.read_text(encoding="utf-8") == "después"
+    assert path.stat().st_mode & 0o777 == 0o640
+
+
+def test_atomic_write_new_file_uses_umask(tmp_path):
+    path = tmp_path / "nuevo.txt"
+    reference = tmp_path / "referencia.txt"
+    reference.write_text("x", encoding="utf-8")
+
+    atomic_write_text(path, "x")
+
+    assert path.stat().st_mode & 0o777 == reference.stat().st_mode & 0o777
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
@@ -0,0 +1,65 @@
+"""Registros de las conversiones EPUB en segundo plano"""
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from poema_algoritmo.epub_jobs import EPUBJobManager, read_job_status
+
+
+def _write_job(jobs_dir, status, age_days=0):
+    job_id = uuid.uuid4().hex
+    when = (datetime.now() - timedelta(days=age_days)).isoformat()
+    record = {"job_id": job_id, "status": status, "created_at": when}
+    if status == "completed":
+        record["completed_at"] = when
+    elif status == "error":
+        record["failed_at"] = when
+    (jobs_dir / f"{job_id}.json").write_text(json.dumps(record), encoding="utf-8")
+    return job_id
+
+
+def test_recover_marks_interrupted_jobs_as_error(tmp_path):
+    running = _write_job(tmp_path, "running")
+    queued = _write_job(tmp_path, "queued")
+    completed = _write_job(tmp_path, "completed")
+
+    EPUBJobManager(tmp_path).recover()
+
+    for job_id in (running, queued):
+        status = read_job_status(tmp_path / f"{job_id}.json")
+        assert status["status"] == "error"
+        assert "failed_at" in status
+    assert read_job_status(tmp_path / f"{completed}.json")["status"] == "completed"
+
+
+def test_prune_keeps_recent_finished_jobs(tmp_path):
+    old = _write_job(tmp_path, "completed", age_days=30)
+    finished = [_write_job(tmp_path, "completed", age_days=days) for days in (3, 2, 1)]
+    running = _write_job(tmp_path, "running", age_days=30)
+
+    removed = EPUBJobManager(tmp_path, keep_jobs=2, max_age_days=7).prune()
+
+    remaining = {p.stem for p in tmp_path.glob("*.json")}
+    assert removed == 2
+    assert remaining == {finished[1], finished[2], running}
+    assert old not in remaining
+
+
+def test_recover_removes_temporary_files(tmp_path):
+    jobs_dir = tmp_path / ".jobs"
+    jobs_dir.mkdir()
+    epub = tmp_path / "upload.epub"
+    partial = tmp_path / ".libro.txt.tmp"
+    epub.write_bytes(b"epub")
+    partial.write_text("=== POEMA ===", encoding="utf-8")
+    job_id = _write_job(jobs_dir, "running")
+    status_path = jobs_dir / f"{job_id}.json"
+    status = read_job_status(status_path)
+    status.update({"temp_epub_path": str(epub), "temp_output_path": str(partial)})
+    status_path.write_text(json.dumps(status), encoding="utf-8")
+
+    EPUBJobManager(jobs_dir).recover()
+
+    assert not epub.exists()
+    assert not partial.exists()
+    assert read_job_status(status_path)["status"] == "error"
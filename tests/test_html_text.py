@@ -0,0 +1,20 @@
+"""Paridad de los extractores de texto HTML de EPUBs ("stream" vs "bs4")"""
+import pytest
+
+from benchmark_html_backends import PARITY_CASES
+from poema_algoritmo.html_text import get_html_backend, html_to_text_bs4, html_to_text_stream
+
+
+@pytest.mark.parametrize("content", PARITY_CASES)
+def test_stream_matches_bs4(content):
+    assert html_to_text_stream(content) == html_to_text_bs4(content)
+
+
+def test_stream_accepts_decoded_text():
+    content = '<p>café &amp; té<br/>sin <b>azúcar</b></p><style>p {}</style>'
+    assert html_to_text_stream(content) == html_to_text_bs4(content)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_html_backend("lxml")
@@ -0,0 +1,10 @@
+"""Arrancar el servidor no debe importar dependencias pesadas (torch, transformers...)"""
+import pytest
+
+from benchmark_import_time import MODES, measure
+
+
+@pytest.mark.parametrize("mode", sorted(MODES))
+def test_startup_skips_heavy_modules(mode):
+    result = measure(mode)
+    assert result["heavy"] == [], f"{mode} importa al arrancar: {', '.join(result['heavy'])}"
@@ -0,0 +1,39 @@
+"""Detección de casi duplicados con MinHash + LSH"""
+from poema_algoritmo.near_duplicates import NearDuplicateIndex, deduplicate_poems, pick_canonical
+
+BASE = (
+    "Hay un lugar en el mar donde la noche se queda quieta sobre las piedras "
+    "y el viento no sabe volver a casa cuando cae la lluvia"
+)
+EDITION = BASE.upper().replace(" y el ", ", y el ") + "."
+OTHER = (
+    "La ciudad despierta con ruido de campanas y los perros del puerto "
+    "ladran a los barcos que no llegan nunca"
+)
+
+
+def test_punctuation_and_case_variants_cluster_together():
+    index = NearDuplicateIndex(threshold=0.8)
+    for key, text in (("a", BASE), ("b", OTHER), ("c", EDITION)):
+        index.add(key, text)
+
+    clusters = index.clusters()
+
+    assert [cluster["keys"] for cluster in clusters] == [["a", "c"]]
+    assert clusters[0]["similarity"] >= 0.8
+
+
+def test_distinct_poems_are_not_clustered():
+    index = NearDuplicateIndex(threshold=0.5)
+    index.add(0, BASE)
+    index.add(1, OTHER)
+    assert index.clusters() == []
+
+
+def test_deduplicate_keeps_first_occurrence():
+    assert deduplicate_poems([BASE, OTHER, EDITION]) == [BASE, OTHER]
+
+
+def test_pick_canonical_prefers_longest():
+    assert pick_canonical(["corto", "el más largo", "medio"]) == 1
+    assert pick_canonical(["igual", "igual"]) == 0
@@ -0,0 +1,113 @@
+"""Segmentación en texto libre: mismos poemas que los extractores anteriores del entrenamiento, el panel y el EPUB"""
+from poema_algoritmo.epub_processor import EPUBProcessor
+from poema_algoritmo.segmentation import ADMIN_RULES, TRAINING_RULES, segment_poems
+
+
+def _texts(text, rules):
+    return [span.text for span in segment_poems(text, rules)]
+
+
+def test_training_keeps_stanzas_and_long_gaps_without_title():
+    text = (
+        "Prefacio del traductor\nnotas sin interés\n"
+        "AL LECTOR\n"
+        "La necedad, el error, el pecado,\nocupan nuestros espíritus.\n\n"
+        "Y alimentamos nuestros remordimientos\ncomo los mendigos a sus parásitos.\n\n\n\n"
+        "Nuestros pecados son testarudos,\nnuestros arrepentimientos cobardes.\n\n\n\n"
+        "EL ALBATROS\n"
+        "A menudo, para divertirse,\nlos marineros cazan albatros,\nvastos pájaros de los mares."
+    )
+
+    assert _texts(text, TRAINING_RULES) == [
+        # Una vacía entre estrofas se conserva; tres sin título detrás dejan dos más
+        "La necedad, el error, el pecado,\nocupan nuestros espíritus.\n\n"
+        "Y alimentamos nuestros remordimientos\ncomo los mendigos a sus parásitos.\n\n\n\n\n"
+        "Nuestros pecados son testarudos,\nnuestros arrepentimientos cobardes.",
+        "A menudo, para divertirse,\nlos marineros cazan albatros,\nvastos pájaros de los mares.",
+    ]
+
+
+def test_training_year_confirms_break_but_dotted_year_is_metadata():
+    text = (
+        "BENDICIÓN\n"
+        "Cuando, por un decreto de las potencias,\nel Poeta aparece en este mundo,\nsu madre espantada blasfema.\n\n\n\n"
+        "1844 (?)\n"
+        "Hay perfumes frescos como carnes de niño,\ndulces como los oboes,\nverdes como las praderas.\n\n\n\n"
+        "1857.\n"
+        "Y otros, corrompidos, ricos y triunfantes,\ncon la expansión de las cosas infinitas."
+    )
+
+    assert _texts(text, TRAINING_RULES) == [
+        "Cuando, por un decreto de las potencias,\nel Poeta aparece en este mundo,\nsu madre espantada blasfema.",
+        "Hay perfumes frescos como carnes de niño,\ndulces como los oboes,\nverdes como las praderas.\n\n\n\n\n"
+        "Y otros, corrompidos, ricos y triunfantes,\ncon la expansión de las cosas infinitas.",
+    ]
+
+
+def test_training_min_lines_counts_kept_blank_lines():
+    text = (
+        "SPLEEN\n"
+        "Soy como el rey de un país lluvioso,\n\nrico, pero impotente, joven y muy viejo\n"
+        "SOLO\n"
+        "Una línea suelta que no llega a poema"
+    )
+
+    assert _texts(text, TRAINING_RULES) == [
+        "Soy como el rey de un país lluvioso,\n\nrico, pero impotente, joven y muy viejo",
+    ]
+
+
+def test_admin_skips_headings_and_metadata_and_keeps_indentation():
+    text = (
+        "LAS FLORES DEL MAL\nCharles Baudelaire\nEditor digital: alguien\n"
+        "PRÓLOGO\n"
+        "  Es el Tedio, los ojos preñados de llanto,\n  sueña con cadalsos fumando su pipa.\n"
+        "1857.\n"
+        "Tú lo conoces, lector, a ese monstruo delicado,\n\n\n\n"
+        "hipócrita lector, mi semejante, mi hermano.\n1844 (?)\nfin"
+    )
+
+    spans = segment_poems(text, ADMIN_RULES)
+
+    assert [span.text for span in spans] == [
+        "Es el Tedio, los ojos preñados de llanto,\n  sueña con cadalsos fumando su pipa.\n"
+        "Tú lo conoces, lector, a ese monstruo delicado,",
+        "hipócrita lector, mi semejante, mi hermano.\n1844 (?)\nfin",
+    ]
+    # Los offsets delimitan el poema en el texto original (el panel reemplaza ese rango)
+    assert text[spans[1].start:spans[1].end] == spans[1].text
+
+
+def test_epub_keeps_years_and_emits_short_line_paragraphs_whole():
+    prose_line = "x" * 160
+    text = (
+        "Amor de la noche\nen la casa del río\n2001 .\nCAPÍTULO 2\n\n"
+        f"Verso corto uno\nverso corto dos\nverso corto tres\n{prose_line}\nluz\nmar\ncielo\n\n"
+        + "Prosa " * 40 + "\nuno\ndos"
+    )
+
+    assert EPUBProcessor().extract_poems_from_text(text) == [
+        "Amor de la noche\nen la casa del río\n2001 .\nCAPÍTULO 2",
+        "Verso corto uno\nverso corto dos\nverso corto tres",
+        f"Verso corto uno\nverso corto dos\nverso corto tres\n{prose_line}\nluz\nmar\ncielo",
+    ]
+
+
+def test_epub_separators_cut_inside_lines():
+    text = (
+        "Prólogo === POEMA === El mar, la sombra y el viento\n1857\n"
+        "=== POEMA 2 ===\ncorto\n"
+        "=== POEMA ===\nLa noche cae sobre la piedra dormida"
+    )
+
+    assert EPUBProcessor().extract_poems_from_text(text) == [
+        "El mar, la sombra y el viento\n1857",
+        "La noche cae sobre la piedra dormida",
+    ]
+
+
+def test_epub_falls_back_to_paragraphs_when_separated_parts_are_short():
+    text = "=== POEMA ===\ncorto\n=== POEMA ===\nbreve\ny leve\n\nsigue"
+
+    # Ninguna parte pasa de 30 caracteres: se segmenta por párrafos con los separadores como texto
+    assert EPUBProcessor().extract_poems_from_text(text) == ["=== POEMA ===\ncorto\n=== POEMA ===\nbreve\ny leve"]
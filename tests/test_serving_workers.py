@@ -0,0 +1,38 @@
+"""Supervisión de los workers de generación (prefork)"""
+import os
+import time
+
+import pytest
+
+from poema_algoritmo import serving_workers
+from poema_algoritmo.serving_workers import PreforkServer
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="requiere fork")
+
+
+def test_workers_failing_at_startup_stop_the_server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(serving_workers, "SUPERVISOR_TICK", 0.01)
+    monkeypatch.setattr(serving_workers, "SERVING_MAX_STARTUP_FAILURES", 4)
+
+    def broken_worker(self):
+        raise RuntimeError("modelo no encontrado")
+
+    monkeypatch.setattr(PreforkServer, "_run_worker", broken_worker)
+    spawned = []
+    spawn = PreforkServer._spawn
+
+    def recording_spawn(self):
+        spawned.append(time.monotonic())
+        spawn(self)
+
+    monkeypatch.setattr(PreforkServer, "_spawn", recording_spawn)
+
+    server = PreforkServer(host="127.0.0.1", port=0, workers=1, preload=False)
+    assert server.run() == 1
+
+    # El primero y tres relevos con espera creciente (0.02, 0.04, 0.08 s); luego se detiene
+    assert len(spawned) == 4
+    gaps = [b - a for a, b in zip(spawned, spawned[1:])]
+    assert gaps[-1] > gaps[0]
+    assert gaps[-1] >= 0.08
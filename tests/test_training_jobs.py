@@ -0,0 +1,141 @@
+"""Cola de entrenamientos: prioridad, directorios de salida y cancelación"""
+import json
+
+import pytest
+
+from poema_algoritmo import training_jobs
+from poema_algoritmo.training_jobs import TrainingJobQueue
+
+
+class FakeWorker:
+    """TrainingWorker que no lanza procesos: el test decide cuándo termina"""
+    started = []
+
+    def __init__(self, buffer, limits):
+        self.on_exit = None
+        self.alive = False
+
+    @property
+    def pid(self):
+        return 4242
+
+    def is_alive(self):
+        return self.alive
+
+    def start(self, trainer_kwargs, train_kwargs, on_exit, log_path):
+        self.alive = True
+        self.on_exit = on_exit
+        self.output_dir = trainer_kwargs["output_dir"]
+        FakeWorker.started.append(self)
+
+    def exit(self, status, **outcome):
+        self.alive = False
+        self.on_exit({"status": status, "exit_code": 0, **outcome})
+
+    def terminate(self, reason="El entrenamiento se detuvo", timeout=10.0):
+        self.exit("error", error=reason)
+
+
+@pytest.fixture(autouse=True)
+def fake_worker(monkeypatch):
+    FakeWorker.started = []
+    monkeypatch.setattr(training_jobs, "TrainingWorker", FakeWorker)
+    monkeypatch.setattr(training_jobs, "_available_cores", lambda: [0, 1, 2, 3])
+    return FakeWorker
+
+
+def _queue(tmp_path, max_concurrent=1):
+    return TrainingJobQueue(tmp_path / "jobs", max_concurrent=max_concurrent, cores_per_job=1, job_memory_mb=0)
+
+
+def _params(tmp_path, name):
+    return {"poems_file": "data/poems.txt", "output_dir": str(tmp_path / name)}
+
+
+def test_higher_priority_runs_first(tmp_path):
+    queue = _queue(tmp_path)
+    queue.start()
+    first = queue.submit(_params(tmp_path, "a"))
+    low = queue.submit(_params(tmp_path, "b"), priority=0)
+    high = queue.submit(_params(tmp_path, "c"), priority=5)
+
+    assert queue.get(first["job_id"])["status"] == "training"
+    assert [j["job_id"] for j in queue.list() if j["status"] == "queued"] == [high["job_id"], low["job_id"]]
+
+    FakeWorker.started[0].exit("completed")
+
+    assert queue.get(high["job_id"])["status"] == "training"
+    assert queue.get(low["job_id"])["status"] == "queued"
+
+
+def test_jobs_sharing_an_output_dir_do_not_run_together(tmp_path):
+    queue = _queue(tmp_path, max_concurrent=2)
+    queue.start()
+    first = queue.submit(_params(tmp_path, "same"))
+    second = queue.submit(_params(tmp_path, "same"))
+    other = queue.submit(_params(tmp_path, "other"))
+
+    assert queue.get(first["job_id"])["status"] == "training"
+    assert queue.get(second["job_id"])["status"] == "queued"
+    assert queue.get(other["job_id"])["status"] == "training"
+
+    FakeWorker.started[0].exit("completed")
+    assert queue.get(second["job_id"])["status"] == "training"
+
+
+def test_cancel_queued_and_running_jobs(tmp_path):
+    queue = _queue(tmp_path)
+    queue.start()
+    running = queue.submit(_params(tmp_path, "a"))
+    queued = queue.submit(_params(tmp_path, "b"))
+
+    assert queue.cancel(queued["job_id"])["status"] == "cancelled"
+    job = queue.cancel(running["job_id"])
+    assert job["status"] == "training" and job["cancel_requested"]
+
+    FakeWorker.started[0].exit("cancelled")
+    assert queue.get(running["job_id"])["status"] == "cancelled"
+    with pytest.raises(ValueError):
+        queue.cancel(running["job_id"])
+
+
+def test_pending_cancel_survives_restart(tmp_path):
+    queue = _queue(tmp_path)
+    queue.start()
+    job = queue.submit(_params(tmp_path, "a"))
+    queue.cancel(job["job_id"])
+
+    # El servidor muere sin que el proceso llegue a ver la cancelación
+    restarted = _queue(tmp_path)
+    restarted.start()
+
+    record = restarted.get(job["job_id"])
+    assert record["status"] == "cancelled"
+    assert len(FakeWorker.started) == 1
+
+
+def test_pending_cancel_is_not_requeued_on_shutdown(tmp_path):
+    queue = _queue(tmp_path)
+    queue.start()
+    cancelled = queue.submit(_params(tmp_path, "a"))
+    queue.cancel(cancelled["job_id"])
+
+    queue.shutdown()
+
+    assert queue.get(cancelled["job_id"])["status"] == "cancelled"
+
+
+def test_interrupted_job_is_requeued_on_restart(tmp_path):
+    queue = _queue(tmp_path)
+    queue.start()
+    job = queue.submit(_params(tmp_path, "a"))
+    path = tmp_path / "jobs" / f"{job['job_id']}.json"
+    assert json.loads(path.read_text())["status"] == "training"
+
+    restarted = _queue(tmp_path)
+    restarted.start()
+
+    record = restarted.get(job["job_id"])
+    assert record["status"] == "training"
+    assert record["restarts"] == 1
+    assert len(FakeWorker.started) == 2
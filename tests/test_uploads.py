@@ -0,0 +1,104 @@
+"""Subidas reanudables: offsets, límites y SHA-256 incremental"""
+import asyncio
+import hashlib
+import threading
+
+import pytest
+
+from poema_algoritmo import uploads
+from poema_algoritmo.uploads import (
+    ResumableUploadStore,
+    UploadChecksumError,
+    UploadOffsetError,
+    UploadTooLargeError,
+)
+
+DATA = "La noche y el mar\n".encode("utf-8") * 1000
+
+
+async def _chunks(data: bytes, size: int = 4096):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def _append(store, upload_id, offset, data):
+    return asyncio.run(store.append(upload_id, offset, _chunks(data)))
+
+
+def test_parts_resume_from_current_offset(tmp_path):
+    store = ResumableUploadStore(tmp_path)
+    upload_id = store.create("poems.txt", "dataset", total_size=len(DATA))["upload_id"]
+
+    assert _append(store, upload_id, 0, DATA[:5000])["offset"] == 5000
+    with pytest.raises(UploadOffsetError) as error:
+        _append(store, upload_id, 4000, DATA[4000:])
+    assert error.value.expected_offset == 5000
+    assert store.get(upload_id)["offset"] == 5000
+
+    assert _append(store, upload_id, 5000, DATA[5000:])["offset"] == len(DATA)
+    info, path, sha256 = asyncio.run(store.finalize(upload_id))
+    assert path.read_bytes() == DATA
+    assert sha256 == info["sha256"] == hashlib.sha256(DATA).hexdigest()
+
+
+def test_checksum_survives_restart(tmp_path):
+    store = ResumableUploadStore(tmp_path)
+    upload_id = store.create("poems.txt", "dataset")["upload_id"]
+    _append(store, upload_id, 0, DATA[:7000])
+
+    # Otro proceso (reinicio): el hash incremental se reconstruye desde el .part
+    restarted = ResumableUploadStore(tmp_path)
+    _append(restarted, upload_id, 7000, DATA[7000:])
+    _, _, sha256 = asyncio.run(restarted.finalize(upload_id, expected_sha256=hashlib.sha256(DATA).hexdigest()))
+
+    assert sha256 == hashlib.sha256(DATA).hexdigest()
+
+
+def test_wrong_checksum_is_rejected(tmp_path):
+    store = ResumableUploadStore(tmp_path)
+    upload_id = store.create("poems.txt", "dataset")["upload_id"]
+    _append(store, upload_id, 0, DATA)
+
+    with pytest.raises(UploadChecksumError):
+        asyncio.run(store.finalize(upload_id, expected_sha256="0" * 64))
+    assert store.get(upload_id)["offset"] == len(DATA)
+
+
+def test_incomplete_upload_cannot_be_finalized(tmp_path):
+    store = ResumableUploadStore(tmp_path)
+    upload_id = store.create("poems.txt", "dataset", total_size=len(DATA))["upload_id"]
+    _append(store, upload_id, 0, DATA[:100])
+
+    with pytest.raises(UploadOffsetError) as error:
+        asyncio.run(store.finalize(upload_id))
+    assert error.value.expected_offset == 100
+
+
+def test_oversized_part_is_discarded(tmp_path):
+    store = ResumableUploadStore(tmp_path, max_size=len(DATA))
+    upload_id = store.create("poems.txt", "dataset")["upload_id"]
+    _append(store, upload_id, 0, DATA[:1000])
+
+    with pytest.raises(UploadTooLargeError):
+        _append(store, upload_id, 1000, DATA)
+    assert store.get(upload_id)["offset"] == 1000
+
+    _append(store, upload_id, 1000, DATA[1000:])
+    _, _, sha256 = asyncio.run(store.finalize(upload_id))
+    assert sha256 == hashlib.sha256(DATA).hexdigest()
+
+
+def test_writes_run_off_the_event_loop(tmp_path, monkeypatch):
+    threads = set()
+    write_block = uploads._write_block
+
+    def recording_write_block(f, hasher, block):
+        threads.add(threading.get_ident())
+        write_block(f, hasher, block)
+
+    monkeypatch.setattr(uploads, "_write_block", recording_write_block)
+    store = ResumableUploadStore(tmp_path)
+    upload_id = store.create("poems.txt", "dataset")["upload_id"]
+    _append(store, upload_id, 0, DATA)
+
+    assert threads and threading.get_ident() not in threads